@@ -1,8 +1,11 @@
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from os.path import join
 
 from api.v09.serializers import ImageSerializer
+from candidates.management.commands.candidates_cache_api_to_directory import (
+    CachedAPIPageWriter,
+)
 from candidates.models import LoggedAction, PersonRedirect
 from candidates.models.db import ActionType
 from candidates.tests.auth import TestUserMixin
@@ -12,14 +15,17 @@ from candidates.tests.uk_examples import UK2015ExamplesMixin
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import DefaultStorage
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
+from django.utils import timezone
 from django_webtest import WebTest
+from freezegun import freeze_time
 from mock import patch
 from moderation_queue.tests.paths import EXAMPLE_IMAGE_FILENAME
 from parties.models import Party
 from parties.tests.fixtures import DefaultPartyFixtures
-from people.models import PersonIdentifier, PersonImage
+from people.models import Person, PersonIdentifier, PersonImage
 from people.tests.factories import PersonFactory
+from popolo.models import Membership
 from rest_framework.authtoken.models import Token
 
 
@@ -406,6 +412,188 @@ class TestAPI(
             "https://candidates.democracyclub.org.uk/api/next/people/818/?format=json",
         )
 
+    @patch(
+        "candidates.management.commands.candidates_cache_api_to_directory.datetime"
+    )
+    def test_cache_api_to_directory_resume(self, mock_datetime):
+        mock_datetime.now.return_value = datetime(2017, 5, 14, 12, 33, 5, 0)
+        timestamped_directory = join("cached-api", "2017-05-14T12:33:05")
+        write_page = CachedAPIPageWriter.write_page
+        pages_written = []
+
+        def interrupted_write_page(writer, endpoint, page_number, *args):
+            if len(pages_written) == 3:
+                raise KeyboardInterrupt
+            pages_written.append((endpoint, page_number))
+            return write_page(writer, endpoint, page_number, *args)
+
+        with patch.object(
+            CachedAPIPageWriter, "write_page", interrupted_write_page
+        ), self.assertRaises(KeyboardInterrupt):
+            call_command(
+                "candidates_cache_api_to_directory",
+                page_size="3",
+                url_prefix="https://example.com/media/api-cache-for-wcivf",
+            )
+        self.assertEqual(
+            set(self.storage.listdir(timestamped_directory)[1]),
+            {
+                "checkpoint.json",
+                "people-000001.json",
+                "people-000002.json",
+                "ballots-000001.json",
+            },
+        )
+        self.assertFalse(self.storage.exists(join("cached-api", "latest")))
+
+        # Only the pages that weren't written before are written now
+        pages_written.clear()
+        with patch.object(
+            CachedAPIPageWriter, "write_page", interrupted_write_page
+        ):
+            call_command(
+                "candidates_cache_api_to_directory",
+                url_prefix="https://example.com/media/api-cache-for-wcivf",
+                resume=True,
+            )
+        self.assertEqual(
+            pages_written,
+            [("ballots", 2), ("ballots", 3), ("ballots", 4)],
+        )
+        self.assertEqual(
+            set(self.storage.listdir(timestamped_directory)[1]),
+            {
+                "people-000001.json",
+                "people-000002.json",
+                "ballots-000001.json",
+                "ballots-000002.json",
+                "ballots-000003.json",
+                "ballots-000004.json",
+            },
+        )
+        with self.storage.open(
+            join(timestamped_directory, "ballots-000002.json")
+        ) as f:
+            ballots_2_data = json.loads(f.read().decode("utf8"))
+        self.assertEqual(ballots_2_data["count"], 10)
+        self.assertEqual(len(ballots_2_data["results"]), 3)
+        self.assertEqual(
+            ballots_2_data["next"],
+            "https://example.com/media/api-cache-for-wcivf/"
+            "2017-05-14T12:33:05/ballots-000003.json",
+        )
+        self.assertTrue(
+            self.storage.exists(
+                join("cached-api", "latest", "ballots-000001.json")
+            )
+        )
+
+        with self.assertRaises(CommandError):
+            call_command(
+                "candidates_cache_api_to_directory",
+                url_prefix="https://example.com/media/api-cache-for-wcivf",
+                resume=True,
+            )
+
+    def test_cache_api_to_directory_incremental(self):
+        incremental_directory = join("cached-api", "incremental")
+        write_shard = CachedAPIPageWriter.write_shard
+        shards_written = []
+
+        def spy_write_shard(writer, endpoint, shard, pks):
+            shards_written.append((endpoint, shard))
+            return write_shard(writer, endpoint, shard, pks)
+
+        def cache_api(when):
+            shards_written.clear()
+            with patch.object(
+                CachedAPIPageWriter, "write_shard", spy_write_shard
+            ), freeze_time(when):
+                call_command(
+                    "candidates_cache_api_to_directory",
+                    url_prefix="https://example.com/media/api-cache-for-wcivf",
+                    incremental=True,
+                )
+            with self.storage.open(
+                join(incremental_directory, "manifest.json")
+            ) as f:
+                return json.loads(f.read().decode("utf8"))
+
+        now = timezone.now()
+        first_manifest = cache_api(now + timedelta(hours=1))
+        self.assertEqual(
+            sorted(shards_written),
+            [
+                ("ballots", 0),
+                ("people", 0),
+                ("people", 2),
+                ("people", 4),
+                ("people", 5),
+            ],
+        )
+        people_shard = first_manifest["endpoints"]["people"]["0"]
+        self.assertEqual(people_shard["count"], 1)
+        self.assertEqual(
+            people_shard["url"],
+            "https://example.com/media/api-cache-for-wcivf/incremental/{}".format(
+                people_shard["file"]
+            ),
+        )
+        with self.storage.open(
+            join(incremental_directory, people_shard["file"])
+        ) as f:
+            shard_data = json.loads(f.read().decode("utf8"))
+        self.assertEqual(shard_data["results"][0]["name"], "Sheila Gilmore")
+
+        # Nothing has changed
+        self.assertEqual(
+            cache_api(now + timedelta(hours=2))["endpoints"],
+            first_manifest["endpoints"],
+        )
+        self.assertEqual(shards_written, [])
+
+        with freeze_time(now + timedelta(hours=3)):
+            person = Person.objects.get(pk=818)
+            person.name = "Sheila M Gilmore"
+            person.save()
+        second_manifest = cache_api(now + timedelta(hours=4))
+        self.assertEqual(shards_written, [("people", 0)])
+        self.assertNotEqual(
+            second_manifest["endpoints"]["people"]["0"]["hash"],
+            people_shard["hash"],
+        )
+        self.assertEqual(
+            second_manifest["endpoints"]["people"]["2"],
+            first_manifest["endpoints"]["people"]["2"],
+        )
+        # The old version of the shard is kept until the next run
+        self.assertTrue(
+            self.storage.exists(
+                join(incremental_directory, people_shard["file"])
+            )
+        )
+        cache_api(now + timedelta(hours=5))
+        self.assertFalse(
+            self.storage.exists(
+                join(incremental_directory, people_shard["file"])
+            )
+        )
+
+        # Removing a candidacy doesn't change any modified timestamps
+        Membership.objects.filter(person_id=818).delete()
+        cache_api(now + timedelta(hours=6))
+        self.assertEqual(
+            sorted(shards_written), [("ballots", 0), ("people", 0)]
+        )
+
+        with freeze_time(now + timedelta(hours=7)):
+            LoggedAction.objects.create(
+                ballot=self.edinburgh_east_post_ballot,
+                action_type=ActionType.CANDIDACY_DELETE,
+            )
+        cache_api(now + timedelta(hours=8))
+        self.assertEqual(shards_written, [("ballots", 0)])
+
     def _setup_cached_api_directory(self, dir_list):
         """
         Saves a tmp file in settings.MEDIA_ROOT, called `.keep` in each
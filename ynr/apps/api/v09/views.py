@@ -19,7 +19,7 @@ from elections.uk.geo_helpers import (
     get_ballots_from_coords,
     get_ballots_from_postcode,
 )
-from people.models import Person
+from people.models import Person, versions_prefetch
 from popolo.models import Membership, Organization, Post
 from rest_framework import viewsets
 from rest_framework.response import Response
@@ -212,6 +212,7 @@ class PersonViewSet(viewsets.ReadOnlyModelViewSet):
             ),
             "memberships__ballot__election",
             "other_names",
+            versions_prefetch(),
         ).order_by("id")
         date_qs = self.request.query_params.get("updated_gte", None)
         if date_qs:
@@ -4,6 +4,7 @@ from bulk_adding.fields import (
     PersonSuggestionRadioSelect,
 )
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db.models import (
     CharField,
@@ -195,7 +196,11 @@ class BaseBulkAddReconcileFormSet(BaseBulkAddFormSet):
         }
 
         qs = (
-            search_person_by_name(person_name, synonym=True)
+            search_person_by_name(
+                person_name,
+                synonym=True,
+                fuzzy=settings.BULK_ADD_FUZZY_SEARCH,
+            )
             .prefetch_related(
                 Prefetch(
                     "memberships",
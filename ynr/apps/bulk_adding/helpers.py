@@ -16,7 +16,7 @@ def add_person(request, person_data):
     change_metadata = get_change_metadata(request, person_data["source"])
 
     person.record_version(change_metadata, new_person=True)
-    person.save()
+    person.save_versions()
 
     LoggedAction.objects.create(
         user=request.user,
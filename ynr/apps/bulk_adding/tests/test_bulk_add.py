@@ -12,6 +12,8 @@ from candidates.tests.factories import (
 )
 from candidates.tests.test_update_view import membership_id_set
 from candidates.tests.uk_examples import UK2015ExamplesMixin
+from django.db import connection
+from django.test import override_settings
 from django.utils.timezone import now
 from django_webtest import WebTest
 from official_documents.models import BallotSOPN
@@ -1386,6 +1388,26 @@ class TestBulkAdding(TestUserMixin, UK2015ExamplesMixin, WebTest):
                     suggestion_pks,
                 )
 
+    @override_settings(BULK_ADD_FUZZY_SEARCH=True)
+    def test_fuzzy_suggestions_for_names_with_typos(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        ballot = BallotPaperFactory()
+        person = PersonFactory.create(name="John Smith")
+        PersonFactory.create(name="Jane Doe")
+        Person.objects.update_name_search()
+
+        formset = BulkAddReconcileFormSet(initial=[], ballot=ballot)
+        suggestions = formset.suggested_people(
+            "Jonh Smiht",
+            new_party="PP52",
+            new_election=ballot.election,
+            new_name="Jonh Smiht",
+            ballot=ballot,
+        )
+
+        self.assertEqual([p.pk for p in suggestions], [person.pk])
+
     def test_reconcile_form_restores_selections_on_back_navigation_from_confirm(
         self,
     ):
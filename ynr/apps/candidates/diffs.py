@@ -2,8 +2,8 @@
 # between our JSON representation of candidates.
 
 
+import copy
 import json
-import re
 from typing import Dict, List
 
 import jsonpatch
@@ -81,30 +81,196 @@ def explain_candidacy(operation, attribute, ballot_paper_id, leaf):
             operation[key] = " and ".join(clauses)
 
 
-def get_version_diff(from_data, to_data):
-    """Calculate the diff (a mangled JSON patch) between from_data and to_data"""
+def escape_path_key(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def take_equal_value(unmatched, value):
+    """
+    Remove and return the path of the most recently found value in
+    `unmatched`, a list of (path, value), that's equal to `value`, or None.
+    This is how jsonpatch pairs removed and added values up as moves.
+    """
+    for index in range(len(unmatched) - 1, -1, -1):
+        if (unmatched[index][1], type(unmatched[index][1])) == (
+            value,
+            type(value),
+        ):
+            return unmatched.pop(index)[0]
+    return None
+
+
+def values_equal(src, dst):
+    if type(src) is type(dst) and src == dst:
+        return True
+    # Compare them as JSON, like jsonpatch does, so that e.g. True and 1
+    # are different
+    return json.dumps(src) == json.dumps(dst)
+
+
+class VersionDataDiffer:
+    """
+    Find the JSON patch operations between two versions of a person's data,
+    in a single walk over both versions.
+
+    Dicts (the top level, `candidacies` keyed by ballot paper ID and
+    `extra_fields`) are compared key by key. A value that's removed from one
+    key and added at another, e.g. a candidacy moving to a different ballot
+    with the same party, is a move. Keys are visited in the order jsonpatch
+    visits them, so that when there are several equal values the same ones
+    are paired up.
+
+    Lists of dicts (`identifiers` and `other_names`) are compared item by
+    item, with items added or removed at the end.
+
+    Any other lists, e.g. `not_standing`, are passed to jsonpatch, as the
+    indexes of their items change as each operation is applied. They're
+    short, so it doesn't cost much to replay the operations on a copy.
+    """
+
+    def __init__(self):
+        # ("remove" or "add", path, value), in the order they were found
+        self.changes = []
+        self.operations = []
+        self.other_lists = {}
+
+    def compare_dicts(self, path, src, dst):
+        src_keys = set(src.keys())
+        dst_keys = set(dst.keys())
+        for key in src_keys - dst_keys:
+            self.changes.append(
+                ("remove", f"{path}/{escape_path_key(key)}", src[key])
+            )
+        for key in dst_keys - src_keys:
+            self.changes.append(
+                ("add", f"{path}/{escape_path_key(key)}", dst[key])
+            )
+        for key in src_keys & dst_keys:
+            self.compare_values(
+                f"{path}/{escape_path_key(key)}", src[key], dst[key]
+            )
+
+    def compare_lists_of_dicts(self, path, src, dst):
+        for index, (src_item, dst_item) in enumerate(zip(src, dst)):
+            if src_item != dst_item:
+                self.compare_dicts(f"{path}/{index}", src_item, dst_item)
+        # Items are removed from, or added to, the end of the list
+        for src_item in src[len(dst) :]:
+            self.operations.append(
+                {
+                    "op": "remove",
+                    "path": f"{path}/{len(dst)}",
+                    "previous_value": src_item,
+                }
+            )
+        for index in range(len(src), len(dst)):
+            self.operations.append(
+                {"op": "add", "path": f"{path}/{index}", "value": dst[index]}
+            )
+
+    def compare_other_lists(self, path, src, dst):
+        self.other_lists[path] = copy.deepcopy(src)
+        for operation in jsonpatch.make_patch(src, dst):
+            operation["path"] = path + operation["path"]
+            if "from" in operation:
+                operation["from"] = path + operation["from"]
+            operation["list_path"] = path
+            self.operations.append(operation)
+
+    def compare_values(self, path, src, dst):
+        if isinstance(src, dict) and isinstance(dst, dict):
+            self.compare_dicts(path, src, dst)
+        elif isinstance(src, list) and isinstance(dst, list):
+            if src == dst:
+                return
+            if all(isinstance(item, dict) for item in src + dst):
+                self.compare_lists_of_dicts(path, src, dst)
+            else:
+                self.compare_other_lists(path, src, dst)
+        elif not values_equal(src, dst):
+            self.operations.append(
+                {
+                    "op": "replace",
+                    "path": path,
+                    "value": dst,
+                    "previous_value": src,
+                }
+            )
+
+    def diff(self, src, dst):
+        """
+        Return the operations, sorted by op and path, with the previous value
+        of anything that's replaced or removed
+        """
+        self.compare_values("", src, dst)
+
+        # A removed value is paired with the last equal value that was added
+        # before it, and an added value with the last equal value that was
+        # removed before it
+        unmatched = {"remove": [], "add": []}
+        for change, path, value in self.changes:
+            other = "add" if change == "remove" else "remove"
+            other_path = take_equal_value(unmatched[other], value)
+            if other_path is None:
+                unmatched[change].append((path, value))
+            elif change == "add":
+                self.operations.append(
+                    {"op": "move", "from": other_path, "path": path}
+                )
+            else:
+                self.operations.append(
+                    {"op": "move", "from": path, "path": other_path}
+                )
+        for path, value in unmatched["add"]:
+            self.operations.append({"op": "add", "path": path, "value": value})
+        for path, value in unmatched["remove"]:
+            self.operations.append(
+                {"op": "remove", "path": path, "previous_value": value}
+            )
+
+        self.operations.sort(key=lambda o: (o["op"], o["path"]))
+        return self.operations
+
+    def list_previous_value(self, list_path, operation):
+        return jsonpointer.resolve_pointer(
+            self.other_lists[list_path],
+            operation["path"][len(list_path) :],
+            default=None,
+        )
+
+    def apply_list_operation(self, list_path, operation):
+        relative_operation = {
+            **operation,
+            "path": operation["path"][len(list_path) :],
+        }
+        if "from" in operation:
+            relative_operation["from"] = operation["from"][len(list_path) :]
+        jsonpatch.apply_patch(
+            self.other_lists[list_path], [relative_operation], in_place=True
+        )
+
+
+def get_raw_version_diff(from_data, to_data):
+    """
+    Calculate the diff (a mangled JSON patch) between from_data and to_data,
+    without the human readable explanations of candidacies.
 
-    basic_patch = jsonpatch.make_patch(from_data, to_data)
+    This doesn't depend on anything other than the two versions, so it can be
+    stored and explained later with `explain_version_diff`.
+    """
+    differ = VersionDataDiffer()
     result = []
-    for operation in sorted(basic_patch, key=lambda o: (o["op"], o["path"])):
+    for operation in differ.diff(from_data, to_data):
         op = operation["op"]
         attribute = operation["path"].split("/")[1]
+        list_path = operation.pop("list_path", None)
         ignore = False
 
-        if op in ("replace", "remove"):
-            operation["previous_value"] = jsonpointer.resolve_pointer(
-                from_data, operation["path"], default=None
+        if op in ("replace", "remove") and list_path is not None:
+            operation["previous_value"] = differ.list_previous_value(
+                list_path, operation
             )
 
-        # We deal with candidacies slightly
-        # differently so they can be presented in human-readable form,
-        # so match those cases first:
-        if operation["path"].strip("/").startswith("candidacies/"):
-            parts = operation["path"].split("/")[1:]
-            attribute, ballot_paper_id, *leaf = parts
-            leaf = leaf[0] if leaf else None
-            explain_candidacy(operation, attribute, ballot_paper_id, leaf)
-
         if op in ("replace", "remove", "move"):
             if op == "replace" and not operation["previous_value"]:
                 if operation["value"]:
@@ -121,18 +287,58 @@ def get_version_diff(from_data, to_data):
             # standing_in value is being set to None, because that's
             # saying 'we *know* they're not standing then'
             ignore = True
-        operation["path"] = re.sub(r"^/", "", operation["path"])
         if not ignore:
             result.append(operation)
-        # The operations generated by jsonpatch are incremental, so we
-        # need to apply each before going on to parse the next:
-        operation["path"] = "/" + operation["path"]
-        from_data = jsonpatch.apply_patch(from_data, [operation])
+        if list_path is not None:
+            # The operations generated by jsonpatch are incremental, so we
+            # need to apply each before going on to parse the next:
+            differ.apply_list_operation(list_path, operation)
     for operation in result:
         operation["path"] = operation["path"].lstrip("/")
     return result
 
 
+def explain_version_diff(operations):
+    """
+    Return a copy of the operations from `get_raw_version_diff` with the
+    values of candidacies replaced with a human-readable explanation.
+
+    This is done separately from calculating the diff, as the explanation
+    depends on whether the ballot is in the future.
+    """
+    result = []
+    for operation in operations:
+        operation = operation.copy()
+        # We deal with candidacies slightly
+        # differently so they can be presented in human-readable form:
+        if operation["path"].startswith("candidacies/"):
+            attribute, ballot_paper_id, *leaf = operation["path"].split("/")
+            leaf = leaf[0] if leaf else None
+            explain_candidacy(operation, attribute, ballot_paper_id, leaf)
+        result.append(operation)
+    return result
+
+
+def get_changed_fields(operations):
+    """
+    Return the sorted top level fields changed by the operations from
+    `get_raw_version_diff`. Favourite biscuits is an extra field, but it's
+    reported as a field of its own.
+    """
+    fields = set()
+    for operation in operations:
+        if operation["path"] == "extra_fields/favourite_biscuits":
+            fields.add("favourite_biscuits")
+        else:
+            fields.add(operation["path"].split("/")[0])
+    return sorted(fields)
+
+
+def get_version_diff(from_data, to_data):
+    """Calculate the diff (a mangled JSON patch) between from_data and to_data"""
+    return explain_version_diff(get_raw_version_diff(from_data, to_data))
+
+
 def clean_version_data(data):
     data = data.copy()
     for election_slug, standing_in in data.get("standing_in", {}).items():
@@ -165,35 +371,79 @@ def get_parents_version_data(parents, id_to_version):
     return [(None, {})]
 
 
-def get_version_diffs(versions) -> List[Dict]:
+def get_raw_version_diffs(
+    versions, cached_diffs=None, parent_map=None
+) -> Dict[str, Dict]:
+    """
+    Return a dict of version ID to the parent version IDs and raw diffs
+    against each parent, for each of an array of version dicts.
+
+    Versions that are in `cached_diffs` aren't diffed again. `parent_map`
+    is the result of `get_versions_parent_map` for these versions, if it's
+    already known.
+    """
+    cached_diffs = cached_diffs or {}
+    if all(v["version_id"] in cached_diffs for v in versions):
+        return {
+            v["version_id"]: cached_diffs[v["version_id"]] for v in versions
+        }
+
+    id_to_parent_ids = parent_map
+    if id_to_parent_ids is None:
+        id_to_parent_ids = get_versions_parent_map(versions)
+    id_to_version = {v["version_id"]: v for v in versions}
+    result = {}
+    for v in versions:
+        version_id = v["version_id"]
+        if version_id in cached_diffs:
+            result[version_id] = cached_diffs[version_id]
+            continue
+        data = clean_version_data(v["data"])
+        result[version_id] = {
+            "parent_version_ids": id_to_parent_ids[version_id],
+            "diffs": [
+                {
+                    "parent_version_id": parent_with_data[0],
+                    "parent_diff": get_raw_version_diff(
+                        clean_version_data(parent_with_data[1]), data
+                    ),
+                }
+                for parent_with_data in get_parents_version_data(
+                    id_to_parent_ids[version_id], id_to_version
+                )
+            ],
+        }
+    return result
+
+
+def get_version_diffs(versions, raw_diffs=None) -> List[Dict]:
     """Add a diff to each of an array of version dicts
 
     The first version is the most recent; the last is the original
-    version."""
+    version.
+
+    `raw_diffs` can be the result of `get_raw_version_diffs` for these
+    versions, if it's already known."""
     if not versions:
         return []
-    id_to_parent_ids = get_versions_parent_map(versions)
-    id_to_version = {v["version_id"]: v for v in versions}
+    if raw_diffs is None:
+        raw_diffs = get_raw_version_diffs(versions)
     result = []
     for v in versions:
         version_id = v["version_id"]
-        v["parent_version_ids"] = id_to_parent_ids[version_id]
+        parent_version_ids = raw_diffs[version_id]["parent_version_ids"]
+        v["parent_version_ids"] = parent_version_ids
         version_with_diffs = v.copy()
         version_with_diffs["data"] = clean_version_data(
             version_with_diffs["data"]
         )
-        version_with_diffs["parent_version_ids"] = id_to_parent_ids[version_id]
+        version_with_diffs["parent_version_ids"] = parent_version_ids
         version_with_diffs["diffs"] = [
             {
-                "parent_version_id": parent_with_data[0],
-                "parent_diff": get_version_diff(
-                    clean_version_data(parent_with_data[1]),
-                    version_with_diffs["data"],
-                ),
+                "parent_version_id": diff["parent_version_id"],
+                "parent_diff": explain_version_diff(diff["parent_diff"]),
             }
-            for parent_with_data in get_parents_version_data(
-                id_to_parent_ids[version_id], id_to_version
-            )
+            for diff in raw_diffs[version_id]["diffs"]
         ]
         result.append(version_with_diffs)
     return result
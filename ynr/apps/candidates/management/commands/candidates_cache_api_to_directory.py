@@ -1,35 +1,170 @@
+import hashlib
 import json
 import re
-from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from multiprocessing import get_context
 from os.path import join
-from urllib.parse import parse_qs, urlsplit
 
+import elections.api.next.api_views
+import people.api.next.api_views
+from api.next.views import ResultsSetPagination
+from candidates.models import Ballot, LoggedAction
 from django.core.files.base import ContentFile
 from django.core.files.storage import DefaultStorage
-from django.core.management.base import BaseCommand
-from django.test import Client
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from people.models import Person
+from popolo.models import Membership
+from rest_framework.request import Request
 
+CHECKPOINT_FILENAME = "checkpoint.json"
 
-def path_and_query(url):
-    split_url = urlsplit(url)
-    return split_url.path + "?" + split_url.query
+INCREMENTAL_DIRECTORY = "incremental"
+MANIFEST_FILENAME = "manifest.json"
 
+# Changes are looked for from a little before the previous incremental run
+# started, to allow for transactions that were still open at the time
+INCREMENTAL_OVERLAP = timedelta(minutes=2)
 
-def page_from_url(url):
-    page_values = parse_qs(urlsplit(url).query).get("page")
-    if page_values:
-        return int(page_values[0])
-    return 1
+# How many pages to write between saving the checkpoint
+CHECKPOINT_EVERY = 20
 
 
 def page_filename(endpoint, page_number):
     return "{}-{:06d}.json".format(endpoint, page_number)
 
 
+def shard_filename(endpoint, shard, content_hash):
+    return "{}-{:06d}-{}.json".format(endpoint, shard, content_hash[:16])
+
+
 def is_timestamped_dir(directory):
     return re.search(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}$", directory)
 
 
+def dump_json(data):
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode(
+        "utf8"
+    )
+
+
+def ids_hash(pks):
+    return hashlib.sha256(
+        ",".join(str(pk) for pk in sorted(pks)).encode("utf8")
+    ).hexdigest()
+
+
+def save_to_storage(storage, name, content):
+    """
+    Save `content` to `name`, replacing any existing file rather than letting
+    the storage pick an alternative name.
+    """
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+class CachedAPIPageWriter:
+    """
+    Serialise pages of an API endpoint and write them to storage.
+
+    Each page is defined by the list of primary keys on it, so pages can be
+    written in any order and by any process. The JSON is the same as the
+    paginated API response, with `next` and `previous` pointing at the
+    neighbouring cached files.
+    """
+
+    viewsets = {
+        "people": people.api.next.api_views.PersonViewSet,
+        "ballots": elections.api.next.api_views.BallotViewSet,
+    }
+
+    def __init__(self, json_directory, link_prefix, hostname, secure):
+        self.json_directory = json_directory
+        self.link_prefix = link_prefix
+        self.hostname = hostname
+        self.secure = secure
+
+    def get_viewset(self, endpoint):
+        django_request = RequestFactory().get(
+            "/api/next/{}/".format(endpoint),
+            {"format": "json"},
+            secure=self.secure,
+            SERVER_NAME=self.hostname,
+        )
+        viewset = self.viewsets[endpoint](
+            action="list", kwargs={"version": "next"}, format_kwarg=None
+        )
+        viewset.request = Request(django_request)
+        (
+            viewset.request.version,
+            viewset.request.versioning_scheme,
+        ) = viewset.determine_version(viewset.request, version="next")
+        return viewset
+
+    def page_link(self, endpoint, page_number, page_count):
+        if not 1 <= page_number <= page_count:
+            return None
+        return "/".join(
+            [self.link_prefix, page_filename(endpoint, page_number)]
+        )
+
+    def results(self, endpoint, pks):
+        viewset = self.get_viewset(endpoint)
+        queryset = viewset.get_queryset().filter(pk__in=pks)
+        return viewset.get_serializer(queryset, many=True).data
+
+    def page_json(self, endpoint, page_number, pks, count, page_count):
+        data = {
+            "count": count,
+            "next": self.page_link(endpoint, page_number + 1, page_count),
+            "previous": self.page_link(endpoint, page_number - 1, page_count),
+            "results": self.results(endpoint, pks),
+        }
+        return dump_json(data)
+
+    def write_page(self, endpoint, page_number, pks, count, page_count):
+        json_page = self.page_json(
+            endpoint, page_number, pks, count, page_count
+        )
+        save_to_storage(
+            DefaultStorage(),
+            join(self.json_directory, page_filename(endpoint, page_number)),
+            json_page,
+        )
+        return endpoint, page_number
+
+    def write_shard(self, endpoint, shard, pks):
+        """
+        Write a shard of an incremental snapshot, named after a hash of its
+        content so that a shard file never changes once it's been published.
+        """
+        json_shard = dump_json(
+            {"count": len(pks), "results": self.results(endpoint, pks)}
+        )
+        content_hash = hashlib.sha256(json_shard).hexdigest()
+        filename = shard_filename(endpoint, shard, content_hash)
+        storage = DefaultStorage()
+        name = join(self.json_directory, filename)
+        if not storage.exists(name):
+            storage.save(name, ContentFile(json_shard))
+        return (
+            endpoint,
+            shard,
+            {
+                "count": len(pks),
+                "hash": content_hash,
+                "file": filename,
+                "url": "/".join([self.link_prefix, filename]),
+            },
+        )
+
+
 class Command(BaseCommand):
     help = "Cache the output of the persons and posts endpoints to a directory"
 
@@ -54,7 +189,38 @@ class Command(BaseCommand):
         parser.add_argument(
             "--page-size",
             type=int,
-            help="How many results should be output per file (max 200)",
+            help="How many results should be output per file (max {})".format(
+                ResultsSetPagination.max_page_size
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="How many processes to use to write pages",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help=(
+                "Carry on from the checkpoint of the most recent run that "
+                "didn't finish, rather than starting a new directory"
+            ),
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Only rewrite the shards of cached-api/incremental/ that have "
+                "changed since the last incremental run, and update its "
+                "manifest.json"
+            ),
+        )
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=1000,
+            help="How many ids each shard covers in --incremental mode",
         )
         parser.add_argument(
             "--prune",
@@ -69,16 +235,23 @@ class Command(BaseCommand):
     def update_latest_page(self, output_directory, endpoint):
         latest_page_location = join(output_directory, "latest")
         file_name = join(latest_page_location, page_filename(endpoint, 1))
-        self.storage.save(file_name, ContentFile(self.first_page_json))
+        with self.storage.open(
+            join(self.json_directory, page_filename(endpoint, 1))
+        ) as first_page:
+            save_to_storage(self.storage, file_name, first_page.read())
+
+    def timestamped_dirs(self):
+        if not self.storage.exists(self.directory_path):
+            return []
+        return sorted(
+            directory
+            for directory in self.storage.listdir(self.directory_path)[0]
+            if is_timestamped_dir(directory)
+        )
 
     def prune(self):
-        all_dirs = []
-        for directory in self.storage.listdir(self.directory_path)[0]:
-            if is_timestamped_dir(directory):
-                all_dirs.append(directory)
-
         # Make sure we always leave at least the last 4 directories
-        timestamped_directories_to_remove = sorted(all_dirs)[:-4]
+        timestamped_directories_to_remove = self.timestamped_dirs()[:-4]
 
         for path in sorted(timestamped_directories_to_remove):
             dir_path = join(self.directory_path, path)
@@ -107,75 +280,294 @@ class Command(BaseCommand):
             )
         return url_prefix
 
-    def rewrite_link(self, endpoint, url):
-        if not url:
-            return None
-        page = page_from_url(url)
-        filename = page_filename(endpoint, page)
-        return "/".join([self.url_prefix, self.timestamp, filename])
-
-    def get(self, url):
-        kwargs = {"SERVER_NAME": self.hostname}
-        if self.secure:
-            kwargs["wsgi.url_scheme"] = "https"
-            kwargs["secure"] = True
-        return self.client.get(url, **kwargs)
-
-    def rewrite_next_and_previous_links(self, endpoint, data):
-        data["next"] = self.rewrite_link(endpoint, data["next"])
-        data["previous"] = self.rewrite_link(endpoint, data["previous"])
-
-    def get_api_results_to_directory(self, endpoint, json_directory, page_size):
-        url = "/api/next/{endpoint}/?page_size={page_size}&format=json".format(
-            page_size=page_size, endpoint=endpoint
-        )
-
-        while url:
-            page = page_from_url(url)
-            output_filename = join(
-                json_directory, page_filename(endpoint, page)
-            )
-            response = self.get(url)
-            if response.status_code != 200:
-                msg = "Unexpected response {0} from {1}"
-                raise Exception(msg.format(response.status_code, url))
-            data = json.loads(response.content.decode("utf-8"))
-            original_next_url = data["next"]
-            self.rewrite_next_and_previous_links(endpoint, data)
-
-            json_page = json.dumps(data, indent=4, sort_keys=True).encode(
-                "utf8"
+    @property
+    def checkpoint_path(self):
+        return join(self.json_directory, CHECKPOINT_FILENAME)
+
+    def save_checkpoint(self):
+        save_to_storage(
+            self.storage,
+            self.checkpoint_path,
+            json.dumps(self.checkpoint).encode("utf8"),
+        )
+
+    def load_checkpoint(self):
+        """
+        Find the most recent timestamped directory with a checkpoint in it,
+        and carry on writing to it.
+        """
+        for timestamp in reversed(self.timestamped_dirs()):
+            checkpoint_path = join(
+                self.directory_path, timestamp, CHECKPOINT_FILENAME
             )
+            if self.storage.exists(checkpoint_path):
+                with self.storage.open(checkpoint_path) as checkpoint_file:
+                    return timestamp, json.loads(checkpoint_file.read())
+        raise CommandError("No unfinished run to resume")
+
+    def paginate_endpoint(self, endpoint, page_size):
+        """
+        Split the ordered primary keys of an endpoint into pages.
+
+        This is a single scan of the ordering columns, after which every page
+        can be fetched with a `pk__in` lookup rather than an increasingly
+        expensive OFFSET.
+        """
+        viewset = self.writer.get_viewset(endpoint)
+        pages = []
+        page = []
+        for pk in (
+            viewset.get_queryset()
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=10_000)
+        ):
+            page.append(pk)
+            if len(page) == page_size:
+                pages.append(page)
+                page = []
+        if page or not pages:
+            pages.append(page)
+        return {
+            "count": sum(len(page) for page in pages),
+            "pages": pages,
+            "done": [],
+        }
+
+    def page_jobs(self):
+        for endpoint in self.endpoints:
+            endpoint_checkpoint = self.checkpoint[endpoint]
+            done = set(endpoint_checkpoint["done"])
+            page_count = len(endpoint_checkpoint["pages"])
+            for page_number, pks in enumerate(
+                endpoint_checkpoint["pages"], start=1
+            ):
+                if page_number in done:
+                    continue
+                yield (
+                    endpoint,
+                    page_number,
+                    pks,
+                    endpoint_checkpoint["count"],
+                    page_count,
+                )
+
+    def page_written(self, endpoint, page_number):
+        self.checkpoint[endpoint]["done"].append(page_number)
+        self.pages_since_checkpoint += 1
+        if self.pages_since_checkpoint >= CHECKPOINT_EVERY:
+            self.save_checkpoint()
+            self.pages_since_checkpoint = 0
+
+    def run_jobs(self, func, jobs, callback):
+        """
+        Call `func` with each job's arguments, in a process pool if there's
+        more than one worker, and pass what it returns to `callback`.
+        """
+        if self.workers == 1:
+            for job in jobs:
+                callback(*func(*job))
+            return
+
+        # Each process needs its own database connection, so make sure
+        # none are inherited when forking
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=get_context("fork")
+        ) as executor:
+            futures = [executor.submit(func, *job) for job in jobs]
+            for future in as_completed(futures):
+                callback(*future.result())
+
+    def write_pages(self):
+        self.pages_since_checkpoint = 0
+        self.run_jobs(
+            self.writer.write_page, self.page_jobs(), self.page_written
+        )
 
-            if page == 1:
-                self.first_page_json = json_page
+    @property
+    def manifest_path(self):
+        return join(self.json_directory, MANIFEST_FILENAME)
+
+    def load_manifest(self):
+        if not self.storage.exists(self.manifest_path):
+            return None
+        with self.storage.open(self.manifest_path) as manifest_file:
+            return json.loads(manifest_file.read())
+
+    def changed_pks(self, endpoint, since):
+        if endpoint == "people":
+            queryset = Person.objects.filter(modified__gt=since)
+            return set(queryset.values_list("pk", flat=True))
+        changed = set(
+            Ballot.objects.last_updated(since).values_list("pk", flat=True)
+        )
+        # Changes that don't touch any modified timestamps, such as
+        # removing a candidacy, are still logged against the ballot
+        changed.update(
+            LoggedAction.objects.filter(created__gt=since)
+            .exclude(ballot=None)
+            .values_list("ballot_id", flat=True)
+        )
+        return changed
 
-            self.storage.save(output_filename, ContentFile(json_page))
+    def membership_ids(self, shard_size):
+        """
+        Group the primary key of every candidacy into the shards of the
+        people and ballots they're for. A shard whose candidacies aren't the
+        same as last time has had one deleted, which leaves nothing else
+        behind to find it by.
+        """
+        shards = {endpoint: defaultdict(list) for endpoint in self.endpoints}
+        for pk, person_id, ballot_id in (
+            Membership.objects.order_by("pk")
+            .values_list("pk", "person_id", "ballot_id")
+            .iterator(chunk_size=10_000)
+        ):
+            shards["people"][person_id // shard_size].append(pk)
+            shards["ballots"][ballot_id // shard_size].append(pk)
+        return shards
+
+    def shard_ids(self, endpoint, shard_size):
+        """
+        Group every primary key of an endpoint into shards of `shard_size`
+        consecutive ids. Shards are based on ids rather than the API ordering
+        so that new objects don't move existing ones into other shards.
+        """
+        model = Person if endpoint == "people" else Ballot
+        shards = defaultdict(list)
+        for pk in (
+            model.objects.order_by("pk")
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=10_000)
+        ):
+            shards[pk // shard_size].append(pk)
+        return shards
+
+    def handle_incremental(self, shard_size):
+        """
+        Write an incremental snapshot to `cached-api/incremental/`.
 
-            # Now make sure the next URL works with the test client:
-            if original_next_url:
-                url = path_and_query(original_next_url)
-            else:
-                url = None
+        Each endpoint is split into shards of ids, and only the shards with
+        objects that have changed since the last run, or with objects or
+        candidacies added or removed, are written. `manifest.json` maps each shard to a hash of
+        its content, so consumers can compare it with the last manifest they
+        saw and only fetch the shards that have changed.
+        """
+        self.json_directory = join(self.directory_path, INCREMENTAL_DIRECTORY)
+        self.writer = CachedAPIPageWriter(
+            self.json_directory,
+            "/".join([self.url_prefix, INCREMENTAL_DIRECTORY]),
+            self.hostname,
+            self.secure,
+        )
+        run_started = timezone.now()
+        previous_manifest = self.load_manifest()
+        if previous_manifest and previous_manifest["shard_size"] != shard_size:
+            previous_manifest = None
+
+        manifest = {
+            "generated": run_started.isoformat(),
+            "shard_size": shard_size,
+            "endpoints": {},
+        }
+        jobs = []
+        membership_ids = self.membership_ids(shard_size)
+        for endpoint in self.endpoints:
+            previous_shards = {}
+            changed = None
+            if previous_manifest:
+                previous_shards = previous_manifest["endpoints"][endpoint]
+                changed = self.changed_pks(
+                    endpoint,
+                    parse_datetime(previous_manifest["generated"])
+                    - INCREMENTAL_OVERLAP,
+                )
+            shards = manifest["endpoints"][endpoint] = {}
+            for shard, pks in self.shard_ids(endpoint, shard_size).items():
+                previous_shard = previous_shards.get(str(shard))
+                shard_ids_hash = ids_hash(pks)
+                memberships_hash = ids_hash(membership_ids[endpoint][shard])
+                if (
+                    previous_shard
+                    and previous_shard["ids_hash"] == shard_ids_hash
+                    and previous_shard.get("memberships_hash")
+                    == memberships_hash
+                    and changed.isdisjoint(pks)
+                ):
+                    shards[str(shard)] = previous_shard
+                    continue
+                shards[str(shard)] = {
+                    "ids_hash": shard_ids_hash,
+                    "memberships_hash": memberships_hash,
+                }
+                jobs.append((endpoint, shard, pks))
+
+        def shard_written(endpoint, shard, shard_data):
+            manifest["endpoints"][endpoint][str(shard)].update(shard_data)
+
+        self.run_jobs(self.writer.write_shard, jobs, shard_written)
+        save_to_storage(self.storage, self.manifest_path, dump_json(manifest))
+        self.delete_unused_shards(manifest, previous_manifest)
+        if self.verbosity > 1:
+            self.stdout.write("Wrote {} shards".format(len(jobs)))
+
+    def delete_unused_shards(self, manifest, previous_manifest):
+        """
+        Delete shard files that aren't in the current or the previous
+        manifest. Files from the previous manifest are kept so consumers
+        that are part way through reading it don't find them missing.
+        """
+        in_use = {MANIFEST_FILENAME}
+        for shard_manifest in (manifest, previous_manifest or {}):
+            for shards in shard_manifest.get("endpoints", {}).values():
+                in_use.update(shard["file"] for shard in shards.values())
+        for filename in self.storage.listdir(self.json_directory)[1]:
+            if filename not in in_use:
+                self.storage.delete(join(self.json_directory, filename))
 
     def handle(self, *args, **options):
-        self.client = Client()
         self.directory_path = "cached-api"
         self.storage = DefaultStorage()
         self.secure = not options.get("http", False)
         self.hostname = options["hostname"]
         self.url_prefix = self.get_url_prefix(options["url_prefix"])
+        self.workers = max(int(options["workers"]), 1)
+        self.verbosity = options["verbosity"]
+
+        if options["incremental"]:
+            self.handle_incremental(int(options["shard_size"]))
+            return
+
+        if options["resume"]:
+            self.timestamp, self.checkpoint = self.load_checkpoint()
+        else:
+            self.timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+            self.checkpoint = None
+        self.json_directory = join(self.directory_path, self.timestamp)
+        self.writer = CachedAPIPageWriter(
+            self.json_directory,
+            "/".join([self.url_prefix, self.timestamp]),
+            self.hostname,
+            self.secure,
+        )
 
-        self.timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-        json_directory = join(self.directory_path, self.timestamp)
+        if self.checkpoint is None:
+            page_size = int(options["page_size"] or 200)
+            page_size = min(page_size, ResultsSetPagination.max_page_size)
+            self.checkpoint = {
+                endpoint: self.paginate_endpoint(endpoint, page_size)
+                for endpoint in self.endpoints
+            }
+            self.save_checkpoint()
+
+        try:
+            self.write_pages()
+        except BaseException:
+            self.save_checkpoint()
+            raise
 
-        page_size = options["page_size"]
-        if not page_size:
-            page_size = 200
         for endpoint in self.endpoints:
-            self.get_api_results_to_directory(
-                endpoint, json_directory, page_size
-            )
             self.update_latest_page(self.directory_path, endpoint)
+        self.storage.delete(self.checkpoint_path)
         if options["prune"]:
             self.prune()
@@ -13,8 +13,10 @@ from django_extensions.db.models import TimeStampedModel
 from moderation_queue.review_required_helper import (
     POST_DECISION_REVIEW_TYPES,
     REVIEW_TYPES,
+    ReviewDecisionContext,
 )
 from moderation_queue.slack import post_action_to_slack
+from moderation_queue.statement_moderation import queue_statement_moderation
 from popolo.models import VersionNotFound
 
 
@@ -110,7 +112,7 @@ class LoggedAction(models.Model):
     """A model for logging the actions of users on the site
 
     We record the changes that have been made to a person in PopIt in
-    that person's 'versions' field, but is not much help for queries
+    that person's versions, but they're not much help for queries
     like "what has John Q User been doing on the site?". The
     LoggedAction model makes that kind of query easy, however, and
     should be helpful in tracking down both bugs and the actions of
@@ -313,9 +315,10 @@ class LoggedAction(models.Model):
         and sets the flags accordingly
 
         """
+        context = ReviewDecisionContext(self)
         for review_stage in [REVIEW_TYPES, POST_DECISION_REVIEW_TYPES]:
             for review_type in review_stage:
-                decider = review_type.cls(self)
+                decider = review_type.cls(self, context)
                 decision = decider.needs_review()
                 if decision == review_type.cls.Status.NEEDS_REVIEW:
                     self.flagged_type = review_type.type
@@ -337,6 +340,10 @@ class LoggedAction(models.Model):
             self.version_fields = self.person.version_fields(version_id)
         super().save(**kwargs)
 
+        statement_to_moderate = self.__dict__.pop("statement_to_moderate", None)
+        if statement_to_moderate:
+            queue_statement_moderation(self, statement_to_moderate)
+
         if (
             not has_initial_pk
             and self.flagged_type
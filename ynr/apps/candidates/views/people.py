@@ -173,21 +173,18 @@ class RevertPersonView(LoginRequiredMixin, View):
 
         with transaction.atomic():
             person = get_object_or_404(Person, id=person_id)
-            versions = person.versions
-            data_to_revert_to = None
-            for version in versions:
-                if version["version_id"] == version_id:
-                    data_to_revert_to = version["data"]
-                    break
-
-            if not data_to_revert_to:
+            version = person.person_versions.filter(
+                version_id=version_id
+            ).first()
+
+            if not version:
                 message = "Couldn't find the version {0} of person {1}"
                 raise Exception(message.format(version_id, person_id))
 
             change_metadata = get_change_metadata(self.request, source)
 
             # Update the person here...
-            revert_person_from_version_data(person, data_to_revert_to)
+            revert_person_from_version_data(person, version.content["data"])
 
             person.record_version(change_metadata)
             person.save()
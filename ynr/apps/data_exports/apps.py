@@ -8,16 +8,17 @@ from django.db.models.signals import post_migrate
 
 def create_materialized_view_when_migrations_disabled(**kwargs):
     """
-    This is needed because we manage the view in a migration (to better allow changing
+    This is needed because we manage the table in a migration (to better allow changing
     it over time), but we disable migrations when running tests.
 
-    Parts of the application relies on the view existing, so we need to ensure it's there
+    Parts of the application relies on the table existing, so we need to ensure it's there
     by using a `post_migrate` signal (that's called even when no migrations are run)
 
     """
     if settings.MIGRATION_MODULES.__class__.__name__ == "DisableMigrations":
         migration = importlib.import_module(
-            "data_exports.migrations.0002_create_sql", package=None
+            "data_exports.migrations.0006_materialized_memberships_table",
+            package=None,
         )
 
         with connection.cursor() as cursor:
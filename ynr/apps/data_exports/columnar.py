@@ -0,0 +1,148 @@
+"""
+Columnar (Parquet and Arrow) versions of the data exports.
+
+These are built from the same filtered `MaterializedMembershipsQuerySet` as
+the CSV, using the `value_type` of each field in `csv_fields` as the column
+type.
+
+Rows are fetched from the database in batches, and each batch is written out
+before the next is fetched, so memory use doesn't grow with the size of the
+export.
+
+Every batch only contains rows for a single `election_date`. This means that
+each row group in a Parquet file covers one election date, and that we can
+write a dataset with a file per election date.
+
+"""
+
+import io
+from tempfile import TemporaryFile
+from typing import Iterator, List
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.files import File
+
+from .csv_fields import csv_fields
+
+ARROW_TYPES = {
+    "str": pa.string(),
+    "int": pa.int64(),
+    # Only used for percentages
+    "decimal": pa.decimal128(5, 2),
+    "bool": pa.bool_(),
+    "date": pa.date32(),
+    "datetime": pa.timestamp("us", tz="UTC"),
+}
+
+ARROW_BATCH_SIZE = 10_000
+
+
+def arrow_schema(fieldnames: List[str]) -> pa.Schema:
+    return pa.schema(
+        [
+            pa.field(name, ARROW_TYPES[csv_fields[name].value_type])
+            for name in fieldnames
+        ]
+    )
+
+
+def iter_record_batches(
+    queryset, fieldnames: List[str], batch_size: int = ARROW_BATCH_SIZE
+) -> Iterator[pa.RecordBatch]:
+    """
+    Yield the rows of `queryset` as Arrow record batches of up to
+    `batch_size` rows, starting a new batch whenever the election date
+    changes.
+
+    :param queryset: a `MaterializedMembershipsQuerySet` that has been through
+        `for_data_table`, so it's ordered by election date and returns dicts
+    :param fieldnames: the fields selected by the queryset
+    """
+    schema = arrow_schema(fieldnames)
+    rows = []
+    for row in queryset.iterator(chunk_size=batch_size):
+        if rows and (
+            len(rows) >= batch_size
+            or row["election_date"] != rows[0]["election_date"]
+        ):
+            yield pa.RecordBatch.from_pylist(rows, schema=schema)
+            rows = []
+        rows.append(row)
+    if rows:
+        yield pa.RecordBatch.from_pylist(rows, schema=schema)
+
+
+def iter_arrow_stream(queryset, fieldnames: List[str]) -> Iterator[bytes]:
+    """
+    Yield an Arrow IPC stream of the rows of `queryset`, one record batch at
+    a time.
+    """
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, arrow_schema(fieldnames)) as writer:
+        yield drain()
+        for batch in iter_record_batches(queryset, fieldnames):
+            writer.write_batch(batch)
+            yield drain()
+    yield drain()
+
+
+def write_parquet(file_like, queryset, fieldnames: List[str]):
+    """
+    Write the rows of `queryset` to a single Parquet file, with separate
+    row groups for each election date.
+    """
+    with pq.ParquetWriter(file_like, arrow_schema(fieldnames)) as writer:
+        for batch in iter_record_batches(queryset, fieldnames):
+            writer.write_batch(batch)
+
+
+def write_partitioned_parquet(
+    storage, directory: str, queryset, fieldnames: List[str]
+) -> List[str]:
+    """
+    Write the rows of `queryset` to `storage` as a Parquet dataset,
+    partitioned by election date:
+
+        <directory>/election_date=2024-05-02/data.parquet
+
+    Returns the names of the files that were saved.
+    """
+    schema = arrow_schema(fieldnames)
+    saved = []
+    partition_date = None
+    parquet_file = writer = None
+
+    def save_partition():
+        writer.close()
+        parquet_file.seek(0)
+        name = f"{directory}/election_date={partition_date}/data.parquet"
+        saved.append(storage.save(name, File(parquet_file)))
+        parquet_file.close()
+
+    for batch in iter_record_batches(queryset, fieldnames):
+        batch_date = batch.column("election_date")[0].as_py().isoformat()
+        if batch_date != partition_date:
+            if writer:
+                save_partition()
+            partition_date = batch_date
+            parquet_file = TemporaryFile()
+            writer = pq.ParquetWriter(parquet_file, schema)
+        writer.write_batch(batch)
+    if writer:
+        save_partition()
+    return saved
+
+
+def write_parquet_to_temporary_file(queryset, fieldnames: List[str]):
+    parquet_file = TemporaryFile()
+    write_parquet(parquet_file, queryset, fieldnames)
+    parquet_file.seek(0)
+    return parquet_file
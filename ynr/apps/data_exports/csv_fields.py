@@ -12,6 +12,9 @@ Fields marked as `core` will _always_ be included in the CSV output.
 
 All other fields are optional.
 
+`value_type` is the type of the value in the database. It's used to pick
+filters and the column types of columnar exports.
+
 """
 
 from collections import OrderedDict
@@ -45,7 +48,9 @@ class CSVField:
     label: str
     core: bool = False
     formatter: Optional[Callable] = None
-    value_type: str = "str"
+    value_type: Literal[
+        "str", "int", "decimal", "bool", "date", "datetime"
+    ] = "str"
     dynamic_filter: bool = True
 
 
@@ -63,6 +68,7 @@ csv_fields["person_id"] = CSVField(
         value, reverse("person-view", kwargs={"person_id": value})
     ),
     label="Person ID",
+    value_type="int",
 )
 csv_fields["person_name"] = CSVField(
     value="person_name",
@@ -116,6 +122,7 @@ csv_fields["election_date"] = CSVField(
     core=True,
     value_group="election",
     label="Election date",
+    value_type="date",
 )
 csv_fields["election_current"] = CSVField(
     value=F("ballot_paper__election__current"),
@@ -123,6 +130,7 @@ csv_fields["election_current"] = CSVField(
     core=True,
     value_group="election",
     label="Current election (boolean)",
+    value_type="bool",
 )
 csv_fields["by_election"] = CSVField(
     value=Case(
@@ -133,6 +141,7 @@ csv_fields["by_election"] = CSVField(
     type="expr",
     value_group="election",
     label="By-election (boolean)",
+    value_type="bool",
 )
 csv_fields["by_election_reason"] = CSVField(
     value=F("ballot_paper__by_election_reason"),
@@ -183,12 +192,14 @@ csv_fields["party_list_position"] = CSVField(
     type="attr",
     value_group="candidacy",
     label="Party list position",
+    value_type="int",
 )
 csv_fields["party_lists_in_use"] = CSVField(
     value=F("ballot_paper__election__party_lists_in_use"),
     type="expr",
     value_group="candidacy",
     label="Party lists in use (boolean)",
+    value_type="bool",
 )
 csv_fields["gss"] = CSVField(
     value=Case(
@@ -223,6 +234,7 @@ csv_fields["cancelled_poll"] = CSVField(
     core=True,
     value_group="election",
     label="Cancelled poll (boolean)",
+    value_type="bool",
 )
 csv_fields["candidates_locked"] = CSVField(
     type="expr",
@@ -230,6 +242,7 @@ csv_fields["candidates_locked"] = CSVField(
     value_group="election",
     label="Candidates locked (boolean)",
     dynamic_filter=False,
+    value_type="bool",
 )
 csv_fields["nuts1"] = CSVField(
     type="expr",
@@ -243,6 +256,7 @@ csv_fields["seats_contested"] = CSVField(
     core=True,
     value_group="election",
     label="Seats contested",
+    value_type="int",
 )
 csv_fields["organisation_name"] = CSVField(
     type="expr",
@@ -272,6 +286,7 @@ csv_fields["elected"] = CSVField(
     value="elected",
     value_group="results",
     label="Elected",
+    value_type="bool",
 )
 
 csv_fields["tied_vote_winner"] = CSVField(
@@ -279,36 +294,42 @@ csv_fields["tied_vote_winner"] = CSVField(
     value=F("membership__result__tied_vote_winner"),
     value_group="results",
     label="Tied vote winner (Boolean)",
+    value_type="bool",
 )
 csv_fields["rank"] = CSVField(
     type="expr",
     value=F("membership__result__rank"),
     value_group="results",
     label="Rank",
+    value_type="int",
 )
 csv_fields["turnout_reported"] = CSVField(
     type="expr",
     value=F("ballot_paper__resultset__num_turnout_reported"),
     value_group="results",
     label="Ballot papers issued",
+    value_type="int",
 )
 csv_fields["spoilt_ballots"] = CSVField(
     type="expr",
     value=F("ballot_paper__resultset__num_spoilt_ballots"),
     value_group="results",
     label="Reported spoilt ballots",
+    value_type="int",
 )
 csv_fields["total_electorate"] = CSVField(
     type="expr",
     value=F("ballot_paper__resultset__total_electorate"),
     value_group="results",
     label="Electorate",
+    value_type="int",
 )
 csv_fields["turnout_percentage"] = CSVField(
     type="expr",
     value=F("ballot_paper__resultset__turnout_percentage"),
     value_group="results",
     label="Turnout %",
+    value_type="decimal",
 )
 csv_fields["results_source"] = CSVField(
     type="expr",
@@ -380,6 +401,7 @@ csv_fields["statement_last_updated"] = CSVField(
     value=RawSQL(BIOGRAPHY_LAST_UPDATED_SQL, []),
     value_group="person",
     label="Statement last updated",
+    value_type="datetime",
 )
 
 csv_fields["person_last_updated"] = CSVField(
@@ -387,6 +409,7 @@ csv_fields["person_last_updated"] = CSVField(
     value=F("person__modified"),
     value_group="person",
     label="Person last updated",
+    value_type="datetime",
 )
 
 storages_url = default_storage.url("")
@@ -186,7 +186,7 @@ def create_materialized_membership_filter(
         if not field.dynamic_filter:
             continue
         method = "filter_null_or_empty_str"
-        if field.value_type == "int":
+        if field.value_type in ("int", "decimal"):
             method = "filter_null_or_empty_int"
 
         DynamicMaterializedMembershipFilter.base_filters[
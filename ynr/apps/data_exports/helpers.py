@@ -0,0 +1,173 @@
+import datetime
+import gzip
+import hashlib
+import json
+import zlib
+from collections import Counter
+from tempfile import TemporaryFile
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlencode
+
+from django.core.files import File
+from django.http import QueryDict
+from django.utils import timezone
+
+from .csv_fields import csv_fields, get_core_fieldnames
+from .filters import create_materialized_membership_filter
+from .forms import AdditionalFieldsForm, grouped_choices
+from .models import (
+    CSVDownloadLog,
+    MaterializedMemberships,
+    MaterializedMembershipsRefresh,
+    PrebuiltCSV,
+)
+
+# Query params that don't change the content of a CSV
+IGNORED_QUERY_PARAMS = ("format", "page")
+
+
+def get_filter_data(query_params: QueryDict, queryset=None) -> Dict:
+    """
+    Build the filtered MaterializedMemberships queryset, extra fields and
+    headers for a set of query params from the data export forms.
+    """
+    if queryset is None:
+        queryset = MaterializedMemberships.objects.all()
+    context = {}
+    context["extra_fields"] = []
+    additional_fields_form = AdditionalFieldsForm(data=query_params)
+    if additional_fields_form.is_valid():
+        context["extra_fields"] = additional_fields_form.cleaned_data[
+            "extra_fields"
+        ]
+
+    context["csv_fields"] = grouped_choices()
+
+    context["additional_fields_form"] = additional_fields_form
+
+    for field_name, field in csv_fields.items():
+        if field.core:
+            continue
+        if field.value_group in query_params.getlist("field_group"):
+            context["extra_fields"].append(field_name)
+
+    context["headers"] = get_core_fieldnames() + context["extra_fields"]
+
+    qs = queryset.for_data_table(extra_fields=context["extra_fields"])
+    filter_set = create_materialized_membership_filter(
+        [
+            (field_name, csv_fields[field_name])
+            for field_name in context["extra_fields"]
+        ]
+    )(
+        query_params,
+        queryset=qs,
+    )
+
+    context["objects"] = filter_set.qs
+    context["filter_set"] = filter_set
+
+    return context
+
+
+def normalise_query_params(query_params) -> Dict[str, List[str]]:
+    """
+    Turn a QueryDict, or the `query_params` stored on a CSVDownloadLog, into
+    a dict that's the same for every request that would produce the same CSV.
+
+    Keys are sorted, and blank values and params that don't change the CSV
+    are dropped. The order of values is kept, as it can change the order of
+    the columns.
+    """
+    if isinstance(query_params, QueryDict):
+        items = query_params.lists()
+    else:
+        items = query_params.items()
+
+    normalised = {}
+    for key, values in sorted(items):
+        if key in IGNORED_QUERY_PARAMS:
+            continue
+        if not isinstance(values, list):
+            values = [values]
+        values = [str(value) for value in values if value not in ("", None)]
+        if values:
+            normalised[key] = values
+    return normalised
+
+
+def query_params_to_query_dict(query_params: Dict[str, List[str]]):
+    return QueryDict(urlencode(query_params, doseq=True))
+
+
+def prebuilt_csv_key(query_params: Dict[str, List[str]], generation: int):
+    key_data = json.dumps(
+        {"generation": generation, "query_params": query_params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(key_data.encode("utf8")).hexdigest()
+
+
+def get_prebuilt_csv(query_params: QueryDict) -> Optional[PrebuiltCSV]:
+    """
+    Return the PrebuiltCSV for these query params if there is one for the
+    current generation of `materialized_memberships`.
+    """
+    key = prebuilt_csv_key(
+        normalise_query_params(query_params),
+        MaterializedMembershipsRefresh.current_generation(),
+    )
+    return PrebuiltCSV.objects.filter(key=key).first()
+
+
+def popular_query_params(days: int = 30, limit: int = 20):
+    """
+    Return the `limit` most downloaded sets of normalised query params from
+    the CSVDownloadLog over the last `days` days.
+    """
+    since = timezone.now() - datetime.timedelta(days=days)
+    counts = Counter()
+    for query_params in (
+        CSVDownloadLog.objects.filter(created__gte=since)
+        .values_list("query_params", flat=True)
+        .iterator()
+    ):
+        normalised = normalise_query_params(query_params or {})
+        counts[json.dumps(normalised, sort_keys=True)] += 1
+    return [json.loads(params) for params, _ in counts.most_common(limit)]
+
+
+def build_prebuilt_csv(
+    query_params: Dict[str, List[str]], generation: int
+) -> PrebuiltCSV:
+    """
+    Write a gzipped CSV for these query params to storage and return the
+    PrebuiltCSV pointing at it.
+    """
+    key = prebuilt_csv_key(query_params, generation)
+    filter_data = get_filter_data(query_params_to_query_dict(query_params))
+    with TemporaryFile() as csv_file:
+        with gzip.GzipFile(fileobj=csv_file, mode="wb") as gzip_file:
+            filter_data["objects"].write_csv(
+                gzip_file, extra_fields=filter_data["extra_fields"]
+            )
+        csv_file.seek(0)
+        prebuilt_csv = PrebuiltCSV(
+            key=key, generation=generation, query_params=query_params
+        )
+        prebuilt_csv.csv_file.save(f"{key}.csv.gz", File(csv_file), save=False)
+    prebuilt_csv.save()
+    return prebuilt_csv
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Gzip an iterable of bytes as it's consumed, without holding more than a
+    chunk in memory.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
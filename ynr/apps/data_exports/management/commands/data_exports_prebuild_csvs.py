@@ -0,0 +1,48 @@
+from data_exports.helpers import (
+    build_prebuilt_csv,
+    popular_query_params,
+    prebuilt_csv_key,
+)
+from data_exports.models import MaterializedMembershipsRefresh, PrebuiltCSV
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = """
+    Builds gzipped CSVs for the most popular data export downloads, so they
+    can be served from storage rather than built on each request.
+
+    Popularity comes from the CSVDownloadLog. CSVs are only built once per
+    generation of the MaterializedMemberships table.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="The number of popular downloads to build",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Count downloads made in this many days",
+        )
+
+    def handle(self, *args, **options):
+        generation = MaterializedMembershipsRefresh.current_generation()
+        if not generation:
+            return
+
+        PrebuiltCSV.objects.exclude(generation=generation).delete_with_files()
+
+        for query_params in popular_query_params(
+            days=options["days"], limit=options["limit"]
+        ):
+            key = prebuilt_csv_key(query_params, generation)
+            if PrebuiltCSV.objects.filter(key=key).exists():
+                continue
+            build_prebuilt_csv(query_params, generation)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Built CSV for {query_params}")
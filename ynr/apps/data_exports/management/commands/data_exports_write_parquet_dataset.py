@@ -0,0 +1,44 @@
+from data_exports.columnar import write_partitioned_parquet
+from data_exports.helpers import get_filter_data, query_params_to_query_dict
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = """
+    Writes every candidacy to storage as a Parquet dataset, with a file
+    per election date:
+
+        <directory>/election_date=2024-05-02/data.parquet
+
+    Core fields are always included. Use --field-group to add the fields
+    from the data export field groups, e.g. `--field-group results`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory",
+            default="data_exports/parquet",
+            help="The directory in storage to write the dataset to",
+        )
+        parser.add_argument(
+            "--field-group",
+            action="append",
+            default=[],
+            dest="field_groups",
+            help="A group of fields to add. Can be given more than once",
+        )
+
+    def handle(self, *args, **options):
+        filter_data = get_filter_data(
+            query_params_to_query_dict({"field_group": options["field_groups"]})
+        )
+        saved = write_partitioned_parquet(
+            default_storage,
+            options["directory"],
+            filter_data["objects"],
+            filter_data["headers"],
+        )
+        if options["verbosity"] > 1:
+            for name in saved:
+                self.stdout.write(name)
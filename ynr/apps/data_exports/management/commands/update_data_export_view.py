@@ -3,7 +3,23 @@ from django.core.management.base import BaseCommand
 
 
 class Command(BaseCommand):
-    help = "Updates the MaterializedMemberships materialized view"
+    help = """
+    Updates the MaterializedMemberships table.
+
+    By default only rows that have changed since the last update are rebuilt.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild every row, rather than only the rows that have changed",
+        )
 
     def handle(self, *args, **options):
-        MaterializedMemberships.refresh_view()
+        if options["full"]:
+            refresh = MaterializedMemberships.refresh_view()
+        else:
+            refresh = MaterializedMemberships.refresh_view_incremental()
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Updated {refresh.rows_updated} rows")
@@ -6,7 +6,6 @@ it doesn't actually do anything at all.
 
 # Generated by Django 4.1.7 on 2023-05-08 15:25
 
-import data_exports.models
 from django.db import migrations, models
 
 
@@ -25,6 +24,6 @@ class Migration(migrations.Migration):
                 "db_table": "materialized_memberships",
                 "managed": False,
             },
-            bases=(data_exports.models.MaterializedModelMixin, models.Model),
+            bases=(models.Model,),
         ),
     ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.16 on 2026-10-18 17:14
+
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "data_exports",
+            "0004_alter_materializedmemberships_options_csvdownloadlog",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MaterializedMembershipsRefresh",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                ("full", models.BooleanField(default=False)),
+                ("rows_updated", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "get_latest_by": "created",
+            },
+        ),
+    ]
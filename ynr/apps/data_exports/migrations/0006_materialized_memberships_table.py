@@ -0,0 +1,67 @@
+"""
+Replace the `materialized_memberships` materialized view with a plain table.
+
+Postgres can only refresh a materialized view in full, so we maintain the rows
+ourselves instead. See `MaterializedMemberships.refresh_view_incremental`.
+
+The identifiers are built with a LATERAL join per membership so that Postgres
+doesn't aggregate every person's identifiers when only a few rows are rebuilt.
+
+"""
+
+from importlib import import_module
+
+from django.db import migrations
+
+SQL_STR = """
+DROP MATERIALIZED VIEW IF EXISTS materialized_memberships;
+DROP TABLE IF EXISTS materialized_memberships;
+CREATE TABLE materialized_memberships AS
+SELECT
+    mem.id as id,
+    ballots.ballot_paper_id,
+    Cast(position('.by.' in ballots.ballot_paper_id) as BOOLEAN) as is_by_election,
+    elections.name as election_name,
+    elections.election_date as election_date,
+    posts.label as division_name,
+    mem.person_id,
+    mem.party_list_position,
+    person.name as person_name,
+    parties.ec_id as party_id,
+    parties.name as party_name,
+    mem.elected,
+    person_ids.json_data as identifiers
+FROM popolo_membership as mem
+JOIN people_person person ON mem.person_id = person.id
+JOIN candidates_ballot ballots ON mem.ballot_id = ballots.id
+JOIN elections_election elections ON ballots.election_id = elections.id
+JOIN popolo_post posts ON ballots.post_id = posts.id
+JOIN parties_party as parties ON mem.party_id = parties.id
+LEFT JOIN LATERAL (
+    SELECT jsonb_object_agg(src.value_type, src.value) as json_data
+    FROM (
+        SELECT DISTINCT value_type, value
+        FROM people_personidentifier
+        WHERE person_id = mem.person_id
+    ) src
+) as person_ids ON true;
+
+ALTER TABLE materialized_memberships ADD PRIMARY KEY (id);
+CREATE INDEX materialized_memberships_person_id
+    ON materialized_memberships (person_id);
+CREATE INDEX materialized_memberships_ballot_paper_id
+    ON materialized_memberships (ballot_paper_id);
+CREATE INDEX materialized_memberships_election_date
+    ON materialized_memberships (election_date);
+"""
+
+REVERSE_SQL_STR = (
+    "DROP TABLE IF EXISTS materialized_memberships;"
+    + import_module("data_exports.migrations.0002_create_sql").SQL_STR
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [("data_exports", "0005_materializedmembershipsrefresh")]
+
+    operations = [migrations.RunSQL(SQL_STR, REVERSE_SQL_STR)]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.16 on 2026-10-18 17:21
+
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("data_exports", "0006_materialized_memberships_table"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrebuiltCSV",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("generation", models.PositiveIntegerField(db_index=True)),
+                ("query_params", models.JSONField(default=dict)),
+                (
+                    "csv_file",
+                    models.FileField(upload_to="data_exports/prebuilt_csvs/"),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
-from typing import List, Optional, TextIO
+import datetime
+from typing import BinaryIO, Iterable, Iterator, List, Optional
 
 from data_exports.csv_fields import csv_fields, get_core_fieldnames
 from django.db import connection, models, transaction
@@ -6,18 +7,111 @@ from django.db.models import Count, IntegerField, JSONField
 from django.db.models.expressions import Case, When
 from django.db.models.functions import Coalesce
 from model_utils.models import TimeStampedModel
+from popolo.models import Membership
 from utils.db import LastWord, NullIfBlank
 from ynr_refactoring.settings import PersonIdentifierFields
 
+MATERIALIZED_MEMBERSHIPS_COLUMNS = (
+    "id",
+    "ballot_paper_id",
+    "is_by_election",
+    "election_name",
+    "election_date",
+    "division_name",
+    "person_id",
+    "party_list_position",
+    "person_name",
+    "party_id",
+    "party_name",
+    "elected",
+    "identifiers",
+)
+
+# The rows of `materialized_memberships`. `{where}` is filled in with a
+# clause on `mem` to limit the rows that are built.
+MATERIALIZED_MEMBERSHIPS_SELECT_SQL = """
+SELECT
+    mem.id as id,
+    ballots.ballot_paper_id,
+    Cast(position('.by.' in ballots.ballot_paper_id) as BOOLEAN) as is_by_election,
+    elections.name as election_name,
+    elections.election_date as election_date,
+    posts.label as division_name,
+    mem.person_id,
+    mem.party_list_position,
+    person.name as person_name,
+    parties.ec_id as party_id,
+    parties.name as party_name,
+    mem.elected,
+    person_ids.json_data as identifiers
+FROM popolo_membership as mem
+JOIN people_person person ON mem.person_id = person.id
+JOIN candidates_ballot ballots ON mem.ballot_id = ballots.id
+JOIN elections_election elections ON ballots.election_id = elections.id
+JOIN popolo_post posts ON ballots.post_id = posts.id
+JOIN parties_party as parties ON mem.party_id = parties.id
+LEFT JOIN LATERAL (
+    SELECT jsonb_object_agg(src.value_type, src.value) as json_data
+    FROM (
+        SELECT DISTINCT value_type, value
+        FROM people_personidentifier
+        WHERE person_id = mem.person_id
+    ) src
+) as person_ids ON true
+{where}
+"""
+
+# The minimum number of bytes of CSV to send at a time when streaming
+CSV_CHUNK_SIZE = 64 * 1024
+
+# Overlap between incremental refreshes. This catches rows that were
+# saved in a transaction that started before the last refresh but
+# committed after it.
+INCREMENTAL_REFRESH_OVERLAP = datetime.timedelta(minutes=2)
+
+
+class MaterializedMembershipsRefresh(TimeStampedModel):
+    """
+    A log of each time `materialized_memberships` was brought up to date.
+
+    Incremental refreshes start from the `created` time of the last refresh,
+    and the latest `pk` can be used as a generation number for anything
+    derived from the table.
+
+    """
+
+    full = models.BooleanField(default=False)
+    rows_updated = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        get_latest_by = "created"
 
-class MaterializedModelMixin:
     @classmethod
-    @transaction.atomic
-    def refresh_view(cls):
-        with connection.cursor() as cursor:
-            cursor.execute(
-                "REFRESH MATERIALIZED VIEW {}".format(cls._meta.db_table)
-            )
+    def current_generation(cls) -> int:
+        """
+        The pk of the most recent refresh that changed any rows, or 0 if
+        the table has never been populated.
+        """
+        return (
+            cls.objects.filter(rows_updated__gt=0)
+            .order_by("-pk")
+            .values_list("pk", flat=True)
+            .first()
+        ) or 0
+
+    def invalidate_prebuilt_csvs(self):
+        """
+        Once this refresh is committed, delete any `PrebuiltCSV` that was
+        built from an older generation of the table.
+        """
+        if not self.rows_updated:
+            return
+        generation = self.pk
+        transaction.on_commit(
+            lambda: PrebuiltCSV.objects.exclude(
+                generation=generation
+            ).delete_with_files()
+        )
 
 
 class MaterializedMembershipsQuerySet(models.QuerySet):
@@ -51,7 +145,11 @@ class MaterializedMembershipsQuerySet(models.QuerySet):
         self._fieldnames(extra_fields)
         return self._with_fields(extra_fields)
 
-    def write_csv(self, file_like: TextIO, extra_fields: Optional[List] = None):
+    def iter_csv(
+        self,
+        extra_fields: Optional[List] = None,
+        chunk_size: int = CSV_CHUNK_SIZE,
+    ) -> Iterator[bytes]:
         """
         Asks Postgres to make a CSV for us, rather than using Django/Python to do it.
 
@@ -67,7 +165,7 @@ class MaterializedMembershipsQuerySet(models.QuerySet):
         the exact same amount of work as just selecting the rows for Django, but Django and Python
         have nothing to do.
 
-        To do this we need to break out of the ORM and use `copy_expert`. This
+        To do this we need to break out of the ORM and use `COPY ... TO STDOUT`. This
         comes with a couple of tricky elements:
 
         1. We use `qs.query.sql_with_params()` to get underlying the ORM query. This means we
@@ -79,9 +177,13 @@ class MaterializedMembershipsQuerySet(models.QuerySet):
            order. To ensure the orders can be controlled we wrap the ORM query in an outer
            query that selects the fields in the same order as the selected fields.
 
-        :param file_like: a file-like object that copy_expert can write to
+        This is a generator that yields the CSV as Postgres sends it, so it can be
+        passed straight to a `StreamingHttpResponse`. Rows are grouped into chunks of
+        at least `chunk_size` bytes, so memory use doesn't grow with the size of the CSV.
+
         :param extra_fields: exrta headers defined in `csv_fields` to add to the CSV
             (core headers always included)
+        :param chunk_size: the minimum number of bytes to yield at a time
 
 
         """
@@ -95,8 +197,27 @@ class MaterializedMembershipsQuerySet(models.QuerySet):
         with connection.cursor() as cur:
             sql = cur.mogrify(sql, params)
             with cur.copy(sql) as copy:
+                chunk = bytearray()
                 for row in copy:
-                    file_like.write(row)
+                    chunk += row
+                    if len(chunk) >= chunk_size:
+                        yield bytes(chunk)
+                        chunk.clear()
+                if chunk:
+                    yield bytes(chunk)
+
+    def write_csv(
+        self, file_like: BinaryIO, extra_fields: Optional[List] = None
+    ):
+        """
+        Write the CSV made by `iter_csv` to a file-like object.
+
+        :param file_like: a file-like object that accepts bytes
+        :param extra_fields: exrta headers defined in `csv_fields` to add to the CSV
+            (core headers always included)
+        """
+        for chunk in self.iter_csv(extra_fields=extra_fields):
+            file_like.write(chunk)
 
     def percentage_for_fields(self):
         identifier_fields = sorted(pi.name for pi in PersonIdentifierFields)
@@ -120,20 +241,25 @@ class MaterializedMembershipsQuerySet(models.QuerySet):
         return ret
 
 
-class MaterializedMemberships(MaterializedModelMixin, models.Model):
+class MaterializedMemberships(models.Model):
     """
-    This model isn't managed by Django, as it's a PostgreSQL "materialized view".
+    This model isn't managed by Django. It's a table that we maintain
+    ourselves as a "materialized view" of memberships.
 
     https://en.wikipedia.org/wiki/Materialized_view
 
-    Rather than a table, it's a query that's run once and then the results are stored in the database.
+    Each row is the result of `MATERIALIZED_MEMBERSHIPS_SELECT_SQL` for a
+    single membership. Rather than rebuilding the whole table every time,
+    `refresh_view_incremental` only rebuilds the rows for memberships,
+    people, ballots, elections, posts and parties that have been modified
+    since the last refresh. `refresh_view` rebuilds everything.
 
-    The view is created in a migration like a normal Django model, but the migration is running
-    raw SQL. We then make an unmanaged model in Django (See Meta.managed = False) that can be
-    used like a normal Django model.
+    The table is created in a migration like a normal Django model, but the
+    migration is running raw SQL. We then make an unmanaged model in Django
+    (See Meta.managed = False) that can be used like a normal Django model.
 
-    Every field that's added here needs to be added via a new migration, and every change to the view
-    made in a migrations needs to be reflected here for Django to know about it.
+    Every field that's added here needs to be added via a new migration, and
+    to `MATERIALIZED_MEMBERSHIPS_SELECT_SQL`.
 
     """
 
@@ -174,6 +300,127 @@ class MaterializedMemberships(MaterializedModelMixin, models.Model):
 
     objects = MaterializedMembershipsQuerySet.as_manager()
 
+    @classmethod
+    def _insert_rows(cls, cursor, where="", params=None):
+        columns = ", ".join(MATERIALIZED_MEMBERSHIPS_COLUMNS)
+        select_sql = MATERIALIZED_MEMBERSHIPS_SELECT_SQL.format(where=where)
+        cursor.execute(
+            f"INSERT INTO {cls._meta.db_table} ({columns}) {select_sql}",
+            params,
+        )
+        return cursor.rowcount
+
+    @classmethod
+    def _replace_rows(cls, cursor, column: str, ids: List[int]):
+        """
+        Delete and rebuild all rows where `column` is one of `ids`.
+
+        `column` can be `id` or `person_id`, as they're named the same in
+        the table and in `popolo_membership`.
+        """
+        if not ids:
+            return 0
+        cursor.execute(
+            f"DELETE FROM {cls._meta.db_table} WHERE {column} = ANY(%s)",
+            [ids],
+        )
+        return cls._insert_rows(
+            cursor, where=f"WHERE mem.{column} = ANY(%s)", params=[ids]
+        )
+
+    @classmethod
+    def changed_membership_ids(cls, since: datetime.datetime) -> List[int]:
+        """
+        Return the IDs of all memberships that need rebuilding because they,
+        or one of the rows they're built from, have been modified after
+        `since`.
+        """
+        lookups = (
+            "modified",
+            "person__modified",
+            "person__tmp_person_identifiers__modified",
+            "ballot__modified",
+            "ballot__election__modified",
+            "ballot__post__modified",
+            "party__modified",
+        )
+        querysets = [
+            Membership.objects.filter(**{f"{lookup}__gt": since})
+            .order_by()
+            .values_list("pk", flat=True)
+            for lookup in lookups
+        ]
+        return list(querysets[0].union(*querysets[1:]))
+
+    @classmethod
+    @transaction.atomic
+    def refresh_view(cls):
+        """
+        Rebuild every row in the table.
+
+        Readers continue to see the old rows until the transaction commits.
+        """
+        refresh = MaterializedMembershipsRefresh.objects.create(full=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {cls._meta.db_table}")
+            refresh.rows_updated = cls._insert_rows(cursor)
+        refresh.save()
+        refresh.invalidate_prebuilt_csvs()
+        return refresh
+
+    @classmethod
+    @transaction.atomic
+    def refresh_view_incremental(cls):
+        """
+        Rebuild the rows that have changed since the last refresh, and remove
+        the rows for memberships that have been deleted.
+
+        If the table has never been refreshed, rebuild all of it.
+        """
+        last_refresh = (
+            MaterializedMembershipsRefresh.objects.order_by("-created")
+            .only("created")
+            .first()
+        )
+        if not last_refresh:
+            return cls.refresh_view()
+
+        refresh = MaterializedMembershipsRefresh.objects.create(full=False)
+        since = last_refresh.created - INCREMENTAL_REFRESH_OVERLAP
+        membership_ids = cls.changed_membership_ids(since)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {cls._meta.db_table} mm
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM popolo_membership mem WHERE mem.id = mm.id
+                )
+                """
+            )
+            refresh.rows_updated = cursor.rowcount + cls._replace_rows(
+                cursor, "id", membership_ids
+            )
+        refresh.save()
+        refresh.invalidate_prebuilt_csvs()
+        return refresh
+
+    @classmethod
+    @transaction.atomic
+    def refresh_rows(
+        cls,
+        membership_ids: Optional[Iterable[int]] = None,
+        person_ids: Optional[Iterable[int]] = None,
+    ):
+        """
+        Rebuild the rows for the given memberships and/or people right now,
+        rather than waiting for the next incremental refresh.
+
+        Rows for a person that no longer has any memberships are removed.
+        """
+        with connection.cursor() as cursor:
+            cls._replace_rows(cursor, "id", list(membership_ids or []))
+            cls._replace_rows(cursor, "person_id", list(person_ids or []))
+
 
 class CSVDownloadReason(TimeStampedModel):
     user = models.ForeignKey(
@@ -193,3 +440,29 @@ class CSVDownloadLog(TimeStampedModel):
         "auth.User", blank=True, null=True, on_delete=models.SET_NULL
     )
     query_params = models.JSONField(default={})
+
+
+class PrebuiltCSVQuerySet(models.QuerySet):
+    def delete_with_files(self):
+        for prebuilt_csv in self:
+            prebuilt_csv.csv_file.delete(save=False)
+        return self.delete()
+
+
+class PrebuiltCSV(TimeStampedModel):
+    """
+    A gzipped CSV export, built in the background for a popular set of
+    query params so that downloading it doesn't need to query Postgres.
+
+    `key` is a hash of the normalised query params and the generation of
+    `materialized_memberships` the CSV was built from. A CSV is only served
+    while its generation is current, and is deleted when the table changes.
+
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    generation = models.PositiveIntegerField(db_index=True)
+    query_params = models.JSONField(default=dict)
+    csv_file = models.FileField(upload_to="data_exports/prebuilt_csvs/")
+
+    objects = PrebuiltCSVQuerySet.as_manager()
@@ -0,0 +1,96 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from candidates.tests.uk_examples import UK2015ExamplesMixin
+from data_exports.csv_fields import get_core_fieldnames
+from data_exports.models import MaterializedMemberships
+from data_exports.tests.test_data_exports import csv_url
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class TestColumnarExports(UK2015ExamplesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_lots_of_candidates(
+            self.earlier_election, ((self.labour_party, 4), (self.ld_party, 2))
+        )
+        self.create_lots_of_candidates(
+            self.election, ((self.labour_party, 3), (self.ld_party, 1))
+        )
+        MaterializedMemberships.refresh_view()
+
+    def test_parquet(self):
+        response = self.client.get(
+            csv_url({"format": "parquet", "field_group": "results"})
+        )
+        self.assertEqual(
+            response["Content-Type"], "application/vnd.apache.parquet"
+        )
+        self.assertIn(".parquet", response["Content-Disposition"])
+        parquet_file = pq.ParquetFile(io.BytesIO(response.getvalue()))
+        table = parquet_file.read()
+
+        self.assertEqual(table.num_rows, 10)
+        self.assertEqual(table.column_names[:11], get_core_fieldnames())
+        self.assertEqual(table.schema.field("person_id").type, pa.int64())
+        self.assertEqual(table.schema.field("election_date").type, pa.date32())
+        self.assertEqual(table.schema.field("cancelled_poll").type, pa.bool_())
+        self.assertEqual(table.schema.field("votes_cast").type, pa.int64())
+        self.assertEqual(
+            table.schema.field("turnout_percentage").type,
+            pa.decimal128(5, 2),
+        )
+        # A row group for each election date
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertEqual(
+            table.column("election_date").unique().to_pylist(),
+            [
+                self.earlier_election.election_date,
+                self.election.election_date,
+            ],
+        )
+
+    def test_parquet_filtered(self):
+        response = self.client.get(
+            csv_url({"format": "parquet", "election_id": self.election.slug})
+        )
+        table = pq.read_table(io.BytesIO(response.getvalue()))
+        self.assertEqual(table.num_rows, 4)
+
+    def test_arrow_stream(self):
+        response = self.client.get(csv_url({"format": "arrow"}))
+        self.assertEqual(
+            response["Content-Type"], "application/vnd.apache.arrow.stream"
+        )
+        table = pa.ipc.open_stream(response.getvalue()).read_all()
+        self.assertEqual(table.num_rows, 10)
+        self.assertEqual(table.column_names, get_core_fieldnames())
+
+        parquet_response = self.client.get(csv_url({"format": "parquet"}))
+        self.assertTrue(
+            table.equals(pq.read_table(io.BytesIO(parquet_response.getvalue())))
+        )
+
+    def test_write_parquet_dataset(self):
+        call_command(
+            "data_exports_write_parquet_dataset",
+            directory="test_parquet",
+            field_groups=["results"],
+        )
+        partitions, _ = default_storage.listdir("test_parquet")
+        self.assertEqual(
+            sorted(partitions),
+            [
+                f"election_date={self.earlier_election.election_date}",
+                f"election_date={self.election.election_date}",
+            ],
+        )
+        with default_storage.open(
+            f"test_parquet/election_date={self.election.election_date}/data.parquet"
+        ) as parquet_file:
+            table = pq.read_table(parquet_file)
+        self.assertEqual(table.num_rows, 4)
+        self.assertIn("votes_cast", table.column_names)
@@ -1,14 +1,23 @@
 import csv
+import datetime
+import gzip
+import io
 from urllib.parse import urlencode
 
 from candidates.models import Ballot
 from candidates.tests.uk_examples import UK2015ExamplesMixin
 from data_exports.csv_fields import get_core_fieldnames
-from data_exports.models import CSVDownloadLog, MaterializedMemberships
+from data_exports.models import (
+    CSVDownloadLog,
+    MaterializedMemberships,
+    MaterializedMembershipsRefresh,
+)
 from data_exports.templatetags.data_field_value import data_cell
 from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
 from people.models import Person
 
 
@@ -32,23 +41,54 @@ class TestMaterializedMemberships(UK2015ExamplesMixin, TestCase):
     def test_csv_simple_memberships(self):
         self.assertFalse(CSVDownloadLog.objects.exists())
         req = self.client.get(csv_url({}))
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         self.assertEqual(
             csv_data.fieldnames,
             get_core_fieldnames(),
         )
         self.assertEqual(CSVDownloadLog.objects.count(), 1)
 
+    def test_csv_streamed(self):
+        self.create_lots_of_candidates(
+            self.earlier_election, ((self.labour_party, 16), (self.ld_party, 8))
+        )
+        MaterializedMemberships.refresh_view()
+        response = self.client.get(csv_url({}))
+        self.assertTrue(response.streaming)
+        self.assertIn("Accept-Encoding", response["Vary"])
+        csv_data = response.getvalue()
+        self.assertEqual(len(list(csv_to_dicts(csv_data))), 24)
+
+        gzipped_response = self.client.get(
+            csv_url({}), HTTP_ACCEPT_ENCODING="gzip, deflate, br"
+        )
+        self.assertEqual(gzipped_response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(gzipped_response.getvalue()), csv_data)
+
+    def test_iter_csv_chunks(self):
+        self.create_lots_of_candidates(
+            self.earlier_election, ((self.labour_party, 16), (self.ld_party, 8))
+        )
+        MaterializedMemberships.refresh_view()
+        qs = MaterializedMemberships.objects.for_data_table()
+        chunks = list(qs.iter_csv(chunk_size=500))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) >= 500 for chunk in chunks[:-1]))
+
+        file_like = io.BytesIO()
+        qs.write_csv(file_like)
+        self.assertEqual(file_like.getvalue(), b"".join(chunks))
+
     def test_extra_fields_show_in_export(self):
         req = self.client.get(csv_url({"extra_fields": "votes_cast"}))
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         self.assertTrue(
             "votes_cast" in csv_data.fieldnames,
         )
 
     def test_random_header_cant_be_added(self):
         req = self.client.get(csv_url({"extra_fields": "made_up"}))
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         self.assertFalse(
             "made_up" in csv_data.fieldnames,
         )
@@ -60,7 +100,7 @@ class TestMaterializedMemberships(UK2015ExamplesMixin, TestCase):
         MaterializedMemberships.refresh_view()
 
         req = self.client.get(csv_url({}))
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         expected_person_id = Person.objects.all().first().pk
         self.assertDictEqual(
             next(csv_data),
@@ -121,7 +161,7 @@ class TestMaterializedMemberships(UK2015ExamplesMixin, TestCase):
         MaterializedMemberships.refresh_view()
 
         req = self.client.get(csv_url({}))
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         headers = list(next(csv_data).keys())
         self.assertListEqual(
             headers,
@@ -141,7 +181,7 @@ class TestMaterializedMemberships(UK2015ExamplesMixin, TestCase):
         )
 
         req = self.client.get(csv_url({"field_group": "results"}))
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         headers = list(next(csv_data).keys())
         self.assertListEqual(
             headers,
@@ -184,7 +224,7 @@ class TestMaterializedMemberships(UK2015ExamplesMixin, TestCase):
                 }
             )
         )
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         headers = list(next(csv_data).keys())
         self.assertListEqual(
             headers,
@@ -217,7 +257,7 @@ class TestMaterializedMemberships(UK2015ExamplesMixin, TestCase):
         MaterializedMemberships.refresh_view()
 
         req = self.client.get(csv_url({"field_group": "person"}))
-        csv_data = csv_to_dicts(req.content)
+        csv_data = csv_to_dicts(req.getvalue())
         headers = list(next(csv_data).keys())
         self.maxDiff = None
         self.assertListEqual(
@@ -265,3 +305,92 @@ class TestMaterializedMemberships(UK2015ExamplesMixin, TestCase):
                 "image",
             ],
         )
+
+
+class TestIncrementalRefresh(UK2015ExamplesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_lots_of_candidates(
+            self.earlier_election,
+            ((self.labour_party, 4), (self.ld_party, 2)),
+        )
+        now = timezone.now()
+        # Refresh, then make changes, well outside the refresh overlap
+        with freeze_time(now + datetime.timedelta(hours=1)):
+            MaterializedMemberships.refresh_view()
+        later = freeze_time(now + datetime.timedelta(hours=2))
+        later.start()
+        self.addCleanup(later.stop)
+        self.person = Person.objects.order_by("pk").first()
+
+    def test_first_incremental_refresh_is_full(self):
+        MaterializedMembershipsRefresh.objects.all().delete()
+        refresh = MaterializedMemberships.refresh_view_incremental()
+        self.assertTrue(refresh.full)
+        self.assertEqual(refresh.rows_updated, 6)
+
+    def test_nothing_changed(self):
+        refresh = MaterializedMemberships.refresh_view_incremental()
+        self.assertFalse(refresh.full)
+        self.assertEqual(refresh.rows_updated, 0)
+        self.assertEqual(MaterializedMemberships.objects.count(), 6)
+
+    def test_changed_person_rebuilt(self):
+        self.person.name = "Jane Doe"
+        self.person.save()
+        refresh = MaterializedMemberships.refresh_view_incremental()
+        self.assertEqual(refresh.rows_updated, 1)
+        self.assertEqual(
+            MaterializedMemberships.objects.get(person=self.person).person_name,
+            "Jane Doe",
+        )
+
+    def test_changed_identifier_rebuilt(self):
+        self.person.tmp_person_identifiers.create(
+            value_type="twitter_username", value="janedoe"
+        )
+        refresh = MaterializedMemberships.refresh_view_incremental()
+        self.assertEqual(refresh.rows_updated, 1)
+        self.assertEqual(
+            MaterializedMemberships.objects.get(person=self.person).identifiers,
+            {"twitter_username": "janedoe"},
+        )
+
+    def test_changed_party_rebuilt(self):
+        self.ld_party.name = "Lib Dems"
+        self.ld_party.save()
+        refresh = MaterializedMemberships.refresh_view_incremental()
+        self.assertEqual(refresh.rows_updated, 2)
+        self.assertEqual(
+            MaterializedMemberships.objects.filter(
+                party_name="Lib Dems"
+            ).count(),
+            2,
+        )
+
+    def test_deleted_membership_removed(self):
+        self.person.memberships.all().delete()
+        refresh = MaterializedMemberships.refresh_view_incremental()
+        self.assertEqual(refresh.rows_updated, 1)
+        self.assertEqual(MaterializedMemberships.objects.count(), 5)
+        self.assertFalse(
+            MaterializedMemberships.objects.filter(person=self.person).exists()
+        )
+
+    def test_refresh_rows(self):
+        Person.objects.filter(pk=self.person.pk).update(name="Jane Doe")
+        MaterializedMemberships.refresh_rows(person_ids=[self.person.pk])
+        self.assertEqual(
+            MaterializedMemberships.objects.get(person=self.person).person_name,
+            "Jane Doe",
+        )
+
+    def test_command_full_option(self):
+        call_command("update_data_export_view", full=True)
+        self.assertTrue(
+            MaterializedMembershipsRefresh.objects.latest("pk").full
+        )
+        call_command("update_data_export_view")
+        self.assertFalse(
+            MaterializedMembershipsRefresh.objects.latest("pk").full
+        )
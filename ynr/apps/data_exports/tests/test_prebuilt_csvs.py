@@ -0,0 +1,111 @@
+import gzip
+
+from candidates.tests.uk_examples import UK2015ExamplesMixin
+from data_exports.helpers import (
+    normalise_query_params,
+    popular_query_params,
+)
+from data_exports.models import (
+    CSVDownloadLog,
+    MaterializedMemberships,
+    MaterializedMembershipsRefresh,
+    PrebuiltCSV,
+)
+from data_exports.tests.test_data_exports import csv_url
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import TestCase
+
+
+class TestNormaliseQueryParams(TestCase):
+    def test_query_dict(self):
+        self.assertEqual(
+            normalise_query_params(
+                QueryDict(
+                    "format=csv&party_id=&field_group=results"
+                    "&field_group=person&election_id=parl.2010-05-06"
+                )
+            ),
+            {
+                "election_id": ["parl.2010-05-06"],
+                "field_group": ["results", "person"],
+            },
+        )
+
+    def test_logged_query_params(self):
+        # Older logs only stored the last value for each key
+        self.assertEqual(
+            normalise_query_params(
+                {"election_id": "parl.2010-05-06", "page": "2", "elected": ""}
+            ),
+            normalise_query_params({"election_id": ["parl.2010-05-06"]}),
+        )
+
+    def test_popular_query_params(self):
+        for query_params in (
+            {"election_id": ["parl.2010-05-06"], "format": ["csv"]},
+            {"election_id": "parl.2010-05-06"},
+            {"election_date": ["2010-05-06"]},
+            {},
+            {},
+            {},
+        ):
+            CSVDownloadLog.objects.create(query_params=query_params)
+        self.assertEqual(
+            popular_query_params(limit=2),
+            [{}, {"election_id": ["parl.2010-05-06"]}],
+        )
+
+
+class TestPrebuiltCSVs(UK2015ExamplesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_lots_of_candidates(
+            self.earlier_election, ((self.labour_party, 4), (self.ld_party, 2))
+        )
+        MaterializedMemberships.refresh_view()
+        self.live_csv = self.client.get(
+            csv_url({"party_id": "PP53"})
+        ).getvalue()
+
+    def test_build_and_serve(self):
+        call_command("data_exports_prebuild_csvs")
+        prebuilt_csv = PrebuiltCSV.objects.get()
+        self.assertEqual(prebuilt_csv.query_params, {"party_id": ["PP53"]})
+        self.assertEqual(
+            prebuilt_csv.generation,
+            MaterializedMembershipsRefresh.current_generation(),
+        )
+
+        with self.assertNumQueries(4):
+            # Nothing is read from materialized_memberships
+            response = self.client.get(
+                csv_url({"party_id": "PP53", "format": "csv"}),
+                HTTP_ACCEPT_ENCODING="gzip, deflate",
+            )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)),
+            self.live_csv,
+        )
+
+        response = self.client.get(csv_url({"party_id": "PP53"}))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), self.live_csv)
+
+    def test_only_built_once_per_generation(self):
+        call_command("data_exports_prebuild_csvs")
+        call_command("data_exports_prebuild_csvs")
+        self.assertEqual(PrebuiltCSV.objects.count(), 1)
+
+    def test_invalidated_on_refresh(self):
+        call_command("data_exports_prebuild_csvs")
+        self.assertTrue(PrebuiltCSV.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MaterializedMemberships.refresh_view()
+        self.assertFalse(PrebuiltCSV.objects.exists())
+
+        response = self.client.get(csv_url({"party_id": "PP53"}))
+        self.assertEqual(response.getvalue(), self.live_csv)
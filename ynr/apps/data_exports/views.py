@@ -1,72 +1,47 @@
 import datetime
-from typing import Dict, List, Union
+import gzip
+from typing import Dict
 from urllib.parse import urlencode
 
 from cached_counts.models import ElectionReport
 from django.core.paginator import Paginator
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from django.utils.text import slugify
 from django.views import View
 from django.views.generic import CreateView, TemplateView
 
-from .csv_fields import csv_fields, get_core_fieldnames
-from .filters import (
-    create_materialized_membership_filter,
-)
-from .forms import AdditionalFieldsForm, CSVDownloadReasonForm, grouped_choices
+from .columnar import iter_arrow_stream, write_parquet_to_temporary_file
+from .forms import CSVDownloadReasonForm
+from .helpers import get_filter_data, get_prebuilt_csv, gzip_chunks
 from .models import (
     CSVDownloadLog,
     CSVDownloadReason,
     MaterializedMemberships,
-    MaterializedMembershipsQuerySet,
 )
 
+PREBUILT_CSV_CHUNK_SIZE = 64 * 1024
+
+# The content type and file extension for each `format` query param
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
 
 class DataFilterMixin:
     def get_queryset(self):
         return MaterializedMemberships.objects.all()
 
     def get_filter_data(self, **kwargs):
-        context = {}
-        context["extra_fields"] = []
-        additional_fields_form = AdditionalFieldsForm(data=self.request.GET)
-        if additional_fields_form.is_valid():
-            context["extra_fields"] = additional_fields_form.cleaned_data[
-                "extra_fields"
-            ]
-
-        context["csv_fields"] = grouped_choices()
-
-        context["additional_fields_form"] = additional_fields_form
-
-        for field_name, field in csv_fields.items():
-            if field.core:
-                continue
-            if field.value_group in self.request.GET.getlist("field_group"):
-                context["extra_fields"].append(field_name)
-
-        context["headers"] = get_core_fieldnames() + context["extra_fields"]
-
-        qs = self.get_queryset()
-        qs = qs.for_data_table(extra_fields=context["extra_fields"])
-        filter_set = create_materialized_membership_filter(
-            [
-                (field_name, csv_fields[field_name])
-                for field_name in context["extra_fields"]
-            ]
-        )(
-            self.request.GET,
-            queryset=qs,
-        )
-
-        queryset = filter_set.qs
-        context["objects"]: Union[
-            MaterializedMembershipsQuerySet, List[MaterializedMemberships]
-        ] = queryset
-        context["filter_set"] = filter_set
-
-        return context
+        return get_filter_data(self.request.GET, self.get_queryset())
 
 
 class DataCustomBuilderView(DataFilterMixin, TemplateView):
@@ -109,7 +84,10 @@ class DataExportView(DataFilterMixin, View):
         if self.should_block(request):
             return HttpResponse("Forbidden", status=403)
         context = self.get_filter_data()
-        content_type = "text/csv"
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            export_format = "csv"
+        content_type, extension = EXPORT_FORMATS[export_format]
         date_str = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
         filename_dict = dict(context["filter_set"].data)
         filename_dict.pop("format", None)
@@ -117,22 +95,86 @@ class DataExportView(DataFilterMixin, View):
             "__".join(f"{key}_{value}" for key, value in filename_dict.items())
         )
         headers = {
-            "Content-Disposition": f'attachment; filename="dc-candidates-{file_str}-{date_str}.csv"'
+            "Content-Disposition": f'attachment; filename="dc-candidates-{file_str}-{date_str}.{extension}"'
         }
 
-        response = HttpResponse(
-            content_type=content_type,
-            headers=headers,
-        )
-        context["objects"].write_csv(
-            response, extra_fields=context["extra_fields"]
-        )
+        prebuilt_csv = None
+        if export_format == "csv":
+            prebuilt_csv = get_prebuilt_csv(request.GET)
+
+        if export_format == "parquet":
+            response = FileResponse(
+                write_parquet_to_temporary_file(
+                    context["objects"], context["headers"]
+                ),
+                content_type=content_type,
+                headers=headers,
+            )
+        elif export_format == "arrow":
+            response = StreamingHttpResponse(
+                iter_arrow_stream(context["objects"], context["headers"]),
+                content_type=content_type,
+                headers=headers,
+            )
+        elif prebuilt_csv:
+            response = self.prebuilt_csv_response(
+                prebuilt_csv, content_type, headers
+            )
+        else:
+            response = self.streaming_csv_response(
+                context, content_type, headers
+            )
 
         user = request.user if request.user.is_authenticated else None
-        CSVDownloadLog.objects.create(user=user, query_params=request.GET)
+        CSVDownloadLog.objects.create(
+            user=user, query_params=dict(request.GET.lists())
+        )
 
         return response
 
+    def accepts_gzip(self):
+        return "gzip" in self.request.headers.get("Accept-Encoding", "")
+
+    def streaming_csv_response(self, context, content_type, headers):
+        """
+        Stream the CSV to the client as Postgres makes it, gzipping it on
+        the fly for clients that accept gzip.
+        """
+        chunks = context["objects"].iter_csv(
+            extra_fields=context["extra_fields"]
+        )
+        if self.accepts_gzip():
+            chunks = gzip_chunks(chunks)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        response = StreamingHttpResponse(
+            chunks, content_type=content_type, headers=headers
+        )
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    def prebuilt_csv_response(self, prebuilt_csv, content_type, headers):
+        """
+        Serve a PrebuiltCSV straight from storage. The file is already
+        gzipped, so send it as it is to clients that accept gzip and
+        decompress it on the fly for everyone else.
+        """
+        csv_file = prebuilt_csv.csv_file.open("rb")
+        if self.accepts_gzip():
+            response = FileResponse(
+                csv_file,
+                content_type=content_type,
+                headers={**headers, "Content-Encoding": "gzip"},
+            )
+        else:
+            gzip_file = gzip.GzipFile(fileobj=csv_file)
+            response = StreamingHttpResponse(
+                iter(lambda: gzip_file.read(PREBUILT_CSV_CHUNK_SIZE), b""),
+                content_type=content_type,
+                headers=headers,
+            )
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
 
 class DataShortcutView(TemplateView):
     template_name = "data_exports/data_home.html"
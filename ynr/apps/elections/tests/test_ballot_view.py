@@ -24,8 +24,8 @@ from moderation_queue.tests.paths import EXAMPLE_IMAGE_FILENAME
 from parties.tests.factories import PartyFactory
 from people.models import Person, PersonImage
 from people.tests.factories import PersonFactory
+from people.thumbnails import thumbnail_url
 from popolo.models import Membership
-from sorl.thumbnail import get_thumbnail
 from uk_results.models import CandidateResult, ResultSet
 from utils.dict_io import BufferDictReader
 from utils.testing_utils import FuzzyInt
@@ -220,19 +220,22 @@ class TestBallotView(
     def test_person_photo_shown(self):
         self.create_memberships(self.ballot, self.parties)
         person = self.ballot.membership_set.first().person
-        im = PersonImage.objects.create_from_file(
-            filename=EXAMPLE_IMAGE_FILENAME,
-            new_filename="images/imported.jpg",
-            defaults={
-                "person": person,
-                "md5sum": "md5sum",
-                "copyright": "example-license",
-                "uploading_user": self.user,
-                "user_notes": "Here's an image...",
-                "source": "Found on the candidate's Flickr feed",
-            },
-        )
-        expected_url = get_thumbnail(im.image, "x64").url
+        with self.captureOnCommitCallbacks(execute=True):
+            im = PersonImage.objects.create_from_file(
+                filename=EXAMPLE_IMAGE_FILENAME,
+                new_filename="images/imported.jpg",
+                defaults={
+                    "person": person,
+                    "md5sum": "md5sum",
+                    "copyright": "example-license",
+                    "uploading_user": self.user,
+                    "user_notes": "Here's an image...",
+                    "source": "Found on the candidate's Flickr feed",
+                },
+            )
+        im.refresh_from_db()
+        expected_url = thumbnail_url(im, "x64")
+        self.assertIn("/thumbnails/", expected_url)
         response = self.app.get(self.ballot.get_absolute_url())
         response.mustcontain(expected_url)
 
@@ -1,14 +1,19 @@
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-from time import sleep
+from typing import Iterable, List, Optional, Tuple
 from urllib.parse import urlencode, urljoin
 
 import requests
 from candidates.models import Ballot, PartySet
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from elections.models import Election as YNRElection
-from popolo.models import Organization, Post
+from popolo.models import Organization, Post, PostIdentifier
 
 ALWAYS_USES_LISTS = ["europarl"]
 
@@ -43,12 +48,20 @@ class EEElection(dict):
             None,
         ]
 
+    @property
+    def organisation_lookup(self):
+        """
+        The slug and classification of this election's organisation in YNR
+        """
+        classification = self["organisation"]["organisation_type"]
+        org_slug = ":".join([classification, self["organisation"]["slug"]])
+        return org_slug, classification
+
     def get_or_create_organisation(self):
         if not self["organisation"]:
             return (None, False)
         org_name = self["organisation"]["official_name"]
-        classification = self["organisation"]["organisation_type"]
-        org_slug = ":".join([classification, self["organisation"]["slug"]])
+        org_slug, classification = self.organisation_lookup
 
         if hasattr(self, "organization_object"):
             self.organization_created = False
@@ -72,20 +85,12 @@ class EEElection(dict):
             self.election_created = False
             self.election_object = ELECTION_CACHE[self["election_id"]]
         else:
-            party_lists_in_use = self._set_party_lists_in_use()
-
             election_obj, created = YNRElection.objects.update_or_create(
                 slug=self["election_id"],
                 election_date=self["poll_open_date"],
                 defaults={
-                    "current": self["current"],
-                    "candidate_membership_role": "Candidate",
-                    "for_post_role": self["election_type"]["name"],
-                    "show_official_documents": True,
-                    "name": self["election_title"],
-                    "party_lists_in_use": party_lists_in_use,
+                    **self.election_defaults(),
                     "organization": self.get_or_create_organisation()[0],
-                    "ee_modified": self.get("modified"),
                 },
             )
             self.election_object = election_obj
@@ -93,6 +98,21 @@ class EEElection(dict):
             ELECTION_CACHE[self["election_id"]] = election_obj
         return (self.election_object, self.election_created)
 
+    def election_defaults(self):
+        """
+        The fields of the YNR Election for this election group, other than
+        its organisation
+        """
+        return {
+            "current": self["current"],
+            "candidate_membership_role": "Candidate",
+            "for_post_role": self["election_type"]["name"],
+            "show_official_documents": True,
+            "name": self["election_title"],
+            "party_lists_in_use": self._set_party_lists_in_use(),
+            "ee_modified": self.get("modified"),
+        }
+
     def _set_party_lists_in_use(self):
         election_type = self["election_id"].split(".")[0]
         if election_type in ALWAYS_USES_LISTS:
@@ -103,10 +123,12 @@ class EEElection(dict):
 
         return False
 
-    def get_or_create_partyset(self):
+    def partyset_details(self):
         """
         The list of parties used for this election depends on the territory.
         Currently only Northern Ireland uses a different set.
+
+        Returns the slug and name of the PartySet.
         """
         # The division can have a different code to the organisation
         # for example UK wide orgs like `parl` has divisions in 4 differet
@@ -117,12 +139,11 @@ class EEElection(dict):
             territory_code = self["organisation"]["territory_code"]
 
         if territory_code == "NIR":
-            partyset_name = "Northern Ireland"
-            country = "ni"
-        else:
-            partyset_name = "Great Britain"
-            country = "gb"
+            return "ni", "Northern Ireland"
+        return "gb", "Great Britain"
 
+    def get_or_create_partyset(self):
+        country, partyset_name = self.partyset_details()
         if country in PARTYSET_CACHE:
             self.party_set_created = False
             self.party_set_object = PARTYSET_CACHE[country]
@@ -162,36 +183,15 @@ class EEElection(dict):
            BallotQueryset).
         """
 
-        if not self.parent or self.children:
-            raise ValueError("Can't create YNR Post from a election group ID")
-
+        details = self.post_details()
         # Make an organisation
         org, created = self.get_or_create_organisation()
-        if self["division"]:
-            # Case 1, there is an organisational division related to this
-            # post
-            slug = self["division"]["slug"]
-            label = self["division"]["name"]
-            role = self["division"]["official_identifier"]
-            identifier = self["division"]["official_identifier"]
-            start_date = self["division"]["divisionset"]["start_date"]
-            end_date = self["division"]["divisionset"]["end_date"]
-            territory_code = self["division"]["territory_code"]
-            ee_modified = self["division"].get("modified", "")
-        else:
-            # Case 2, this organisation isn't split in to divisions for
-            # this election, take the info from the organisation directly
-            slug = self["organisation"]["slug"]
-            label = self["organisation"]["official_name"]
-            role = self["elected_role"]
-            identifier = self["organisation"]["official_identifier"]
-            start_date = self["organisation"]["start_date"]
-            end_date = self["organisation"]["end_date"]
-            territory_code = self["organisation"]["territory_code"]
-            ee_modified = self["organisation"].get("modified", "")
+        slug = details["slug"]
+        start_date = details["start_date"]
+        identifier = details["identifier"]
 
         # check the cache first, return early if possible
-        cache_key = "--".join([slug, self.organization_object.slug, start_date])
+        cache_key = self.post_cache_key()
         if cache_key in POST_CACHE:
             self.post_created = False
             self.post_object = POST_CACHE[cache_key]
@@ -216,28 +216,13 @@ class EEElection(dict):
 
         # if it wasnt created and nothing has changed we can return
         # early and skip updating the object in our DB
-        ee_modified = parse_datetime(ee_modified)
-        if (
-            ee_modified
-            and not self.post_created
-            and self.post_object.ee_modified
-            and self.post_object.ee_modified >= ee_modified
-        ):
+        if not self.post_needs_update():
             # add to the cache
             POST_CACHE[cache_key] = self.post_object
             return self.post_object, self.post_created
 
-        self.post_object.role = role
-        self.post_object.label = label
+        old_identifier = self.update_post_object()
         self.post_object.party_set = self.get_or_create_partyset()[0]
-        self.post_object.organization = self.organization_object
-
-        old_identifier = self.post_object.identifier
-
-        self.post_object.identifier = identifier
-        self.post_object.territory_code = territory_code
-        self.post_object.end_date = end_date
-        self.post_object.ee_modified = ee_modified
         self.post_object.save()
 
         if old_identifier != identifier:
@@ -248,6 +233,90 @@ class EEElection(dict):
         POST_CACHE[cache_key] = self.post_object
         return (self.post_object, self.post_created)
 
+    def post_details(self):
+        """
+        The fields of the YNR Post for this ballot, from its division, or
+        from its organisation if it isn't split in to divisions
+        """
+        if not self.parent or self.children:
+            raise ValueError("Can't create YNR Post from a election group ID")
+
+        if self["division"]:
+            # Case 1, there is an organisational division related to this
+            # post
+            slug = self["division"]["slug"]
+            label = self["division"]["name"]
+            role = self["division"]["official_identifier"]
+            identifier = self["division"]["official_identifier"]
+            start_date = self["division"]["divisionset"]["start_date"]
+            end_date = self["division"]["divisionset"]["end_date"]
+            territory_code = self["division"]["territory_code"]
+            ee_modified = self["division"].get("modified", "")
+        else:
+            # Case 2, this organisation isn't split in to divisions for
+            # this election, take the info from the organisation directly
+            slug = self["organisation"]["slug"]
+            label = self["organisation"]["official_name"]
+            role = self["elected_role"]
+            identifier = self["organisation"]["official_identifier"]
+            start_date = self["organisation"]["start_date"]
+            end_date = self["organisation"]["end_date"]
+            territory_code = self["organisation"]["territory_code"]
+            ee_modified = self["organisation"].get("modified", "")
+
+        return {
+            "slug": slug,
+            "label": label,
+            "role": role,
+            "identifier": identifier,
+            "start_date": start_date,
+            "end_date": end_date,
+            "territory_code": territory_code,
+            "ee_modified": parse_datetime(ee_modified),
+        }
+
+    def post_cache_key(self):
+        details = self.post_details()
+        return "--".join(
+            [
+                details["slug"],
+                self.organization_object.slug,
+                details["start_date"],
+            ]
+        )
+
+    def post_needs_update(self):
+        """
+        Whether `post_object` has to be saved. An existing Post that EE
+        hasn't changed since it was last imported is left alone, so that its
+        `modified` time doesn't change.
+        """
+        ee_modified = self.post_details()["ee_modified"]
+        return not (
+            ee_modified
+            and not self.post_created
+            and self.post_object.ee_modified
+            and self.post_object.ee_modified >= ee_modified
+        )
+
+    def update_post_object(self):
+        """
+        Set the fields of `post_object` from EE, other than its PartySet.
+        Returns the identifier it had before.
+        """
+        details = self.post_details()
+        self.post_object.role = details["role"]
+        self.post_object.label = details["label"]
+        self.post_object.organization = self.organization_object
+
+        old_identifier = self.post_object.identifier
+
+        self.post_object.identifier = details["identifier"]
+        self.post_object.territory_code = details["territory_code"]
+        self.post_object.end_date = details["end_date"]
+        self.post_object.ee_modified = details["ee_modified"]
+        return old_identifier
+
     def get_replaced_ballot(self):
         replaces = self.get("replaces")
         if not replaces:
@@ -268,21 +337,11 @@ class EEElection(dict):
         # First, set up the Post and Election with related objects
         self.get_or_create_post()
 
-        voting_system = self["voting_system"] or {}
         ballot_data = {
             "post": self.post_object,
-            "winner_count": self["seats_contested"] or 1,
-            "cancelled": self["cancelled"],
             "replaces": self.get_replaced_ballot(),
-            "tags": self.get("tags", {}),
-            "by_election_reason": self.get("by_election_reason", ""),
-            "voting_system": voting_system.get("slug", ""),
-            "ee_modified": self.get("modified"),
-            "close_of_nominations": self["timetable"]["close_of_nominations"],
-            "sopn_publish_deadline": self["timetable"]["sopn_publish_deadline"],
+            **self.ballot_details(),
         }
-        if ballot_data["cancelled"]:
-            ballot_data["candidates_locked"] = True
 
         # if we have a parent Election update it then add it to
         # the dict to be used to update the Ballot
@@ -299,6 +358,32 @@ class EEElection(dict):
             defaults=ballot_data,
         )
 
+        self.update_ballot_object(ballot_data)
+        self.ballot_object.save()
+
+        return (self.ballot_object, self.ballot_created)
+
+    def ballot_details(self):
+        """
+        The fields of the YNR Ballot for this ballot, other than its Post,
+        Election and the Ballot it replaces
+        """
+        voting_system = self["voting_system"] or {}
+        ballot_data = {
+            "winner_count": self["seats_contested"] or 1,
+            "cancelled": self["cancelled"],
+            "tags": self.get("tags", {}),
+            "by_election_reason": self.get("by_election_reason", ""),
+            "voting_system": voting_system.get("slug", ""),
+            "ee_modified": self.get("modified"),
+            "close_of_nominations": self["timetable"]["close_of_nominations"],
+            "sopn_publish_deadline": self["timetable"]["sopn_publish_deadline"],
+        }
+        if ballot_data["cancelled"]:
+            ballot_data["candidates_locked"] = True
+        return ballot_data
+
+    def update_ballot_object(self, ballot_data):
         # Only un-lock the ballot if we're un-cancelling the election on this sync
         # i.e: we don't want to un-lock every non-cancelled ballot every time we import
         if self.ballot_object.cancelled and not ballot_data["cancelled"]:
@@ -307,10 +392,6 @@ class EEElection(dict):
         for field, value in ballot_data.items():
             setattr(self.ballot_object, field, value)
 
-        self.ballot_object.save()
-
-        return (self.ballot_object, self.ballot_created)
-
     def delete_ballot(self):
         try:
             ballot = Ballot.objects.get(ballot_paper_id=self["election_id"])
@@ -349,9 +430,406 @@ def is_mayor_or_pcc_ballot(election):
     ] in ["mayor", "pcc"]
 
 
+class BulkBallotImporter:
+    """
+    Imports many ballots at once, with the same result as calling
+    `EEElection.get_or_create_ballot` on each of them in turn.
+
+    The ballots are imported a chunk at a time. The Organizations, PartySets,
+    Posts, Elections and Ballots a chunk needs are looked up in a few set
+    based queries, then the new and changed rows are written with
+    `bulk_create` and `bulk_update` in one transaction per chunk.
+    """
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+
+    def import_ballots(
+        self, ballots: Iterable[Tuple[EEElection, Optional[EEElection]]]
+    ):
+        """
+        Import each ballot with its parent, which may be None as for
+        `get_or_create_ballot`
+        """
+        ballots = [
+            (ballot, parent)
+            for ballot, parent in ballots
+            if not hasattr(ballot, "ballot_object")
+        ]
+        for start in range(0, len(ballots), self.chunk_size):
+            with transaction.atomic():
+                self.import_chunk(ballots[start : start + self.chunk_size])
+
+    def import_chunk(self, ballots):
+        for ballot, parent in ballots:
+            # Raise the same errors as `get_or_create_post` would
+            ballot.post_details()
+            if parent:
+                assert (
+                    ballot.parent == parent["election_id"]
+                ), "{} != {}".format(ballot.parent, parent["election_id"])
+        parents = list(
+            {
+                parent["election_id"]: parent
+                for _, parent in ballots
+                if parent and parent["election_id"] not in ELECTION_CACHE
+            }.values()
+        )
+        self.get_or_create_organisations(
+            [ballot for ballot, _ in ballots] + parents
+        )
+        self.get_or_create_posts([ballot for ballot, _ in ballots])
+        self.get_or_create_elections(parents)
+        self.get_or_create_ballots(ballots)
+
+    def get_or_create_organisations(self, elections):
+        # Mayor and PCC ballots are their own parents, so might be here twice
+        elections = {
+            id(election): election
+            for election in elections
+            if election["organisation"]
+            and not hasattr(election, "organization_object")
+        }.values()
+        lookups = {election.organisation_lookup for election in elections}
+        organisations = {
+            (organisation.slug, organisation.classification): organisation
+            for organisation in Organization.objects.filter(
+                slug__in={slug for slug, _ in lookups}
+            )
+        }
+        for election in elections:
+            lookup = election.organisation_lookup
+            election.organization_created = lookup not in organisations
+            if election.organization_created:
+                # There are few enough new organisations that they're
+                # created one at a time, so that their signals run
+                org_slug, classification = lookup
+                organisations[lookup] = Organization.objects.create(
+                    name=election["organisation"]["official_name"],
+                    classification=classification,
+                    slug=org_slug,
+                )
+            election.organization_object = organisations[lookup]
+
+    def get_or_create_partysets(self, ballots):
+        details = dict(
+            ballot.partyset_details()
+            for ballot in ballots
+            if ballot.partyset_details()[0] not in PARTYSET_CACHE
+        )
+        existing = {
+            party_set.slug: party_set
+            for party_set in PartySet.objects.filter(slug__in=details)
+        }
+        created = {}
+        for slug, name in details.items():
+            if slug in existing:
+                existing[slug].name = name
+            else:
+                created[slug] = PartySet(slug=slug, name=name)
+        PartySet.objects.bulk_update(existing.values(), ["name"])
+        PartySet.objects.bulk_create(created.values())
+        PARTYSET_CACHE.update(existing)
+        PARTYSET_CACHE.update(created)
+
+        for ballot in ballots:
+            slug = ballot.partyset_details()[0]
+            ballot.party_set_object = PARTYSET_CACHE[slug]
+            ballot.party_set_created = slug in created
+            created.pop(slug, None)
+
+    def get_or_create_posts(self, ballots):
+        details = [ballot.post_details() for ballot in ballots]
+        existing = {}
+        for post in Post.objects.filter(
+            slug__in={d["slug"] for d in details},
+            organization__in={ballot.organization_object for ballot in ballots},
+            start_date__in={d["start_date"] for d in details},
+        ).select_related("organization", "party_set"):
+            key = (post.slug, post.organization_id, post.start_date)
+            if key in existing:
+                raise Post.MultipleObjectsReturned(
+                    f"More than one Post matches {key}"
+                )
+            existing[key] = post
+
+        to_save = []
+        for ballot, post_details in zip(ballots, details):
+            cache_key = ballot.post_cache_key()
+            if cache_key in POST_CACHE:
+                ballot.post_created = False
+                ballot.post_object = POST_CACHE[cache_key]
+                continue
+            key = (
+                post_details["slug"],
+                ballot.organization_object.pk,
+                post_details["start_date"],
+            )
+            ballot.post_created = key not in existing
+            if ballot.post_created:
+                ballot.post_object = Post(
+                    organization=ballot.organization_object,
+                    slug=post_details["slug"],
+                    start_date=post_details["start_date"],
+                    identifier=post_details["identifier"],
+                )
+            else:
+                ballot.post_object = existing[key]
+            POST_CACHE[cache_key] = ballot.post_object
+            if ballot.post_needs_update():
+                to_save.append(ballot)
+
+        self.get_or_create_partysets(to_save)
+        now = timezone.now()
+        created, updated, identifiers = [], [], []
+        for ballot in to_save:
+            post = ballot.post_object
+            old_identifier = ballot.update_post_object()
+            post.party_set = ballot.party_set_object
+            # Done by a pre_save signal when saving a Post. The foreign keys
+            # were just looked up, so they aren't checked again.
+            post.clean_fields(exclude=["organization", "party_set"])
+            post.clean()
+            if ballot.post_created:
+                created.append(post)
+            else:
+                post.modified = now
+                updated.append(post)
+                if old_identifier != post.identifier:
+                    identifiers.append(
+                        PostIdentifier(
+                            post=post,
+                            label="dc_slug",
+                            identifier=old_identifier,
+                        )
+                    )
+        Post.objects.bulk_create(created)
+        Post.objects.bulk_update(updated, self.POST_FIELDS)
+        PostIdentifier.objects.bulk_create(identifiers)
+
+    POST_FIELDS = [
+        "role",
+        "label",
+        "party_set",
+        "organization",
+        "identifier",
+        "territory_code",
+        "end_date",
+        "ee_modified",
+        "modified",
+    ]
+
+    ELECTION_FIELDS = [
+        "current",
+        "candidate_membership_role",
+        "for_post_role",
+        "show_official_documents",
+        "name",
+        "party_lists_in_use",
+        "ee_modified",
+        "organization",
+        "modified",
+    ]
+
+    def get_or_create_elections(self, parents):
+        existing = {
+            (election.slug, str(election.election_date)): election
+            for election in YNRElection.objects.filter(
+                slug__in=[parent["election_id"] for parent in parents]
+            )
+        }
+        now = timezone.now()
+        created, updated = [], []
+        for parent in parents:
+            defaults = {
+                **parent.election_defaults(),
+                "organization": getattr(parent, "organization_object", None),
+            }
+            key = (parent["election_id"], parent["poll_open_date"])
+            parent.election_created = key not in existing
+            if parent.election_created:
+                parent.election_object = YNRElection(
+                    slug=parent["election_id"],
+                    election_date=parent["poll_open_date"],
+                    **defaults,
+                )
+                created.append(parent.election_object)
+            else:
+                parent.election_object = existing[key]
+                for field, value in defaults.items():
+                    setattr(parent.election_object, field, value)
+                parent.election_object.modified = now
+                updated.append(parent.election_object)
+            ELECTION_CACHE[parent["election_id"]] = parent.election_object
+        # A slug that exists with another date fails here, as it does in
+        # `update_or_create`
+        YNRElection.objects.bulk_create(created)
+        YNRElection.objects.bulk_update(updated, self.ELECTION_FIELDS)
+
+    BALLOT_FIELDS = [
+        "post",
+        "election",
+        "replaces",
+        "winner_count",
+        "cancelled",
+        "candidates_locked",
+        "tags",
+        "by_election_reason",
+        "voting_system",
+        "ee_modified",
+        "close_of_nominations",
+        "sopn_publish_deadline",
+        "modified",
+    ]
+
+    def get_or_create_ballots(self, ballots):
+        ballot_paper_ids = [ballot["election_id"] for ballot, _ in ballots]
+        replaces_ids = [
+            ballot["replaces"]
+            for ballot, _ in ballots
+            if ballot.get("replaces")
+        ]
+        existing = {
+            ballot.ballot_paper_id: ballot
+            for ballot in Ballot.objects.filter(
+                ballot_paper_id__in=ballot_paper_ids + replaces_ids
+            )
+        }
+        # `get_or_create_ballot` only finds the ballots that were there
+        # before, or that were imported before this one
+        imported = {}
+
+        now = timezone.now()
+        created, updated, replaced_later = [], [], []
+        for ballot, parent in ballots:
+            ballot_data = {
+                "post": ballot.post_object,
+                "replaces": None,
+                **ballot.ballot_details(),
+            }
+            replaces = ballot.get("replaces")
+            if replaces in existing:
+                ballot_data["replaces"] = existing[replaces]
+            elif replaces in imported:
+                replaced_later.append(ballot)
+            if parent:
+                # The parent might have been imported in an earlier chunk
+                parent.election_object = ELECTION_CACHE[parent["election_id"]]
+                ballot_data["election"] = parent.election_object
+
+            ballot_paper_id = ballot["election_id"]
+            ballot.ballot_created = ballot_paper_id not in existing
+            if ballot.ballot_created:
+                ballot.ballot_object = Ballot(
+                    ballot_paper_id=ballot_paper_id, **ballot_data
+                )
+                created.append(ballot.ballot_object)
+            else:
+                ballot.ballot_object = existing[ballot_paper_id]
+                ballot.update_ballot_object(ballot_data)
+                ballot.ballot_object.modified = now
+                updated.append(ballot.ballot_object)
+            imported[ballot_paper_id] = ballot.ballot_object
+
+        Ballot.objects.bulk_create(created)
+        Ballot.objects.bulk_update(updated, self.BALLOT_FIELDS)
+
+        for ballot in replaced_later:
+            ballot.ballot_object.replaces = imported[ballot["replaces"]]
+        Ballot.objects.bulk_update(
+            [ballot.ballot_object for ballot in replaced_later], ["replaces"]
+        )
+
+
+class TokenBucket:
+    """
+    A rate limiter that allows `rate` requests a second on average, in bursts
+    of up to `burst` requests. Safe to share between threads.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Wait until a request is allowed
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # Going into debt reserves a slot, so that waiting threads are
+            # let through one at a time rather than all at once
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            self.sleep(wait)
+
+
+class EEClient:
+    """
+    Fetches JSON from Every Election for one import run.
+
+    Requests share one HTTP session, so connections are reused, and are rate
+    limited by `EE_IMPORT_REQUESTS_PER_SECOND`. Successful responses are kept
+    for the rest of the run, so each URL is only fetched once.
+    """
+
+    def __init__(self, requests_per_second=None, threads=None):
+        if requests_per_second is None:
+            requests_per_second = getattr(
+                settings, "EE_IMPORT_REQUESTS_PER_SECOND", 5
+            )
+        if threads is None:
+            threads = getattr(settings, "EE_IMPORT_THREADS", 4)
+        self.threads = threads
+        self.rate_limit = None
+        if requests_per_second:
+            self.rate_limit = TokenBucket(
+                requests_per_second, burst=max(1, threads)
+            )
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(1, threads)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.responses = {}
+
+    def get_json(self, url: str):
+        if url in self.responses:
+            return self.responses[url]
+        if self.rate_limit:
+            self.rate_limit.take()
+        req = self.session.get(url)
+        req.raise_for_status()
+        self.responses[url] = req.json()
+        return self.responses[url]
+
+    def get_many(self, urls: Iterable[str]) -> List:
+        """
+        Fetch each of `urls` at the same time, returning their JSON in the
+        same order
+        """
+        urls = list(dict.fromkeys(urls))
+        if len(urls) <= 1 or self.threads <= 1:
+            return [self.get_json(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            return list(pool.map(self.get_json, urls))
+
+
 class EveryElectionImporter(object):
-    def __init__(self, query_args=None, election_id=None):
+    def __init__(self, query_args=None, election_id=None, client=None):
         self.election_id = election_id
+        self.client = client or EEClient()
         self.EE_BASE_URL = getattr(
             settings, "EE_BASE_URL", "https://elections.democracyclub.org.uk/"
         )
@@ -374,30 +852,63 @@ class EveryElectionImporter(object):
         """
 
         url = self.build_url_with_query_args()
-        req = requests.get(url)
-        req.raise_for_status()
-        return int(req.json().get("count", 0))
+        return int(self.client.get_json(url).get("count", 0))
 
     def build_url_with_query_args(self):
         params = urlencode(OrderedDict(sorted(self.query_args.items())))
         return f"{self.url}?{params}"
 
+    def add_page(self, data: dict, counter: int = 0) -> int:
+        """
+        Add a page of results to the tree, returning how many results have
+        been added from the pages of this list so far
+        """
+        for result in data["results"]:
+            election_id = result["election_id"]
+            self.election_tree[election_id] = EEElection(result)
+            counter += 1
+        if counter:
+            print(f"Added {counter} of {data['count']}")
+        return counter
+
     def url_to_election_tree(self, url: str, counter: int = 0):
         while url:
-            req = requests.get(url)
-            req.raise_for_status()
-            data = req.json()
-            total = data["count"]
-
-            for result in data["results"]:
-                election_id = result["election_id"]
-                self.election_tree[election_id] = EEElection(result)
-                counter += 1
-            if counter:
-                print(f"Added {counter} of {total}")
+            data = self.client.get_json(url)
+            counter = self.add_page(data, counter)
             url = data.get("next")
         return self.election_tree
 
+    def urls_to_election_tree(self, urls: Iterable[str]):
+        """
+        Fetch the first page of each of `urls` at once, then any further
+        pages of each
+        """
+        urls = list(dict.fromkeys(urls))
+        for data in self.client.get_many(urls):
+            counter = self.add_page(data)
+            if data.get("next"):
+                self.url_to_election_tree(data["next"], counter)
+        return self.election_tree
+
+    def election_url(self, election_id: str) -> str:
+        return f"{self.url}{election_id}"
+
+    def fetch_elections(self, election_ids: Iterable[str]):
+        """
+        Fetch the elections in `election_ids` that aren't in the tree yet,
+        all at once, and add them to it
+        """
+        missing = [
+            election_id
+            for election_id in dict.fromkeys(election_ids)
+            if election_id not in self.election_tree
+        ]
+        urls = [self.election_url(election_id) for election_id in missing]
+        for data in self.client.get_many(urls):
+            if "election_id" in data:
+                self.election_tree[data["election_id"]] = EEElection(data)
+        return self.election_tree
+
     def build_election_tree(self, deleted=False) -> dict:
         """
         Get all current elections from Every Election and build them in to
@@ -405,10 +916,7 @@ class EveryElectionImporter(object):
         """
 
         if self.election_id:
-            url = f"{self.url}{self.election_id}"
-            req = requests.get(url)
-            req.raise_for_status()
-            data = req.json()
+            data = self.client.get_json(self.election_url(self.election_id))
             election_id = data["election_id"]
             self.election_tree[election_id] = EEElection(data)
             return self.election_tree
@@ -424,11 +932,11 @@ class EveryElectionImporter(object):
         print("Importing elections")
         self.url_to_election_tree(url)
 
-        # Second pass: get the children
+        # Second pass: get the children. Children with the same date and
+        # prefix are all in the same list, so each list is only fetched once
         print("Importing ballots")
+        urls = []
         for election_id, election in self.election_tree.copy().items():
-            if not settings.RUNNING_TESTS:
-                sleep(1)
             for child in election["children"]:
                 parts = child.split(".")
                 date = parts.pop(-1)
@@ -439,8 +947,8 @@ class EveryElectionImporter(object):
                 )
                 if deleted:
                     url = f"{url}&deleted=1"
-                self.url_to_election_tree(url)
-        return self.election_tree
+                urls.append(url)
+        return self.urls_to_election_tree(urls)
 
     @property
     def ballot_ids(self):
@@ -475,22 +983,39 @@ class EveryElectionImporter(object):
             return child
 
         if child.parent not in self.election_tree:
-            new_importer = EveryElectionImporter(election_id=child.parent)
-            new_importer.build_election_tree()
-            self.election_tree.update(new_importer.election_tree)
+            self.fetch_elections([child.parent])
 
         return self.election_tree[child.parent]
 
     def get_children(self, election_id):
         parent = self.election_tree[election_id]
-        children = []
+        self.fetch_elections(parent["children"])
+        return [self.election_tree[child_id] for child_id in parent["children"]]
 
-        for child_id in parent["children"]:
-            if child_id not in self.election_tree:
-                new_importer = EveryElectionImporter(election_id=child_id)
-                new_importer.build_election_tree()
-                self.election_tree.update(new_importer.election_tree)
-            self.election_tree[child_id]
-            children.append(self.election_tree[child_id])
+    def fetch_parents_and_children(self):
+        """
+        Fetch the parents of all the ballots that aren't in the tree, then the
+        children of any of those parents without a voting system, in two
+        batches rather than one at a time from `get_parent` and
+        `get_children`.
 
-        return children
+        Anything that can't be fetched is left out, so that `get_parent` or
+        `get_children` raise an error for it as before.
+        """
+        ballots = self.ballot_ids
+        self.fetch_elections(
+            ballot.parent
+            for ballot_id, ballot in ballots.items()
+            if ballot_id[:-10] != "gla.a." and ballot.get("group")
+        )
+        parents = [
+            self.election_tree[ballot.parent]
+            for ballot in ballots.values()
+            if ballot.get("group") in self.election_tree
+        ]
+        self.fetch_elections(
+            child_id
+            for parent in parents
+            if not parent["voting_system"]
+            for child_id in parent["children"]
+        )
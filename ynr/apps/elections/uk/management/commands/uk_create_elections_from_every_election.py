@@ -6,7 +6,11 @@ from django.core.management import CommandError
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from elections.models import Election
-from elections.uk.every_election import EveryElectionImporter
+from elections.uk.every_election import (
+    BulkBallotImporter,
+    EEClient,
+    EveryElectionImporter,
+)
 
 
 class Command(BaseCommand):
@@ -43,6 +47,12 @@ class Command(BaseCommand):
             action="store_true",
             help="Check that current elections are still marked as such in EE and verified the 'current' ballots",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Import ballots in bulk rather than one at a time. Faster "
+            "for large imports, such as --full",
+        )
 
     def valid_date(self, value):
         return parse(value).date()
@@ -57,7 +67,11 @@ class Command(BaseCommand):
         return ballots.first().latest_ee_modified
 
     def import_approved_elections(
-        self, full=False, poll_open_date=None, recently_updated_timestamp=None
+        self,
+        full=False,
+        poll_open_date=None,
+        recently_updated_timestamp=None,
+        bulk=False,
     ):
         # Get all approved elections from EveryElection
         query_args = None
@@ -69,8 +83,10 @@ class Command(BaseCommand):
         if recently_updated_timestamp:
             query_args = {"modified": recently_updated_timestamp}
 
-        ee_importer = EveryElectionImporter(query_args)
+        ee_importer = EveryElectionImporter(query_args, client=self.client)
         ee_importer.build_election_tree()
+        ee_importer.fetch_parents_and_children()
+        bulk_ballots = []
         for ballot_id, election_dict in ee_importer.ballot_ids.items():
             try:
                 parent = ee_importer.get_parent(ballot_id)
@@ -91,7 +107,13 @@ class Command(BaseCommand):
                 # not in the election tree because there is nothing to update
                 parent = None
 
-            election_dict.get_or_create_ballot(parent=parent)
+            if bulk:
+                bulk_ballots.append((election_dict, parent))
+            else:
+                election_dict.get_or_create_ballot(parent=parent)
+
+        if bulk_ballots:
+            BulkBallotImporter().import_ballots(bulk_ballots)
 
     def determine_voting_system(self, children):
         """
@@ -118,10 +140,12 @@ class Command(BaseCommand):
         Rather, grab elections we think might no longer be current
         and check with EE
         """
-        might_not_be_current = Election.objects.past().current()
+        might_not_be_current = list(Election.objects.past().current())
+        importer = EveryElectionImporter(client=self.client)
+        importer.fetch_elections(
+            election.slug for election in might_not_be_current
+        )
         for election in might_not_be_current:
-            importer = EveryElectionImporter(election_id=election.slug)
-            importer.build_election_tree()
             current = importer.election_tree[election.slug].get("current")
             if not current:
                 election.current = False
@@ -129,7 +153,7 @@ class Command(BaseCommand):
 
         # Now get all EE current elections and count them against the local DB.
         ee_importer = EveryElectionImporter(
-            {"current": 1, "identifier_type": "ballot"}
+            {"current": 1, "identifier_type": "ballot"}, client=self.client
         )
         ee_current_ballots = ee_importer.count_results()
         local_current_ballots = Ballot.objects.filter(
@@ -149,7 +173,7 @@ class Command(BaseCommand):
             params.pop("poll_open_date__gte")
             params["modified"] = recently_updated_timestamp
 
-        ee_importer = EveryElectionImporter(params)
+        ee_importer = EveryElectionImporter(params, client=self.client)
 
         # TODO account for -recently-updated flag here?
         ee_importer.build_election_tree(deleted=True)
@@ -183,6 +207,10 @@ class Command(BaseCommand):
                 "--recently-updated-delta only works with --recently-updated"
             )
 
+        # Shared by everything in this run, so that each URL is only fetched
+        # once and all requests count towards the same rate limit
+        self.client = EEClient()
+
         with transaction.atomic():
             if options["check_current"]:
                 return self.check_local_current_against_remote()
@@ -196,6 +224,7 @@ class Command(BaseCommand):
                 full=options["full"],
                 poll_open_date=options["poll_open_date"],
                 recently_updated_timestamp=recently_updated_timestamp,
+                bulk=options["bulk"],
             )
             self.delete_deleted_elections(
                 recently_updated_timestamp=recently_updated_timestamp
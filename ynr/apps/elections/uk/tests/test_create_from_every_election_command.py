@@ -1,5 +1,8 @@
 import datetime
+import json
+import threading
 from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Dict, List
 from unittest import mock
 from urllib.parse import parse_qs, urlencode, urljoin, urlparse
@@ -15,6 +18,9 @@ from candidates.tests.factories import (
 )
 from django.conf import settings
 from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django_webtest import WebTest
 from elections.models import Election
@@ -84,7 +90,7 @@ def make_per_election_fixtures_from_pages(pages: List[Dict], deleted=False):
     return fixtures
 
 
-def create_mock_with_fixtures(
+def make_fixtures(
     params: dict,
     parents,
     ballot_pages,
@@ -92,6 +98,9 @@ def create_mock_with_fixtures(
     modified=False,
     extra_urls=None,
 ):
+    """
+    Return the response to each URL the importer should ask EE for
+    """
     fixtures = {}
     if not deleted:
         deleted = no_results
@@ -124,20 +133,75 @@ def create_mock_with_fixtures(
                 {}, f"/api/elections/{election_id}"
             )
             fixtures[url] = fixture
+    return fixtures
+
+
+def find_fixture(fixtures, url):
+    url_params = parse_qs(urlparse(url).query)
+    for fixture_url, fixture in fixtures.items():
+        params = parse_qs(urlparse(fixture_url).query)
+        if params == url_params:
+            return fixture
+    raise ValueError(f"Can't find {url_params} in {fixtures.keys()}")
+
+
+def create_mock_with_fixtures(*args, **kwargs):
+    fixtures = make_fixtures(*args, **kwargs)
 
     def mock(url):
-        url_params = parse_qs(urlparse(url).query)
-        for fixture_url, fixture in fixtures.items():
-            params = parse_qs(urlparse(fixture_url).query)
-            if params == url_params:
-                return Mock(
-                    **{"json.return_value": fixture, "status_code": 200}
-                )
-        raise ValueError(f"Can't find {url_params} in {fixtures.keys()}")
+        return Mock(
+            **{
+                "json.return_value": find_fixture(fixtures, url),
+                "status_code": 200,
+            }
+        )
 
     return mock
 
 
+class StubEEServer:
+    """
+    A local HTTP server that answers like EE, from the same fixtures as
+    `create_mock_with_fixtures`, and records the paths it was asked for
+    """
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.requested = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub.requested.append(self.path)
+                try:
+                    body = json.dumps(find_fixture(stub.fixtures, self.path))
+                    status = 200
+                except ValueError:
+                    body, status = "{}", 404
+                body = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
 exclude_ref_regex_param = {"exclude_election_id_regex": r"^ref\..*"}
 
 fake_requests_current_elections = create_mock_with_fixtures(
@@ -157,7 +221,9 @@ class EE_ImporterTest(WebTest):
     @patch("elections.uk.every_election.requests")
     @freeze_time("2018-02-02")
     def setUp(self, mock_requests):
-        mock_requests.get.side_effect = fake_requests_current_elections
+        mock_requests.Session.return_value.get.side_effect = (
+            fake_requests_current_elections
+        )
 
         self.ee_importer = every_election.EveryElectionImporter()
         self.ee_importer.build_election_tree()
@@ -290,10 +356,12 @@ class EE_ImporterTest(WebTest):
     @patch("elections.uk.every_election.requests")
     def test_create_from_all_elections(self, mock_requests):
         query_args = {"poll_open_date": "2019-01-17", "current": "True"}
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            query_args,
-            current_elections_parents,
-            [current_elections, current_elections_page_2],
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                query_args,
+                current_elections_parents,
+                [current_elections, current_elections_page_2],
+            )
         )
         self.ee_importer = every_election.EveryElectionImporter(query_args)
         self.ee_importer.build_election_tree()
@@ -307,7 +375,7 @@ class EE_ImporterTest(WebTest):
     @patch("elections.uk.every_election.requests")
     @freeze_time("2018-02-02")
     def test_import_management_command(self, mock_requests):
-        mock_requests.get.side_effect = (
+        mock_requests.Session.return_value.get.side_effect = (
             fake_requests_each_type_of_election_on_one_day
         )
 
@@ -347,12 +415,71 @@ class EE_ImporterTest(WebTest):
         )
         self.assertEqual(ballot.winner_count, 3)
 
+    def imported_ballots(self):
+        return list(
+            Ballot.objects.order_by("ballot_paper_id").values(
+                "ballot_paper_id",
+                "winner_count",
+                "cancelled",
+                "candidates_locked",
+                "voting_system",
+                "sopn_publish_deadline",
+                "post__slug",
+                "post__label",
+                "post__identifier",
+                "post__start_date",
+                "post__territory_code",
+                "post__party_set__slug",
+                "post__organization__slug",
+                "election__slug",
+                "election__name",
+                "election__current",
+                "election__party_lists_in_use",
+                "election__organization__slug",
+            )
+        )
+
+    def clear_import_caches(self):
+        every_election.POST_CACHE.clear()
+        every_election.ELECTION_CACHE.clear()
+        every_election.PARTYSET_CACHE.clear()
+
+    @patch("elections.uk.every_election.requests")
+    @freeze_time("2018-02-02")
+    def test_bulk_import_management_command(self, mock_requests):
+        mock_requests.Session.return_value.get.side_effect = (
+            fake_requests_each_type_of_election_on_one_day
+        )
+        call_command("uk_create_elections_from_every_election")
+        one_at_a_time = self.imported_ballots()
+        self.assertEqual(len(one_at_a_time), 15)
+
+        Ballot.objects.all().delete()
+        Post.objects.all().delete()
+        Election.objects.all().delete()
+        every_election.Organization.objects.all().delete()
+        every_election.PartySet.objects.all().delete()
+        self.clear_import_caches()
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("uk_create_elections_from_every_election", bulk=True)
+        self.assertEqual(self.imported_ballots(), one_at_a_time)
+        # Compared to 243 one at a time
+        self.assertLess(len(queries), 100)
+
+        # Importing again updates the same rows
+        post_count = Post.objects.count()
+        self.clear_import_caches()
+        call_command("uk_create_elections_from_every_election", bulk=True)
+        self.assertEqual(self.imported_ballots(), one_at_a_time)
+        self.assertEqual(Post.objects.count(), post_count)
+
     @patch("elections.uk.every_election.requests")
     @freeze_time("2018-02-02")
     def test_delete_elections_no_matches(self, mock_requests):
         # import some data
         # just so we've got a non-empty DB
-        mock_requests.get.side_effect = (
+        mock_requests.Session.return_value.get.side_effect = (
             fake_requests_each_type_of_election_on_one_day
         )
         call_command("uk_create_elections_from_every_election")
@@ -363,11 +490,13 @@ class EE_ImporterTest(WebTest):
         # but none of the elections in the
         # local_highland fixture
         # match anything we just imported
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            no_results,
-            ballot_pages=[],
-            deleted=local_highland,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                no_results,
+                ballot_pages=[],
+                deleted=local_highland,
+            )
         )
         # this should finish cleanly without complaining
         call_command("uk_create_elections_from_every_election")
@@ -380,10 +509,12 @@ class EE_ImporterTest(WebTest):
     @freeze_time("2018-02-02")
     def test_delete_elections_with_matches(self, mock_requests):
         # import some data
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            local_highland_parent,
-            [local_highland],
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                local_highland_parent,
+                [local_highland],
+            )
         )
         call_command("uk_create_elections_from_every_election")
         self.assertEqual(every_election.Ballot.objects.all().count(), 1)
@@ -391,12 +522,14 @@ class EE_ImporterTest(WebTest):
 
         # now we've switched the fixtures round
         # so the records we just imported are deleted in EE
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            no_results,
-            [no_results],
-            # TODO: mock all URLS for deleted results
-            deleted=local_highland,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                no_results,
+                [no_results],
+                # TODO: mock all URLS for deleted results
+                deleted=local_highland,
+            )
         )
         call_command("uk_create_elections_from_every_election")
 
@@ -416,11 +549,13 @@ class EE_ImporterTest(WebTest):
         # the same election/s as deleted and not deleted
         # this makes no sense and shouldn't happen but
         # if it does it should essentially be a no-op
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            local_highland_parent,
-            [local_highland],
-            deleted=local_highland,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                local_highland_parent,
+                [local_highland],
+                deleted=local_highland,
+            )
         )
         call_command("uk_create_elections_from_every_election")
 
@@ -434,10 +569,12 @@ class EE_ImporterTest(WebTest):
         self, mock_requests
     ):
         # import some data
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            parents=local_highland_parent,
-            ballot_pages=[local_highland],
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                parents=local_highland_parent,
+                ballot_pages=[local_highland],
+            )
         )
         call_command("uk_create_elections_from_every_election")
         self.assertEqual(every_election.Ballot.objects.all().count(), 1)
@@ -459,11 +596,13 @@ class EE_ImporterTest(WebTest):
             "previous": None,
             "results": [local_highland["results"][0]],
         }
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            parents=local_highland_parent,
-            ballot_pages=[current_elections],
-            deleted=deleted_elections,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                parents=local_highland_parent,
+                ballot_pages=[current_elections],
+                deleted=deleted_elections,
+            )
         )
 
         # make sure we throw an exception
@@ -479,10 +618,12 @@ class EE_ImporterTest(WebTest):
     @freeze_time("2018-02-02")
     def test_delete_elections_with_related_membership(self, mock_requests):
         # import some data
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            local_highland_parent,
-            [local_highland],
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                local_highland_parent,
+                [local_highland],
+            )
         )
         call_command("uk_create_elections_from_every_election")
         self.assertEqual(every_election.Ballot.objects.all().count(), 1)
@@ -497,11 +638,13 @@ class EE_ImporterTest(WebTest):
 
         # now we've switched the fixtures round
         # so the records we just imported are deleted in EE
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            no_results,
-            [no_results],
-            deleted=local_highland,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                no_results,
+                [no_results],
+                deleted=local_highland,
+            )
         )
         # make sure we throw an exception
         with self.assertRaises(Exception):
@@ -520,11 +663,13 @@ class EE_ImporterTest(WebTest):
         :param mock_requests:
         :return:
         """
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2018-01-03"},
-            duplicate_post_names_parent,
-            [duplicate_post_names],
-            deleted=no_results,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2018-01-03"},
+                duplicate_post_names_parent,
+                [duplicate_post_names],
+                deleted=no_results,
+            )
         )
         call_command("uk_create_elections_from_every_election")
         post_a, post_b = Post.objects.all().order_by(
@@ -550,21 +695,25 @@ class EE_ImporterTest(WebTest):
         Test that posts imported before GSS codes aren't duplicated
         at the point we have GSS codes for them in EE
         """
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2019-04-02"},
-            get_changing_identifier_code_result_parent,
-            [pre_gss_result],
-            deleted=no_results,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2019-04-02"},
+                get_changing_identifier_code_result_parent,
+                [pre_gss_result],
+                deleted=no_results,
+            )
         )
         self.assertEqual(Post.objects.count(), 0)
         call_command("uk_create_elections_from_every_election")
         self.assertEqual(Post.objects.count(), 1)
 
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2019-04-02"},
-            get_changing_identifier_code_result_parent,
-            [post_gss_result],
-            deleted=no_results,
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2019-04-02"},
+                get_changing_identifier_code_result_parent,
+                [post_gss_result],
+                deleted=no_results,
+            )
         )
 
         call_command("uk_create_elections_from_every_election")
@@ -573,6 +722,14 @@ class EE_ImporterTest(WebTest):
     @patch("elections.uk.every_election.requests")
     @freeze_time("2019-05-02")
     def test_adds_replaces(self, mock_requests):
+        self.assert_adds_replaces(mock_requests)
+
+    @patch("elections.uk.every_election.requests")
+    @freeze_time("2019-05-02")
+    def test_bulk_adds_replaces(self, mock_requests):
+        self.assert_adds_replaces(mock_requests, bulk=True)
+
+    def assert_adds_replaces(self, mock_requests, **options):
         "local.highland.wester-ross-strathpeffer-and-lochalsh.by.2018-12-06"
         # PostFactory.create()
         org = OrganizationFactory(name="Highland Council")
@@ -592,13 +749,15 @@ class EE_ImporterTest(WebTest):
         self.assertEqual(Ballot.objects.all().count(), 1)
         old_ballot = Ballot.objects.get()
 
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2019-04-02"},
-            parents=replaced_election_parents,
-            ballot_pages=[replaced_election],
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2019-04-02"},
+                parents=replaced_election_parents,
+                ballot_pages=[replaced_election],
+            )
         )
 
-        call_command("uk_create_elections_from_every_election")
+        call_command("uk_create_elections_from_every_election", **options)
         self.assertEqual(Ballot.objects.all().count(), 2)
         new_ballot = Ballot.objects.order_by("pk").last()
         self.assertEqual(new_ballot.replaces, old_ballot)
@@ -608,10 +767,12 @@ class EE_ImporterTest(WebTest):
     def test_create_duplicate_post_election(self, mock_requests):
         self.assertEqual(Ballot.objects.all().count(), 0)
 
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"poll_open_date__gte": "2019-04-02"},
-            duplicate_post_and_election_parents,
-            [duplicate_post_and_election],
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"poll_open_date__gte": "2019-04-02"},
+                duplicate_post_and_election_parents,
+                [duplicate_post_and_election],
+            )
         )
 
         call_command("uk_create_elections_from_every_election")
@@ -632,17 +793,19 @@ class EE_ImporterTest(WebTest):
         self.assertEqual(Election.objects.all().count(), 0)
         missing_parent = deepcopy(local_highland)
         del missing_parent["results"][0]
-        mock_requests.get.side_effect = create_mock_with_fixtures(
-            {"modified": "2018-02-02T00:00:00"},
-            missing_parent,
-            [missing_parent],
-            modified=True,
-            extra_urls=[
-                (
-                    {"election_id": "local.highland.2018-12-06"},
-                    local_highland["results"][0],
-                )
-            ],
+        mock_requests.Session.return_value.get.side_effect = (
+            create_mock_with_fixtures(
+                {"modified": "2018-02-02T00:00:00"},
+                missing_parent,
+                [missing_parent],
+                modified=True,
+                extra_urls=[
+                    (
+                        {"election_id": "local.highland.2018-12-06"},
+                        local_highland["results"][0],
+                    )
+                ],
+            )
         )
         call_command(
             "uk_create_elections_from_every_election", recently_updated=True
@@ -887,3 +1050,93 @@ class TestEEElection:
         existing_ballot.refresh_from_db()
         assert existing_ballot.cancelled is False
         assert existing_ballot.candidates_locked is True
+
+
+class TestTokenBucket(SimpleTestCase):
+    def test_waits_once_burst_is_used(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        bucket = every_election.TokenBucket(
+            2, burst=2, clock=lambda: now[0], sleep=sleep
+        )
+        bucket.take()
+        bucket.take()
+        self.assertEqual(waits, [])
+        bucket.take()
+        self.assertEqual(waits, [0.5])
+        now[0] += 5
+        for _ in range(3):
+            bucket.take()
+        self.assertEqual(waits, [0.5, 0.5])
+
+
+class TestStubEEServer(SimpleTestCase):
+    query_args = {"poll_open_date": "2019-01-17"}
+
+    def setUp(self):
+        self.fixtures = make_fixtures(
+            self.query_args.copy(),
+            parents=each_type_of_election_on_one_day_parents,
+            ballot_pages=[each_type_of_election_on_one_day],
+        )
+
+    def test_build_election_tree(self):
+        with StubEEServer(self.fixtures) as stub, override_settings(
+            EE_BASE_URL=stub.url
+        ):
+            ee_importer = every_election.EveryElectionImporter(
+                self.query_args.copy(),
+                client=every_election.EEClient(threads=4),
+            )
+            ee_importer.build_election_tree()
+            ee_importer.fetch_parents_and_children()
+            requested = list(stub.requested)
+            for ballot_id in ee_importer.ballot_ids:
+                ee_importer.get_parent(ballot_id)
+
+        self.assertEqual(len(ee_importer.ballot_ids), 15)
+        self.assertEqual(
+            set(ee_importer.election_tree),
+            {
+                election["election_id"]
+                for page in [
+                    each_type_of_election_on_one_day,
+                    each_type_of_election_on_one_day_parents,
+                ]
+                for election in page["results"]
+            },
+        )
+        # Each list of children is only asked for once, and nothing more
+        # is needed to find the parents
+        self.assertEqual(len(requested), len(set(requested)))
+        self.assertEqual(stub.requested, requested)
+
+    def test_missing_parents_are_fetched_together(self):
+        results = {
+            election["election_id"]: election
+            for election in each_type_of_election_on_one_day["results"]
+        }
+        ballot = every_election.EEElection(
+            results["local.adur.buckingham.2019-01-17"]
+        )
+        parent = results["local.adur.2019-01-17"]
+        with StubEEServer(
+            {make_elections_url_with_params({}, ballot.parent): parent}
+        ) as stub, override_settings(EE_BASE_URL=stub.url):
+            ee_importer = every_election.EveryElectionImporter(
+                client=every_election.EEClient()
+            )
+            ee_importer.election_tree[ballot["election_id"]] = ballot
+            ee_importer.fetch_parents_and_children()
+            self.assertEqual(
+                stub.requested, [f"/api/elections/{ballot.parent}"]
+            )
+            self.assertEqual(
+                ee_importer.get_parent(ballot["election_id"]), parent
+            )
+        self.assertEqual(len(stub.requested), 1)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ModerationQueueConfig(AppConfig):
+    name = "moderation_queue"
+
+    def ready(self):
+        import moderation_queue.signals  # noqa
@@ -0,0 +1,143 @@
+"""
+Backends that find faces in queued images, so that they can be cropped to
+the face before they're reviewed.
+
+Each backend returns its results in the same shape as the response from
+Rekognition's DetectFaces, as that's what's stored in
+`QueuedImage.detection_metadata` and read by
+`moderation_queue_rotate_images`. Backends are used from several threads at
+once, so they must be thread safe.
+"""
+
+import abc
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+try:
+    from storages.backends.s3 import S3Storage
+except ImportError:
+    S3Storage = None
+
+
+class BaseFaceDetectionBackend(metaclass=abc.ABCMeta):
+    @abc.abstractmethod
+    def detect_faces(self, image_name, storage, png_bytes):
+        """
+        Return a dict like Rekognition's DetectFaces response, with the
+        largest or most prominent face first in `FaceDetails`.
+
+        :param image_name: the name of the image in `storage`
+        :param png_bytes: the image as it's been saved to `storage`
+        """
+
+
+class RekognitionFaceDetectionBackend(BaseFaceDetectionBackend):
+    def __init__(self):
+        import boto3
+
+        # boto3 clients are thread safe, unlike sessions and resources
+        self.client = boto3.client("rekognition", region_name="eu-west-1")
+
+    def detect_faces(self, image_name, storage, png_bytes):
+        if S3Storage and isinstance(storage, S3Storage):
+            rekognition_image = {
+                "S3Object": {
+                    "Bucket": storage.bucket_name,
+                    "Name": storage._normalize_name(image_name),
+                }
+            }
+        else:
+            rekognition_image = {"Bytes": png_bytes}
+        return self.client.detect_faces(
+            Image=rekognition_image, Attributes=["ALL"]
+        )
+
+
+class OpenCVFaceDetectionBackend(BaseFaceDetectionBackend):
+    """
+    Finds faces locally with an OpenCV Haar cascade. This needs the
+    `opencv-python-headless` package, which isn't installed by default.
+
+    It doesn't work out the pose of the face, so the roll is always 0 and
+    images aren't rotated.
+    """
+
+    cascade = "haarcascade_frontalface_default.xml"
+
+    def __init__(self):
+        try:
+            import cv2
+            import numpy
+        except ImportError:
+            raise ImproperlyConfigured(
+                "OpenCVFaceDetectionBackend needs opencv-python-headless"
+            )
+        self.cv2 = cv2
+        self.numpy = numpy
+        # Classifiers can't be shared between threads
+        self.local = threading.local()
+
+    @property
+    def classifier(self):
+        if not hasattr(self.local, "classifier"):
+            self.local.classifier = self.cv2.CascadeClassifier(
+                self.cv2.data.haarcascades + self.cascade
+            )
+        return self.local.classifier
+
+    def detect_faces(self, image_name, storage, png_bytes):
+        image = self.cv2.imdecode(
+            self.numpy.frombuffer(png_bytes, self.numpy.uint8),
+            self.cv2.IMREAD_GRAYSCALE,
+        )
+        height, width = image.shape
+        faces = self.classifier.detectMultiScale(
+            self.cv2.equalizeHist(image),
+            scaleFactor=1.1,
+            minNeighbors=3,
+            minSize=(20, 20),
+        )
+        faces = sorted(faces, key=lambda face: face[2] * face[3], reverse=True)
+        return {
+            "FaceDetails": [
+                {
+                    "BoundingBox": {
+                        "Left": x / width,
+                        "Top": y / height,
+                        "Width": face_width / width,
+                        "Height": face_height / height,
+                    },
+                    "Pose": {"Roll": 0.0},
+                }
+                for x, y, face_width, face_height in faces
+            ]
+        }
+
+
+class FakeFaceDetectionBackend(BaseFaceDetectionBackend):
+    """
+    Finds a face in the middle of every image, for testing and local
+    development
+    """
+
+    def detect_faces(self, image_name, storage, png_bytes):
+        return {
+            "FaceDetails": [
+                {
+                    "BoundingBox": {
+                        "Left": 0.25,
+                        "Top": 0.25,
+                        "Width": 0.5,
+                        "Height": 0.5,
+                    },
+                    "Pose": {"Roll": 0.0},
+                }
+            ]
+        }
+
+
+def get_face_detection_backend():
+    return import_string(settings.FACE_DETECTION_BACKEND)()
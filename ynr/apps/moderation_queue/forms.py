@@ -15,6 +15,7 @@ from moderation_queue.helpers import (
     convert_image_to_png,
 )
 from people.forms.forms import StrippedCharField
+from people.image_hashes import hash_image_bytes, set_perceptual_hash
 from PIL import Image as PILImage
 from utils.mail import send_mail
 
@@ -122,6 +123,9 @@ class PhotoRotateForm(forms.Form):
         buffer = BytesIO()
         rotated.save(buffer, "PNG")
         self.queued_image.image.save(self.queued_image.image.name, buffer)
+        set_perceptual_hash(
+            self.queued_image, hash_image_bytes(buffer.getvalue())
+        )
         self.queued_image.rotation_tried = True
         sorl.thumbnail.delete(self.queued_image.image.name, delete_file=False)
         self.queued_image.save()
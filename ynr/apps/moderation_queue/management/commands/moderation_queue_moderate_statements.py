@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from moderation_queue.statement_moderation import (
+    BATCH_SIZE,
+    moderate_queued_statements,
+)
+
+
+class Command(BaseCommand):
+    help = """
+    Check the edited statements to voters that are waiting for automated
+    moderation, including any that are due to be tried again
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="How many statements to send to the backend at once",
+        )
+
+    def handle(self, **options):
+        moderated = moderate_queued_statements(
+            batch_size=int(options["batch_size"])
+        )
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Moderated {moderated} statements")
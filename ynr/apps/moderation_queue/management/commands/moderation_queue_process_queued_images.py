@@ -1,68 +1,253 @@
 import json
+import multiprocessing
+import os
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from datetime import timedelta
+from io import BytesIO
 
-import boto3
 import sorl
+from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from moderation_queue.face_detection import get_face_detection_backend
 from moderation_queue.helpers import convert_image_to_png
 from moderation_queue.models import QueuedImage
+from people.image_hashes import dhash, set_perceptual_hash
 from PIL import Image, ImageOps
 
-try:
-    from storages.backends.s3 import S3Storage
-except ImportError:
-    S3Storage = None
-
 # These magic values are because the AWS API crops faces quite tightly by
 # default, meaning we literally just get the face. These values are about
 # right or, they are more right than the default crop.
 MIN_SCALING_FACTOR = 0.7
 MAX_SCALING_FACTOR = 1.3
 
+# How long a claimed image is left alone by other runs of this command
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def convert_image(image_bytes):
+    """
+    Decode an image, rotate it according to its EXIF data and convert it to
+    PNG. This is CPU bound, so it's run in a separate process.
+
+    Returns the PNG, its size and its perceptual hash.
+    """
+    pil_img = Image.open(BytesIO(image_bytes))
+    pil_img = ImageOps.exif_transpose(pil_img)
+    png = convert_image_to_png(pil_img).getvalue()
+    with Image.open(BytesIO(png)) as converted:
+        return png, converted.size, dhash(converted)
+
+
+class ImageNotReadable(Exception):
+    pass
+
 
 class Command(BaseCommand):
-    def handle(self, **options):
-        rekognition = boto3.client("rekognition", region_name="eu-west-1")
-        attributes = ["ALL"]
+    help = """
+    Convert newly queued images to PNG and find the face in them, so they
+    can be cropped when they're reviewed.
 
-        qs = QueuedImage.objects.filter(decision="undecided").exclude(
-            face_detection_tried=True
+    Images are claimed in batches by moving their `processing_claimed_until`
+    on, so more than one copy of this command can run at once. No
+    transaction is open while the images are processed. In each batch the
+    images are decoded and converted in a process pool, while storage and
+    face detection run in a thread pool. The results are saved in a short
+    transaction for each image.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="How many images to claim at once",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="How many processes to convert images in. Use 0 to convert "
+            "them in this process",
         )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="How many images to read, save and detect faces in at once",
+        )
+
+    def handle(self, **options):
+        self.verbosity = int(options["verbosity"])
+        batch_size = int(options["batch_size"])
+        processes = int(options["processes"])
+        self.face_detection = get_face_detection_backend()
+
+        self.process_pool = None
+        if processes:
+            # Forked, so that the workers don't have to set Django up again.
+            # They only use PIL, never the database.
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("fork"),
+            )
+            # Workers are forked when the first job is submitted. Do that
+            # now, before the thread pool is started, as forking while other
+            # threads might be holding locks can leave the workers deadlocked
+            self.process_pool.submit(int).result()
+        # Images that couldn't be read are left to be tried again next time,
+        # but only once in each run
+        self.seen = set()
+        try:
+            with ThreadPoolExecutor(
+                max_workers=int(options["threads"])
+            ) as thread_pool:
+                while True:
+                    batch = self.claim_batch(batch_size)
+                    if not batch:
+                        break
+                    self.process_batch(batch, thread_pool)
+        finally:
+            if self.process_pool:
+                self.process_pool.shutdown()
+
+    def claim_batch(self, batch_size):
+        """
+        Claim a batch of images, by moving their `processing_claimed_until`
+        on by `CLAIM_TIMEOUT`. The row locks are only held while claiming,
+        not while the images are processed.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                QueuedImage.objects.select_for_update(skip_locked=True)
+                .filter(decision=QueuedImage.UNDECIDED)
+                .filter(
+                    Q(processing_claimed_until=None)
+                    | Q(processing_claimed_until__lte=now)
+                )
+                .exclude(face_detection_tried=True)
+                .exclude(pk__in=self.seen)
+                .order_by("pk")[:batch_size]
+            )
+            QueuedImage.objects.filter(pk__in=[qi.pk for qi in batch]).update(
+                processing_claimed_until=now + CLAIM_TIMEOUT
+            )
+        for qi in batch:
+            qi.processing_claimed_until = now + CLAIM_TIMEOUT
+        self.seen.update(qi.pk for qi in batch)
+        return batch
+
+    def release(self, qi):
+        QueuedImage.objects.filter(
+            pk=qi.pk, processing_claimed_until=qi.processing_claimed_until
+        ).update(processing_claimed_until=None)
 
-        for qi in qs:
+    def process_batch(self, batch, thread_pool):
+        """
+        Run each image through the pipeline in the thread pool, and save the
+        results to the database from this thread as they finish
+        """
+        futures = {
+            thread_pool.submit(
+                self.process_image,
+                qi.image.storage,
+                qi.image.name,
+                # Worked out here, as `upload_to` needs the model instance
+                qi.image.field.generate_filename(qi, qi.image.name),
+            ): qi
+            for qi in batch
+        }
+        for future in as_completed(futures):
+            qi = futures[future]
             try:
-                pil_img = Image.open(qi.image.file)
-                pil_img = ImageOps.exif_transpose(pil_img)
-            except Exception as e:
+                saved_name, size, perceptual_hash, detected = future.result()
+            except ImageNotReadable as e:
                 msg = "Skipping QueuedImage{id}: {error}"
-                self.stdout.write(msg.format(id=qi.id, error=e))
+                self.stdout.write(msg.format(id=qi.id, error=e.__cause__))
+                self.release(qi)
                 continue
 
-            png_buffer = convert_image_to_png(pil_img)
-            qi.image.save(qi.image.name, png_buffer)
-            sorl.thumbnail.delete(qi.image.name, delete_file=False)
-
+            if isinstance(detected, Exception):
+                msg = "Skipping QueuedImage{id}: {error}"
+                self.stderr.write(msg.format(id=qi.id, error=detected))
+            old_name = qi.image.name
             try:
-                storage = qi.image.storage
-                if S3Storage and isinstance(storage, S3Storage):
-                    rekognition_image = {
-                        "S3Object": {
-                            "Bucket": storage.bucket_name,
-                            "Name": storage._normalize_name(qi.image.name),
-                        }
-                    }
-                else:
-                    rekognition_image = {"Bytes": png_buffer.getvalue()}
-                detected = rekognition.detect_faces(
-                    Image=rekognition_image, Attributes=attributes
+                saved = self.save_result(
+                    qi, saved_name, size, perceptual_hash, detected
                 )
-                self.set_x_y_from_response(qi, detected, options["verbosity"])
-            except Exception as e:
-                msg = "Skipping QueuedImage{id}: {error}"
-                self.stderr.write(msg.format(id=qi.id, error=e))
+            except Exception:
+                qi.image.storage.delete(saved_name)
+                raise
+            if saved:
+                sorl.thumbnail.delete(old_name, delete_file=False)
+            else:
+                # The image was decided on, or claimed by another run,
+                # while it was being processed
+                qi.image.storage.delete(saved_name)
 
-            qi.face_detection_tried = True
-            qi.rotation_tried = True
-            qi.save()
+    def save_result(self, qi, saved_name, size, perceptual_hash, detected):
+        """
+        Save the processed image to its QueuedImage in a short transaction,
+        if it's still claimed and undecided. Returns whether it was saved.
+        """
+        with transaction.atomic():
+            locked = (
+                QueuedImage.objects.select_for_update()
+                .filter(
+                    pk=qi.pk,
+                    decision=QueuedImage.UNDECIDED,
+                    processing_claimed_until=qi.processing_claimed_until,
+                )
+                .first()
+            )
+            if not locked:
+                return False
+            locked.image.name = saved_name
+            set_perceptual_hash(locked, perceptual_hash)
+            if not isinstance(detected, Exception):
+                self.set_x_y_from_response(
+                    locked, detected, self.verbosity, size
+                )
+            locked.face_detection_tried = True
+            locked.rotation_tried = True
+            locked.processing_claimed_until = None
+            locked.save()
+        return True
+
+    def convert(self, image_bytes):
+        if self.process_pool:
+            return self.process_pool.submit(convert_image, image_bytes).result()
+        return convert_image(image_bytes)
+
+    def process_image(self, storage, name, new_name):
+        """
+        Read and convert an image, save it as `new_name`, then find the face
+        in it. This only uses storage and the face detection backend, so
+        that it can run in a thread. Face detection errors are returned
+        rather than raised, as the image has been converted anyway.
+        """
+        try:
+            with storage.open(name) as f:
+                image_bytes = f.read()
+            png, size, perceptual_hash = self.convert(image_bytes)
+        except Exception as e:
+            raise ImageNotReadable() from e
+
+        saved_name = storage.save(new_name, ContentFile(png))
+        try:
+            detected = self.face_detection.detect_faces(
+                saved_name, storage, png
+            )
+        except Exception as e:
+            return saved_name, size, perceptual_hash, e
+        return saved_name, size, perceptual_hash, detected
 
     def get_bound(self, bound, im_size, scaling_factor):
         """
@@ -73,10 +258,13 @@ class Command(BaseCommand):
         bound = bound * im_size * scaling_factor
         return max(0, bound)
 
-    def set_x_y_from_response(self, qi, detected, verbosity=0):
+    def set_x_y_from_response(self, qi, detected, verbosity=0, size=None):
         if detected and detected["FaceDetails"]:
-            im_width = qi.image.width
-            im_height = qi.image.height
+            if size:
+                im_width, im_height = size
+            else:
+                im_width = qi.image.width
+                im_height = qi.image.height
             bounding_box = detected["FaceDetails"][0]["BoundingBox"]
             qi.crop_min_x = self.get_bound(
                 bound=bounding_box["Left"],
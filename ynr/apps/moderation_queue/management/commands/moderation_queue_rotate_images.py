@@ -4,6 +4,7 @@ from io import BytesIO
 import sorl
 from django.core.management.base import BaseCommand, CommandError
 from moderation_queue.models import QueuedImage
+from people.image_hashes import hash_image_bytes, set_perceptual_hash
 from PIL import Image
 
 # These magic values are because the AWS API crops faces quite tightly by
@@ -53,6 +54,7 @@ class Command(BaseCommand):
         buffer = BytesIO()
         rotated.save(buffer, "PNG")
         queued_image.image.save(queued_image.image.name, buffer)
+        set_perceptual_hash(queued_image, hash_image_bytes(buffer.getvalue()))
         queued_image.rotation_tried = True
         sorl.thumbnail.delete(queued_image.image.name, delete_file=False)
         return queued_image
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.16 on 2026-10-18 18:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("candidates", "0096_backfill_ballot_timetable_fields"),
+        ("moderation_queue", "0033_queuedimage_rotation_tried"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueuedStatementModeration",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("statement", models.TextField()),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "logged_action",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="queued_statement_moderation",
+                        to="candidates.loggedaction",
+                    ),
+                ),
+            ],
+        ),
+    ]
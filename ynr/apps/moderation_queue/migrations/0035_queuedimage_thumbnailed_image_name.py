@@ -0,0 +1,21 @@
+# Generated by Django 5.2.16 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("moderation_queue", "0034_queuedstatementmoderation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="queuedimage",
+            name="thumbnailed_image_name",
+            field=models.CharField(
+                blank=True,
+                help_text="The image that the thumbnails in storage were made from",
+                max_length=512,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.16 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("moderation_queue", "0036_queuedimage_perceptual_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="queuedimage",
+            name="processing_claimed_until",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When moderation_queue_process_queued_images is processing this image, other runs leave it alone until then",
+                null=True,
+            ),
+        ),
+    ]
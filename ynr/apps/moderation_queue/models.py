@@ -5,8 +5,11 @@ from os.path import join, splitext
 from tempfile import NamedTemporaryFile
 
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from PIL import Image as PillowImage
 
 PHOTO_REVIEWERS_GROUP_NAME = "Photo Reviewers"
@@ -93,10 +96,38 @@ class QueuedImage(models.Model):
 
     face_detection_tried = models.BooleanField(default=False)
     rotation_tried = models.BooleanField(default=False)
+    processing_claimed_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When moderation_queue_process_queued_images is processing "
+        "this image, other runs leave it alone until then",
+    )
+
+    thumbnailed_image_name = models.CharField(
+        max_length=512,
+        blank=True,
+        help_text="The image that the thumbnails in storage were made from",
+    )
+    # See people.image_hashes
+    perceptual_hash = models.BigIntegerField(null=True, blank=True)
+    perceptual_hash_bands = ArrayField(
+        models.SmallIntegerField(), null=True, blank=True
+    )
 
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    # See people.thumbnails
+    thumbnail_sizes = ["x100"]
+
+    class Meta:
+        indexes = (
+            GinIndex(
+                fields=["perceptual_hash_bands"],
+                name="queuedimage_hash_bands",
+            ),
+        )
+
     def __str__(self):
         message = "Image uploaded by {user} of candidate {person_id}"
         return message.format(
@@ -165,3 +196,24 @@ class SuggestedPostLock(models.Model):
         if not self.pk:
             self.ballot_hash = self.ballot.hashed_memberships
         return super().save(*args, **kwargs)
+
+
+class QueuedStatementModeration(models.Model):
+    """
+    An edited statement to voters that's waiting to be checked by the
+    statement moderation backend. The result is written back to the
+    LoggedAction of the edit.
+    """
+
+    logged_action = models.OneToOneField(
+        "candidates.LoggedAction",
+        on_delete=models.CASCADE,
+        related_name="queued_statement_moderation",
+    )
+    statement = models.TextField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Statement moderation for {self.logged_action_id}"
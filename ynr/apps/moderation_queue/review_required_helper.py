@@ -3,16 +3,171 @@ from collections import namedtuple
 from datetime import datetime, timedelta
 from enum import Enum, unique
 
-import openai
-import sentry_sdk
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.functional import cached_property
 
 # How many previously approved edits of a type are ok before we stop flagging?
 from moderation_queue.models import VERY_TRUSTED_USER_GROUP_NAME
+from moderation_queue.statement_moderation import get_moderation_backend
+from popolo.models import VersionNotFound
 
 PREVIOUSLY_APPROVED_COUNT = 20
 
 
+def user_facts_cache_key(user_id):
+    return f"user_{user_id}_review_facts"
+
+
+def clear_user_review_facts(user_id):
+    """
+    Call this when something that `ReviewDecisionContext.user_facts` is
+    made from changes for a user, other than them making a new edit
+    """
+    cache.delete(user_facts_cache_key(user_id))
+
+
+def count_new_edit_in_user_review_facts(user_id):
+    """
+    Add a new edit to the cached edit count for a user, if there is one,
+    rather than counting them all again for their next edit
+    """
+    key = user_facts_cache_key(user_id)
+    user_facts = cache.get(key)
+    if user_facts and "edit_count" in user_facts:
+        user_facts["edit_count"] += 1
+        cache.set(
+            key, user_facts, settings.NEEDS_REVIEW_USER_FACTS_CACHE_SECONDS
+        )
+
+
+class ReviewDecisionContext:
+    """
+    The facts about a LoggedAction that the deciders use, worked out when
+    they're first asked for and shared between all the deciders that are
+    run over it.
+
+    Facts about the user, like how many edits they've made, are kept in the
+    cache between requests, and cleared by `moderation_queue.signals` when
+    they change.
+    """
+
+    def __init__(self, logged_action):
+        """
+        :type logged_action: candidates.models.LoggedAction
+        """
+        self.logged_action = logged_action
+
+    @cached_property
+    def user_facts(self):
+        if not self.logged_action.user_id:
+            return {}
+        return cache.get(user_facts_cache_key(self.logged_action.user_id)) or {}
+
+    def user_fact(self, name, get_value):
+        if name not in self.user_facts:
+            self.user_facts[name] = get_value()
+            cache.set(
+                user_facts_cache_key(self.logged_action.user_id),
+                self.user_facts,
+                settings.NEEDS_REVIEW_USER_FACTS_CACHE_SECONDS,
+            )
+        return self.user_facts[name]
+
+    @property
+    def user_edit_count(self):
+        return self.user_fact(
+            "edit_count", self.logged_action.user.loggedaction_set.count
+        )
+
+    @property
+    def user_is_very_trusted(self):
+        return self.user_fact(
+            "very_trusted",
+            self.logged_action.user.groups.filter(
+                name=VERY_TRUSTED_USER_GROUP_NAME
+            ).exists,
+        )
+
+    def user_approved_count(self, flagged_type):
+        approved_counts = self.user_fact(
+            "approved_counts", self.get_user_approved_counts
+        )
+        return approved_counts.get(flagged_type, 0)
+
+    def get_user_approved_counts(self):
+        return dict(
+            self.logged_action.__class__.objects.filter(
+                user=self.logged_action.user
+            )
+            .exclude(approved=None)
+            .values_list("flagged_type")
+            .annotate(count=Count("pk"))
+            .order_by()
+        )
+
+    @cached_property
+    def version_diff(self):
+        """
+        The operations in the diff of the person's new version against its
+        first parent
+        """
+        la = self.logged_action
+        if not la.person:
+            return []
+        cached_diffs = (
+            la.person.person_versions.filter(
+                version_id=la.popit_person_new_version
+            )
+            .values_list("diffs", flat=True)
+            .first()
+        )
+        if cached_diffs:
+            return cached_diffs[0]["parent_diff"]
+        try:
+            version_diff = la.person.version_dict(la.popit_person_new_version)
+        except VersionNotFound:
+            return []
+        return version_diff["diffs"][0]["parent_diff"]
+
+    @cached_property
+    def statement(self):
+        """
+        The new statement to voters, if the edit changed it
+        """
+        statement = None
+        for op in self.version_diff:
+            if op["path"] == "biography":
+                statement = op.get("value")
+        return statement
+
+    @cached_property
+    def name_replaced(self):
+        return any(
+            op["path"] == "name" and op["op"] == "replace"
+            for op in self.version_diff
+        )
+
+    @cached_property
+    def standing_in_locked_current_ballot(self):
+        return self.logged_action.person.memberships.filter(
+            ballot__election__current=True, ballot__candidates_locked=True
+        ).exists()
+
+    @cached_property
+    def recent_revert_count(self):
+        from candidates.models import LoggedAction
+        from candidates.models.db import ActionType
+
+        return LoggedAction.objects.filter(
+            person=self.logged_action.person,
+            action_type=ActionType.PERSON_REVERT,
+            # updated in the last 24 hours
+            updated__gt=datetime.now() - timedelta(settings.LAST_24_HOURS),
+        ).count()
+
+
 class BaseReviewRequiredDecider(metaclass=abc.ABCMeta):
     """
     A base class that decides if a given LoggedAction needs to be flagged
@@ -25,11 +180,13 @@ class BaseReviewRequiredDecider(metaclass=abc.ABCMeta):
         NEEDS_REVIEW = 1
         NO_REVIEW_NEEDED = 2
 
-    def __init__(self, logged_action):
+    def __init__(self, logged_action, context=None):
         """
         :type logged_action: candidates.models.LoggedAction
+        :type context: ReviewDecisionContext
         """
         self.logged_action = logged_action
+        self.context = context or ReviewDecisionContext(logged_action)
 
     @abc.abstractmethod
     def review_description_text(self):
@@ -62,10 +219,11 @@ class FirstByUserEditsDecider(BaseReviewRequiredDecider):
         )
 
     def needs_review(self):
-        if self.logged_action.user:
-            user_edits = self.logged_action.user.loggedaction_set.count()
-            if user_edits < settings.NEEDS_REVIEW_FIRST_EDITS:
-                return self.Status.NEEDS_REVIEW
+        if (
+            self.logged_action.user
+            and self.context.user_edit_count < settings.NEEDS_REVIEW_FIRST_EDITS
+        ):
+            return self.Status.NEEDS_REVIEW
         return self.Status.UNDECIDED
 
 
@@ -112,14 +270,10 @@ class CandidateStatementEditDecider(BaseReviewRequiredDecider):
 
     def needs_review(self):
         if self.logged_action.person:
-            la = self.logged_action
-            for version_diff in la.person.version_diffs:
-                if version_diff["version_id"] == la.popit_person_new_version:
-                    this_diff = version_diff["diffs"][0]["parent_diff"]
-                    for op in this_diff:
-                        if op["path"] == "biography":
-                            # this is an edit to a biography / statement
-                            return self.Status.NEEDS_REVIEW
+            for op in self.context.version_diff:
+                if op["path"] == "biography":
+                    # this is an edit to a biography / statement
+                    return self.Status.NEEDS_REVIEW
         return self.Status.UNDECIDED
 
 
@@ -137,12 +291,10 @@ class PreviouslyApprovedEditsOfTypeDecider(BaseReviewRequiredDecider):
         if not self.logged_action.user:
             return self.Status.UNDECIDED
 
-        previous_approved_of_type = self.logged_action.__class__.objects.filter(
-            user=self.logged_action.user,
-            flagged_type=self.logged_action.flagged_type,
-        ).exclude(approved=None)
-
-        if previous_approved_of_type.count() >= PREVIOUSLY_APPROVED_COUNT:
+        previous_approved_of_type = self.context.user_approved_count(
+            self.logged_action.flagged_type
+        )
+        if previous_approved_of_type >= PREVIOUSLY_APPROVED_COUNT:
             return self.Status.NO_REVIEW_NEEDED
 
         return self.Status.UNDECIDED
@@ -182,10 +334,7 @@ class EditMadeByTrustedUserDecider(BaseReviewRequiredDecider):
         if not self.logged_action.user:
             return self.Status.UNDECIDED
 
-        trusted_permissions = [VERY_TRUSTED_USER_GROUP_NAME]
-
-        qs = self.logged_action.user.groups.filter(name__in=trusted_permissions)
-        if qs.exists():
+        if self.context.user_is_very_trusted:
             return self.Status.NO_REVIEW_NEEDED
         return self.Status.UNDECIDED
 
@@ -200,22 +349,13 @@ class CandidateCurrentNameDecider(BaseReviewRequiredDecider):
 
     def needs_review(self):
         if self.logged_action.user and self.logged_action.person:
-            la = self.logged_action
-            qs = la.person.memberships.filter(
-                ballot__election__current=True, ballot__candidates_locked=True
-            )
-            if qs.exists():
-                # This person is standing in a current election
-                for version_diff in la.person.version_diffs:
-                    if (
-                        version_diff["version_id"]
-                        == la.popit_person_new_version
-                    ):
-                        this_diff = version_diff["diffs"][0]["parent_diff"]
-                        for op in this_diff:
-                            if op["path"] == "name" and op["op"] == "replace":
-                                # this is an edit to a name
-                                return self.Status.NEEDS_REVIEW
+            # Is this an edit to the name of someone standing in a current
+            # election?
+            if (
+                self.context.name_replaced
+                and self.context.standing_in_locked_current_ballot
+            ):
+                return self.Status.NEEDS_REVIEW
             return self.Status.UNDECIDED
         return None
 
@@ -225,17 +365,13 @@ class RevertedEdits(BaseReviewRequiredDecider):
         return "Too many reverted edits in 24 hours"
 
     def needs_review(self):
-        from candidates.models import LoggedAction
         from candidates.models.db import ActionType
 
         if self.logged_action.action_type == ActionType.PERSON_REVERT:
-            recent_revert_qs = LoggedAction.objects.filter(
-                person=self.logged_action.person,
-                action_type=ActionType.PERSON_REVERT,
-                # updated in the last 24 hours
-                updated__gt=datetime.now() - timedelta(settings.LAST_24_HOURS),
-            ).order_by("updated")
-            if recent_revert_qs.count() >= settings.NEEDS_REVIEW_MAX_REVERTS:
+            if (
+                self.context.recent_revert_count
+                >= settings.NEEDS_REVIEW_MAX_REVERTS
+            ):
                 return self.Status.NEEDS_REVIEW
             return self.Status.UNDECIDED
         return None
@@ -253,11 +389,14 @@ class EditTypesThatNeverNeedReview(BaseReviewRequiredDecider):
 
 
 class OpenAIModerationReview(BaseReviewRequiredDecider):
+    """
+    Queues edited statements to be checked by the statement moderation
+    backend once the edit has been saved. The edit is flagged later if the
+    statement is, see `moderation_queue.statement_moderation`.
+    """
+
     def review_description_text(self):
-        reasons = ", ".join(
-            [cat for cat, flagged in self.moderation.categories if flagged]
-        )
-        return f"Automated moderation detected: {reasons}"
+        return "Automated moderation of statement"
 
     def needs_review(self):
         if not self.logged_action.person:
@@ -270,35 +409,13 @@ class OpenAIModerationReview(BaseReviewRequiredDecider):
         ]:
             return self.Status.UNDECIDED
 
-        statement = None
-        la = self.logged_action
-        for version_diff in la.person.version_diffs:
-            if version_diff["version_id"] == la.popit_person_new_version:
-                this_diff = version_diff["diffs"][0]["parent_diff"]
-                for op in this_diff:
-                    if op["path"] == "biography":
-                        # this is an edit to a biography / statement
-                        statement = op["value"]
+        statement = self.context.statement
         if not statement:
             return self.Status.UNDECIDED
-
-        api_key = getattr(settings, "OPEN_AI_API_KEY", None)
-        if not api_key:
+        if not get_moderation_backend():
             return self.Status.UNDECIDED
-        try:
-            client = openai.OpenAI(api_key=api_key)
-            response = client.moderations.create(
-                input=statement, model="omni-moderation-latest"
-            )
-        except openai.APIStatusError:
-            sentry_sdk.capture_exception()
-            return self.Status.UNDECIDED
-        if not response.results:
-            return self.Status.UNDECIDED
-        self.moderation = response.results[0]
-        if self.moderation.flagged:
-            return self.Status.NEEDS_REVIEW
-
+        # Picked up by `LoggedAction.save`
+        self.logged_action.statement_to_moderate = statement
         return self.Status.UNDECIDED
 
 
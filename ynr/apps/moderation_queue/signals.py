@@ -0,0 +1,60 @@
+from candidates.models import LoggedAction
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from moderation_queue.models import QueuedImage
+from moderation_queue.review_required_helper import (
+    clear_user_review_facts,
+    count_new_edit_in_user_review_facts,
+)
+from people.thumbnails import delete_thumbnails, queue_thumbnails
+
+
+@receiver(post_save, sender=LoggedAction)
+def update_user_review_facts(sender, instance, created, **kwargs):
+    """
+    Keep the cached facts used to decide if a user's edits need review up
+    to date. New edits just add to the edit count, anything else might have
+    changed the approved edit counts so they're all cleared.
+    """
+    if not instance.user_id:
+        return
+    if created and instance.approved is None:
+        count_new_edit_in_user_review_facts(instance.user_id)
+    else:
+        clear_user_review_facts(instance.user_id)
+
+
+@receiver(post_delete, sender=LoggedAction)
+def clear_user_review_facts_on_delete(sender, instance, **kwargs):
+    if instance.user_id:
+        clear_user_review_facts(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def clear_user_review_facts_on_group_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Whether a user is very trusted depends on their groups
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        clear_user_review_facts(instance.pk)
+        return
+    # The users of a group were changed
+    if action == "pre_clear":
+        pk_set = instance.user_set.values_list("pk", flat=True)
+    for user_id in pk_set:
+        clear_user_review_facts(user_id)
+
+
+@receiver(post_save, sender=QueuedImage)
+def make_queued_image_thumbnails(sender, instance, **kwargs):
+    queue_thumbnails(instance)
+
+
+@receiver(post_delete, sender=QueuedImage)
+def delete_queued_image_thumbnails(sender, instance, **kwargs):
+    delete_thumbnails(instance)
@@ -250,14 +250,22 @@ class FlaggedEditSlackReplyer:
 
     def mark_as_approved(self, pk):
         from candidates.models import LoggedAction
+        from moderation_queue.review_required_helper import (
+            clear_user_review_facts,
+        )
 
-        LoggedAction.objects.filter(pk=pk).update(
+        logged_actions = LoggedAction.objects.filter(pk=pk)
+        logged_actions.update(
             approved={
                 "via": "slack",
                 "username": self.username,
                 "datetime": datetime.datetime.now().isoformat(),
             }
         )
+        # The update doesn't send any signals
+        for user_id in logged_actions.values_list("user_id", flat=True):
+            if user_id:
+                clear_user_review_facts(user_id)
 
     def reply(self):
         self.mark_as_approved(self.action["value"])
@@ -0,0 +1,348 @@
+"""
+Automated moderation of edited statements to voters.
+
+Checking a statement means calling an external API, so it isn't done while
+the edit is being saved. `OpenAIModerationReview` queues the statement
+instead, and `moderate_queued_statements` checks queued statements in
+batches from a django-q task, flagging the LoggedAction of any edit whose
+statement is flagged.
+
+If the backend can't be reached, the statements are tried again later with
+an exponential backoff, until they've been tried `MAX_ATTEMPTS` times. After
+that the edit is flagged for a person to review instead.
+"""
+
+import abc
+from collections import namedtuple
+from datetime import timedelta
+from typing import List
+
+import openai
+import sentry_sdk
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_q.tasks import async_task
+from moderation_queue.models import QueuedStatementModeration
+
+# How many statements are sent to the backend at once
+BATCH_SIZE = 32
+MAX_ATTEMPTS = 5
+# The wait before the first retry, doubled for each one after that
+RETRY_DELAY = timedelta(minutes=1)
+# How long claimed statements are left alone by other workers
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+MODERATION_FLAGGED_TYPE = "automated_statement_moderation"
+UNCHECKED_REASON = (
+    "Automated moderation couldn't check this statement, so it needs a person "
+    "to check it"
+)
+
+ModerationResult = namedtuple("ModerationResult", ["flagged", "categories"])
+
+
+class ModerationUnavailable(Exception):
+    """
+    The backend couldn't be reached, or is rate limiting us, so the
+    statements should be tried again later
+    """
+
+
+class ModerationFailed(Exception):
+    """
+    The backend rejected the statements, so there's no point trying again
+    """
+
+
+class BaseModerationBackend(metaclass=abc.ABCMeta):
+    @property
+    def enabled(self):
+        return True
+
+    @abc.abstractmethod
+    def moderate(self, statements: List[str]) -> List[ModerationResult]:
+        """
+        Return a `ModerationResult` for each of the statements, in the same
+        order
+        """
+
+
+class OpenAIModerationBackend(BaseModerationBackend):
+    model = "omni-moderation-latest"
+
+    def __init__(self):
+        self.api_key = getattr(settings, "OPEN_AI_API_KEY", None)
+
+    @property
+    def enabled(self):
+        return bool(self.api_key)
+
+    def moderate(self, statements):
+        client = openai.OpenAI(api_key=self.api_key, max_retries=0)
+        try:
+            response = client.moderations.create(
+                input=statements, model=self.model
+            )
+        except (
+            openai.APIConnectionError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+        ) as e:
+            raise ModerationUnavailable(str(e))
+        except openai.APIStatusError as e:
+            raise ModerationFailed(str(e))
+        if len(response.results) != len(statements):
+            raise ModerationFailed(
+                "Got {} results for {} statements".format(
+                    len(response.results), len(statements)
+                )
+            )
+        return [
+            ModerationResult(
+                flagged=result.flagged,
+                categories=[
+                    category
+                    for category, flagged in result.categories
+                    if flagged
+                ],
+            )
+            for result in response.results
+        ]
+
+
+class FakeModerationBackend(BaseModerationBackend):
+    """
+    Flags statements that contain any of the words for a category, for
+    testing and local development without the OpenAI API
+    """
+
+    flagged_words = {
+        "harassment": ["harass"],
+        "violence": ["violent"],
+    }
+
+    def moderate(self, statements):
+        results = []
+        for statement in statements:
+            statement = statement.lower()
+            categories = [
+                category
+                for category, words in self.flagged_words.items()
+                if any(word in statement for word in words)
+            ]
+            results.append(
+                ModerationResult(
+                    flagged=bool(categories), categories=categories
+                )
+            )
+        return results
+
+
+def get_moderation_backend():
+    """
+    Return the backend set by `STATEMENT_MODERATION_BACKEND`, or None if it
+    isn't set up, e.g. because there's no API key
+    """
+    backend = import_string(settings.STATEMENT_MODERATION_BACKEND)()
+    if not backend.enabled:
+        return None
+    return backend
+
+
+def moderation_reason(categories):
+    return "Automated moderation detected: {}".format(", ".join(categories))
+
+
+def queue_statement_moderation(logged_action, statement):
+    QueuedStatementModeration.objects.update_or_create(
+        logged_action=logged_action,
+        defaults={
+            "statement": statement,
+            "attempts": 0,
+            "next_attempt": timezone.now(),
+        },
+    )
+    transaction.on_commit(
+        lambda: async_task(
+            "moderation_queue.statement_moderation.moderate_queued_statements"
+        )
+    )
+
+
+def flag_for_review(logged_action, reason):
+    """
+    Flag the edit for review and tell Slack about it
+    """
+    from candidates.models import LoggedAction
+    from candidates.models.db import EditType
+    from moderation_queue.slack import post_action_to_slack
+
+    logged_action.flagged_type = MODERATION_FLAGGED_TYPE
+    logged_action.flagged_reason = reason
+    # Saving would run the review deciders again
+    LoggedAction.objects.filter(pk=logged_action.pk).update(
+        flagged_type=logged_action.flagged_type,
+        flagged_reason=logged_action.flagged_reason,
+    )
+    if (
+        logged_action.person_id
+        and logged_action.edit_type == EditType.USER.name
+    ):
+        transaction.on_commit(
+            lambda pk=logged_action.pk: post_action_to_slack(pk)
+        )
+
+
+def apply_moderation_result(logged_action, result):
+    """
+    Flag the edit if its statement was flagged, unless the user has had
+    enough edits flagged like this approved before.
+
+    Edits that were already flagged when they were saved keep their flag,
+    as they're already waiting for review and have been sent to Slack.
+    """
+    from moderation_queue.review_required_helper import (
+        PreviouslyApprovedEditsOfTypeDecider,
+    )
+
+    if not result.flagged or logged_action.flagged_type:
+        return
+    reason = moderation_reason(result.categories)
+    logged_action.flagged_type = MODERATION_FLAGGED_TYPE
+    logged_action.flagged_reason = reason
+    decider = PreviouslyApprovedEditsOfTypeDecider(logged_action)
+    if decider.needs_review() == decider.Status.NO_REVIEW_NEEDED:
+        logged_action.flagged_type = ""
+        logged_action.flagged_reason = ""
+        return
+    flag_for_review(logged_action, reason)
+
+
+def retry_later(queued):
+    """
+    Schedule the next attempt at checking each of the statements. Edits
+    whose statements have run out of attempts are flagged so that a person
+    checks them instead.
+    """
+    now = timezone.now()
+    to_update = []
+    for queued_moderation in queued:
+        queued_moderation.attempts += 1
+        if queued_moderation.attempts >= MAX_ATTEMPTS:
+            logged_action = queued_moderation.logged_action
+            sentry_sdk.capture_message(
+                "Gave up moderating the statement for LoggedAction {}".format(
+                    logged_action.pk
+                )
+            )
+            if not logged_action.flagged_type:
+                flag_for_review(logged_action, UNCHECKED_REASON)
+            queued_moderation.delete()
+            continue
+        queued_moderation.next_attempt = now + RETRY_DELAY * 2 ** (
+            queued_moderation.attempts - 1
+        )
+        to_update.append(queued_moderation)
+    QueuedStatementModeration.objects.bulk_update(
+        to_update, ["attempts", "next_attempt"]
+    )
+
+
+def claim_queued_statements(batch_size):
+    """
+    Claim the statements that are due, by moving their `next_attempt` on by
+    `CLAIM_TIMEOUT`. The row locks are only held while claiming, not while
+    the backend is checking the statements.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queued = list(
+            QueuedStatementModeration.objects.select_for_update(
+                skip_locked=True, of=("self",)
+            )
+            .filter(next_attempt__lte=now)
+            .order_by("next_attempt")[:batch_size]
+        )
+        QueuedStatementModeration.objects.filter(
+            pk__in=[queued_moderation.pk for queued_moderation in queued]
+        ).update(next_attempt=now + CLAIM_TIMEOUT)
+    for queued_moderation in queued:
+        queued_moderation.next_attempt = now + CLAIM_TIMEOUT
+    return queued
+
+
+def lock_claimed_statements(queued):
+    """
+    Lock the claimed statements again so their results can be written.
+    Statements that have been queued again since they were claimed, because
+    the edit was changed, are left to be checked again.
+    """
+    claimed_until = {
+        queued_moderation.pk: queued_moderation.next_attempt
+        for queued_moderation in queued
+    }
+    locked = (
+        QueuedStatementModeration.objects.select_for_update(of=("self",))
+        .filter(pk__in=claimed_until)
+        .select_related("logged_action")
+        .order_by("pk")
+    )
+    return [
+        queued_moderation
+        for queued_moderation in locked
+        if queued_moderation.next_attempt == claimed_until[queued_moderation.pk]
+    ]
+
+
+def moderate_queued_statements(batch_size=BATCH_SIZE):
+    """
+    Check the queued statements that are due, a batch at a time.
+
+    Each batch is claimed in a short transaction, checked outside of any
+    transaction and then written in another short one, so that this can be
+    run by more than one worker at once. If a worker dies while checking a
+    batch, it's checked again once the claim runs out. Returns how many
+    statements were checked.
+    """
+    backend = get_moderation_backend()
+    if not backend:
+        return 0
+    moderated = 0
+    while True:
+        queued = claim_queued_statements(batch_size)
+        if not queued:
+            return moderated
+        try:
+            results = backend.moderate(
+                [queued_moderation.statement for queued_moderation in queued]
+            )
+        except ModerationUnavailable:
+            sentry_sdk.capture_exception()
+            with transaction.atomic():
+                retry_later(lock_claimed_statements(queued))
+            # Leave the rest of the queue until the backend is back
+            return moderated
+        except ModerationFailed:
+            sentry_sdk.capture_exception()
+            results = None
+        if results:
+            results = dict(
+                zip(
+                    [queued_moderation.pk for queued_moderation in queued],
+                    results,
+                )
+            )
+        with transaction.atomic():
+            queued = lock_claimed_statements(queued)
+            if results:
+                for queued_moderation in queued:
+                    apply_moderation_result(
+                        queued_moderation.logged_action,
+                        results[queued_moderation.pk],
+                    )
+                moderated += len(queued)
+            QueuedStatementModeration.objects.filter(
+                pk__in=[queued_moderation.pk for queued_moderation in queued]
+            ).delete()
@@ -0,0 +1,135 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from moderation_queue.face_detection import FakeFaceDetectionBackend
+from moderation_queue.management.commands.moderation_queue_process_queued_images import (
+    Command,
+)
+from moderation_queue.models import QueuedImage
+from moderation_queue.tests.paths import (
+    BROKEN_IMAGE_FILENAME,
+    EXAMPLE_IMAGE_FILENAME,
+)
+from people.tests.factories import PersonFactory
+from PIL import Image
+
+
+@override_settings(
+    FACE_DETECTION_BACKEND="moderation_queue.face_detection.FakeFaceDetectionBackend"
+)
+class TestProcessQueuedImages(TestCase):
+    def setUp(self):
+        self.person = PersonFactory(name="Jane Doe")
+
+    def queue_image(self, filename):
+        queued_image = QueuedImage(person=self.person)
+        with open(filename, "rb") as f:
+            queued_image.image.save("upload.jpg", ContentFile(f.read()))
+        return queued_image
+
+    def process(self, **options):
+        out = StringIO()
+        call_command(
+            "moderation_queue_process_queued_images",
+            stdout=out,
+            stderr=StringIO(),
+            **options,
+        )
+        return out.getvalue()
+
+    def assert_processed(self, queued_image):
+        queued_image.refresh_from_db()
+        self.assertTrue(queued_image.face_detection_tried)
+        self.assertTrue(queued_image.rotation_tried)
+        with Image.open(queued_image.image) as image:
+            self.assertEqual(image.format, "PNG")
+            width, height = image.size
+        self.assertEqual(queued_image.crop_min_x, int(0.25 * width * 0.7))
+        self.assertEqual(queued_image.crop_max_y, int(0.5 * height * 1.3))
+        self.assertEqual(
+            json.loads(queued_image.detection_metadata)["FaceDetails"][0][
+                "Pose"
+            ],
+            {"Roll": 0.0},
+        )
+
+    def test_process_in_batches(self):
+        queued_images = [
+            self.queue_image(EXAMPLE_IMAGE_FILENAME) for _ in range(3)
+        ]
+        self.process(batch_size=2, processes=0, threads=2)
+        for queued_image in queued_images:
+            self.assert_processed(queued_image)
+
+    def test_process_pool(self):
+        queued_image = self.queue_image(EXAMPLE_IMAGE_FILENAME)
+        self.process(processes=1)
+        self.assert_processed(queued_image)
+
+    def test_broken_image_skipped(self):
+        broken = self.queue_image(BROKEN_IMAGE_FILENAME)
+        queued_image = self.queue_image(EXAMPLE_IMAGE_FILENAME)
+        out = self.process(processes=0)
+        self.assertIn(f"Skipping QueuedImage{broken.pk}", out)
+        broken.refresh_from_db()
+        self.assertFalse(broken.face_detection_tried)
+        self.assert_processed(queued_image)
+
+    def test_already_tried_images_ignored(self):
+        queued_image = self.queue_image(EXAMPLE_IMAGE_FILENAME)
+        QueuedImage.objects.update(face_detection_tried=True)
+        self.process(processes=0)
+        queued_image.refresh_from_db()
+        self.assertEqual(queued_image.detection_metadata, "")
+
+    def test_claimed_images_ignored(self):
+        queued_image = self.queue_image(EXAMPLE_IMAGE_FILENAME)
+        QueuedImage.objects.update(
+            processing_claimed_until=timezone.now() + timedelta(minutes=1)
+        )
+        self.process(processes=0)
+        queued_image.refresh_from_db()
+        self.assertFalse(queued_image.face_detection_tried)
+
+    def test_processed_images_release_their_claim(self):
+        queued_image = self.queue_image(EXAMPLE_IMAGE_FILENAME)
+        self.process(processes=0)
+        self.assert_processed(queued_image)
+        self.assertIsNone(queued_image.processing_claimed_until)
+
+    def test_image_decided_while_processing_left_alone(self):
+        queued_image = self.queue_image(EXAMPLE_IMAGE_FILENAME)
+        original_name = queued_image.image.name
+        claim_batch = Command.claim_batch
+        saved_names = []
+
+        def claim_and_decide(command, batch_size):
+            batch = claim_batch(command, batch_size)
+            QueuedImage.objects.update(decision=QueuedImage.APPROVED)
+            return batch
+
+        def detect_faces(backend, image_name, storage, png_bytes):
+            saved_names.append(image_name)
+            return {"FaceDetails": []}
+
+        with patch.object(
+            Command, "claim_batch", autospec=True, side_effect=claim_and_decide
+        ), patch.object(
+            FakeFaceDetectionBackend,
+            "detect_faces",
+            autospec=True,
+            side_effect=detect_faces,
+        ):
+            self.process(processes=0)
+
+        queued_image.refresh_from_db()
+        self.assertFalse(queued_image.face_detection_tried)
+        self.assertEqual(queued_image.image.name, original_name)
+        self.assertEqual(len(saved_names), 1)
+        self.assertFalse(queued_image.image.storage.exists(saved_names[0]))
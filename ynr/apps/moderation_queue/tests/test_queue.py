@@ -18,12 +18,14 @@ from candidates.tests.uk_examples import UK2015ExamplesMixin
 from django.contrib.auth.models import Group, User
 from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory
 from django.test.utils import override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.formats import date_format
 from django_webtest import WebTest
 from mock import patch
+from moderation_queue.forms import PhotoRotateForm
 from moderation_queue.models import (
     PHOTO_REVIEWERS_GROUP_NAME,
     QueuedImage,
@@ -32,7 +34,8 @@ from moderation_queue.models import (
 from moderation_queue.tests.paths import EXAMPLE_IMAGE_FILENAME
 from official_documents.models import BallotSOPN
 from parties.tests.factories import PartyFactory
-from people.models import Person
+from people.image_hashes import hash_image_bytes, hash_image_field
+from people.models import Person, PersonImage
 from people.tests.factories import PersonFactory
 from PIL import Image
 from popolo.models import OtherName
@@ -157,7 +160,7 @@ class PhotoReviewTests(UK2015ExamplesMixin, WebTest):
 
     def test_photo_review_queue_view_logged_in_privileged(self):
         queue_url = reverse("photo-review-list")
-        with self.assertNumQueries(FuzzyInt(38, 41)):
+        with self.assertNumQueries(FuzzyInt(23, 25)):
             response = self.app.get(queue_url, user=self.test_reviewer)
         self.assertEqual(response.status_code, 200)
         queue_table = response.html.find("table")
@@ -206,6 +209,51 @@ class PhotoReviewTests(UK2015ExamplesMixin, WebTest):
         response = self.app.get(review_url, user=self.test_reviewer)
         self.assertEqual(response.status_code, 200)
 
+    def test_photo_review_queue_flags_near_duplicates(self):
+        PersonImage.objects.create_from_file(
+            filename=self.example_image_filename,
+            defaults={"person": self.q2.person, "source": "Example"},
+        )
+        hash_image_field(self.q1)
+        self.q1.save()
+        response = self.app.get(
+            reverse("photo-review-list"), user=self.test_reviewer
+        )
+        rows = response.html.find("table").find_all("tr")
+        self.assertIn("Possible duplicate", rows[1].find_all("td")[5].text)
+        self.assertNotIn("Possible duplicate", rows[2].find_all("td")[5].text)
+
+    def test_photo_review_shows_near_duplicates(self):
+        for queued_image in (self.q2, self.q3):
+            hash_image_field(queued_image)
+            queued_image.save()
+        review_url = reverse(
+            "photo-review", kwargs={"queued_image_id": self.q1.id}
+        )
+        response = self.app.get(review_url, user=self.test_reviewer)
+        self.q1.refresh_from_db()
+        self.assertIsNotNone(self.q1.perceptual_hash)
+        duplicates = response.html.find(id="near-duplicates")
+        links = [a["href"] for a in duplicates.find_all("a")]
+        self.assertIn(self.q2.get_absolute_url(), links)
+        self.assertIn(self.q3.get_absolute_url(), links)
+        self.assertNotIn(self.q1.get_absolute_url(), links)
+
+    def test_rotating_photo_updates_its_hash(self):
+        hash_image_field(self.q1)
+        self.q1.save()
+        original_hash = self.q1.perceptual_hash
+        request = RequestFactory().post("/", {"rotate": "left"})
+
+        PhotoRotateForm(queued_image=self.q1, request=request).process()
+
+        self.q1.refresh_from_db()
+        self.assertNotEqual(self.q1.perceptual_hash, original_hash)
+        with self.q1.image.open() as f:
+            self.assertEqual(
+                self.q1.perceptual_hash, hash_image_bytes(f.read())
+            )
+
     def test_shows_photo_policy_text_in_photo_review_page(self):
         review_url = reverse(
             "photo-review", kwargs={"queued_image_id": self.q1.id}
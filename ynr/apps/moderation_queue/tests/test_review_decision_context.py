@@ -0,0 +1,93 @@
+from candidates.models import LoggedAction
+from candidates.models.db import ActionType
+from candidates.tests.auth import TestUserMixin
+from candidates.views.version_data import get_change_metadata
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from moderation_queue.models import VERY_TRUSTED_USER_GROUP_NAME
+from moderation_queue.review_required_helper import (
+    CandidateCurrentNameDecider,
+    OpenAIModerationReview,
+    ReviewDecisionContext,
+)
+from moderation_queue.slack import FlaggedEditSlackReplyer
+from people.tests.factories import PersonFactory
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+)
+class TestReviewDecisionContext(TestUserMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.person = PersonFactory(name="Jane Doe")
+        self.person.record_version(get_change_metadata(None, "Created"))
+        self.person.save()
+        self.person.name = "Janet Doe"
+        self.person.biography = "A statement"
+        version = get_change_metadata(None, "Renamed")
+        self.person.record_version(version)
+        self.person.save()
+        self.version_id = version["version_id"]
+
+    def log_action(self, **kwargs):
+        return LoggedAction.objects.create(
+            user=self.user,
+            person=self.person,
+            action_type=ActionType.PERSON_UPDATE,
+            popit_person_new_version=self.version_id,
+            source="Just for tests...",
+            **kwargs,
+        )
+
+    def test_version_diff_shared_between_deciders(self):
+        la = LoggedAction(
+            user=self.user,
+            person=self.person,
+            popit_person_new_version=self.version_id,
+        )
+        context = ReviewDecisionContext(la)
+        with self.assertNumQueries(1):
+            self.assertEqual(context.statement, "A statement")
+            self.assertTrue(context.name_replaced)
+        with self.assertNumQueries(1):
+            CandidateCurrentNameDecider(la, context).needs_review()
+        with self.assertNumQueries(0):
+            OpenAIModerationReview(la, context).needs_review()
+
+    def test_user_facts_cached_between_logged_actions(self):
+        self.log_action()
+        context = ReviewDecisionContext(self.log_action())
+        self.assertEqual(context.user_edit_count, 2)
+        self.assertFalse(context.user_is_very_trusted)
+        self.assertEqual(context.user_approved_count("some_type"), 0)
+
+        context = ReviewDecisionContext(self.log_action())
+        with self.assertNumQueries(0):
+            self.assertEqual(context.user_edit_count, 3)
+            self.assertFalse(context.user_is_very_trusted)
+            self.assertEqual(context.user_approved_count("some_type"), 0)
+
+    def test_user_facts_cleared_when_they_change(self):
+        la = self.log_action()
+        self.assertEqual(la.flagged_type, "needs_review_due_to_first_edits")
+        context = ReviewDecisionContext(la)
+        self.assertFalse(context.user_is_very_trusted)
+        self.assertEqual(context.user_approved_count(la.flagged_type), 0)
+
+        FlaggedEditSlackReplyer(
+            {"user": {"username": "slack_user"}}, {"value": la.pk}
+        ).mark_as_approved(la.pk)
+        context = ReviewDecisionContext(la)
+        self.assertEqual(context.user_approved_count(la.flagged_type), 1)
+
+        self.user.groups.add(
+            Group.objects.get(name=VERY_TRUSTED_USER_GROUP_NAME)
+        )
+        self.assertTrue(ReviewDecisionContext(la).user_is_very_trusted)
+
+        la.delete()
+        self.assertEqual(ReviewDecisionContext(la).user_edit_count, 0)
@@ -0,0 +1,167 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from candidates.models import LoggedAction
+from candidates.models.db import ActionType
+from candidates.views.version_data import get_change_metadata
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from moderation_queue.models import QueuedStatementModeration
+from moderation_queue.statement_moderation import (
+    MAX_ATTEMPTS,
+    UNCHECKED_REASON,
+    FakeModerationBackend,
+    ModerationUnavailable,
+    moderate_queued_statements,
+    queue_statement_moderation,
+)
+from people.tests.factories import PersonFactory
+
+
+@override_settings(
+    STATEMENT_MODERATION_BACKEND="moderation_queue.statement_moderation.FakeModerationBackend"
+)
+class TestStatementModeration(TestCase):
+    def edit_statement(self, statement):
+        person = PersonFactory(name="Jane Doe")
+        person.biography = statement
+        version = get_change_metadata(None, "Edited statement")
+        person.record_version(version)
+        person.save()
+        return LoggedAction.objects.create(
+            person=person,
+            action_type=ActionType.PERSON_UPDATE,
+            popit_person_new_version=version["version_id"],
+            source="Just for tests...",
+        )
+
+    def test_statement_queued_and_flagged_after_save(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            la = self.edit_statement("I will harass my opponents")
+        self.assertEqual(la.flagged_type, "")
+        queued = QueuedStatementModeration.objects.get()
+        self.assertEqual(queued.logged_action, la)
+        self.assertEqual(queued.statement, "I will harass my opponents")
+
+        for callback in callbacks:
+            callback()
+
+        la.refresh_from_db()
+        self.assertEqual(la.flagged_type, "automated_statement_moderation")
+        self.assertEqual(
+            la.flagged_reason, "Automated moderation detected: harassment"
+        )
+        self.assertFalse(QueuedStatementModeration.objects.exists())
+
+    def test_clean_statement_not_flagged(self):
+        la = self.edit_statement("I like parks")
+        self.assertEqual(moderate_queued_statements(), 1)
+        la.refresh_from_db()
+        self.assertEqual(la.flagged_type, "")
+        self.assertFalse(QueuedStatementModeration.objects.exists())
+
+    @override_settings(
+        STATEMENT_MODERATION_BACKEND="moderation_queue.statement_moderation.OpenAIModerationBackend",
+        OPEN_AI_API_KEY=None,
+    )
+    def test_nothing_queued_without_a_backend(self):
+        self.edit_statement("I will harass my opponents")
+        self.assertFalse(QueuedStatementModeration.objects.exists())
+
+    def test_statements_moderated_in_batches(self):
+        for statement in ["One", "Two", "Three violent"]:
+            self.edit_statement(statement)
+        with patch.object(
+            FakeModerationBackend,
+            "moderate",
+            autospec=True,
+            side_effect=FakeModerationBackend.moderate,
+        ) as moderate:
+            self.assertEqual(moderate_queued_statements(batch_size=2), 3)
+        self.assertEqual(moderate.call_count, 2)
+        self.assertEqual(
+            list(
+                LoggedAction.objects.exclude(flagged_type="").values_list(
+                    "flagged_reason", flat=True
+                )
+            ),
+            ["Automated moderation detected: violence"],
+        )
+
+    def test_statements_claimed_while_being_checked(self):
+        self.edit_statement("I will harass my opponents")
+
+        def moderate(backend, statements):
+            # Another worker wouldn't pick these up
+            self.assertFalse(
+                QueuedStatementModeration.objects.filter(
+                    next_attempt__lte=timezone.now()
+                ).exists()
+            )
+            return FakeModerationBackend.moderate(backend, statements)
+
+        with patch.object(
+            FakeModerationBackend, "moderate", autospec=True
+        ) as mock_moderate:
+            mock_moderate.side_effect = moderate
+            self.assertEqual(moderate_queued_statements(), 1)
+        self.assertFalse(QueuedStatementModeration.objects.exists())
+
+    def test_statement_queued_again_while_being_checked(self):
+        la = self.edit_statement("I will harass my opponents")
+
+        def moderate(backend, statements):
+            queue_statement_moderation(la, "I like parks")
+            return FakeModerationBackend.moderate(backend, statements)
+
+        with patch.object(
+            FakeModerationBackend, "moderate", autospec=True
+        ) as mock_moderate:
+            mock_moderate.side_effect = moderate
+            self.assertEqual(moderate_queued_statements(), 0)
+        la.refresh_from_db()
+        self.assertEqual(la.flagged_type, "")
+        self.assertEqual(
+            QueuedStatementModeration.objects.get().statement, "I like parks"
+        )
+
+    def test_retry_with_backoff(self):
+        self.edit_statement("I will harass my opponents")
+        with patch.object(
+            FakeModerationBackend,
+            "moderate",
+            side_effect=ModerationUnavailable("Rate limited"),
+        ):
+            self.assertEqual(moderate_queued_statements(), 0)
+            queued = QueuedStatementModeration.objects.get()
+            self.assertEqual(queued.attempts, 1)
+            self.assertGreater(queued.next_attempt, timezone.now())
+
+            # Not due yet
+            self.assertEqual(moderate_queued_statements(), 0)
+            self.assertEqual(
+                QueuedStatementModeration.objects.get().attempts, 1
+            )
+
+            for attempt in range(2, MAX_ATTEMPTS + 1):
+                QueuedStatementModeration.objects.update(
+                    next_attempt=timezone.now() - timedelta(seconds=1)
+                )
+                moderate_queued_statements()
+        self.assertFalse(QueuedStatementModeration.objects.exists())
+        la = LoggedAction.objects.get()
+        self.assertEqual(la.flagged_type, "automated_statement_moderation")
+        self.assertEqual(la.flagged_reason, UNCHECKED_REASON)
+
+    def test_already_flagged_edit_keeps_its_flag(self):
+        la = self.edit_statement("I will harass my opponents")
+        LoggedAction.objects.filter(pk=la.pk).update(
+            flagged_type="needs_review_due_to_first_edits",
+            flagged_reason="First edits by user",
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(moderate_queued_statements(), 1)
+        self.assertEqual(callbacks, [])
+        la.refresh_from_db()
+        self.assertEqual(la.flagged_type, "needs_review_due_to_first_edits")
+        self.assertEqual(la.flagged_reason, "First edits by user")
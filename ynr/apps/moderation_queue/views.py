@@ -39,7 +39,17 @@ from moderation_queue.helpers import (
     image_form_valid_response,
     upload_photo_response,
 )
-from people.models import TRUSTED_TO_EDIT_NAME, EditLimitationStatuses, Person
+from people.image_hashes import (
+    hash_image_field,
+    near_duplicate_exists,
+    near_duplicates,
+)
+from people.models import (
+    TRUSTED_TO_EDIT_NAME,
+    EditLimitationStatuses,
+    Person,
+    PersonImage,
+)
 from popolo.models import Membership, OtherName
 from sopn_parsing.models import AWSTextractParsedSOPNStatus
 from utils.exceptions import PrettyError
@@ -154,6 +164,11 @@ class PhotoReviewList(GroupRequiredMixin, ListView):
             QueuedImage.objects.filter(decision="undecided")
             .order_by("created")
             .select_related("user", "person")
+            .annotate(
+                has_near_duplicate=near_duplicate_exists(
+                    PersonImage.objects.all()
+                )
+            )
         )
 
 
@@ -263,8 +278,42 @@ class PhotoReview(GroupRequiredMixin, TemplateView):
             self.queued_image.image.url
         )
         context["person"] = person
+        context["near_duplicates"] = self.get_near_duplicates()
         return context
 
+    def get_near_duplicates(self):
+        """
+        Photos we already have, or have been sent before, that look like this
+        one, e.g. because it's the same photo resized or re-encoded
+        """
+        queued_image = self.queued_image
+        if queued_image.perceptual_hash is None:
+            # Not hashed by moderation_queue_process_queued_images yet
+            try:
+                hash_image_field(queued_image)
+            except (OSError, ValueError):
+                return {}
+            QueuedImage.objects.filter(pk=queued_image.pk).update(
+                perceptual_hash=queued_image.perceptual_hash,
+                perceptual_hash_bands=queued_image.perceptual_hash_bands,
+            )
+        return {
+            "person_images": list(
+                near_duplicates(
+                    PersonImage.objects.select_related("person"),
+                    queued_image.perceptual_hash,
+                )[:10]
+            ),
+            "queued_images": list(
+                near_duplicates(
+                    QueuedImage.objects.exclude(
+                        pk=queued_image.pk
+                    ).select_related("person"),
+                    queued_image.perceptual_hash,
+                )[:10]
+            ),
+        }
+
     def form_valid(self, form):
         self.queued_image = self.form.process()
         if isinstance(form, PhotoReviewForm):
@@ -1,14 +1,15 @@
 import io
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from candidates.models import Ballot
 from django.core.files.base import ContentFile
 from django.db import transaction
+from django_q.tasks import async_task
 from official_documents.models import (
     BallotSOPN,
+    BallotSOPNHistory,
     ElectionSOPN,
     PageMatchingMethods,
-    add_ballot_sopn,
 )
 from pypdf import PdfReader, PdfWriter
 from pypdf.errors import DependencyError, PdfReadError
@@ -20,63 +21,196 @@ class PDFProcessingError(ValueError):
     """
 
 
+def render_pages(reader: PdfReader, pages: List[int]) -> bytes:
+    """
+    Return a PDF of `pages` from `reader`
+    """
+    writer = PdfWriter()
+    try:
+        for page in pages:
+            writer.add_page(reader.pages[page])
+    except DependencyError as exception:
+        raise PDFProcessingError(f"{exception}")
+    pdf_pages = io.BytesIO()
+    writer.write(pdf_pages)
+    return pdf_pages.getvalue()
+
+
+def extract_page_text(reader: PdfReader, pages: List[int]) -> List[str]:
+    """
+    Return the text of each of `pages` in `reader`
+    """
+    try:
+        return [reader.pages[page].extract_text() for page in pages]
+    except DependencyError as exception:
+        raise PDFProcessingError(f"{exception}")
+
+
+def parse_ballot_sopns(ballot_sopn_ids):
+    """
+    Parse BallotSOPNs that have been made by splitting an ElectionSOPN.
+    Queued by `ElectionSOPNPageSplitter.write` once they've been committed.
+    """
+    for ballot_sopn in BallotSOPN.objects.filter(pk__in=ballot_sopn_ids):
+        ballot_sopn.parse()
+
+
 class ElectionSOPNPageSplitter:
     def __init__(
-        self, election_sopn: ElectionSOPN, ballot_to_pages: Dict[str, List[int]]
+        self,
+        election_sopn: ElectionSOPN,
+        ballot_to_pages: Dict[str, List[int]],
     ):
         """
         ballot_to_pages MUST be 0th indexed, so the first page is page 0
         """
         self.election_sopn = election_sopn
-        self.ballot_to_pages = ballot_to_pages
+        self.ballot_to_pages = {
+            ballot_paper_id: pages
+            for ballot_paper_id, pages in ballot_to_pages.items()
+            if pages
+        }
         if not self.election_sopn.uploaded_file.name.endswith("pdf"):
             raise PdfReadError("Not a PDF")
-        self.reader = PdfReader(self.election_sopn.uploaded_file.open())
-
-    @transaction.atomic()
-    def split(
-        self, method=PageMatchingMethods.MANUAL_MATCHED, parse_ballots=True
-    ):
-        if self.election_sopn.pk is not None:
-            BallotSOPN.objects.filter(
-                election_sopn_id=self.election_sopn.pk
-            ).delete()
+        with self.election_sopn.uploaded_file.open() as pdf_file:
+            self.pdf_bytes = pdf_file.read()
+        self.reader = PdfReader(io.BytesIO(self.pdf_bytes))
 
-        for ballot_paper_id, matched_pages in self.ballot_to_pages.items():
-            if not matched_pages:
-                continue
-
-            pdf_pages = io.BytesIO()
-            writer = PdfWriter()
-            try:
-                for page in matched_pages:
-                    writer.add_page(self.reader.pages[page])
-            except DependencyError as exception:
-                raise PDFProcessingError(f"{exception}")
-
-            writer.write(pdf_pages)
-            pdf_pages.seek(0)
-            pdf_content = ContentFile(
-                pdf_pages.getvalue(),
-                name=f"sopn-{ballot_paper_id}.pdf",
+    def relevant_pages(self, ballot_paper_id) -> str:
+        matched_pages = self.ballot_to_pages[ballot_paper_id]
+        relevant_pages = ",".join([str(num) for num in matched_pages])
+        if len(relevant_pages) >= 20:
+            # chances are this is an error, so raise
+            raise PDFProcessingError(
+                f"Page matching error: {self.election_sopn.uploaded_file.url} matched to pages: {relevant_pages}"
             )
-            relevant_pages = ",".join([str(num) for num in matched_pages])
-            if len(relevant_pages) >= 20:
-                # chances are this is an error, so raise
-                raise PDFProcessingError(
-                    f"Page matching error: {self.election_sopn.uploaded_file.url} matched to pages: {relevant_pages}"
-                )
+        return relevant_pages
 
-            ballot = Ballot.objects.get(ballot_paper_id=ballot_paper_id)
+    def render(self) -> Dict[str, bytes]:
+        """
+        Return a PDF of the matched pages of each ballot, keyed by ballot
+        paper ID. Doesn't touch the database, so call this outside of any
+        transaction.
+        """
+        for ballot_paper_id in self.ballot_to_pages:
+            self.relevant_pages(ballot_paper_id)
+
+        return {
+            ballot_paper_id: render_pages(self.reader, pages)
+            for ballot_paper_id, pages in self.ballot_to_pages.items()
+        }
+
+    def extract_text(self) -> List[str]:
+        """
+        Return the text of every page of the ElectionSOPN
+        """
+        return extract_page_text(
+            self.reader, list(range(len(self.reader.pages)))
+        )
 
-            add_ballot_sopn(
-                ballot,
-                pdf_content,
-                self.election_sopn.source_url,
-                relevant_pages,
+    def upload(
+        self, rendered: Dict[str, bytes]
+    ) -> List[Tuple[BallotSOPN, BallotSOPNHistory]]:
+        """
+        Upload the PDFs from `render` as the files of new, unsaved
+        BallotSOPNs and their history. Doesn't write to the database, so
+        call this outside of any transaction, as uploading can be slow.
+        """
+        ballots = Ballot.objects.in_bulk(
+            list(rendered), field_name="ballot_paper_id"
+        )
+        missing = set(rendered) - set(ballots)
+        if missing:
+            raise Ballot.DoesNotExist(
+                f"Unknown ballots: {', '.join(sorted(missing))}"
+            )
+
+        uploaded = []
+        for ballot_paper_id, pdf in rendered.items():
+            relevant_pages = self.relevant_pages(ballot_paper_id)
+            ballot_sopn = BallotSOPN(
+                ballot=ballots[ballot_paper_id],
+                relevant_pages=relevant_pages,
+                source_url=self.election_sopn.source_url,
                 election_sopn=self.election_sopn,
-                parse=parse_ballots,
             )
+            ballot_sopn.validate_relevant_pages()
+            history_item = BallotSOPNHistory(
+                ballot=ballots[ballot_paper_id],
+                relevant_pages=relevant_pages,
+                source_url=self.election_sopn.source_url,
+            )
+            for instance in (ballot_sopn, history_item):
+                self.upload_file(instance, ballot_paper_id, pdf)
+            uploaded.append((ballot_sopn, history_item))
+        return uploaded
 
+    def write(
+        self,
+        uploaded: List[Tuple[BallotSOPN, BallotSOPNHistory]],
+        method=PageMatchingMethods.MANUAL_MATCHED,
+        parse_ballots=True,
+    ) -> List[BallotSOPN]:
+        """
+        Save the BallotSOPNs from `upload`, replacing any from an earlier
+        split of this ElectionSOPN, in one short transaction. Parsing the
+        new BallotSOPNs is queued once that's committed.
+        """
+        ballot_sopns = [ballot_sopn for ballot_sopn, _ in uploaded]
+        history = [history_item for _, history_item in uploaded]
+        with transaction.atomic():
+            BallotSOPN.objects.filter(
+                election_sopn_id=self.election_sopn.pk
+            ).delete()
+            BallotSOPN.objects.filter(
+                ballot__in=[ballot_sopn.ballot for ballot_sopn in ballot_sopns]
+            ).delete()
+            BallotSOPNHistory.objects.bulk_create(history)
+            BallotSOPN.objects.bulk_create(ballot_sopns)
             self.election_sopn.page_matching_method = method
             self.election_sopn.save()
+
+            if parse_ballots and ballot_sopns:
+                ballot_sopn_ids = [
+                    ballot_sopn.pk for ballot_sopn in ballot_sopns
+                ]
+                transaction.on_commit(
+                    lambda: async_task(
+                        "official_documents.extract_pages.parse_ballot_sopns",
+                        ballot_sopn_ids,
+                    )
+                )
+        return ballot_sopns
+
+    def save(
+        self,
+        rendered: Dict[str, bytes],
+        method=PageMatchingMethods.MANUAL_MATCHED,
+        parse_ballots=True,
+    ) -> List[BallotSOPN]:
+        """
+        Save the PDFs from `render` as the BallotSOPNs of their ballots.
+
+        Don't call this inside a transaction, as the files are uploaded
+        while it's open. Call `upload` before it, and `write` in it, instead.
+        """
+        return self.write(
+            self.upload(rendered), method=method, parse_ballots=parse_ballots
+        )
+
+    def upload_file(self, instance, ballot_paper_id, pdf):
+        """
+        Save `pdf` to storage as the file of the unsaved `instance`, so that
+        saving the instance doesn't upload anything
+        """
+        field = instance.uploaded_file.field
+        name = field.generate_filename(instance, f"sopn-{ballot_paper_id}.pdf")
+        instance.uploaded_file = field.storage.save(
+            name, ContentFile(pdf), max_length=field.max_length
+        )
+
+    def split(
+        self, method=PageMatchingMethods.MANUAL_MATCHED, parse_ballots=True
+    ):
+        self.save(self.render(), method=method, parse_ballots=parse_ballots)
+        return True
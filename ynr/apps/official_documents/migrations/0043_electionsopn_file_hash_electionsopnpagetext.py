@@ -0,0 +1,45 @@
+# Generated by Django 5.2.16 on 2026-10-18 20:15
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("official_documents", "0042_electionsopn_blank_pages"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="electionsopn",
+            name="file_hash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name="ElectionSOPNPageText",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_hash", models.CharField(max_length=64)),
+                ("page_number", models.PositiveIntegerField()),
+                ("text", models.TextField()),
+                (
+                    "tokens",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(), default=list, size=None
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("file_hash", "page_number"),
+                "unique_together": {("file_hash", "page_number")},
+            },
+        ),
+    ]
@@ -4,6 +4,7 @@ from pathlib import Path
 from typing import List
 
 from candidates.models import Ballot
+from django.contrib.postgres.fields import ArrayField
 from django.core.files.base import ContentFile
 from django.core.validators import FileExtensionValidator
 from django.db import models
@@ -153,6 +154,9 @@ class ElectionSOPN(TimeStampedModel):
         blank=True,
     )
 
+    # The SHA-256 of `uploaded_file`, used to look up its ElectionSOPNPageText
+    file_hash = models.CharField(max_length=64, blank=True)
+
     class Meta:
         get_latest_by = "modified"
 
@@ -204,6 +208,26 @@ class ElectionSOPN(TimeStampedModel):
         return {str(k): v for k, v in sorted(pages.items())}
 
 
+class ElectionSOPNPageText(models.Model):
+    """
+    The text of a page of an ElectionSOPN's PDF, and the normalised words in
+    it, used to match pages to ballots.
+
+    Stored by the hash of the file rather than against the ElectionSOPN, so
+    that the text of a file is only extracted once, even if it's uploaded
+    again.
+    """
+
+    file_hash = models.CharField(max_length=64)
+    page_number = models.PositiveIntegerField()
+    text = models.TextField()
+    tokens = ArrayField(models.TextField(), default=list)
+
+    class Meta:
+        ordering = ("file_hash", "page_number")
+        unique_together = ("file_hash", "page_number")
+
+
 def ballot_sopn_file_name(instance: "BaseBallotSOPN", filename):
     return (
         Path("official_documents")
@@ -0,0 +1,292 @@
+"""
+Matching the pages of an ElectionSOPN to the ballots in its election.
+
+The text of each page is extracted once per file and stored as
+`ElectionSOPNPageText`, along with the normalised words in it. Matching then
+builds an inverted index of those words, and looks each ballot's post label
+up in it as a phrase, so no PDF has to be read again.
+"""
+
+import hashlib
+import re
+import statistics
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from candidates.models import LoggedAction
+from candidates.models.db import ActionType, EditType
+from django.db import transaction
+from django.db.models import Q
+from pypdf.errors import PdfReadError
+from sopn_parsing.helpers.text_helpers import clean_page_text
+
+from .extract_pages import ElectionSOPNPageSplitter, PDFProcessingError
+from .models import ElectionSOPN, ElectionSOPNPageText, PageMatchingMethods
+
+TOKEN_RE = re.compile(r"[a-z]+")
+
+# A page that names more ballots than this equally often is probably a list
+# of every ballot rather than the SOPN for one of them
+MAX_TIED_BALLOTS = 2
+
+
+def page_tokens(text: str) -> List[str]:
+    """
+    The normalised words in `text`, in order
+    """
+    return TOKEN_RE.findall(clean_page_text(text))
+
+
+def stored_page_texts(
+    election_sopn: ElectionSOPN,
+) -> List[ElectionSOPNPageText]:
+    """
+    Return the stored text of every page of `election_sopn`, or an empty
+    list if it hasn't been extracted yet
+    """
+    if not election_sopn.file_hash:
+        return []
+    return list(
+        ElectionSOPNPageText.objects.filter(file_hash=election_sopn.file_hash)
+    )
+
+
+def get_page_texts(election_sopn: ElectionSOPN) -> List[ElectionSOPNPageText]:
+    """
+    Return the text of every page of `election_sopn`, extracting it from the
+    PDF only if this file hasn't been seen before
+    """
+    page_texts = stored_page_texts(election_sopn)
+    if page_texts:
+        return page_texts
+
+    splitter = ElectionSOPNPageSplitter(election_sopn, {})
+    file_hash = hashlib.sha256(splitter.pdf_bytes).hexdigest()
+    if file_hash != election_sopn.file_hash:
+        election_sopn.file_hash = file_hash
+        election_sopn.save(update_fields=["file_hash"])
+
+    page_texts = list(ElectionSOPNPageText.objects.filter(file_hash=file_hash))
+    if page_texts:
+        return page_texts
+
+    page_texts = [
+        ElectionSOPNPageText(
+            file_hash=file_hash,
+            page_number=page_number,
+            text=text,
+            tokens=page_tokens(text),
+        )
+        for page_number, text in enumerate(splitter.extract_text())
+    ]
+    # Another process might have got here first, with the same text
+    ElectionSOPNPageText.objects.bulk_create(page_texts, ignore_conflicts=True)
+    return page_texts
+
+
+class PageIndex:
+    """
+    An inverted index of the words on each page of a document
+    """
+
+    def __init__(self, pages: List[List[str]]):
+        self.pages = pages
+        self.postings: Dict[str, set] = defaultdict(set)
+        for page_number, tokens in enumerate(pages):
+            for token in tokens:
+                self.postings[token].add(page_number)
+
+    def find_phrase(self, phrase: List[str]) -> Dict[int, List[int]]:
+        """
+        Return the positions that `phrase` starts at on each page it's on
+        """
+        if not phrase:
+            return {}
+        candidate_pages = set.intersection(
+            *(self.postings.get(token, set()) for token in phrase)
+        )
+        found = {}
+        for page_number in sorted(candidate_pages):
+            tokens = self.pages[page_number]
+            positions = [
+                i
+                for i in range(len(tokens) - len(phrase) + 1)
+                if tokens[i : i + len(phrase)] == phrase
+            ]
+            if positions:
+                found[page_number] = positions
+        return found
+
+    def best_matches(self, phrases: Dict[str, List[str]]) -> Dict[int, str]:
+        """
+        Return the key of the phrase that each page is most likely to be
+        about.
+
+        Mentions that are part of a longer phrase, such as "Park" in
+        "Aldershot Park", are ignored. Each phrase is then scored by how
+        many more times it's on the page than on the median page, so that
+        names in every page's header or footer, like the council's address,
+        don't count.
+        """
+        mentions = defaultdict(list)
+        for key, phrase in phrases.items():
+            for page_number, positions in self.find_phrase(phrase).items():
+                mentions[page_number].extend(
+                    (start, start + len(phrase), key) for start in positions
+                )
+
+        counts = {}
+        first_mentions = {}
+        for page_number, page_mentions in mentions.items():
+            # Longest first, so that longer mentions are kept
+            page_mentions.sort(key=lambda m: (m[0] - m[1], m[0]))
+            kept = []
+            for start, end, key in page_mentions:
+                if not any(s <= start and end <= e for s, e, _ in kept):
+                    kept.append((start, end, key))
+            counts[page_number] = Counter(key for _, _, key in kept)
+            first_mentions[page_number] = {}
+            for start, _, key in sorted(kept):
+                first_mentions[page_number].setdefault(key, start)
+
+        background = {
+            key: statistics.median(
+                counts.get(page_number, {}).get(key, 0)
+                for page_number in range(len(self.pages))
+            )
+            for key in {key for c in counts.values() for key in c}
+        }
+
+        matches = {}
+        for page_number, page_counts in counts.items():
+            scores = {
+                key: count - background[key]
+                for key, count in page_counts.items()
+                if count > background[key]
+            }
+            if not scores:
+                continue
+            top_score = max(scores.values())
+            top = [key for key, score in scores.items() if score == top_score]
+            if len(top) > MAX_TIED_BALLOTS:
+                continue
+            matches[page_number] = min(
+                top, key=first_mentions[page_number].__getitem__
+            )
+        return matches
+
+
+def suggest_page_mapping(
+    election_sopn: ElectionSOPN, page_texts=None
+) -> Dict[str, str]:
+    """
+    Suggest which ballot each page of `election_sopn` is for, in the same
+    form as `ElectionSOPN.page_mapping`.
+
+    Blank pages are NOMATCH, and a page about the same ballot as the page
+    before it is a CONTINUATION. Pages that can't be matched with any
+    confidence are left out, to be matched by hand.
+
+    Ballots with a SOPN that didn't come from `election_sopn` aren't
+    suggested, as splitting would replace it.
+    """
+    if page_texts is None:
+        page_texts = get_page_texts(election_sopn)
+    index = PageIndex([page_text.tokens for page_text in page_texts])
+    ballots = election_sopn.election.ballot_set.filter(
+        Q(sopn=None) | Q(sopn__election_sopn=election_sopn)
+    ).select_related("post")
+    matches = index.best_matches(
+        {
+            ballot.ballot_paper_id: page_tokens(ballot.post.label)
+            for ballot in ballots
+        }
+    )
+
+    pages = {}
+    seen = set()
+    previous = None
+    for page_number, page_text in enumerate(page_texts):
+        ballot_paper_id = matches.get(page_number)
+        if not page_text.tokens:
+            pages[page_number] = ElectionSOPN.NOMATCH
+        elif ballot_paper_id and ballot_paper_id == previous:
+            pages[page_number] = ElectionSOPN.CONTINUATION
+        elif ballot_paper_id and ballot_paper_id not in seen:
+            pages[page_number] = ballot_paper_id
+            seen.add(ballot_paper_id)
+        else:
+            ballot_paper_id = None
+        previous = ballot_paper_id
+    return {str(k): v for k, v in pages.items()}
+
+
+def ballot_pages(pages: Dict[str, str]) -> Dict[str, List[int]]:
+    """
+    Convert a page mapping, as made by the matching UI or
+    `suggest_page_mapping`, to the pages of each ballot, as used by
+    `ElectionSOPNPageSplitter`
+    """
+    ballots = {
+        v: []
+        for k, v in pages.items()
+        if v not in [ElectionSOPN.CONTINUATION, ElectionSOPN.NOMATCH]
+    }
+    last_ballot = None
+    for k, v in pages.items():
+        if v == ElectionSOPN.NOMATCH:
+            continue
+        if v == ElectionSOPN.CONTINUATION:
+            if last_ballot is not None:
+                ballots[last_ballot].append(int(k))
+            continue
+        ballots[v].append(int(k))
+        last_ballot = v
+
+    return ballots
+
+
+def auto_match_pages(election_sopn: ElectionSOPN) -> Optional[Dict[str, str]]:
+    """
+    Split `election_sopn` into BallotSOPNs if every page of it can be
+    matched automatically. Returns the page mapping used, or None if it
+    wasn't split.
+    """
+    page_texts = get_page_texts(election_sopn)
+    pages = suggest_page_mapping(election_sopn, page_texts=page_texts)
+    ballot_to_pages = ballot_pages(pages)
+    if len(pages) < len(page_texts) or not ballot_to_pages:
+        return None
+
+    splitter = ElectionSOPNPageSplitter(election_sopn, ballot_to_pages)
+    uploaded = splitter.upload(splitter.render())
+    with transaction.atomic():
+        election_sopn.blank_pages = [
+            k for k, v in pages.items() if v == ElectionSOPN.NOMATCH
+        ]
+        election_sopn.save()
+        splitter.write(uploaded, method=PageMatchingMethods.AUTO_MATCHED)
+        LoggedAction.objects.create(
+            election=election_sopn.election,
+            action_type=ActionType.SOPN_SPLIT_BALLOTS,
+            source="Automatic matching",
+            edit_type=EditType.BOT.name,
+        )
+    return pages
+
+
+def match_election_sopn_pages(election_sopn_id):
+    """
+    Extract the text of a newly uploaded ElectionSOPN, and split it if all
+    its pages can be matched. Queued by `CreateElectionSOPNView` once the
+    ElectionSOPN has been committed.
+    """
+    election_sopn = ElectionSOPN.objects.select_related("election").get(
+        pk=election_sopn_id
+    )
+    if election_sopn.page_matching_method:
+        return
+    try:
+        auto_match_pages(election_sopn)
+    except (PdfReadError, PDFProcessingError) as e:
+        print(f"Couldn't match the pages of {election_sopn}: {e}")
@@ -0,0 +1,235 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from candidates.models import LoggedAction
+from candidates.models.db import ActionType, EditType
+from candidates.tests.factories import (
+    BallotPaperFactory,
+    ElectionFactory,
+    PostFactory,
+)
+from candidates.tests.uk_examples import UK2015ExamplesMixin
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase
+from official_documents.extract_pages import ElectionSOPNPageSplitter
+from official_documents.models import (
+    BallotSOPN,
+    ElectionSOPN,
+    ElectionSOPNPageText,
+    PageMatchingMethods,
+)
+from official_documents.page_matching import (
+    PageIndex,
+    auto_match_pages,
+    ballot_pages,
+    page_tokens,
+    suggest_page_mapping,
+)
+from official_documents.views import ElectionSOPNMatchingView
+
+HALTON_SOPN_PATH = (
+    Path(__file__).parents[2]
+    / "sopn_parsing/tests/data/halton-2019-statement-of-persons-nominated.pdf"
+)
+
+HALTON_WARDS = [
+    "Appleton",
+    "Beechwood",
+    "Birchfield",
+    "Broadheath",
+    "Daresbury",
+    "Ditton",
+    "Farnworth",
+    "Grange",
+    "Halton Brook",
+    "Halton Castle",
+    "Halton Lea",
+    "Halton View",
+    "Heath",
+    "Hough Green",
+    "Kingsway",
+    "Mersey",
+    "Norton North",
+    "Norton South",
+    "Riverside",
+]
+
+
+class TestPageIndex(SimpleTestCase):
+    def setUp(self):
+        self.index = PageIndex(
+            [
+                page_tokens(text)
+                for text in [
+                    "Election for Aldershot Park. Aldershot Park Ward. "
+                    "Council Offices, Farnborough Road",
+                    "Election for Park. Candidate of 1 Aldershot Park Road. "
+                    "Council Offices, Farnborough Road",
+                    "Election for Farnborough West. "
+                    "Council Offices, Farnborough Road",
+                ]
+            ]
+        )
+
+    def test_page_tokens(self):
+        self.assertEqual(
+            page_tokens("St. Mary's & St. John's\n(Ward 2)"),
+            ["st", "marys", "and", "st", "johns", "ward"],
+        )
+
+    def test_find_phrase(self):
+        self.assertEqual(
+            self.index.find_phrase(["aldershot", "park"]),
+            {0: [2, 4], 1: [5]},
+        )
+        self.assertEqual(self.index.find_phrase(["west", "park"]), {})
+
+    def test_best_matches(self):
+        self.assertEqual(
+            self.index.best_matches(
+                {
+                    "aldershot-park": ["aldershot", "park"],
+                    "park": ["park"],
+                    "farnborough-west": ["farnborough", "west"],
+                    "farnborough": ["farnborough"],
+                }
+            ),
+            {0: "aldershot-park", 1: "park", 2: "farnborough-west"},
+        )
+
+    def test_list_of_ballots_not_matched(self):
+        index = PageIndex(
+            [
+                page_tokens(text)
+                for text in [
+                    "Wards: Alpha, Beta, Gamma",
+                    "Election for Alpha",
+                    "Election for Beta",
+                    "Election for Gamma",
+                ]
+            ]
+        )
+        self.assertEqual(
+            index.best_matches({"a": ["alpha"], "b": ["beta"], "g": ["gamma"]}),
+            {1: "a", 2: "b", 3: "g"},
+        )
+
+
+class TestPageMatching(UK2015ExamplesMixin, TestCase):
+    def setUp(self):
+        self.election = ElectionFactory.create(
+            slug="local.halton.2019-05-02",
+            name="Halton local election",
+            current=True,
+        )
+        self.ballot_paper_ids = []
+        for ward in HALTON_WARDS:
+            slug = ward.lower().replace(" ", "-")
+            ballot_paper_id = f"local.halton.{slug}.2019-05-02"
+            BallotPaperFactory(
+                election=self.election,
+                post=PostFactory(
+                    label=ward, slug=slug, organization=self.commons
+                ),
+                ballot_paper_id=ballot_paper_id,
+            )
+            self.ballot_paper_ids.append(ballot_paper_id)
+        self.election_sopn = self.create_election_sopn()
+
+    def create_election_sopn(self):
+        return ElectionSOPN.objects.create(
+            election=self.election,
+            source_url="https://example.com/",
+            uploaded_file=ContentFile(
+                HALTON_SOPN_PATH.read_bytes(), name="halton.pdf"
+            ),
+        )
+
+    def test_suggest_page_mapping(self):
+        self.assertEqual(
+            suggest_page_mapping(self.election_sopn),
+            {
+                str(page): ballot_paper_id
+                for page, ballot_paper_id in enumerate(self.ballot_paper_ids)
+            },
+        )
+        self.assertEqual(
+            ElectionSOPNPageText.objects.filter(
+                file_hash=self.election_sopn.file_hash
+            ).count(),
+            19,
+        )
+
+    def test_text_is_extracted_once_per_file(self):
+        suggest_page_mapping(self.election_sopn)
+        reupload = self.create_election_sopn()
+        with patch.object(
+            ElectionSOPNPageSplitter, "extract_text"
+        ) as extract_text:
+            suggest_page_mapping(self.election_sopn)
+            self.assertEqual(len(suggest_page_mapping(reupload)), 19)
+        extract_text.assert_not_called()
+        self.assertEqual(reupload.file_hash, self.election_sopn.file_hash)
+
+    def test_ballots_with_other_sopns_are_not_suggested(self):
+        BallotSOPN.objects.create(
+            ballot=self.election.ballot_set.get(
+                ballot_paper_id=self.ballot_paper_ids[0]
+            ),
+            source_url="https://example.com/appleton",
+        )
+        pages = suggest_page_mapping(self.election_sopn)
+        self.assertNotIn("0", pages)
+        self.assertEqual(pages["1"], self.ballot_paper_ids[1])
+
+    def test_auto_match_pages(self):
+        auto_match_pages(self.election_sopn)
+        self.election_sopn.refresh_from_db()
+        self.assertEqual(
+            self.election_sopn.page_matching_method,
+            PageMatchingMethods.AUTO_MATCHED,
+        )
+        self.assertEqual(
+            self.election_sopn.page_mapping["18"], self.ballot_paper_ids[18]
+        )
+        self.assertEqual(
+            BallotSOPN.objects.filter(election_sopn=self.election_sopn).count(),
+            19,
+        )
+        logged_action = LoggedAction.objects.get(
+            action_type=ActionType.SOPN_SPLIT_BALLOTS
+        )
+        self.assertEqual(logged_action.election, self.election)
+        self.assertEqual(logged_action.edit_type, EditType.BOT.name)
+
+    def test_auto_match_pages_needs_every_page(self):
+        self.election.ballot_set.get(
+            ballot_paper_id=self.ballot_paper_ids[0]
+        ).delete()
+        self.assertIsNone(auto_match_pages(self.election_sopn))
+        self.assertFalse(BallotSOPN.objects.exists())
+
+    def test_matching_view_only_suggests_from_stored_text(self):
+        view = ElectionSOPNMatchingView()
+        view.object = self.election_sopn
+        with patch.object(
+            ElectionSOPNPageSplitter, "extract_text"
+        ) as extract_text:
+            self.assertEqual(view.get_pages(), {})
+        extract_text.assert_not_called()
+
+        suggest_page_mapping(self.election_sopn)
+        self.assertEqual(len(view.get_pages()), 19)
+
+    def test_ballot_pages(self):
+        self.assertEqual(
+            ballot_pages(
+                {
+                    "0": "NOMATCH",
+                    "1": "local.foo.a.2024-05-02",
+                    "2": "CONTINUATION",
+                    "3": "local.foo.b.2024-05-02",
+                }
+            ),
+            {"local.foo.a.2024-05-02": [1, 2], "local.foo.b.2024-05-02": [3]},
+        )
@@ -1,6 +1,7 @@
 from io import BytesIO
 from unittest.mock import patch
 
+from candidates.models import Ballot
 from candidates.tests.factories import (
     BallotPaperFactory,
     ElectionFactory,
@@ -13,7 +14,11 @@ from official_documents.extract_pages import (
     ElectionSOPNPageSplitter,
     PDFProcessingError,
 )
-from official_documents.models import BallotSOPN, ElectionSOPN
+from official_documents.models import (
+    BallotSOPN,
+    BallotSOPNHistory,
+    ElectionSOPN,
+)
 from pypdf import PdfReader, PdfWriter
 from pypdf.errors import DependencyError, PdfReadError
 
@@ -92,3 +97,86 @@ class ElectionSOPNPageSplitterTestCase(UK2015ExamplesMixin, TestCase):
         bs2 = ballot_sopns.get(ballot__ballot_paper_id="ballot2")
         reader = PdfReader(bs2.uploaded_file.open())
         self.assertEqual(len(reader.pages), 2)
+
+    def test_render_pages(self):
+        ballot_to_pages = {
+            "ballot1": [0],
+            "ballot2": [1, 2],
+        }
+        splitter = ElectionSOPNPageSplitter(self.election_sopn, ballot_to_pages)
+        rendered = splitter.render()
+        self.assertEqual(len(PdfReader(BytesIO(rendered["ballot1"])).pages), 1)
+        self.assertEqual(len(PdfReader(BytesIO(rendered["ballot2"])).pages), 2)
+
+    def test_upload_before_write(self):
+        splitter = ElectionSOPNPageSplitter(
+            self.election_sopn, {"ballot1": [0], "ballot2": [1, 2]}
+        )
+        uploaded = splitter.upload(splitter.render())
+        self.assertFalse(BallotSOPN.objects.exists())
+        for ballot_sopn, history_item in uploaded:
+            self.assertTrue(
+                ballot_sopn.uploaded_file.storage.exists(
+                    ballot_sopn.uploaded_file.name
+                )
+            )
+            self.assertIsNone(history_item.pk)
+
+        splitter.write(uploaded)
+        self.assertEqual(
+            BallotSOPN.objects.filter(election_sopn=self.election_sopn).count(),
+            2,
+        )
+
+    def test_split_replaces_earlier_split(self):
+        ElectionSOPNPageSplitter(
+            self.election_sopn, {"ballot1": [0, 1], "ballot2": [2]}
+        ).split()
+        ElectionSOPNPageSplitter(
+            self.election_sopn, {"ballot1": [0], "ballot2": [1, 2]}
+        ).split()
+
+        ballot_sopns = BallotSOPN.objects.filter(
+            election_sopn=self.election_sopn
+        )
+        self.assertEqual(
+            dict(
+                ballot_sopns.values_list(
+                    "ballot__ballot_paper_id", "relevant_pages"
+                )
+            ),
+            {"ballot1": "0", "ballot2": "1,2"},
+        )
+        self.assertEqual(
+            BallotSOPNHistory.objects.filter(
+                ballot__ballot_paper_id="ballot1"
+            ).count(),
+            2,
+        )
+
+    def test_split_unknown_ballot(self):
+        splitter = ElectionSOPNPageSplitter(
+            self.election_sopn, {"ballot1": [0], "not-a-ballot": [1]}
+        )
+        with self.assertRaises(Ballot.DoesNotExist):
+            splitter.split()
+        self.assertFalse(BallotSOPN.objects.exists())
+
+    def test_parsing_queued_after_commit(self):
+        splitter = ElectionSOPNPageSplitter(
+            self.election_sopn, {"ballot1": [0], "ballot2": [1, 2]}
+        )
+        with patch.object(BallotSOPN, "parse") as parse:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                splitter.split()
+                parse.assert_not_called()
+            self.assertEqual(len(callbacks), 1)
+            self.assertEqual(parse.call_count, 2)
+
+    def test_split_without_parsing(self):
+        splitter = ElectionSOPNPageSplitter(
+            self.election_sopn, {"ballot1": [0]}
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            splitter.split(parse_ballots=False)
+        self.assertEqual(callbacks, [])
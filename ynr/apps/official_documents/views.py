@@ -16,6 +16,7 @@ from django.views.generic import (
     TemplateView,
     UpdateView,
 )
+from django_q.tasks import async_task
 from elections.models import Election
 from moderation_queue.models import SuggestedPostLock
 from sopn_parsing.helpers.text_helpers import NoTextInDocumentError
@@ -30,6 +31,11 @@ from .models import (
     add_ballot_sopn,
 )
 from .notifications import send_ballot_sopn_update_notification
+from .page_matching import (
+    ballot_pages,
+    stored_page_texts,
+    suggest_page_mapping,
+)
 
 
 class CreateOrUpdateBallotSOPNView(GroupRequiredMixin, UpdateView):
@@ -141,6 +147,13 @@ class CreateElectionSOPNView(GroupRequiredMixin, CreateView):
             source=self.object.source_url,
             edit_type=EditType.USER,
         )
+        election_sopn_id = self.object.pk
+        transaction.on_commit(
+            lambda: async_task(
+                "official_documents.page_matching.match_election_sopn_pages",
+                election_sopn_id,
+            )
+        )
         return ret
 
 
@@ -179,10 +192,25 @@ class ElectionSOPNMatchingView(GroupRequiredMixin, DetailView):
             "election_id": self.object.election.name,
             "sopn_pdf": self.object.uploaded_file.url,
             "ballots": ballots,
-            "pages": self.object.page_mapping,
+            "pages": self.get_pages(),
         }
         return context
 
+    def get_pages(self):
+        """
+        The pages as they were last matched, or if they haven't been
+        matched yet, the pages that can be matched automatically.
+
+        Suggestions only come from page text that's already been stored by
+        `match_election_sopn_pages`, so that viewing this page never has to
+        read the PDF.
+        """
+        if not self.object.page_matching_method:
+            page_texts = stored_page_texts(self.object)
+            if page_texts:
+                return suggest_page_mapping(self.object, page_texts=page_texts)
+        return self.object.page_mapping
+
     def validate_payload(self, pages):
         # we're making quite a lot of assumptions about this data
         # so we need to be quite strict about checking it on the way in
@@ -216,26 +244,8 @@ class ElectionSOPNMatchingView(GroupRequiredMixin, DetailView):
 
     def clean_matcher_data(self, pages):
         self.validate_payload(pages)
+        return ballot_pages(pages)
 
-        ballots = {
-            v: []
-            for k, v in pages.items()
-            if v not in [ElectionSOPN.CONTINUATION, ElectionSOPN.NOMATCH]
-        }
-        last_ballot = None
-        for k, v in pages.items():
-            if v == ElectionSOPN.NOMATCH:
-                continue
-            if v == ElectionSOPN.CONTINUATION:
-                if last_ballot is not None:
-                    ballots[last_ballot].append(int(k))
-                continue
-            ballots[v].append(int(k))
-            last_ballot = v
-
-        return ballots
-
-    @transaction.atomic
     def post(self, request, **kwargs):
         sopn = self.get_object()
 
@@ -243,21 +253,25 @@ class ElectionSOPNMatchingView(GroupRequiredMixin, DetailView):
 
         cleaned_data = self.clean_matcher_data(pages)
 
-        sopn.blank_pages = [
-            k for k, v in pages.items() if v == ElectionSOPN.NOMATCH
-        ]
-        sopn.save()
-
         splitter = ElectionSOPNPageSplitter(sopn, cleaned_data)
-        splitter.split(method=PageMatchingMethods.MANUAL_MATCHED)
-        LoggedAction.objects.create(
-            user=request.user,
-            election=sopn.election,
-            action_type=ActionType.SOPN_SPLIT_BALLOTS,
-            ip_address=get_client_ip(request),
-            source="Manual matching",
-            edit_type=EditType.USER,
-        )
+        # Rendering and uploading the PDFs is slow, so don't hold a
+        # transaction open for it
+        uploaded = splitter.upload(splitter.render())
+
+        with transaction.atomic():
+            sopn.blank_pages = [
+                k for k, v in pages.items() if v == ElectionSOPN.NOMATCH
+            ]
+            sopn.save()
+            splitter.write(uploaded, method=PageMatchingMethods.MANUAL_MATCHED)
+            LoggedAction.objects.create(
+                user=request.user,
+                election=sopn.election,
+                action_type=ActionType.SOPN_SPLIT_BALLOTS,
+                ip_address=get_client_ip(request),
+                source="Manual matching",
+                edit_type=EditType.USER,
+            )
         return HttpResponseRedirect(sopn.get_absolute_url())
 
 
@@ -3,6 +3,7 @@ from io import StringIO
 from django.core.management.base import BaseCommand
 from parties.importer import ECPartyImporter
 from parties.models import PartyEmblem
+from sopn_parsing.helpers.party_matching import invalidate_party_matchers
 from utils.slack import SlackHelper
 
 
@@ -53,6 +54,8 @@ class Command(BaseCommand):
         if not options["skip_create_joint"]:
             importer.create_joint_parties(raise_on_error=False)
 
+        invalidate_party_matchers()
+
         if importer.collector:
             self.stdout.write(
                 self.style.SUCCESS(
@@ -93,7 +93,19 @@ class PersonViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=["get"], name="Versions")
     def versions(self, request, pk=None, **kwargs):
-        return Response(self.get_object().versions)
+        qs = (
+            self.get_object()
+            .person_versions.order_by("-pk")
+            .values_list("content", flat=True)
+        )
+
+        # A bare list unless a page is asked for, so that existing clients
+        # get what they always have
+        if self.paginator.page_query_param in request.query_params:
+            page = self.paginate_queryset(qs)
+            return self.get_paginated_response(page)
+
+        return Response(list(qs))
 
     serializer_class = people.api.next.serializers.PersonSerializer
     pagination_class = ResultsSetPagination
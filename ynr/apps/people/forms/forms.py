@@ -309,7 +309,6 @@ class BasePersonForm(forms.ModelForm):
         model = Person
         exclude = (
             "membership",
-            "versions",
             "not_standing",
             "edit_limitations",
             "sort_name",
@@ -0,0 +1,140 @@
+"""
+Perceptual hashes of uploaded images, so that photos that have been
+re-encoded, resized or lightly cropped can be spotted as duplicates of
+photos we already have. `PersonImage.md5sum` only matches identical files.
+
+The hash is a 64 bit dHash: the image is shrunk to 9x8 greyscale pixels, and
+each bit says whether a pixel is brighter than the one to its right. Similar
+images have hashes that differ in only a few bits, so near duplicates are
+found by the Hamming distance between hashes.
+
+Comparing every pair of hashes can't use an index, so the hash is also
+stored as `perceptual_hash_bands`, the 8 bytes of the hash each tagged with
+their position, in an array with a GIN index. Two hashes within a Hamming
+distance of 7 must have at least one byte in common, so the indexed overlap
+finds every candidate, and the exact distance is then worked out for those.
+"""
+
+from io import BytesIO
+
+from django.db.models import (
+    BigIntegerField,
+    Exists,
+    Func,
+    IntegerField,
+    OuterRef,
+    Value,
+)
+from PIL import Image, ImageOps
+
+HASH_BITS = 64
+BAND_BITS = 8
+BANDS = HASH_BITS // BAND_BITS
+# Must be less than BANDS, so that the band overlap finds every match
+NEAR_DUPLICATE_DISTANCE = 6
+
+
+class HammingDistance(Func):
+    """
+    The number of bits that differ between two 64 bit hashes
+    """
+
+    arg_joiner = " # "
+    template = "bit_count((%(expressions)s)::bit(64))"
+    output_field = IntegerField()
+
+
+def dhash(image):
+    """
+    Return the dHash of a PIL image, as a signed 64 bit integer so that it
+    fits in a bigint column
+    """
+    image = ImageOps.exif_transpose(image).convert("L")
+    pixels = list(image.resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            right = pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    if value >= 2 ** (HASH_BITS - 1):
+        value -= 2**HASH_BITS
+    return value
+
+
+def hash_image_bytes(image_bytes):
+    with Image.open(BytesIO(image_bytes)) as image:
+        return dhash(image)
+
+
+def hash_bands(perceptual_hash):
+    """
+    Split a hash into bytes, each tagged with its position so that only
+    the same byte of two hashes can match
+    """
+    unsigned = perceptual_hash % 2**HASH_BITS
+    mask = 2**BAND_BITS - 1
+    return [
+        (band << BAND_BITS) | ((unsigned >> (band * BAND_BITS)) & mask)
+        for band in range(BANDS)
+    ]
+
+
+def hamming_distance(a, b):
+    return bin((a ^ b) % 2**HASH_BITS).count("1")
+
+
+def set_perceptual_hash(instance, perceptual_hash):
+    instance.perceptual_hash = perceptual_hash
+    instance.perceptual_hash_bands = (
+        None if perceptual_hash is None else hash_bands(perceptual_hash)
+    )
+
+
+def hash_image_field(instance):
+    """
+    Read `instance.image` and set its hash, without saving the instance
+    """
+    with instance.image.storage.open(instance.image.name) as f:
+        set_perceptual_hash(instance, hash_image_bytes(f.read()))
+
+
+def near_duplicates(
+    queryset, perceptual_hash, max_distance=NEAR_DUPLICATE_DISTANCE
+):
+    """
+    Filter a queryset of a model with a perceptual hash to the images within
+    `max_distance` of the hash, closest first, annotated with their
+    `hash_distance`
+    """
+    return (
+        queryset.filter(
+            perceptual_hash_bands__overlap=hash_bands(perceptual_hash)
+        )
+        .annotate(
+            hash_distance=HammingDistance(
+                "perceptual_hash",
+                Value(perceptual_hash, output_field=BigIntegerField()),
+            )
+        )
+        .filter(hash_distance__lte=max_distance)
+        .order_by("hash_distance")
+    )
+
+
+def near_duplicate_exists(queryset, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """
+    An `Exists` expression for annotating another model with a perceptual
+    hash with whether it has a near duplicate in `queryset`
+    """
+    return Exists(
+        queryset.filter(
+            perceptual_hash_bands__overlap=OuterRef("perceptual_hash_bands")
+        )
+        .annotate(
+            hash_distance=HammingDistance(
+                "perceptual_hash", OuterRef("perceptual_hash")
+            )
+        )
+        .filter(hash_distance__lte=max_distance)
+    )
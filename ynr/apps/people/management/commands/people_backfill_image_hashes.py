@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from moderation_queue.models import QueuedImage
+from people.image_hashes import hash_image_bytes, set_perceptual_hash
+from people.models import PersonImage
+
+
+def read_image(storage, name):
+    try:
+        with storage.open(name) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def hash_image(image_bytes):
+    """
+    Hash an image, or return None if it can't be read. This is CPU bound, so
+    it's run in a separate process.
+    """
+    if image_bytes is None:
+        return None
+    try:
+        return hash_image_bytes(image_bytes)
+    except (OSError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    help = """
+    Work out the perceptual hashes of person images and queued images that
+    don't have one, so that they can be found as near duplicates.
+
+    Images are read from storage in a thread pool and hashed in a process
+    pool. Each batch is saved as it's done, so the command can be stopped and
+    run again.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="How many images to hash before saving them",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="How many processes to hash images in",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=16,
+            help="How many images to read from storage at once",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Hash all the images again, not just the ones without a hash",
+        )
+
+    def handle(self, **options):
+        self.verbosity = int(options["verbosity"])
+        self.batch_size = int(options["batch_size"])
+        # Forked, so that the workers don't have to set Django up again.
+        # They only use PIL, never the database.
+        with ProcessPoolExecutor(
+            max_workers=int(options["processes"]),
+            mp_context=multiprocessing.get_context("fork"),
+        ) as self.process_pool, ThreadPoolExecutor(
+            max_workers=int(options["threads"])
+        ) as self.thread_pool:
+            for model in (PersonImage, QueuedImage):
+                queryset = model.objects.exclude(image="")
+                if not options["all"]:
+                    queryset = queryset.filter(perceptual_hash__isnull=True)
+                self.hash_images(queryset)
+
+    def hash_images(self, queryset):
+        model = queryset.model
+        pks = list(queryset.order_by("pk").values_list("pk", flat=True))
+        hashed = 0
+        for start in range(0, len(pks), self.batch_size):
+            batch = list(
+                model.objects.filter(
+                    pk__in=pks[start : start + self.batch_size]
+                ).only("pk", "image")
+            )
+            images = self.thread_pool.map(
+                read_image,
+                [instance.image.storage for instance in batch],
+                [instance.image.name for instance in batch],
+            )
+            hashes = self.process_pool.map(hash_image, images)
+            to_update = []
+            for instance, perceptual_hash in zip(batch, hashes):
+                if perceptual_hash is None:
+                    self.stderr.write(f"Couldn't read {instance.image.name}")
+                    continue
+                set_perceptual_hash(instance, perceptual_hash)
+                to_update.append(instance)
+            model.objects.bulk_update(
+                to_update, ["perceptual_hash", "perceptual_hash_bands"]
+            )
+            hashed += len(to_update)
+            if self.verbosity > 1:
+                self.stdout.write(
+                    "{} of {} done".format(
+                        min(start + self.batch_size, len(pks)), len(pks)
+                    )
+                )
+        self.stdout.write(f"Hashed {hashed} {model._meta.verbose_name_plural}")
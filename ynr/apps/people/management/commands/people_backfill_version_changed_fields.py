@@ -0,0 +1,101 @@
+from candidates.models import LoggedAction
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from people.models import Person, PersonVersion
+
+
+class Command(BaseCommand):
+    help = """
+    Work out the fields changed by each person version that was stored
+    before they were recorded with the version.
+
+    People are done in batches, each in its own transaction, so the command
+    can be stopped and run again.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="How many people to update in each transaction",
+        )
+        parser.add_argument(
+            "--update-logged-actions",
+            action="store_true",
+            help="Also set the version fields of logged actions that don't "
+            "have them",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = int(options["batch_size"])
+        person_ids = list(
+            PersonVersion.objects.filter(changed_fields__isnull=True)
+            .order_by("person_id")
+            .values_list("person_id", flat=True)
+            .distinct()
+        )
+        updated = 0
+        for start in range(0, len(person_ids), batch_size):
+            with transaction.atomic():
+                for person in Person.objects.filter(
+                    pk__in=person_ids[start : start + batch_size]
+                ):
+                    updated += self.backfill_person(person)
+            if options["verbosity"] > 1:
+                self.stdout.write(
+                    "{} of {} people done".format(
+                        min(start + batch_size, len(person_ids)),
+                        len(person_ids),
+                    )
+                )
+        self.stdout.write(f"Set the changed fields of {updated} versions")
+
+        if options["update_logged_actions"]:
+            self.update_logged_actions()
+
+    def backfill_person(self, person):
+        versions = list(person.person_versions.all())
+        id_to_version = {
+            version.version_id: version.content for version in versions
+        }
+        parent_map = None
+        to_update = []
+        for version in versions:
+            if version.changed_fields is not None:
+                continue
+            if version.parent_version_ids is None and parent_map is None:
+                parent_map = person.get_versions_parent_map()
+            version.set_changed_fields(
+                parent_version_ids=(parent_map or {}).get(version.version_id),
+                id_to_version=id_to_version,
+            )
+            to_update.append(version)
+        PersonVersion.objects.bulk_update(to_update, ["changed_fields"])
+        return len(to_update)
+
+    def update_logged_actions(self):
+        logged_actions = LoggedAction.objects.filter(
+            version_fields__isnull=True,
+            person__isnull=False,
+        ).exclude(popit_person_new_version="")
+        to_update = []
+        for logged_action in logged_actions.iterator():
+            changed_fields = (
+                PersonVersion.objects.filter(
+                    person_id=logged_action.person_id,
+                    version_id=logged_action.popit_person_new_version,
+                )
+                .values_list("changed_fields", flat=True)
+                .first()
+            )
+            if changed_fields is None:
+                continue
+            logged_action.version_fields = changed_fields
+            to_update.append(logged_action)
+        LoggedAction.objects.bulk_update(
+            to_update, ["version_fields"], batch_size=1000
+        )
+        self.stdout.write(
+            f"Set the version fields of {len(to_update)} logged actions"
+        )
@@ -0,0 +1,319 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from candidates.diffs import get_version_diffs
+from candidates.models import Ballot, LoggedAction
+from candidates.models.db import ActionType
+from candidates.models.versions import (
+    get_person_as_version_data,
+    get_versions_parent_map,
+    revert_person_from_version_data,
+)
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from parties.models import Party
+from people.merging import PersonMerger
+from people.models import Person
+from ynr_refactoring.settings import PersonIdentifierFields
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+IDENTIFIER_FIELDS = [field.name for field in PersonIdentifierFields]
+
+
+def copy_data(data, **changes):
+    data = json.loads(json.dumps(data))
+    data.update(changes)
+    return data
+
+
+class SyntheticHistory:
+    """
+    Makes up a long history for a person, as version dicts, most recent
+    first.
+
+    The history starts with the merged people's own histories, each ending
+    in a merge into the person. Each version changes the biography, and
+    changes identifiers with a probability of `identifier_churn`. Some also
+    change other names and candidacies, if there are ballots to use.
+    """
+
+    def __init__(self, rng, depth, merges, identifier_churn, ballots, parties):
+        self.rng = rng
+        self.depth = depth
+        self.merges = merges
+        self.identifier_churn = identifier_churn
+        self.ballots = ballots
+        self.parties = parties
+        self.timestamp = datetime(2010, 1, 1)
+
+    def version(self, source, data):
+        self.timestamp += timedelta(hours=self.rng.randint(1, 500))
+        return {
+            "information_source": source,
+            "version_id": "{:016x}".format(self.rng.getrandbits(64)),
+            "timestamp": self.timestamp.strftime(TIMESTAMP_FORMAT),
+            "username": "benchmark",
+            "data": copy_data(data),
+        }
+
+    def edit(self, data, number):
+        data["biography"] = f"Biography, edit {number}"
+        if self.rng.random() < self.identifier_churn:
+            field = self.rng.choice(IDENTIFIER_FIELDS)
+            data[field] = f"https://example.com/{field}/{number}"
+            data["identifiers"] = [
+                {
+                    "identifier": f"uk.org.publicwhip/person/{number}",
+                    "scheme": "uk.org.publicwhip",
+                }
+            ]
+        if self.rng.random() < 0.1:
+            data["other_names"].append(
+                {
+                    "name": f"Other name {number}",
+                    "note": "",
+                    "start_date": None,
+                    "end_date": None,
+                }
+            )
+        if self.ballots and self.rng.random() < 0.1:
+            ballot = self.rng.choice(self.ballots)
+            if ballot in data["candidacies"]:
+                del data["candidacies"][ballot]
+            else:
+                data["candidacies"][ballot] = {
+                    "party": self.rng.choice(self.parties)
+                }
+
+    def history(self, initial_data, person_id):
+        versions = []
+        number = 0
+        depths = [self.depth // (self.merges + 1)] * self.merges
+        depths.append(self.depth - sum(depths))
+        for merge in range(self.merges):
+            merged_id = str(10_000_000 + merge)
+            data = copy_data(initial_data, id=merged_id)
+            for _ in range(depths[merge]):
+                number += 1
+                self.edit(data, number)
+                versions.insert(0, self.version("Synthetic edit", data))
+            versions.insert(
+                0,
+                self.version(
+                    f"After merging person {merged_id}",
+                    copy_data(initial_data, id=person_id),
+                ),
+            )
+        data = copy_data(initial_data, id=person_id)
+        for _ in range(depths[-1]):
+            number += 1
+            self.edit(data, number)
+            versions.insert(0, self.version("Synthetic edit", data))
+        return versions
+
+
+class Command(BaseCommand):
+    help = """
+    Time and measure the memory used by the version history code, for
+    made up people with long histories.
+
+    Everything is done in a transaction that's rolled back, so nothing is
+    left in the database. Candidacies are only added to the histories if
+    there are unlocked ballots in the database to use.
+
+    Use --save-baseline to store the results, and --baseline to compare a
+    later run against them.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--depth",
+            type=int,
+            default=300,
+            help="How many versions each person has",
+        )
+        parser.add_argument(
+            "--merges",
+            type=int,
+            default=3,
+            help="How many other people have been merged into each person",
+        )
+        parser.add_argument(
+            "--identifier-churn",
+            type=float,
+            default=0.3,
+            help="The chance of each version changing an identifier",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="How many times to time each operation",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--save-baseline",
+            metavar="PATH",
+            help="Save the results as a JSON baseline",
+        )
+        parser.add_argument(
+            "--baseline",
+            metavar="PATH",
+            help="Compare the results to a saved baseline",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=1.5,
+            help="How many times slower than the baseline counts as a "
+            "regression",
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = int(options["repeat"])
+        config = {
+            "depth": int(options["depth"]),
+            "merges": int(options["merges"]),
+            "identifier_churn": float(options["identifier_churn"]),
+            "seed": int(options["seed"]),
+        }
+        with transaction.atomic():
+            results = self.run_benchmarks(config)
+            transaction.set_rollback(True)
+
+        for name, result in results.items():
+            self.stdout.write(
+                "{}: median {:.1f}ms, min {:.1f}ms, peak memory {:.0f}KiB".format(
+                    name,
+                    result["median_ms"],
+                    result["min_ms"],
+                    result["peak_kib"],
+                )
+            )
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as f:
+                json.dump({"config": config, "results": results}, f, indent=2)
+        if options["baseline"]:
+            self.compare_to_baseline(
+                options["baseline"],
+                config,
+                results,
+                float(options["tolerance"]),
+            )
+
+    def make_person(self, name, history):
+        person = Person.objects.create(name=name)
+        initial_data = get_person_as_version_data(person)
+        person.versions = history.history(initial_data, str(person.pk))
+        person.save()
+        return person
+
+    def run_benchmarks(self, config):
+        rng = random.Random(config["seed"])
+        ballots = list(
+            Ballot.objects.filter(candidates_locked=False).values_list(
+                "ballot_paper_id", flat=True
+            )[:5]
+        )
+        parties = list(Party.objects.values_list("ec_id", flat=True)[:5])
+
+        def history():
+            return SyntheticHistory(
+                rng,
+                config["depth"],
+                config["merges"],
+                config["identifier_churn"],
+                ballots if parties else [],
+                parties,
+            )
+
+        person = self.make_person("Benchmark Person", history())
+        other_person = self.make_person("Benchmark Duplicate", history())
+        user = User.objects.create(username="version-benchmark")
+        versions = person.versions
+        revert_to = versions[len(versions) // 2]["data"]
+
+        def fresh(person):
+            return Person.objects.get(pk=person.pk)
+
+        def log_action():
+            LoggedAction(
+                user=user,
+                person=fresh(person),
+                action_type=ActionType.PERSON_UPDATE,
+                popit_person_new_version=versions[0]["version_id"],
+                source="Benchmark",
+            ).save()
+
+        benchmarks = {
+            "get_version_diffs": lambda: get_version_diffs(
+                [copy_data(version) for version in versions]
+            ),
+            "get_versions_parent_map": lambda: get_versions_parent_map(
+                versions
+            ),
+            "Person.get_versions_parent_map": lambda: fresh(
+                person
+            ).get_versions_parent_map(),
+            "revert_person_from_version_data": lambda: (
+                revert_person_from_version_data(fresh(person), revert_to)
+            ),
+            "PersonMerger.merge_versions_json": lambda: PersonMerger(
+                fresh(person), fresh(other_person)
+            ).merge_versions_json(),
+            "LoggedAction.save": log_action,
+        }
+        return {name: self.measure(func) for name, func in benchmarks.items()}
+
+    def run_and_roll_back(self, func):
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+
+    def measure(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            self.run_and_roll_back(func)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        try:
+            self.run_and_roll_back(func)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "median_ms": statistics.median(timings),
+            "min_ms": min(timings),
+            "peak_kib": peak / 1024,
+        }
+
+    def compare_to_baseline(self, path, config, results, tolerance):
+        with open(path) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            self.stderr.write(
+                "The baseline was made with different options: {}".format(
+                    baseline["config"]
+                )
+            )
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline["results"]:
+                continue
+            ratio = result["median_ms"] / baseline["results"][name]["median_ms"]
+            self.stdout.write(f"{name}: {ratio:.2f}x the baseline time")
+            if ratio > tolerance:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(
+                "Slower than the baseline: {}".format(", ".join(regressions))
+            )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from people.thumbnails import generate_thumbnails_for, thumbnail_models
+
+
+class Command(BaseCommand):
+    help = """
+    Make the thumbnails of images that don't have them yet, e.g. those
+    uploaded before thumbnails were made when images are saved, or when
+    `thumbnail_sizes` has changed. Use --all to make them all again.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Make the thumbnails of every image again",
+        )
+
+    def handle(self, **options):
+        for model in thumbnail_models():
+            qs = model.objects.exclude(image="")
+            if options["all"]:
+                qs.update(thumbnailed_image_name="")
+            else:
+                qs = qs.exclude(thumbnailed_image_name=F("image"))
+            made = 0
+            for pk in qs.values_list("pk", flat=True).iterator():
+                try:
+                    generate_thumbnails_for(model._meta.label, pk)
+                except Exception as e:
+                    self.stderr.write(
+                        f"Couldn't make thumbnails for {model.__name__} {pk}: "
+                        f"{e}"
+                    )
+                    continue
+                made += 1
+            self.stdout.write(
+                f"Made thumbnails for {made} {model._meta.verbose_name_plural}"
+            )
@@ -5,6 +5,7 @@ from candidates.models import PersonRedirect
 from django.core.files import File
 from django.db import connection, models
 from django.db.models.expressions import RawSQL
+from people.image_hashes import hash_image_bytes, set_perceptual_hash
 from ynr_refactoring.settings import PersonIdentifierFields
 
 
@@ -14,6 +15,8 @@ class PersonImageManager(models.Manager):
         defaults["md5sum"] = get_file_md5sum(filename)
         person_image = self.model(**defaults)
         with open(filename, "rb") as f:
+            set_perceptual_hash(person_image, hash_image_bytes(f.read()))
+            f.seek(0)
             file = File(f)
             person_image.image.save(new_filename, file)
         return person_image
@@ -114,9 +117,10 @@ WHEN biography = '' THEN NULL
 ELSE (
     WITH expanded AS (
         SELECT
-            (elem->>'timestamp')::timestamptz AS ts,
-            elem->'data'->>'biography' AS bio
-        FROM jsonb_array_elements(people_person.versions) AS elem
+            (content->>'timestamp')::timestamptz AS ts,
+            content->'data'->>'biography' AS bio
+        FROM people_personversion
+        WHERE people_personversion.person_id = people_person.id
     ),
     ordered AS (
         SELECT
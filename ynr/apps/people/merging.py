@@ -17,6 +17,7 @@ from django.db import connection, transaction
 from duplicates.merge_helpers import alter_duplicate_suggestion_post_merge
 from people.models import PersonImage
 from results.models import ResultEvent
+from search.utils import invalidate_search_results
 
 
 class InvalidMergeError(ValueError):
@@ -84,7 +85,7 @@ class PersonMerger:
             ("delisted", "merge_person_attrs"),
             ("name_search_vector", "discard_data"),
             # Relations
-            ("versions", "merge_versions_json"),
+            ("person_versions", "merge_versions_json"),
             ("tmp_person_identifiers", "merge_person_identifiers"),
             ("image", "merge_images"),
             ("loggedaction", "merge_logged_actions"),
@@ -164,11 +165,9 @@ class PersonMerger:
             get_person_as_version_data(self.source_person),
         )
 
-        # Make sure the secondary person's version history is appended, so it
-        # isn't lost.
-        dest_person_versions = self.dest_person.versions
-        dest_person_versions += self.source_person.versions
-        self.dest_person.versions = dest_person_versions
+        # Move the secondary person's version history to the primary person,
+        # so it isn't lost.
+        self.source_person.person_versions.update(person=self.dest_person)
 
     @property
     def person_attrs_to_merge(self):
@@ -382,17 +381,20 @@ class PersonMerger:
 
     def merge_materialized_memberships(self):
         """
-        Rebuild the materialized view when merging.
+        Rebuild the materialized memberships rows for both people when merging.
 
-        This is expensive, but there's not a lot of other choices.
+        If we leave old data hanging around in there then JOIN operations
+        will fail on the missing rows.
 
-        We can't modify the view's data at all (e.g we can't UPDATE...WHERE)
-        as we do for other operations, but if we leave old data hanging
-        around in there then JOIN operations will fail on the missing rows.
+        The merge methods aren't called in any particular order, so we wait
+        until the merge has been committed before rebuilding the rows.
 
         :return:
         """
-        MaterializedMemberships.refresh_view()
+        person_ids = [self.dest_person.pk, self.source_person.pk]
+        transaction.on_commit(
+            lambda: MaterializedMemberships.refresh_rows(person_ids=person_ids)
+        )
 
     def setup_redirect(self):
         # Create a redirect from the old person to the new person:
@@ -444,4 +446,6 @@ class PersonMerger:
                 self.safe_delete(
                     self.source_person, with_logged_action=bool(self.request)
                 )
+            # The people found by a search for either name have changed
+            transaction.on_commit(invalidate_search_results)
         return self.dest_person
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.16 on 2026-10-18 17:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0048_remove_person_biography_last_updated"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PersonVersionDiff",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version_id", models.CharField(max_length=32)),
+                ("parent_version_ids", models.JSONField(default=list)),
+                ("diffs", models.JSONField(default=list)),
+                (
+                    "person",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="version_diff_cache",
+                        to="people.person",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("person", "version_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,195 @@
+# Generated by Django 5.2.16 on 2026-10-18 17:50
+
+import re
+from collections import defaultdict
+from datetime import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+# Copied from candidates.models.versions, so that this migration doesn't
+# change if that does
+def version_timestamp_key(version):
+    return datetime.strptime(version["timestamp"], "%Y-%m-%dT%H:%M:%S.%f")
+
+
+def is_a_merge(version):
+    m = re.search(r"^After merging person (\d+)", version["information_source"])
+    if m:
+        return m.group(1)
+    return None
+
+
+def get_versions_parent_map(versions_data):
+    version_id_to_parent_ids = {}
+    if not versions_data:
+        return version_id_to_parent_ids
+    canonical_person_id = versions_data[0]["data"]["id"]
+    ordered_versions = sorted(versions_data, key=version_timestamp_key)
+    person_id_to_ordered_versions = defaultdict(list)
+    # Divide all the version with the same ID into separate ordered
+    # lists, and record the parent of each version that we get from
+    # doing that:
+    for version in ordered_versions:
+        version_id = version["version_id"]
+        person_id = version["data"]["id"]
+        versions_for_person_id = person_id_to_ordered_versions[person_id]
+        if versions_for_person_id:
+            last_version_id = versions_for_person_id[-1]["version_id"]
+            version_id_to_parent_ids[version_id] = [last_version_id]
+        else:
+            version_id_to_parent_ids[version_id] = []
+        versions_for_person_id.append(version)
+    # Now go through looking for versions that represent merges. Note
+    # that it's *possible* for someone to create a new version that
+    # doesn't represent a merge but which has a information_source
+    # message that makes it look like one. We try to raise an
+    # exception if this might have happened, by checking that (a) the
+    # person ID in the message also has history in this versions array
+    # and (b) the number of unique person IDs in the versions is one
+    # more than the number of versions that look like merges. We raise
+    # an exception in either of these situations.
+    number_of_person_ids = len(person_id_to_ordered_versions.keys())
+    number_of_merges = 0
+    for version in ordered_versions:
+        version_id = version["version_id"]
+        merged_from = is_a_merge(version)
+        if merged_from is None:
+            continue
+        if merged_from not in person_id_to_ordered_versions:
+            # This can happen because for some time there was a bug
+            # where the history of the secondary person wasn't
+            # included on merging; just treat this as any other
+            # version in that case.
+            continue
+        number_of_merges += 1
+        last_version_id_of_other = person_id_to_ordered_versions[merged_from][
+            -1
+        ]["version_id"]
+        version_id_to_parent_ids[version_id].append(last_version_id_of_other)
+    if (number_of_merges + 1) != number_of_person_ids:
+        msg = (
+            "It looks like there was a bogus merge version for person "
+            "with ID {person_id}; there were {nm} merge versions and {np} "
+            "person IDs."
+        )
+        raise Exception(
+            msg.format(
+                person_id=canonical_person_id,
+                nm=number_of_merges,
+                np=number_of_person_ids,
+            )
+        )
+    return version_id_to_parent_ids
+
+
+def move_versions_to_person_version(apps, schema_editor):
+    Person = apps.get_model("people", "Person")
+    PersonVersion = apps.get_model("people", "PersonVersion")
+    people = Person.objects.exclude(versions=[]).only("pk", "versions")
+    for person in people.iterator(chunk_size=BATCH_SIZE):
+        try:
+            parent_map = get_versions_parent_map(person.versions)
+        except Exception:
+            parent_map = {}
+        PersonVersion.objects.bulk_create(
+            [
+                PersonVersion(
+                    person_id=person.pk,
+                    version_id=version["version_id"],
+                    data_id=version.get("data", {}).get("id", ""),
+                    parent_version_ids=parent_map.get(version["version_id"]),
+                    content=version,
+                )
+                # Oldest first, so that the primary keys are in version order
+                for version in reversed(person.versions)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def move_versions_to_person(apps, schema_editor):
+    Person = apps.get_model("people", "Person")
+    PersonVersion = apps.get_model("people", "PersonVersion")
+    person_ids = (
+        PersonVersion.objects.order_by()
+        .values_list("person_id", flat=True)
+        .distinct()
+    )
+    for person_id in person_ids.iterator(chunk_size=BATCH_SIZE):
+        Person.objects.filter(pk=person_id).update(
+            versions=list(
+                PersonVersion.objects.filter(person_id=person_id)
+                .order_by("-pk")
+                .values_list("content", flat=True)
+            )
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0049_personversiondiff"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PersonVersion",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version_id", models.CharField(max_length=32)),
+                (
+                    "data_id",
+                    models.CharField(
+                        help_text="The person ID in the version data. This is different to the person for versions merged in from another person",
+                        max_length=32,
+                    ),
+                ),
+                (
+                    "parent_version_ids",
+                    models.JSONField(
+                        help_text="The IDs of the versions that this version was made from, or null if they haven't been worked out",
+                        null=True,
+                    ),
+                ),
+                ("content", models.JSONField()),
+                (
+                    "person",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="person_versions",
+                        to="people.person",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["person", "version_id"],
+                        name="people_pers_person__54316b_idx",
+                    ),
+                    models.Index(
+                        fields=["person", "data_id"],
+                        name="people_pers_person__0e393e_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(
+            move_versions_to_person_version, move_versions_to_person
+        ),
+        migrations.RemoveField(
+            model_name="person",
+            name="versions",
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.16 on 2026-10-18 18:04
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0050_personversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="personversion",
+            name="changed_fields",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=200),
+                help_text="The top level fields changed since the first parent version, or null if they haven't been worked out",
+                null=True,
+                size=None,
+            ),
+        ),
+    ]
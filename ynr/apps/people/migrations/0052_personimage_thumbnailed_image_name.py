@@ -0,0 +1,21 @@
+# Generated by Django 5.2.16 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0051_personversion_changed_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="personimage",
+            name="thumbnailed_image_name",
+            field=models.CharField(
+                blank=True,
+                help_text="The image that the thumbnails in storage were made from",
+                max_length=512,
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.16 on 2026-10-18 18:24
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0052_personimage_thumbnailed_image_name"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="personimage",
+            name="perceptual_hash",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="personimage",
+            name="perceptual_hash_bands",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.SmallIntegerField(),
+                blank=True,
+                null=True,
+                size=None,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="personimage",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["perceptual_hash_bands"], name="personimage_hash_bands"
+            ),
+        ),
+    ]
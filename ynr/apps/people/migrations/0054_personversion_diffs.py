@@ -0,0 +1,47 @@
+# Generated by Django 5.2.16 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("people", "0053_personimage_perceptual_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="personversion",
+            name="diffs",
+            field=models.JSONField(
+                help_text="The raw diffs of this version against each of its parents, or null if they haven't been worked out",
+                null=True,
+            ),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE people_personversion AS version
+            SET diffs = diff.diffs,
+                parent_version_ids = COALESCE(
+                    version.parent_version_ids, diff.parent_version_ids
+                )
+            FROM people_personversiondiff AS diff
+            WHERE diff.person_id = version.person_id
+              AND diff.version_id = version.version_id
+            """,
+            """
+            INSERT INTO people_personversiondiff
+                (person_id, version_id, parent_version_ids, diffs)
+            SELECT DISTINCT ON (person_id, version_id)
+                person_id,
+                version_id,
+                COALESCE(parent_version_ids, '[]'::jsonb),
+                diffs
+            FROM people_personversion
+            WHERE diffs IS NOT NULL
+            ORDER BY person_id, version_id, id DESC
+            """,
+        ),
+        migrations.DeleteModel(
+            name="PersonVersionDiff",
+        ),
+    ]
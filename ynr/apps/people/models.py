@@ -4,11 +4,17 @@ from enum import Enum, unique
 from urllib.parse import quote_plus, urljoin
 
 from auth_helpers.views import user_in_group
-from candidates.diffs import get_version_diffs
+from candidates.diffs import (
+    get_changed_fields,
+    get_raw_version_diff,
+    get_raw_version_diffs,
+    get_version_diffs,
+)
 from candidates.models.db import ActionType, LoggedAction
 from candidates.models.popolo_extra import Ballot
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.indexes import GinIndex
 from django.contrib.postgres.search import (
     SearchQuery,
@@ -33,10 +39,10 @@ from people.managers import (
     PersonQuerySet,
 )
 from people.notifications import send_name_change_notification
+from people.thumbnails import thumbnail_url
 from popolo.models import Membership, VersionNotFound
 from slugify import slugify
 from sorl.thumbnail import delete as sorl_delete
-from sorl.thumbnail import get_thumbnail
 
 TRUSTED_TO_EDIT_NAME = "Trusted to edit person name"
 
@@ -74,9 +80,30 @@ class PersonImage(TimeStampedModel):
     md5sum = models.CharField(max_length=32, blank=True)
     user_copyright = models.CharField(max_length=128, blank=True)
     notes = models.TextField(blank=True)
+    thumbnailed_image_name = models.CharField(
+        max_length=512,
+        blank=True,
+        help_text="The image that the thumbnails in storage were made from",
+    )
+    # See people.image_hashes
+    perceptual_hash = models.BigIntegerField(null=True, blank=True)
+    perceptual_hash_bands = ArrayField(
+        models.SmallIntegerField(), null=True, blank=True
+    )
 
     objects = PersonImageManager()
 
+    # See people.thumbnails
+    thumbnail_sizes = ["x64", "x200"]
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = (
+            GinIndex(
+                fields=["perceptual_hash_bands"],
+                name="personimage_hash_bands",
+            ),
+        )
+
 
 class PersonIdentifier(TimeStampedModel):
     """
@@ -193,6 +220,15 @@ class PersonIdentifier(TimeStampedModel):
         return format_html(text, self.value)
 
 
+def versions_prefetch():
+    """
+    Prefetch people's versions in the order that `Person.versions` uses
+    """
+    return models.Prefetch(
+        "person_versions", queryset=PersonVersion.objects.order_by("-pk")
+    )
+
+
 class Person(TimeStampedModel, models.Model):
     """
     A real person, alive or dead
@@ -288,10 +324,6 @@ class Person(TimeStampedModel, models.Model):
         "popolo.Source", help_text="URLs to source documents about the person"
     )
 
-    # Former 'extra' fields
-    # This field stores JSON data with previous version information
-    # (as it did in PopIt).
-    versions = JSONField(default=list)
     not_standing = models.ManyToManyField(
         "elections.Election", related_name="persons_not_standing_tmp"
     )
@@ -396,49 +428,268 @@ class Person(TimeStampedModel, models.Model):
         ).select_related("person", "party", "post")
         return list(result)
 
+    @property
+    def versions(self):
+        """
+        All of this person's versions, most recent first.
+
+        The versions are stored as `PersonVersion` rows, and this loads all of
+        them, so query `person_versions` directly where only some are needed.
+        Lists of people should prefetch them with `versions_prefetch()`.
+        """
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "_replaced_versions" in self.__dict__:
+            versions = list(self._replaced_versions)
+        elif "person_versions" in prefetched:
+            versions = [
+                version.content for version in prefetched["person_versions"]
+            ]
+        elif self.pk:
+            versions = list(
+                self.person_versions.order_by("-pk").values_list(
+                    "content", flat=True
+                )
+            )
+        else:
+            versions = []
+        new_versions = self.__dict__.get("_new_versions", [])
+        return [version.content for version in new_versions] + versions
+
+    @versions.setter
+    def versions(self, versions):
+        """
+        Replace all of this person's versions when the person is next saved.
+
+        This is only for rewriting history, e.g. when removing data. New
+        versions should be added with `record_version`.
+        """
+        self._replaced_versions = list(versions or [])
+        self.__dict__.pop("_new_versions", None)
+        self.__dict__.pop("_latest_versions", None)
+        self.__dict__.pop("_version_diff_cache", None)
+
+    def latest_versions(self, data_ids):
+        """
+        Return a dict of the most recent version for each of `data_ids`, the
+        person IDs in the version data. These are only different to this
+        person's ID for versions that were merged in from another person.
+        """
+        pending = [
+            version.content
+            for version in self.__dict__.get("_new_versions", [])
+        ]
+        pending += self.__dict__.get("_replaced_versions", [])
+        latest = {}
+        for version in pending:
+            latest.setdefault(version.get("data", {}).get("id"), version)
+        if "_replaced_versions" not in self.__dict__:
+            # The versions this person was last saved with, and any that
+            # were prefetched, so that repeated edits don't look them up
+            for data_id, version in self.__dict__.get(
+                "_latest_versions", {}
+            ).items():
+                latest.setdefault(data_id, version)
+            prefetched = getattr(self, "_prefetched_objects_cache", {})
+            for version in prefetched.get("person_versions", []):
+                latest.setdefault(version.data_id, version.content)
+        missing = [data_id for data_id in data_ids if data_id not in latest]
+        if missing and self.pk and "_replaced_versions" not in self.__dict__:
+            stored_versions = (
+                self.person_versions.filter(data_id__in=missing)
+                .order_by("data_id", "-pk")
+                .distinct("data_id")
+            )
+            for stored_version in stored_versions:
+                latest[stored_version.data_id] = stored_version.content
+        return {
+            data_id: latest[data_id]
+            for data_id in data_ids
+            if data_id in latest
+        }
+
+    def get_versions_parent_map(self):
+        """
+        Return a dict of version ID to parent version IDs for all of this
+        person's versions, using the parents recorded with each version.
+        """
+        # Needed because of a circular import
+        from candidates.models.versions import get_versions_parent_map
+
+        if "_replaced_versions" in self.__dict__:
+            return get_versions_parent_map(self.versions)
+        parent_map = {}
+        if self.pk:
+            parent_map = dict(
+                self.person_versions.values_list(
+                    "version_id", "parent_version_ids"
+                )
+            )
+        for version in self.__dict__.get("_new_versions", []):
+            parent_map[version.version_id] = version.parent_version_ids
+        if None in parent_map.values():
+            # Some versions were stored without their parents, because they
+            # couldn't be worked out when the versions were stored.
+            return get_versions_parent_map(self.versions)
+        return parent_map
+
     def record_version(self, change_metadata, new_person=False):
         # Needed because of a circular import
-        from candidates.models.versions import get_person_as_version_data
+        from candidates.models.versions import (
+            get_person_as_version_data,
+            is_a_merge,
+        )
 
-        versions = []
-        if self.versions:
-            versions = self.versions
         new_version = change_metadata.copy()
         new_version["data"] = get_person_as_version_data(
             self, new_person=new_person
         )
-        should_insert = True
+        data_id = new_version["data"]["id"]
+        merged_from = is_a_merge(new_version)
+        data_ids = [data_id]
+        if merged_from:
+            data_ids.append(merged_from)
+        latest = {}
+        if not new_person:
+            latest = self.latest_versions(data_ids)
+
+        # Don't create empty versions, unless this is a merge
+        if (
+            not new_version["information_source"].startswith(
+                "After merging person"
+            )
+            and data_id in latest
+            and latest[data_id]["data"] == new_version["data"]
+        ):
+            return
+
+        parents = list(latest.values())
+        version = PersonVersion(
+            version_id=new_version["version_id"],
+            data_id=data_id,
+            parent_version_ids=[parent["version_id"] for parent in parents],
+            content=new_version,
+        )
+        self.add_new_version_diff(version, parents)
+        self._new_versions = [version] + self.__dict__.get("_new_versions", [])
+        self.__dict__.pop("_version_diff_cache", None)
 
-        if versions and new_version["data"] == versions[0]["data"]:
-            # Don't create empty versions
-            should_insert = False
+    def add_new_version_diff(self, version, parents):
+        """
+        Diff a version that's about to be added against its parents, so the
+        diffs are saved with it.
+        """
+        # Needed because of a circular import
+        from candidates.diffs import (
+            clean_version_data,
+            get_parents_version_data,
+        )
 
-        if new_version["information_source"].startswith("After merging person"):
-            # Always create a version if this is a merge
-            should_insert = True
+        data = clean_version_data(version.content["data"])
+        diffs = [
+            {
+                "parent_version_id": parent_version_id,
+                "parent_diff": get_raw_version_diff(
+                    clean_version_data(parent_data), data
+                ),
+            }
+            for parent_version_id, parent_data in get_parents_version_data(
+                version.parent_version_ids,
+                {parent["version_id"]: parent for parent in parents},
+            )
+        ]
+        version.diffs = diffs
+        version.changed_fields = get_changed_fields(diffs[0]["parent_diff"])
 
-        if should_insert:
-            versions.insert(0, new_version)
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        self.save_versions(adding=adding)
 
-        self.versions = versions
+    def save_versions(self, adding=False):
+        """
+        Save the versions recorded since this person was last saved, without
+        saving the person. The person must already have been saved.
+        """
+        replaced_versions = self.__dict__.pop("_replaced_versions", None)
+        new_versions = self.__dict__.pop("_new_versions", None)
+        if replaced_versions is not None or new_versions:
+            # Any prefetched versions are out of date now
+            getattr(self, "_prefetched_objects_cache", {}).pop(
+                "person_versions", None
+            )
+        if replaced_versions is not None:
+            if not adding:
+                self.person_versions.all().delete()
+            PersonVersion.objects.bulk_create(
+                PersonVersion.from_versions(self, replaced_versions)
+            )
+            self.__dict__.pop("_latest_versions", None)
+        if new_versions:
+            for version in new_versions:
+                version.person = self
+            # Oldest first, so that the primary keys are in version order
+            PersonVersion.objects.bulk_create(reversed(new_versions))
+            # Kept so that the fields changed by a version that's just been
+            # saved, and the parents of the next version, can be found
+            # without reading them back
+            self._saved_changed_fields = {
+                **self.__dict__.get("_saved_changed_fields", {}),
+                **{
+                    version.version_id: version.changed_fields
+                    for version in new_versions
+                },
+            }
+            self._latest_versions = {
+                **self.__dict__.get("_latest_versions", {}),
+                **{
+                    version.data_id: version.content
+                    for version in reversed(new_versions)
+                },
+            }
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        for attr in (
+            "_replaced_versions",
+            "_new_versions",
+            "_latest_versions",
+            "_saved_changed_fields",
+            "_version_diff_cache",
+        ):
+            self.__dict__.pop(attr, None)
 
     def version_fields(self, version_id):
-        if not self.versions:
+        """
+        The top level fields changed by a version, compared to its first
+        parent.
+
+        These are stored when the version is recorded, so this doesn't need
+        the rest of the person's history. Versions stored before that are
+        diffed against their first parent here, and the result saved.
+        """
+        for version in self.__dict__.get("_new_versions", []):
+            if version.version_id == version_id:
+                return version.changed_fields
+        saved_changed_fields = self.__dict__.get("_saved_changed_fields", {})
+        if version_id in saved_changed_fields:
+            return saved_changed_fields[version_id]
+        if not self.pk:
             return []
-        version_diffs = {
-            version["version_id"]: version["diffs"][0]["parent_diff"]
-            for version in get_version_diffs(self.versions)
-        }
-        diff = version_diffs.get(version_id)
-        if not diff:
+        version = (
+            self.person_versions.filter(version_id=version_id)
+            .order_by("-pk")
+            .first()
+        )
+        if not version:
             return []
-
-        field_list = [i["path"] for i in diff]
-        if "extra_fields/favourite_biscuits" in field_list:
-            field_list.remove("extra_fields/favourite_biscuits")
-            field_list.append("favourite_biscuits")
-
-        return list({field.split("/")[0] for field in field_list})
+        if version.changed_fields is None:
+            version.set_changed_fields(
+                parent_version_ids=self.get_versions_parent_map().get(
+                    version_id
+                )
+            )
+            version.save(update_fields=["changed_fields"])
+        return version.changed_fields
 
     def get_slug(self):
         return slugify(self.name)
@@ -635,16 +886,54 @@ class Person(TimeStampedModel, models.Model):
 
     @property
     def version_diffs(self):
-        versions = self.versions
-        if not versions:
-            versions = []
-        return get_version_diffs(versions)
+        """
+        The versions of this person with their diffs against their parents.
+
+        Diffs are stored with each `PersonVersion` when it's recorded, so
+        only versions stored before that are diffed here, and their diffs
+        saved.
+        """
+        if "_version_diff_cache" in self.__dict__:
+            return self._version_diff_cache
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        stored_versions = list(self.__dict__.get("_new_versions", []))
+        if "_replaced_versions" in self.__dict__:
+            # Versions that are being rewritten are diffed again
+            versions = self.versions
+        else:
+            if "person_versions" in prefetched:
+                stored_versions += prefetched["person_versions"]
+            elif self.pk:
+                stored_versions += self.person_versions.order_by("-pk")
+            versions = [version.content for version in stored_versions]
+        cached_diffs = {
+            version.version_id: {
+                "parent_version_ids": version.parent_version_ids,
+                "diffs": version.diffs,
+            }
+            for version in stored_versions
+            if version.diffs is not None
+        }
+        parent_map = None
+        if any(v["version_id"] not in cached_diffs for v in versions):
+            parent_map = self.get_versions_parent_map()
+        raw_diffs = get_raw_version_diffs(versions, cached_diffs, parent_map)
+        diffed_versions = []
+        for version in stored_versions:
+            if version.pk and version.diffs is None:
+                raw_diff = raw_diffs[version.version_id]
+                version.parent_version_ids = raw_diff["parent_version_ids"]
+                version.diffs = raw_diff["diffs"]
+                diffed_versions.append(version)
+        if diffed_versions:
+            PersonVersion.objects.bulk_update(
+                diffed_versions, ["parent_version_ids", "diffs"]
+            )
+        self._version_diff_cache = get_version_diffs(versions, raw_diffs)
+        return self._version_diff_cache
 
     def version_dict(self, version_id):
-        versions = self.versions or []
-        if not hasattr(self, "_version_diff_cache"):
-            self._version_diff_cache = get_version_diffs(versions)
-        for version_diff in self._version_diff_cache:
+        for version_diff in self.version_diffs:
             if version_diff["version_id"] == version_id:
                 return version_diff
         msg = "Couldn't find version {0} for person with ID {1}"
@@ -843,13 +1132,9 @@ class Person(TimeStampedModel, models.Model):
         """
         Return either the person's primary image or blank outline of a person
         """
-        if self.person_image:
-            try:
-                return get_thumbnail(self.person_image, "x64").url
-            except FileNotFoundError:
-                pass
-
-        return static("candidates/img/blank-person.png")
+        return thumbnail_url(self.person_image_model, "x64") or static(
+            "candidates/img/blank-person.png"
+        )
 
     def __str__(self):
         return self.name
@@ -933,6 +1218,115 @@ class Person(TimeStampedModel, models.Model):
         self.save()
 
 
+class PersonVersion(models.Model):
+    """
+    A version of a person, recorded each time they're edited.
+
+    Versions are only ever added, apart from when history is rewritten, e.g.
+    to remove data. `content` is the version as it was stored in the old
+    `Person.versions` array: the change metadata and the person's data.
+    """
+
+    person = models.ForeignKey(
+        Person, on_delete=models.CASCADE, related_name="person_versions"
+    )
+    version_id = models.CharField(max_length=32)
+    data_id = models.CharField(
+        max_length=32,
+        help_text="The person ID in the version data. This is different to "
+        "the person for versions merged in from another person",
+    )
+    parent_version_ids = JSONField(
+        null=True,
+        help_text="The IDs of the versions that this version was made from, "
+        "or null if they haven't been worked out",
+    )
+    content = JSONField()
+    changed_fields = ArrayField(
+        models.CharField(max_length=200),
+        null=True,
+        help_text="The top level fields changed since the first parent "
+        "version, or null if they haven't been worked out",
+    )
+    diffs = JSONField(
+        null=True,
+        help_text="The raw diffs of this version against each of its parents, "
+        "or null if they haven't been worked out",
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(fields=["person", "version_id"]),
+            models.Index(fields=["person", "data_id"]),
+        )
+
+    def __str__(self):
+        return f"{self.version_id} ({self.person_id})"
+
+    @classmethod
+    def from_versions(cls, person, versions):
+        """
+        Make unsaved `PersonVersion`s for an array of version dicts, most
+        recent first, in the order they should be created.
+        """
+        # Needed because of a circular import
+        from candidates.models.versions import get_versions_parent_map
+
+        try:
+            parent_map = get_versions_parent_map(versions)
+        except Exception:
+            # Versions with missing timestamps or bogus merges. Their parents
+            # are left to be worked out when they're asked for.
+            parent_map = {}
+        return [
+            cls(
+                person=person,
+                version_id=version["version_id"],
+                data_id=version.get("data", {}).get("id", ""),
+                parent_version_ids=parent_map.get(version["version_id"]),
+                content=version,
+            )
+            for version in reversed(versions)
+        ]
+
+    def set_changed_fields(self, parent_version_ids=None, id_to_version=None):
+        """
+        Work out `changed_fields` by diffing this version against its first
+        parent.
+
+        :param parent_version_ids: used when the stored parents are missing
+        :param id_to_version: version dicts by version ID, to save fetching
+            the parent from the database
+        """
+        # Needed because of a circular import
+        from candidates.diffs import clean_version_data
+
+        if self.parent_version_ids is not None:
+            parent_version_ids = self.parent_version_ids
+        parent_data = {}
+        if parent_version_ids:
+            parent_version_id = parent_version_ids[0]
+            if id_to_version and parent_version_id in id_to_version:
+                parent = id_to_version[parent_version_id]
+            else:
+                parent = (
+                    PersonVersion.objects.filter(
+                        person_id=self.person_id,
+                        version_id=parent_version_id,
+                    )
+                    .values_list("content", flat=True)
+                    .first()
+                )
+            if parent:
+                parent_data = parent["data"]
+        self.changed_fields = get_changed_fields(
+            get_raw_version_diff(
+                clean_version_data(parent_data),
+                clean_version_data(self.content["data"]),
+            )
+        )
+
+
 class PersonNameSynonym(models.Model):
     class Meta:
         ordering = ("-term",)
@@ -1,8 +1,15 @@
 from candidates.models import LoggedAction
 from candidates.models.db import ActionType
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from people.models import Person
+from people.models import Person, PersonImage, PersonNameSynonym
+from people.thumbnails import delete_thumbnails, queue_thumbnails
+from search.utils import (
+    invalidate_search_results,
+    search_result_cache,
+    synonym_table,
+)
 
 
 @receiver(post_delete, sender=Person)
@@ -14,3 +21,28 @@ def created_logged_action(sender, **kwargs):
     LoggedAction.objects.get_or_create(
         action_type=ActionType.PERSON_DELETE, person_pk=kwargs["instance"].pk
     )
+
+
+@receiver(post_delete, sender=Person)
+def invalidate_search_results_on_delete(sender, **kwargs):
+    transaction.on_commit(invalidate_search_results)
+
+
+@receiver([post_save, post_delete], sender=PersonNameSynonym)
+def clear_search_caches(sender, **kwargs):
+    """
+    Make sure the next search in this process picks up the change to the
+    name synonyms
+    """
+    synonym_table.clear()
+    search_result_cache.clear()
+
+
+@receiver(post_save, sender=PersonImage)
+def make_person_image_thumbnails(sender, instance, **kwargs):
+    queue_thumbnails(instance)
+
+
+@receiver(post_delete, sender=PersonImage)
+def delete_person_image_thumbnails(sender, instance, **kwargs):
+    delete_thumbnails(instance)
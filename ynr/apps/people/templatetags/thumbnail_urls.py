@@ -0,0 +1,13 @@
+from django import template
+from people.thumbnails import thumbnail_url as get_thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(instance, geometry):
+    """
+    The URL of a pre-generated thumbnail of an image model, e.g.
+    `{{ queued_image|thumbnail_url:"x100" }}`. See `people.thumbnails`.
+    """
+    return get_thumbnail_url(instance, geometry) or ""
@@ -93,6 +93,14 @@ class TestPersonViewSet(UK2015ExamplesMixin, TestCase):
         response = self.client.get(f"/api/next/people/{person_id}/versions/")
         self.assertEqual(response.json(), [])
 
+        response = self.client.get(
+            f"/api/next/people/{person_id}/versions/?page=1"
+        )
+        self.assertEqual(
+            response.json(),
+            {"count": 0, "next": None, "previous": None, "results": []},
+        )
+
     def test_person_history_view(self):
         """
         Smoke test to ensure the history view works properly
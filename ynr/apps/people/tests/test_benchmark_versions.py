@@ -0,0 +1,61 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from candidates.tests.uk_examples import UK2015ExamplesMixin
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from people.models import Person, PersonVersion
+
+
+class TestBenchmarkVersions(UK2015ExamplesMixin, TestCase):
+    def benchmark(self, *args):
+        out = StringIO()
+        call_command(
+            "people_benchmark_versions",
+            "--depth=20",
+            "--merges=2",
+            "--repeat=1",
+            *args,
+            stdout=out,
+            stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_benchmark_and_compare_to_baseline(self):
+        people_count = Person.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            baseline_path = Path(directory) / "baseline.json"
+            out = self.benchmark(f"--save-baseline={baseline_path}")
+            self.assertIn("LoggedAction.save: median", out)
+
+            baseline = json.loads(baseline_path.read_text())
+            self.assertEqual(
+                set(baseline["results"]),
+                {
+                    "get_version_diffs",
+                    "get_versions_parent_map",
+                    "Person.get_versions_parent_map",
+                    "revert_person_from_version_data",
+                    "PersonMerger.merge_versions_json",
+                    "LoggedAction.save",
+                },
+            )
+
+            out = self.benchmark(
+                f"--baseline={baseline_path}", "--tolerance=1000"
+            )
+            self.assertIn("get_version_diffs: ", out)
+
+            for result in baseline["results"].values():
+                result["median_ms"] = 0.0001
+            baseline_path.write_text(json.dumps(baseline))
+            with self.assertRaisesRegex(
+                CommandError, "Slower than the baseline"
+            ):
+                self.benchmark(f"--baseline={baseline_path}")
+
+        # Nothing is left in the database
+        self.assertEqual(Person.objects.count(), people_count)
+        self.assertFalse(PersonVersion.objects.exists())
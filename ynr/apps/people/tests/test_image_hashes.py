@@ -0,0 +1,117 @@
+from io import BytesIO, StringIO
+
+from candidates.tests.helpers import TmpMediaRootMixin
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from moderation_queue.models import QueuedImage
+from moderation_queue.tests.paths import (
+    BROKEN_IMAGE_FILENAME,
+    EXAMPLE_IMAGE_FILENAME,
+)
+from people.image_hashes import (
+    NEAR_DUPLICATE_DISTANCE,
+    hamming_distance,
+    hash_bands,
+    hash_image_bytes,
+    near_duplicates,
+)
+from people.models import PersonImage
+from people.tests.factories import PersonFactory
+from PIL import Image
+
+
+def read_example_image():
+    with open(EXAMPLE_IMAGE_FILENAME, "rb") as f:
+        return f.read()
+
+
+def reencode(image_bytes, scale, quality):
+    with Image.open(BytesIO(image_bytes)) as image:
+        image = image.convert("RGB").resize(
+            (int(image.width * scale), int(image.height * scale))
+        )
+        out = BytesIO()
+        image.save(out, "JPEG", quality=quality)
+        return out.getvalue()
+
+
+class TestImageHashes(TmpMediaRootMixin):
+    def setUp(self):
+        self.person = PersonFactory(name="Jane Doe")
+        self.image_bytes = read_example_image()
+
+    def queue_image(self, image_bytes):
+        queued_image = QueuedImage(person=self.person)
+        queued_image.image.save("upload.jpg", ContentFile(image_bytes))
+        return queued_image
+
+    def test_resized_image_is_near_duplicate(self):
+        original = hash_image_bytes(self.image_bytes)
+        resized = hash_image_bytes(reencode(self.image_bytes, 0.5, 50))
+        self.assertLessEqual(
+            hamming_distance(original, resized), NEAR_DUPLICATE_DISTANCE
+        )
+
+    def test_different_image_is_not_near_duplicate(self):
+        with Image.open(BytesIO(self.image_bytes)) as image:
+            flipped = image.transpose(Image.FLIP_LEFT_RIGHT)
+            out = BytesIO()
+            flipped.save(out, "PNG")
+        self.assertGreater(
+            hamming_distance(
+                hash_image_bytes(self.image_bytes),
+                hash_image_bytes(out.getvalue()),
+            ),
+            NEAR_DUPLICATE_DISTANCE,
+        )
+
+    def test_hash_bands(self):
+        self.assertEqual(
+            hash_bands(0), [0, 256, 512, 768, 1024, 1280, 1536, 1792]
+        )
+        self.assertEqual(hash_bands(-1)[0], 255)
+        self.assertEqual(hash_bands(-1)[7], 7 << 8 | 255)
+
+    def test_backfill_and_find_near_duplicates(self):
+        original = self.queue_image(self.image_bytes)
+        resized = self.queue_image(reencode(self.image_bytes, 0.5, 50))
+        broken = QueuedImage(person=self.person)
+        with open(BROKEN_IMAGE_FILENAME, "rb") as f:
+            broken.image.save("broken.jpg", ContentFile(f.read()))
+        person_image = PersonImage.objects.create_from_file(
+            filename=EXAMPLE_IMAGE_FILENAME,
+            defaults={"person": self.person, "source": "Example"},
+        )
+        # Hashed as it's created
+        self.assertEqual(
+            person_image.perceptual_hash, hash_image_bytes(self.image_bytes)
+        )
+
+        out = StringIO()
+        err = StringIO()
+        call_command(
+            "people_backfill_image_hashes",
+            processes=1,
+            threads=2,
+            batch_size=2,
+            stdout=out,
+            stderr=err,
+        )
+        self.assertIn("Hashed 0 person images", out.getvalue())
+        self.assertIn("Hashed 2 queued images", out.getvalue())
+        self.assertIn(broken.image.name, err.getvalue())
+
+        original.refresh_from_db()
+        duplicates = near_duplicates(
+            QueuedImage.objects.exclude(pk=original.pk),
+            original.perceptual_hash,
+        )
+        self.assertEqual([qi.pk for qi in duplicates], [resized.pk])
+        self.assertEqual(
+            list(
+                near_duplicates(
+                    PersonImage.objects.all(), original.perceptual_hash
+                ).values_list("pk", "hash_distance")
+            ),
+            [(person_image.pk, 0)],
+        )
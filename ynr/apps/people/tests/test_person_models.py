@@ -13,8 +13,9 @@ from moderation_queue.models import QueuedImage
 from moderation_queue.tests.paths import EXAMPLE_IMAGE_FILENAME
 from people.models import Person, PersonImage
 from people.tests.factories import PersonFactory
+from people.thumbnails import thumbnail_name
+from PIL import Image
 from popolo.models import Membership
-from sorl.thumbnail import get_thumbnail
 
 
 class TestPersonModels(
@@ -31,22 +32,37 @@ class TestPersonModels(
             "/static/candidates/img/blank-person.png",
         )
 
-        pi = PersonImage.objects.create_from_file(
-            filename=EXAMPLE_IMAGE_FILENAME,
-            new_filename="images/jowell-pilot.jpg",
-            defaults={
-                "person": person,
-                "source": "Taken from Wikipedia",
-                "copyright": "example-license",
-                "user_notes": "A photo of Tessa Jowell",
-            },
-        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            pi = PersonImage.objects.create_from_file(
+                filename=EXAMPLE_IMAGE_FILENAME,
+                new_filename="images/jowell-pilot.jpg",
+                defaults={
+                    "person": person,
+                    "source": "Taken from Wikipedia",
+                    "copyright": "example-license",
+                    "user_notes": "A photo of Tessa Jowell",
+                },
+            )
 
-        url = get_thumbnail(pi.image, "x64").url
         # fresh lookup of the instance is required in order to invalidate the
         # cached value of person_image
         person = Person.objects.get()
-        self.assertEqual(person.get_display_image_url(), url)
+        # The full image is used until the thumbnails have been made
+        self.assertEqual(person.get_display_image_url(), pi.image.url)
+
+        for callback in callbacks:
+            callback()
+        person = Person.objects.get()
+        thumbnail = thumbnail_name(pi.image.name, "x64")
+        self.assertEqual(
+            thumbnail,
+            f"thumbnails/images/people/{person.pk}/images/jowell-pilot/x64.jpg",
+        )
+        self.assertEqual(
+            person.get_display_image_url(), pi.image.storage.url(thumbnail)
+        )
+        with Image.open(pi.image.storage.open(thumbnail)) as image:
+            self.assertEqual(image.height, 64)
 
     def test_all_person_images_have_a_timestamp(self):
         """ensure that all person images have a timestamp"""
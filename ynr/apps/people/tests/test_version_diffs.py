@@ -1,9 +1,22 @@
 import re
+from io import StringIO
+from unittest.mock import patch
 
+import jsonpatch
 import people.tests.factories
-from candidates.diffs import get_version_diff, get_version_diffs
+from candidates.diffs import (
+    get_raw_version_diff,
+    get_version_diff,
+    get_version_diffs,
+)
+from candidates.models import LoggedAction
 from candidates.tests.uk_examples import UK2015ExamplesMixin
+from candidates.views.version_data import get_change_metadata
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from people.models import Person, PersonVersion
 
 
 def sort_operations_for_comparison(versions_with_diffs):
@@ -961,6 +974,84 @@ class TestVersionDiffs(UK2015ExamplesMixin, TestCase):
             ],
         )
 
+    def test_lists_and_moves(self):
+        from_v = {
+            "name": "Jane",
+            "candidacies": {"local.a.2019-05-02": {"party": "PP1"}},
+            "other_names": [
+                {"name": "Janey", "note": ""},
+                {"name": "J", "note": ""},
+            ],
+            "not_standing": ["parl.2017-06-08", "parl.2019-12-12"],
+        }
+        to_v = {
+            "name": "Jane",
+            "candidacies": {"local.b.2019-05-02": {"party": "PP1"}},
+            "other_names": [{"name": "Janey", "note": "Nickname"}],
+            "not_standing": ["parl.2019-12-12"],
+        }
+        self.assertEqual(
+            get_version_diff(from_v, to_v),
+            [
+                {
+                    "op": "move",
+                    "from": "/candidacies/local.a.2019-05-02",
+                    "path": "candidacies/local.b.2019-05-02",
+                },
+                {
+                    "op": "remove",
+                    "path": "not_standing/0",
+                    "previous_value": "parl.2017-06-08",
+                },
+                {
+                    "op": "remove",
+                    "path": "other_names/1",
+                    "previous_value": {"name": "J", "note": ""},
+                },
+                # Replacing an empty value is shown as adding one
+                {
+                    "op": "add",
+                    "path": "other_names/0/note",
+                    "previous_value": "",
+                    "value": "Nickname",
+                },
+            ],
+        )
+
+    def test_moves_of_equal_values_match_jsonpatch(self):
+        from_v = {
+            "name": "Jane",
+            "candidacies": {
+                f"local.{ward}.2019-05-02": {"party": "PP1"} for ward in "abc"
+            },
+        }
+        to_v = {
+            "name": "Jane",
+            "candidacies": {"local.d.2019-05-02": {"party": "PP1"}},
+        }
+        # Which of the removed candidacies jsonpatch moves depends on set
+        # order, so compare with what it does
+        expected = {
+            operation["op"]: operation
+            for operation in jsonpatch.make_patch(from_v, to_v)
+        }
+        diff = get_raw_version_diff(from_v, to_v)
+        self.assertEqual(
+            [
+                operation["from"]
+                for operation in diff
+                if operation["op"] == "move"
+            ],
+            [expected["move"]["from"]],
+        )
+        removed = [
+            "/" + operation["path"]
+            for operation in diff
+            if operation["op"] == "remove"
+        ]
+        self.assertEqual(len(removed), 2)
+        self.assertNotIn(expected["move"]["from"], removed)
+
 
 class TestSingleVersionRendering(UK2015ExamplesMixin, TestCase):
     maxDiff = None
@@ -1050,3 +1141,171 @@ class TestSingleVersionRendering(UK2015ExamplesMixin, TestCase):
             '<dd><p class="version-diff"><span class="version-op-add" style="color: #0a6b0c">Added: other_names/0/note =&gt; &quot;Maiden name&quot;</span><br/></p></dd>'
             "</dl>",
         )
+
+
+class TestVersionDiffCache(TestCase):
+    def setUp(self):
+        self.person = people.tests.factories.PersonFactory(name="Jane Doe")
+        self.person.record_version(get_change_metadata(None, "Created"))
+        self.person.save()
+        self.person.name = "Janet Doe"
+        self.person.record_version(get_change_metadata(None, "Renamed"))
+        self.person.save()
+
+    def test_diffs_cached_when_recording_versions(self):
+        first, second = reversed(self.person.versions)
+        stored = {
+            version.version_id: version
+            for version in PersonVersion.objects.filter(person=self.person)
+        }
+        self.assertEqual(
+            set(stored), {first["version_id"], second["version_id"]}
+        )
+        self.assertEqual(
+            stored[first["version_id"]].diffs[0]["parent_version_id"], None
+        )
+        self.assertEqual(
+            stored[second["version_id"]].diffs[0]["parent_version_id"],
+            first["version_id"],
+        )
+
+        person = Person.objects.get(pk=self.person.pk)
+        with patch("candidates.diffs.get_raw_version_diff") as raw_diff:
+            version_diffs = person.version_diffs
+            self.assertEqual(
+                person.version_fields(second["version_id"]), ["name"]
+            )
+        raw_diff.assert_not_called()
+        self.assertEqual(version_diffs, get_version_diffs(person.versions))
+        self.assertEqual(
+            version_diffs[0]["diffs"][0]["parent_diff"],
+            [
+                {
+                    "op": "replace",
+                    "path": "name",
+                    "previous_value": "Jane Doe",
+                    "value": "Janet Doe",
+                }
+            ],
+        )
+
+    def test_missing_diffs_cached_on_read(self):
+        self.person.person_versions.update(diffs=None)
+
+        person = Person.objects.get(pk=self.person.pk)
+        self.assertEqual(len(person.version_diffs), 2)
+        self.assertFalse(
+            person.person_versions.filter(diffs__isnull=True).exists()
+        )
+
+    def test_rewritten_versions_diffed_again(self):
+        versions = self.person.versions
+        versions[0]["data"]["name"] = "Jan Doe"
+        self.person.versions = versions
+        self.person.save()
+
+        person = Person.objects.get(pk=self.person.pk)
+        self.assertFalse(
+            person.person_versions.exclude(diffs__isnull=True).exists()
+        )
+        self.assertEqual(
+            person.version_diffs[0]["diffs"][0]["parent_diff"][0]["value"],
+            "Jan Doe",
+        )
+
+    def test_next_version_parents_not_read_back(self):
+        latest = self.person.versions[0]
+        self.person.name = "Jan Doe"
+        with CaptureQueriesContext(connection) as queries:
+            self.person.record_version(get_change_metadata(None, "Renamed"))
+        self.assertFalse(
+            [q for q in queries if "people_personversion" in q["sql"]]
+        )
+        self.assertEqual(
+            self.person.version_diffs[0]["parent_version_ids"],
+            [latest["version_id"]],
+        )
+
+
+class TestVersionChangedFields(TestCase):
+    def setUp(self):
+        self.person = people.tests.factories.PersonFactory(name="Jane Doe")
+        self.person.record_version(get_change_metadata(None, "Created"))
+        self.person.save()
+        self.person.name = "Janet Doe"
+        self.person.biography = "A biography"
+        self.person.record_version(get_change_metadata(None, "Renamed"))
+        self.person.save()
+        self.first, self.second = reversed(self.person.versions)
+
+    def test_changed_fields_stored_when_recording_versions(self):
+        changed_fields = dict(
+            self.person.person_versions.values_list(
+                "version_id", "changed_fields"
+            )
+        )
+        self.assertIn("name", changed_fields[self.first["version_id"]])
+        self.assertEqual(
+            changed_fields[self.second["version_id"]], ["biography", "name"]
+        )
+        self.assertEqual(
+            self.person.version_fields(self.second["version_id"]),
+            ["biography", "name"],
+        )
+
+        person = Person.objects.get(pk=self.person.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                person.version_fields(self.second["version_id"]),
+                ["biography", "name"],
+            )
+        self.assertEqual(person.version_fields("not-a-version"), [])
+
+    def test_changed_fields_worked_out_on_read(self):
+        self.person.person_versions.update(changed_fields=None)
+        person = Person.objects.get(pk=self.person.pk)
+        self.assertEqual(
+            person.version_fields(self.second["version_id"]),
+            ["biography", "name"],
+        )
+        self.assertEqual(
+            person.person_versions.get(
+                version_id=self.second["version_id"]
+            ).changed_fields,
+            ["biography", "name"],
+        )
+
+    def test_backfill_command(self):
+        expected = dict(
+            self.person.person_versions.values_list(
+                "version_id", "changed_fields"
+            )
+        )
+        self.person.person_versions.update(changed_fields=None)
+        self.person.person_versions.filter(
+            version_id=self.second["version_id"]
+        ).update(parent_version_ids=None)
+        LoggedAction.objects.create(
+            person=self.person,
+            popit_person_new_version=self.second["version_id"],
+        )
+
+        out = StringIO()
+        call_command(
+            "people_backfill_version_changed_fields",
+            update_logged_actions=True,
+            stdout=out,
+        )
+
+        self.assertEqual(
+            dict(
+                self.person.person_versions.values_list(
+                    "version_id", "changed_fields"
+                )
+            ),
+            expected,
+        )
+        self.assertEqual(
+            LoggedAction.objects.get().version_fields, ["biography", "name"]
+        )
+        self.assertIn("Set the changed fields of 2 versions", out.getvalue())
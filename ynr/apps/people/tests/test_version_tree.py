@@ -1,5 +1,9 @@
 from candidates.models.versions import get_versions_parent_map
+from candidates.views.version_data import get_change_metadata
 from django.test import TestCase
+from people.merging import PersonMerger
+from people.models import Person, versions_prefetch
+from people.tests.factories import PersonFactory
 
 
 class TestVersionTree(TestCase):
@@ -264,3 +268,92 @@ class TestVersionTree(TestCase):
             r"with ID 2009; there were 2 merge versions and 2 person IDs.",
         ):
             get_versions_parent_map(versions)
+
+
+class TestPersonVersions(TestCase):
+    def record_version(self, person, source):
+        person.record_version(get_change_metadata(None, source))
+        person.save()
+        return person.person_versions.latest("pk")
+
+    def test_parents_recorded_with_versions(self):
+        person = PersonFactory(name="Jane Doe")
+        first = self.record_version(person, "Created")
+        person.name = "Janet Doe"
+        second = self.record_version(person, "Renamed")
+
+        self.assertEqual(first.parent_version_ids, [])
+        self.assertEqual(second.parent_version_ids, [first.version_id])
+        self.assertEqual(second.data_id, str(person.pk))
+        self.assertEqual(
+            [v["version_id"] for v in person.versions],
+            [second.version_id, first.version_id],
+        )
+        self.assertEqual(
+            person.get_versions_parent_map(),
+            get_versions_parent_map(person.versions),
+        )
+
+    def test_versions_read_from_prefetch(self):
+        person = PersonFactory(name="Jane Doe")
+        self.record_version(person, "Created")
+        person.name = "Janet Doe"
+        self.record_version(person, "Renamed")
+
+        person = Person.objects.prefetch_related(versions_prefetch()).get(
+            pk=person.pk
+        )
+        with self.assertNumQueries(0):
+            versions = person.versions
+        self.assertEqual(
+            [v["information_source"] for v in versions],
+            ["Renamed", "Created"],
+        )
+
+    def test_unchanged_version_not_recorded(self):
+        person = PersonFactory(name="Jane Doe")
+        self.record_version(person, "Created")
+        self.record_version(person, "Nothing changed")
+        self.assertEqual(person.person_versions.count(), 1)
+
+    def test_merge_moves_versions(self):
+        dest = PersonFactory(name="Jane Doe")
+        source = PersonFactory(name="Janet Doe")
+        dest_version = self.record_version(dest, "Created")
+        source_version = self.record_version(source, "Created again")
+        source_pk = source.pk
+
+        PersonMerger(dest, source).merge()
+
+        merge_version = dest.person_versions.latest("pk")
+        self.assertEqual(
+            merge_version.content["information_source"],
+            f"After merging person {source_pk}",
+        )
+        self.assertEqual(
+            merge_version.parent_version_ids,
+            [dest_version.version_id, source_version.version_id],
+        )
+        self.assertEqual(dest.person_versions.count(), 3)
+        self.assertEqual(
+            dest.get_versions_parent_map(),
+            get_versions_parent_map(dest.versions),
+        )
+
+    def test_replaced_versions_without_timestamps(self):
+        person = PersonFactory(
+            versions=[
+                {"version_id": "b", "data": {"id": "1"}},
+                {"version_id": "a", "data": {"id": "1"}},
+            ]
+        )
+        self.assertEqual(
+            list(
+                person.person_versions.order_by("pk").values_list(
+                    "version_id", "parent_version_ids"
+                )
+            ),
+            [("a", None), ("b", None)],
+        )
+        with self.assertRaises(KeyError):
+            person.get_versions_parent_map()
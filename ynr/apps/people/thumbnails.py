@@ -0,0 +1,157 @@
+"""
+Thumbnails of uploaded images, made when the image is saved rather than by
+sorl-thumbnail the first time they're shown.
+
+Models opt in by setting `thumbnail_sizes` to a list of sorl-style
+geometries, e.g. `["x64", "200x200"]`, and having an `image` field and a
+`thumbnailed_image_name` field. The thumbnails are saved to storage with
+names worked out from the image's name:
+
+    thumbnails/images/people/1234/photo/x64.jpg
+
+and `thumbnailed_image_name` is set to the name of the image they were made
+from. That means that `thumbnail_url` can give the URL of a thumbnail
+without looking at storage, the cache or sorl-thumbnail's key value store.
+"""
+
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django_q.tasks import async_task
+from PIL import Image, ImageOps
+
+THUMBNAIL_QUALITY = 85
+
+
+def thumbnail_models():
+    return [
+        model
+        for model in apps.get_models()
+        if getattr(model, "thumbnail_sizes", None)
+    ]
+
+
+def parse_geometry(geometry):
+    """
+    Return the width and height in a geometry like "100x200", "x64" or
+    "300", with None for a missing dimension
+    """
+    width, _, height = geometry.partition("x")
+    return (int(width) if width else None, int(height) if height else None)
+
+
+def thumbnail_name(image_name, geometry):
+    root = posixpath.splitext(image_name)[0]
+    return f"thumbnails/{root}/{geometry}.jpg"
+
+
+def resize(image, geometry):
+    """
+    Scale an image to fit the geometry, keeping its aspect ratio. Like
+    sorl-thumbnail, small images are scaled up.
+    """
+    width, height = parse_geometry(geometry)
+    scales = []
+    if width:
+        scales.append(width / image.width)
+    if height:
+        scales.append(height / image.height)
+    scale = min(scales)
+    return image.resize(
+        (
+            max(1, round(image.width * scale)),
+            max(1, round(image.height * scale)),
+        ),
+        Image.LANCZOS,
+    )
+
+
+def generate_thumbnails(instance):
+    """
+    Render and save a thumbnail of `instance.image` for each of the model's
+    `thumbnail_sizes`, replacing any that were there already
+    """
+    storage = instance.image.storage
+    with storage.open(instance.image.name) as f:
+        image = Image.open(BytesIO(f.read()))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    for geometry in instance.thumbnail_sizes:
+        buffer = BytesIO()
+        resize(image, geometry).save(
+            buffer, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True
+        )
+        name = thumbnail_name(instance.image.name, geometry)
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_thumbnails(instance):
+    """
+    Delete the thumbnails of `instance.image` from storage, if there are any
+    """
+    if instance.thumbnailed_image_name != instance.image.name:
+        return
+    storage = instance.image.storage
+    for geometry in instance.thumbnail_sizes:
+        storage.delete(thumbnail_name(instance.image.name, geometry))
+
+
+def generate_thumbnails_for(model_label, pk):
+    """
+    The django-q task that makes the thumbnails for a saved image. It does
+    nothing if the image has been deleted or replaced since it was queued.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if not instance or not instance.image:
+        return
+    image_name = instance.image.name
+    if instance.thumbnailed_image_name == image_name:
+        return
+    generate_thumbnails(instance)
+    model.objects.filter(pk=pk, image=image_name).update(
+        thumbnailed_image_name=image_name
+    )
+
+
+def queue_thumbnails(instance):
+    """
+    Make the thumbnails of an image once it's been committed, unless they've
+    already been made for this version of the image
+    """
+    if not instance.image:
+        return
+    if instance.thumbnailed_image_name == instance.image.name:
+        return
+    model_label = instance._meta.label
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: async_task(
+            "people.thumbnails.generate_thumbnails_for", model_label, pk
+        )
+    )
+
+
+def thumbnail_url(instance, geometry):
+    """
+    Return the URL of a pre-generated thumbnail of `instance.image`, or of
+    the image itself if its thumbnails haven't been made yet.
+
+    Returns None if there's no image.
+    """
+    if not instance or not instance.image:
+        return None
+    if geometry not in instance.thumbnail_sizes:
+        raise ValueError(
+            f"{geometry} isn't one of the thumbnail sizes of "
+            f"{instance._meta.label}"
+        )
+    if instance.thumbnailed_image_name != instance.image.name:
+        return instance.image.url
+    return instance.image.storage.url(
+        thumbnail_name(instance.image.name, geometry)
+    )
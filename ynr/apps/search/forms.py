@@ -1,6 +1,6 @@
 from django.forms import forms
 from django.utils.html import escape
-from search.utils import search_person_by_name
+from search.utils import cached_search_person_by_name
 
 
 class PersonSearchForm(forms.Form):
@@ -8,4 +8,4 @@ class PersonSearchForm(forms.Form):
         return escape(self.cleaned_data["q"])
 
     def search(self):
-        return search_person_by_name(self.cleaned_data["q"])[:10]
+        return cached_search_person_by_name(self.cleaned_data["q"])[:10]
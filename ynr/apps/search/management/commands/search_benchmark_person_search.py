@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from people.models import Person
+from search.utils import search_person_by_name
+
+
+def add_typo(name, rng):
+    """
+    Swap two neighbouring letters in each word of the name that's long
+    enough for it to still be recognisable
+    """
+    words = []
+    for word in name.split():
+        if len(word) > 3:
+            i = rng.randrange(1, len(word) - 2)
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+        words.append(word)
+    return " ".join(words)
+
+
+class Command(BaseCommand):
+    help = """
+    Time searches for the names of a random sample of people, with a typo
+    added to each name, and report the latency percentiles and how often the
+    person was in the first page of results.
+
+    This should be run against a copy of the full people table.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=200,
+            help="How many people to search for",
+        )
+        parser.add_argument(
+            "--no-fuzzy",
+            action="store_false",
+            dest="fuzzy",
+            help="Use the full text search without trigram matching",
+        )
+        parser.add_argument(
+            "--no-typos",
+            action="store_false",
+            dest="typos",
+            help="Search for the names as they are",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        people = list(
+            Person.objects.order_by("?").values_list("pk", "name")[
+                : options["samples"]
+            ]
+        )
+        timings = []
+        found = 0
+        for pk, name in people:
+            if options["typos"]:
+                name = add_typo(name, rng)
+            start = time.perf_counter()
+            results = list(
+                search_person_by_name(
+                    name, synonym=True, fuzzy=options["fuzzy"]
+                ).values_list("pk", flat=True)[:10]
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+            if pk in results:
+                found += 1
+
+        if len(timings) < 2:
+            self.stderr.write("Not enough people to benchmark")
+            return
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            "{} searches: p50 {:.1f}ms, p95 {:.1f}ms, max {:.1f}ms".format(
+                len(timings), percentiles[49], percentiles[94], max(timings)
+            )
+        )
+        self.stdout.write(
+            "Found in the first 10 results: {}/{}".format(found, len(timings))
+        )
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Trigram indexes on people's names and other names for fuzzy searches.
+
+    These are made here rather than on the models because the test database
+    is built from the models, and doesn't have `pg_trgm` installed.
+    """
+
+    dependencies = [
+        ("search", "0001_initial"),
+        ("people", "0048_remove_person_biography_last_updated"),
+        ("popolo", "0054_membership_sopn_names"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE INDEX IF NOT EXISTS people_person_name_trgm_idx
+            ON people_person USING gin (lower(name) gin_trgm_ops);
+            CREATE INDEX IF NOT EXISTS popolo_othername_name_trgm_idx
+            ON popolo_othername USING gin (lower(name) gin_trgm_ops);
+            """,
+            """
+            DROP INDEX IF EXISTS people_person_name_trgm_idx;
+            DROP INDEX IF EXISTS popolo_othername_name_trgm_idx;
+            """,
+        )
+    ]
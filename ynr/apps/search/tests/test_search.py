@@ -2,10 +2,22 @@ import re
 
 from candidates.tests.auth import TestUserMixin
 from candidates.tests.uk_examples import UK2015ExamplesMixin
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django_webtest import WebTest
 from people.models import Person, PersonNameSynonym
 from people.tests.factories import PersonFactory
-from search.utils import search_person_by_name
+from search.utils import (
+    SEARCH_RESULTS_VERSION_CACHE_KEY,
+    build_search_query,
+    cached_search_person_by_name,
+    search_person_by_name,
+    search_result_cache,
+    similarity_threshold,
+    synonym_table,
+)
 
 
 class TestSearchView(TestUserMixin, UK2015ExamplesMixin, WebTest):
@@ -151,3 +163,157 @@ class TestSearchView(TestUserMixin, UK2015ExamplesMixin, WebTest):
         qs = search_person_by_name(name=person.name)
         self.assertEqual(qs.count(), 1)
         self.assertEqual(qs.first().name, person.name)
+
+
+class TestSearchCaches(TestCase):
+    def setUp(self):
+        Person.objects.update_name_search_trigger()
+        synonym_table.clear()
+        search_result_cache.clear()
+
+    def test_synonyms_without_ts_rewrite(self):
+        PersonFactory(name="Bertram Wilberforce Wooster")
+        PersonNameSynonym.objects.create(term="bertie", synonym="Bertram")
+        self.assertEqual(
+            build_search_query("Bertie W", synonym=True),
+            "((( 'bertie' ) | ( 'Bertram' )) & (w)) | "
+            "((( 'bertie' ) | ( 'Bertram' )) | (w))",
+        )
+        with CaptureQueriesContext(connection) as queries:
+            qs = search_person_by_name("Bertie", synonym=True)
+            self.assertEqual(qs.get().name, "Bertram Wilberforce Wooster")
+        self.assertFalse(any("ts_rewrite" in query["sql"] for query in queries))
+        self.assertFalse(search_person_by_name("Bertie").exists())
+
+    def test_multiple_word_synonym_terms_use_ts_rewrite(self):
+        PersonFactory(name="Bertram Wilberforce Wooster")
+        PersonNameSynonym.objects.create(
+            term="bertie & wooster", synonym="Bertram"
+        )
+        self.assertTrue(
+            search_person_by_name("Bertie Wooster", synonym=True).exists()
+        )
+
+    @override_settings(SEARCH_CACHE_TTL=60)
+    def test_search_results_cached(self):
+        person = PersonFactory(name="Henry Jekyll")
+        PersonFactory(name="Henry Higgins")
+        with self.assertNumQueries(1):
+            results = cached_search_person_by_name("Henry Jekyll")
+        self.assertEqual(
+            [p.name for p in results], ["Henry Jekyll", "Henry Higgins"]
+        )
+        self.assertEqual(len(search_result_cache.entries), 1)
+
+        with self.assertNumQueries(0):
+            cached = cached_search_person_by_name("  henry JEKYLL")
+            self.assertEqual(
+                [
+                    (p.pk, p.rank, p.party_name, p.membership_count)
+                    for p in cached
+                ],
+                [
+                    (p.pk, p.rank, p.party_name, p.membership_count)
+                    for p in results
+                ],
+            )
+
+        # Saving a synonym clears the cache
+        PersonNameSynonym.objects.create(term="harry", synonym="henry")
+        self.assertEqual(len(search_result_cache.entries), 0)
+        self.assertEqual(
+            cached_search_person_by_name("Harry Jekyll", synonym=True)[0],
+            person,
+        )
+
+    @override_settings(
+        SEARCH_CACHE_TTL=60,
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+            }
+        },
+    )
+    def test_deleted_people_clear_cached_results(self):
+        PersonFactory(name="Henry Higgins")
+        person = PersonFactory(name="Henry Jekyll")
+        self.assertEqual(len(cached_search_person_by_name("Henry Jekyll")), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            person.delete()
+        self.assertEqual(len(cached_search_person_by_name("Henry Jekyll")), 1)
+
+    @override_settings(
+        SEARCH_CACHE_TTL=60,
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+            }
+        },
+    )
+    def test_shared_version_checked_once_per_ttl(self):
+        PersonFactory(name="Henry Jekyll")
+        cached_search_person_by_name("Henry Jekyll")
+        # As if another process had deleted someone
+        cache.set(SEARCH_RESULTS_VERSION_CACHE_KEY, "another-version")
+        with self.assertNumQueries(0):
+            cached_search_person_by_name("Henry Jekyll")
+
+        search_result_cache.version_checked_at -= 60
+        with self.assertNumQueries(1):
+            cached_search_person_by_name("Henry Jekyll")
+        self.assertEqual(search_result_cache.version, "another-version")
+
+    def test_search_page_uses_cached_results(self):
+        PersonFactory(name="Henry Jekyll")
+        with override_settings(SEARCH_CACHE_TTL=60):
+            self.client.get("/search?q=Henry")
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/search?q=Henry")
+        self.assertFalse(
+            any("name_search_vector" in query["sql"] for query in queries)
+        )
+
+
+class TestFuzzySearch(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        Person.objects.update_name_search_trigger()
+        search_result_cache.clear()
+
+    def test_typos(self):
+        person = PersonFactory(name="John Smith")
+        PersonFactory(name="Jane Doe")
+        self.assertFalse(search_person_by_name("Jonh Smiht").exists())
+        self.assertEqual(
+            list(search_person_by_name("Jonh Smiht", fuzzy=True)), [person]
+        )
+
+    def test_other_names(self):
+        person = PersonFactory(name="Henry Jekyll")
+        person.other_names.create(name="Edward Hyde")
+        self.assertEqual(
+            list(search_person_by_name("Edwrad Hyde", fuzzy=True)), [person]
+        )
+
+    def test_exact_matches_ranked_first(self):
+        PersonFactory(name="John Smyth")
+        person = PersonFactory(name="John Smith")
+        results = list(search_person_by_name("John Smith", fuzzy=True))
+        self.assertEqual(results[0], person)
+        self.assertEqual(len(results), 2)
+
+    def test_similarity_threshold_is_put_back(self):
+        def current_threshold():
+            with connection.cursor() as cursor:
+                cursor.execute("SHOW pg_trgm.similarity_threshold")
+                return cursor.fetchone()[0]
+
+        with connection.cursor() as cursor:
+            cursor.execute("SET pg_trgm.similarity_threshold = 0.3")
+        with similarity_threshold(0.2):
+            self.assertEqual(current_threshold(), "0.2")
+        self.assertEqual(current_threshold(), "0.3")
+        search_person_by_name("Jonh Smiht", fuzzy=True).exists()
+        self.assertEqual(current_threshold(), "0.3")
@@ -1,28 +1,183 @@
 import re
+import time
 import unicodedata
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Union
 
-from django.contrib.postgres.search import SearchQuery, SearchRank
-from django.db import connection
-from django.db.models import Count, F, OuterRef, Subquery
-from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (
+    Count,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Lower
 from people.managers import PersonQuerySet
-from people.models import Person
-from popolo.models import Membership
+from people.models import Person, PersonNameSynonym
+from popolo.models import Membership, OtherName
 
+# Searches with more results than this aren't cached
+SEARCH_CACHE_MAX_RESULTS = 200
+SEARCH_CACHE_MAX_ENTRIES = 1024
+SEARCH_RESULTS_VERSION_CACHE_KEY = "search:results_version"
 
-def search_person_by_name(name: str, synonym: bool = False) -> PersonQuerySet:
+# The `pg_trgm.similarity_threshold` for fuzzy searches. This is lower than
+# the default of 0.3 so that a name with a typo in each word, e.g.
+# "jonh smiht", still matches
+FUZZY_SIMILARITY_THRESHOLD = 0.2
+
+# How much of the rank of a fuzzy search comes from the trigram similarity,
+# with the rest coming from the full text search rank
+FUZZY_SIMILARITY_WEIGHT = 0.5
+
+# A synonym term that's a single lexeme, and so can be matched against the
+# words of a search without asking Postgres
+SIMPLE_SYNONYM_TERM_RE = re.compile(r"^'([a-z]+)'$")
+
+
+class SynonymTable:
     """
-    Take a string and turn it into a Django query that uses PostgresSQLs full
-    text search.
+    An in-process copy of the `PersonNameSynonym` table, used to add name
+    synonyms to a search without a `ts_rewrite` round trip.
 
-    This function manages query parsing, and prevents the user passing in
-    search logic.
+    It's reloaded after `SEARCH_CACHE_TTL` seconds, and straight away when a
+    synonym is saved or deleted in this process.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.loaded_at = None
+        self.synonyms: Dict[str, List[str]] = {}
+        self.needs_ts_rewrite = False
+
+    def load(self):
+        synonyms = defaultdict(list)
+        needs_ts_rewrite = False
+        for term, synonym in PersonNameSynonym.objects.values_list(
+            "term", "synonym"
+        ):
+            match = SIMPLE_SYNONYM_TERM_RE.match(term)
+            if match:
+                synonyms[match.group(1)].append(synonym)
+            else:
+                needs_ts_rewrite = True
+        self.synonyms = dict(synonyms)
+        self.needs_ts_rewrite = needs_ts_rewrite
+        self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at >= settings.SEARCH_CACHE_TTL
+        ):
+            self.load()
+
+    def expand(self, word: str) -> str:
+        """
+        Return the tsquery text for a single word of a search, including any
+        synonyms for it.
+        """
+        if word not in self.synonyms:
+            return word
+        return " | ".join(
+            f"( {synonym} )" for synonym in [f"'{word}'"] + self.synonyms[word]
+        )
+
+
+synonym_table = SynonymTable()
+
+
+class SearchResultCache:
+    """
+    A least recently used cache of the people found by a search, annotated
+    for display, with entries expiring after `SEARCH_CACHE_TTL` seconds.
+
+    This is per process, so an edited or new person can take up to the TTL
+    to appear in the results of a search that's been made recently. When a
+    person is merged or deleted, `invalidate` is called, and each process
+    drops its entries the next time it checks, which it does at most once
+    every `SEARCH_CACHE_TTL` seconds.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.version = None
+        self.version_checked_at = None
+
+    def clear(self):
+        self.entries.clear()
+
+    def check_version(self):
+        now = time.monotonic()
+        if (
+            self.version_checked_at is not None
+            and now - self.version_checked_at < settings.SEARCH_CACHE_TTL
+        ):
+            return
+        self.version_checked_at = now
+        version = cache.get(SEARCH_RESULTS_VERSION_CACHE_KEY)
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def get(self, key: str) -> Optional[List[Person]]:
+        if not settings.SEARCH_CACHE_TTL:
+            return None
+        self.check_version()
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, results = entry
+        if time.monotonic() >= expires:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return results
+
+    def set(self, key: str, results: List[Person]):
+        ttl = settings.SEARCH_CACHE_TTL
+        if not ttl:
+            return
+        self.entries[key] = (time.monotonic() + ttl, results)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
 
-    The complexity arises because we use a synonyms table for common name
-    synonyms. This is done using PostgresSQLs built in `ts_rewrite`, however
-    see the comment in line about a workaround for a performance bug.
+    def invalidate(self):
+        self.version = uuid.uuid4().hex
+        self.version_checked_at = time.monotonic()
+        cache.set(SEARCH_RESULTS_VERSION_CACHE_KEY, self.version, None)
+        self.clear()
 
+
+search_result_cache = SearchResultCache()
+
+
+def invalidate_search_results():
+    """
+    Make every process drop its cached search results. Call this after
+    people have been merged or deleted.
     """
+    search_result_cache.invalidate()
+
+
+def normalise_search_words(name: str) -> List[str]:
     name = (
         unicodedata.normalize("NFKD", name)
         .encode("ascii", "ignore")
@@ -30,49 +185,68 @@ def search_person_by_name(name: str, synonym: bool = False) -> PersonQuerySet:
     )
     name = name.lower()
     name = re.sub(r"[^a-z ]", " ", name)
-    name = " ".join(name.strip().split())
-    if not name:
-        return Person.objects.none()
-    and_name = " & ".join(name.split(" "))
-    or_name = " | ".join(name.split(" "))
-    name = f"({and_name}) | ({or_name})"
-    name = name.strip()
+    return name.split()
+
+
+def ts_rewrite_synonyms(name: str) -> str:
+    """
+    Add synonyms to a raw search query using PostgresSQLs `ts_rewrite`.
+
+    We do this as a separate query because of a bug in Postgres and
+    `ts_rewrite`. In theory we can use `ts_rewrite` in line, however this
+    causes the search query to take almost 10 seconds on the full database.
+    Doing the rewrite to add synonnyms first and then passing that query in
+    to the actual search speeds this up, with the final search taking less
+    than 30ms
+
+    This is only needed for synonym terms that are more than a single word.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT ts_rewrite(
+            to_tsquery('simple'::regconfig, %s),
+            'SELECT term, synonym
+            FROM people_personnamesynonym
+            WHERE to_tsquery(''simple''::regconfig, '%s') @> term'
+        );
+        """,
+            (name, name),
+        )
+        return cursor.fetchone()[0]
+
+
+def build_search_query(name: str, synonym: bool = False) -> str:
+    """
+    Turn a name into a raw tsquery string that matches all of the words in
+    it, or any of them.
+
+    If `synonym` is True, each word is ORed with its synonyms from
+    `PersonNameSynonym`. For example with:
+    ```
+    PersonNameSynonym.objects.create(term="sam", synonym="samantha")
+    ```
+    the search for "sam" would be transformed in to "('sam' | 'samantha')"
+    """
+    words = normalise_search_words(name)
+    if not words:
+        return ""
 
     if synonym:
-        # First perform a query that builts the final query
-        # We do this because of a bug in Postgres and `ts_rewrite`.
-        # In theory we can use `ts_rewrite` in line, however this causes the
-        # search query to take almost 10 seconds on the full database.
-        # Doing the rewrite to add synonnyms first and then passing that query
-        # in to the actual search speeds this up, with the final search taking
-        # less than 30ms
-        with connection.cursor() as cursor:
-            # This query takes the search terms and returns a query string
-            # with name synonyms attached.
-            # For example with:
-            # ```
-            # PersonNameSynonym.objects.create(term="sam", synonym="samantha")
-            # ```
-            # The search for "sam" would be transformed in to "(sam | samantha)"
-            # with `|` acting as an OR operator
-            cursor.execute(
-                """
-            SELECT ts_rewrite(
-                to_tsquery('simple'::regconfig, %s),
-                'SELECT term, synonym
-                FROM people_personnamesynonym
-                WHERE to_tsquery(''simple''::regconfig, '%s') @> term'
-            );
-            """,
-                (name, name),
-            )
-            row = cursor.fetchone()
+        synonym_table.ensure_loaded()
+        if not synonym_table.needs_ts_rewrite:
+            words = [f"({synonym_table.expand(word)})" for word in words]
+
+    and_name = " & ".join(words)
+    or_name = " | ".join(words)
+    query = f"({and_name}) | ({or_name})"
+
+    if synonym and synonym_table.needs_ts_rewrite:
+        query = ts_rewrite_synonyms(query)
+    return query
 
-        query = SearchQuery(row[0], search_type="raw", config="simple")
-    else:
-        query = SearchQuery(name, search_type="raw", config="simple")
 
-    # Build the query
+def annotate_search_results(queryset) -> PersonQuerySet:
     membership_subquery = Subquery(
         Membership.objects.filter(person=OuterRef("id"))
         .annotate(
@@ -85,19 +259,174 @@ def search_person_by_name(name: str, synonym: bool = False) -> PersonQuerySet:
         .values("populated_party_name")[:1]
     )
     return (
-        Person.objects.annotate(membership_count=Count("memberships"))
-        .filter(name_search_vector=query)
+        queryset.annotate(membership_count=Count("memberships"))
         .annotate(vector=F("name_search_vector"))
         .annotate(party_name=membership_subquery)
+        .select_related("image")
+        .order_by("-rank", "membership_count")
+        .defer("biography")
+    )
+
+
+@contextmanager
+def similarity_threshold(threshold: float = FUZZY_SIMILARITY_THRESHOLD):
+    """
+    Set `pg_trgm.similarity_threshold` for the queries run inside the block.
+
+    The setting is local to a transaction, and put back at the end of the
+    block, so it doesn't change other queries made on the same connection.
+    Querysets have to be evaluated inside the block to use it.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # None if pg_trgm hasn't been used on this connection yet
+        cursor.execute(
+            "SELECT current_setting('pg_trgm.similarity_threshold', true)"
+        )
+        previous = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+            (str(threshold),),
+        )
+        yield
+        if previous is not None:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+                (previous,),
+            )
+
+
+def trigram_similar_person_ids(name: str) -> Set[int]:
+    """
+    The IDs of people whose name or other names are similar to `name`, using
+    the `pg_trgm` indexes added in `search.0002_name_trigram_indexes`.
+    """
+    person_content_type = ContentType.objects.get_for_model(Person)
+    with similarity_threshold():
+        person_ids = set(
+            Person.objects.annotate(lower_name=Lower("name"))
+            .filter(lower_name__trigram_similar=name)
+            .values_list("pk", flat=True)
+        )
+        person_ids.update(
+            OtherName.objects.annotate(lower_name=Lower("name"))
+            .filter(
+                content_type=person_content_type,
+                lower_name__trigram_similar=name,
+            )
+            .values_list("object_id", flat=True)
+        )
+    return person_ids
+
+
+def ranked_search(query_string: str) -> PersonQuerySet:
+    query = SearchQuery(query_string, search_type="raw", config="simple")
+    return Person.objects.filter(name_search_vector=query).annotate(
+        rank=SearchRank(
+            F("name_search_vector"),
+            query,
+            cover_density=True,
+            weights=[0.1, 0.3, 0.4, 1.0],
+        )
+    )
+
+
+def fuzzy_ranked_search(query_string: str, name: str) -> PersonQuerySet:
+    """
+    Find people whose name or other names are similar to `name`, as well as
+    those matching the full text search, ranking them by a blend of the
+    trigram similarity and the full text search rank.
+
+    The candidates are the people matching the full text search, and those
+    with similar names, found first so that the trigram indexes can be used
+    with our own similarity threshold.
+    """
+    query = SearchQuery(query_string, search_type="raw", config="simple")
+    person_content_type = ContentType.objects.get_for_model(Person)
+    other_names = (
+        OtherName.objects.annotate(lower_name=Lower("name"))
+        .filter(content_type=person_content_type)
+        .order_by()
+    )
+    candidates = Q(name_search_vector=query) | Q(
+        pk__in=trigram_similar_person_ids(name)
+    )
+    other_name_similarity = Subquery(
+        other_names.filter(object_id=OuterRef("pk"))
+        .annotate(similarity=TrigramSimilarity("lower_name", name))
+        .values("object_id")
+        .annotate(max_similarity=Max("similarity"))
+        .values("max_similarity")
+    )
+    return (
+        Person.objects.filter(candidates)
         .annotate(
-            rank=SearchRank(
-                F("vector"),
-                query,
-                cover_density=True,
-                weights=[0.1, 0.3, 0.4, 1.0],
+            similarity=Greatest(
+                TrigramSimilarity(Lower("name"), name),
+                Coalesce(other_name_similarity, 0.0),
+            )
+        )
+        .annotate(
+            rank=(
+                Value(1 - FUZZY_SIMILARITY_WEIGHT)
+                * SearchRank(
+                    F("name_search_vector"),
+                    query,
+                    cover_density=True,
+                    weights=[0.1, 0.3, 0.4, 1.0],
+                )
+                + Value(FUZZY_SIMILARITY_WEIGHT) * F("similarity")
             )
         )
-        .select_related("image")
-        .order_by("-rank", "membership_count")
-        .defer("biography", "versions")
     )
+
+
+def search_person_by_name(
+    name: str, synonym: bool = False, fuzzy: bool = False
+) -> PersonQuerySet:
+    """
+    Take a string and turn it into a Django query that uses PostgresSQLs full
+    text search.
+
+    This function manages query parsing, and prevents the user passing in
+    search logic.
+
+    If `fuzzy` is True, people with names that are similar to the search are
+    included too, so that typos in either don't stop a match.
+
+    """
+    query_string = build_search_query(name, synonym=synonym)
+    if not query_string:
+        return Person.objects.none()
+    if fuzzy:
+        fuzzy_name = " ".join(normalise_search_words(name))
+        queryset = fuzzy_ranked_search(query_string, fuzzy_name)
+    else:
+        queryset = ranked_search(query_string)
+    return annotate_search_results(queryset)
+
+
+def cached_search_person_by_name(
+    name: str, synonym: bool = False
+) -> Union[List[Person], PersonQuerySet]:
+    """
+    Like `search_person_by_name`, for showing the results of a search.
+
+    The people found by searches with up to `SEARCH_CACHE_MAX_RESULTS`
+    results are cached with their annotations, so a repeated search doesn't
+    query the database at all. Other searches return the queryset, to be
+    paginated by the database.
+    """
+    query_string = build_search_query(name, synonym=synonym)
+    if not query_string:
+        return []
+
+    results = search_result_cache.get(query_string)
+    if results is not None:
+        return list(results)
+
+    queryset = annotate_search_results(ranked_search(query_string))
+    results = list(queryset[: SEARCH_CACHE_MAX_RESULTS + 1])
+    if len(results) > SEARCH_CACHE_MAX_RESULTS:
+        return queryset
+    search_result_cache.set(query_string, results)
+    return list(results)
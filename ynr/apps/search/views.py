@@ -3,7 +3,7 @@ from django.urls import reverse
 from django.views.generic import ListView
 from elections.uk.lib import is_valid_postcode
 from search.forms import PersonSearchForm
-from search.utils import search_person_by_name
+from search.utils import cached_search_person_by_name
 
 
 class PersonSearch(ListView):
@@ -26,7 +26,7 @@ class PersonSearch(ListView):
         return ret
 
     def get_queryset(self):
-        return search_person_by_name(
+        return cached_search_person_by_name(
             self.request.GET.get("q", ""), synonym=True
         )
 
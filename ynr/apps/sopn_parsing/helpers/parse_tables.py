@@ -1,19 +1,16 @@
 import json
 import re
+from typing import Optional, Tuple
 
 from bulk_adding.models import RawPeople
 from candidates.models import Ballot
-from django.contrib.postgres.search import TrigramSimilarity
 from django.core.files.base import ContentFile
 from django.core.files.storage import DefaultStorage
-from django.db.models import F, Value
-from django.db.models.functions import Lower, Replace
 from django.db.utils import DataError
 from nameparser import HumanName
-from pandas import DataFrame
-from parties.models import Party, PartyDescription
-from sopn_parsing.helpers.text_helpers import clean_text
-from utils.db import Levenshtein
+from pandas import DataFrame, Series
+from sopn_parsing.helpers.party_matching import get_party_matcher
+from sopn_parsing.helpers.text_helpers import clean_page_text, clean_text
 
 FIRST_NAME_FIELDS = [
     "other name",
@@ -62,39 +59,29 @@ DESCRIPTION_VALUES = [
 ] + WELSH_DESCRIPTION_VALUES
 
 
-def iter_rows(data):
-    counter = 0
-    more = True
-    while more:
-        try:
-            yield data.iloc[counter]
-            counter += 1
-        except IndexError:
-            more = False
-
-
-def merge_row_cells(row):
-    return [c for c in row if c]
+HEADER_LIKE_RE = re.compile("|".join(re.escape(f) for f in NAME_FIELDS))
 
 
 def clean_row(row):
     return [clean_text(c) for c in row]
 
 
-def contains_header_like_strings(row):
-    row_string = clean_text(row.to_string())
-    if any(s in row_string for s in NAME_FIELDS):
-        return True
-    return False
-
+def find_header_row(cell_counts, row_texts) -> Optional[int]:
+    """
+    Return the position of the first row that looks like the table's header,
+    or None.
 
-def looks_like_header(row, avg_row):
-    avg_row = avg_row - 3
-    if len(merge_row_cells(row)) >= avg_row and contains_header_like_strings(
-        row
-    ):
-        return True
-    return False
+    A header has at least as many non-empty cells as the average row, less
+    three, and contains one of the NAME_FIELDS once cleaned.
+    """
+    if not len(cell_counts):
+        return None
+    looks_like_header = (cell_counts >= cell_counts.mean() - 3) & (
+        row_texts.str.contains(HEADER_LIKE_RE, regex=True).to_numpy()
+    )
+    if not looks_like_header.any():
+        return None
+    return int(looks_like_header.argmax())
 
 
 def order_name_fields(name_fields):
@@ -217,7 +204,7 @@ def clean_description(description):
     return description
 
 
-def get_description(description, sopn):
+def get_description(description, sopn, matcher=None):
     description = clean_description(description).strip()
 
     if not description:
@@ -225,123 +212,28 @@ def get_description(description, sopn):
     if description.lower() in INDEPENDENT_VALUES:
         return None
 
-    description_value = Replace(
-        Lower(Value(description)), Value("&"), Value("and")
-    )
+    if matcher is None:
+        matcher = get_party_matcher()
     register = sopn.sopn.ballot.post.party_set.slug.upper()
-
-    # First try to get Party object with an exact match between parsed
-    # description and the Party name
-
-    # annotate search_text field to both QuerySets which normalizes name field
-    # by changing '&' to 'and' this is then used instead of the name field for
-    # string matching
-    party_qs = (
-        Party.objects.register(register)
-        .current()
-        .annotate(search_text=Lower(Replace("name", Value("&"), Value("and"))))
-    )
-    party = party_qs.filter(search_text=description_value)
-    # If we find one, return None, so that the pain Party object
-    # is parsed in get_party below, and this will then be preselected
-    # for the user on the form.
-    if party.exists():
-        return None
-
-    party_description_qs = PartyDescription.objects.annotate(
-        search_text=Lower(Replace("description", Value("&"), Value("and")))
-    )
-    try:
-        return party_description_qs.get(
-            search_text=description_value, party__register=register
-        )
-    except (
-        PartyDescription.DoesNotExist,
-        PartyDescription.MultipleObjectsReturned,
-    ) as e:
-        print(e)
-        pass
-
-    # try to find any that start with parsed description
-    description_obj = party_description_qs.filter(
-        search_text__istartswith=description_value, party__register=register
-    ).first()
-
-    # Levenshtein
-    try:
-        qs = party_description_qs.annotate(
-            lev_dist=Levenshtein(F("search_text"), description_value)
-        ).order_by("lev_dist")
-        description_obj = qs.filter(lev_dist__lte=3).first()
-        if description_obj:
-            print(
-                f"{description} matched with {description_obj.description} with a distance of {description_obj.lev_dist}"
-            )
-            return description_obj
-    except ValueError:
-        print("Levenshtein failed")
-        pass
-
-    if description_obj:
-        return description_obj
-
-    # final check - if this is a Welsh version of a description, it will be at
-    # the end of the description
-    try:
-        return party_description_qs.filter(
-            search_text__endswith=f"| {description}", party__register=register
-        ).first()
-    except PartyDescription.DoesNotExist:
-        print(f"Couldn't find description for {description}")
-        pass
+    return matcher.match_description(description, register)
 
 
-def get_party(description_model, description_str, sopn):
+def get_party(description_model, description_str, sopn, matcher=None):
     if description_model:
         return description_model.party
 
+    if matcher is None:
+        matcher = get_party_matcher()
     party_name = clean_description(description_str)
     register = sopn.sopn.ballot.post.party_set.slug.upper()
 
-    # annotate search_text field which normalizes name field by changing '&' to 'and'
-    # this is then used instead of the name field for string matching
-    qs = (
-        Party.objects.register(register)
-        .active_for_date(date=sopn.sopn.ballot.election.election_date)
-        .annotate(search_text=Replace("name", Value("&"), Value("and")))
-    )
     if not party_name or party_name.lower().strip() in INDEPENDENT_VALUES:
-        return Party.objects.get(ec_id="ynmp-party:2")
-
-    try:
-        return qs.get(search_text=party_name)
-    except Party.DoesNotExist:
-        party_obj = None
-
-    qs = qs.annotate(
-        lev_dist=Levenshtein("search_text", Value(party_name))
-    ).order_by("lev_dist")
-    party_obj = qs.filter(lev_dist__lte=5).first()
-    if party_obj:
-        print(
-            f"{party_name} matched with {party_obj.name} with a distance of {party_obj.lev_dist}"
-        )
-        return party_obj
+        return matcher.independent_party()
 
-    # Last resort attempt - look for the most similar party object to help when
-    # parsed name is missing a whitespace e.g. Barnsley IndependentGroup
-    qs = qs.annotate(similarity=TrigramSimilarity("name", party_name)).order_by(
-        "-similarity"
+    return matcher.match_party(
+        party_name, register, sopn.sopn.ballot.election.election_date
     )
 
-    party_obj = qs.filter(similarity__gte=0.5).first()
-    if not party_obj:
-        closest = qs.first()
-        print(f"Couldn't find party for {party_name}.")
-        print(f"Closest is {closest.name} with similarity {closest.similarity}")
-
-    return party_obj
-
 
 def get_ynr_name(row, name_fields):
     """
@@ -384,7 +276,7 @@ def get_sopn_names(row, name_fields):
     return ("", "")
 
 
-def add_previous_party_affiliations(party_str, raw_data, sopn):
+def add_previous_party_affiliations(party_str, raw_data, sopn, matcher=None):
     """
     Attempts to find previous party affiliations and add them to the data
     object. If no party can be found, returns the data unchanged.
@@ -393,7 +285,10 @@ def add_previous_party_affiliations(party_str, raw_data, sopn):
         return raw_data
 
     party = get_party(
-        description_model=None, description_str=party_str, sopn=sopn
+        description_model=None,
+        description_str=party_str,
+        sopn=sopn,
+        matcher=matcher,
     )
 
     if not party:
@@ -403,22 +298,28 @@ def add_previous_party_affiliations(party_str, raw_data, sopn):
     return raw_data
 
 
-def parse_table(sopn, data):
-    data.columns = clean_row(data.columns)
+def parse_table(sopn, columns, rows):
+    """
+    Parse the candidates from the rows of a table, given as tuples of cell
+    values in the same order as `columns`, the cells of its header
+    """
+    columns = clean_row(columns)
 
-    name_fields = get_name_fields(data.columns)
+    name_fields = get_name_fields(columns)
 
     # if we have more than one name field try to order them
     if len(name_fields) > 1:
         name_fields = order_name_fields(name_fields)
 
-    description_field = guess_description_field(data.columns)
+    description_field = guess_description_field(columns)
     previous_party_affiliations_field = guess_previous_party_affiliations_field(
-        data=data.columns, sopn=sopn
+        data=columns, sopn=sopn
     )
 
+    matcher = get_party_matcher()
     ballot_data = []
-    for row in iter_rows(data):
+    for values in rows:
+        row = dict(zip(columns, values))
         name = get_ynr_name(row, name_fields)
         last_name, first_name = get_sopn_names(row, name_fields)
         # if we couldnt parse a candidate name skip this row
@@ -426,12 +327,13 @@ def parse_table(sopn, data):
             continue
 
         description_obj = get_description(
-            description=row[description_field], sopn=sopn
+            description=row[description_field], sopn=sopn, matcher=matcher
         )
         party_obj = get_party(
             description_model=description_obj,
             description_str=row[description_field],
             sopn=sopn,
+            matcher=matcher,
         )
         if not party_obj:
             continue
@@ -450,6 +352,7 @@ def parse_table(sopn, data):
                 party_str=row[previous_party_affiliations_field],
                 raw_data=data,
                 sopn=sopn,
+                matcher=matcher,
             )
 
         ballot_data.append(data)
@@ -481,48 +384,70 @@ def parse_raw_data_for_ballot(ballot, reparse=False):
     parse_raw_data(ballot, reparse=reparse)
 
 
-def parse_dataframe(ballot: Ballot, df: DataFrame):
-    # Don't parse situation of polling stations
+def find_table(df: DataFrame) -> Optional[Tuple[list, list]]:
+    """
+    Find the table of candidates in a data frame of Textract output. Returns
+    the cells of its header and a tuple of the cells of each row after it,
+    or None if there doesn't seem to be a header.
+
+    Each distinct cell is cleaned once, rather than cleaning each row as a
+    string. Missing cells, from tables with fewer columns, are cleaned as
+    "nan" and count as non-empty, as they did when each row was cleaned.
+    """
     df.reset_index(drop=True, inplace=True)
-    polling_station_index = df[
-        df.apply(
-            lambda row: row.astype(str)
-            .str.contains("polling station", case=False)
-            .any(),
-            axis=1,
+    text = df.fillna("nan")
+    distinct_cells = set(text.to_numpy(dtype=object).ravel())
+
+    # Don't parse situation of polling stations
+    polling_station_cells = [
+        cell
+        for cell in distinct_cells
+        if "polling station" in str(cell).lower()
+    ]
+    mentions_polling_stations = text.isin(polling_station_cells).any(axis=1)
+    if mentions_polling_stations.any():
+        end = int(mentions_polling_stations.to_numpy().argmax())
+        df = df.iloc[:end]
+        text = text.iloc[:end]
+
+    cleaned = {cell: clean_page_text(str(cell)) for cell in distinct_cells}
+    # A row is cut at its first "(", as if it was cleaned as one string
+    row_texts = (
+        Series(
+            [
+                " ".join(cleaned[cell] for cell in row)
+                for row in text.to_numpy(dtype=object)
+            ],
+            dtype=object,
         )
-    ].index
-    if not polling_station_index.empty:
-        polling_station_index = polling_station_index[0]
-        if isinstance(polling_station_index, str):
-            polling_station_index = int(polling_station_index)
-        new_df = df.loc[: polling_station_index - 1]
-        df = new_df
-
-    cell_counts = [len(merge_row_cells(c)) for c in iter_rows(df)]
-
-    header_found = False
-    avg_row = sum(cell_counts) / float(len(cell_counts) or 1)
-    for row in iter_rows(df):
-        if not header_found:
-            if looks_like_header(row, avg_row):
-                df.columns = row
-                df = df.drop(row.name)
-                header_found = True
-            else:
-                try:
-                    df = df.drop(row.name)
-                except IndexError:
-                    break
-    if not header_found:
+        .str.split("(", n=1)
+        .str[0]
+        .str.replace(r"\s+", " ", regex=True)
+    )
+    header_position = find_header_row(
+        df.ne("").sum(axis=1).to_numpy(), row_texts
+    )
+    if header_position is None:
+        return None
+    columns = list(df.iloc[header_position])
+    rows = list(
+        df.iloc[header_position + 1 :].itertuples(index=False, name=None)
+    )
+    return columns, rows
+
+
+def parse_dataframe(ballot: Ballot, df: DataFrame):
+    table = find_table(df)
+    if table is None:
         # Don't try to parse if we don't think we know the header
         print(f"We couldn't find a header for {ballot.ballot_paper_id}")
         return None
+    columns, rows = table
     # We're now in a position where we think we have the table we want
     # with the columns set and other header rows removed.
     # Time to parse it in to names and parties
     try:
-        return parse_table(ballot, df)
+        return parse_table(ballot, columns, rows)
     except ValueError as e:
         # Something went wrong. This will happen a lot. let's move on
         print(f"Error attempting to parse a table for {ballot.ballot_paper_id}")
@@ -0,0 +1,364 @@
+"""
+Matching the party and description text parsed from a SOPN to `Party` and
+`PartyDescription` objects.
+
+This used to be done with a handful of queries for each candidate, each one
+normalising every party name or description in Postgres. Instead, all the
+parties and descriptions are loaded into a `PartyMatcher` once, and matched
+in memory in the same way as the queries did: exact, prefix, Levenshtein and
+trigram similarity matches, with the same normalisation and ordering.
+
+The matcher is kept for `SOPN_PARTY_MATCHER_TTL` seconds in each process,
+and rebuilt sooner if `invalidate_party_matchers` is called, which the EC
+party importer does after each import.
+"""
+
+import re
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from parties.models import Party, PartyDescription
+
+PARTY_MATCHER_VERSION_CACHE_KEY = "sopn_parsing:party_matcher_version"
+
+INDEPENDENT_PARTY_EC_ID = "ynmp-party:2"
+
+# The same as the `lev_dist__lte` filters that used to be used
+MAX_DESCRIPTION_DISTANCE = 3
+MAX_PARTY_DISTANCE = 5
+MIN_PARTY_SIMILARITY = 0.5
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    The Levenshtein distance between `a` and `b`, as calculated by
+    Postgres's fuzzystrmatch. Stops early and returns `max_distance + 1` once
+    the distance is known to be more than `max_distance`.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+def trigrams(text: str) -> frozenset:
+    """
+    The set of trigrams pg_trgm makes from `text`: each word is lower
+    cased and padded with two spaces before and one after.
+    """
+    result = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return frozenset(result)
+
+
+def trigram_similarity(a: frozenset, b: frozenset) -> float:
+    """
+    pg_trgm's `similarity` of two sets of trigrams
+    """
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def description_search_text(text: str) -> str:
+    """
+    The `Lower(Replace(..., "&", "and"))` used to compare descriptions
+    """
+    return text.lower().replace("&", "and")
+
+
+def is_active_for_date(party: Party, date) -> bool:
+    """
+    The same as `PartyQuerySet.active_for_date`
+    """
+    if party.date_registered > date:
+        return False
+    return party.date_deregistered is None or party.date_deregistered >= date
+
+
+class PartyMatcher:
+    """
+    An in-memory index of every Party and PartyDescription, used to match
+    the text parsed from SOPNs.
+    """
+
+    def __init__(
+        self,
+        parties: List[Party],
+        descriptions: List[PartyDescription],
+    ):
+        self.parties = sorted(parties, key=lambda p: (p.name, p.pk))
+        self.parties_by_ec_id = {party.ec_id: party for party in self.parties}
+        self.party_trigrams = {
+            party.pk: trigrams(party.name) for party in self.parties
+        }
+
+        parties_by_pk = {party.pk: party for party in self.parties}
+        for description in descriptions:
+            description.party = parties_by_pk[description.party_id]
+            description.search_text = description_search_text(
+                description.description
+            )
+        # Ordered as `PartyDescription.Meta.ordering`
+        self.descriptions = sorted(
+            descriptions, key=lambda d: (not d.active, d.pk)
+        )
+        self.descriptions_by_register = defaultdict(list)
+        self.descriptions_by_length = defaultdict(list)
+        for description in self.descriptions:
+            self.descriptions_by_register[description.party.register].append(
+                description
+            )
+            self.descriptions_by_length[len(description.search_text)].append(
+                description
+            )
+        self.register_parties: Dict[str, List[Party]] = {}
+
+    @classmethod
+    def build(cls):
+        return cls(
+            list(Party.objects.all()),
+            list(PartyDescription.objects.all()),
+        )
+
+    def parties_for_register(self, register: str) -> List[Party]:
+        """
+        The same parties as `Party.objects.register(register)`
+        """
+        register = register.upper()
+        if register not in self.register_parties:
+            self.register_parties[register] = [
+                party
+                for party in self.parties
+                if party.register in (register, None)
+            ]
+        return self.register_parties[register]
+
+    def active_parties(self, register: str, date) -> List[Party]:
+        return [
+            party
+            for party in self.parties_for_register(register)
+            if is_active_for_date(party, date)
+        ]
+
+    def closest_descriptions(self, search_text: str, max_distance: int):
+        """
+        Every description within `max_distance` of `search_text`, in any
+        register, closest first
+        """
+        matches = []
+        length = len(search_text)
+        for candidate_length in range(
+            length - max_distance, length + max_distance + 1
+        ):
+            for description in self.descriptions_by_length.get(
+                candidate_length, []
+            ):
+                distance = levenshtein(
+                    description.search_text, search_text, max_distance
+                )
+                if distance <= max_distance:
+                    matches.append((distance, description.pk, description))
+        matches.sort(key=lambda match: match[:2])
+        return [(distance, description) for distance, _, description in matches]
+
+    def match_description(
+        self, description: str, register: str
+    ) -> Optional[PartyDescription]:
+        """
+        Return the PartyDescription that the cleaned `description` is of, if
+        any. Returns None if it's the name of a current party, so that the
+        party is matched instead.
+        """
+        search_text = description_search_text(description)
+        today = timezone.localdate()
+        for party in self.parties_for_register(register):
+            party_text = description_search_text(party.name)
+            if party_text == search_text and is_active_for_date(party, today):
+                return None
+
+        register_descriptions = self.descriptions_by_register.get(register, [])
+        exact = [
+            d for d in register_descriptions if d.search_text == search_text
+        ]
+        if len(exact) == 1:
+            return exact[0]
+
+        prefix_match = next(
+            (
+                d
+                for d in register_descriptions
+                if d.search_text.startswith(search_text)
+            ),
+            None,
+        )
+
+        closest = self.closest_descriptions(
+            search_text, MAX_DESCRIPTION_DISTANCE
+        )
+        if closest:
+            distance, description_obj = closest[0]
+            print(
+                f"{description} matched with {description_obj.description} with a distance of {distance}"
+            )
+            return description_obj
+
+        if prefix_match:
+            return prefix_match
+
+        # If this is a Welsh version of a description, it will be at the end
+        # of the description
+        return next(
+            (
+                d
+                for d in register_descriptions
+                if d.search_text.endswith(f"| {description}")
+            ),
+            None,
+        )
+
+    def independent_party(self) -> Party:
+        try:
+            return self.parties_by_ec_id[INDEPENDENT_PARTY_EC_ID]
+        except KeyError:
+            raise Party.DoesNotExist(
+                f"No party with ec_id {INDEPENDENT_PARTY_EC_ID}"
+            )
+
+    def match_party(self, party_name: str, register: str, date) -> Party:
+        """
+        Return the Party active on `date` that the cleaned `party_name` is
+        most likely to be, or None
+        """
+        parties = self.active_parties(register, date)
+        search_texts = {
+            party.pk: party.name.replace("&", "and") for party in parties
+        }
+
+        exact = [p for p in parties if search_texts[p.pk] == party_name]
+        if len(exact) > 1:
+            raise Party.MultipleObjectsReturned(
+                f"{len(exact)} parties are called {party_name}"
+            )
+        if exact:
+            return exact[0]
+
+        closest = sorted(
+            (
+                (
+                    levenshtein(
+                        search_texts[party.pk], party_name, MAX_PARTY_DISTANCE
+                    ),
+                    index,
+                    party,
+                )
+                for index, party in enumerate(parties)
+            ),
+            key=lambda match: match[:2],
+        )
+        if closest and closest[0][0] <= MAX_PARTY_DISTANCE:
+            distance, _, party = closest[0]
+            print(
+                f"{party_name} matched with {party.name} with a distance of {distance}"
+            )
+            return party
+
+        # Last resort attempt - look for the most similar party object to
+        # help when parsed name is missing a whitespace e.g.
+        # Barnsley IndependentGroup
+        name_trigrams = trigrams(party_name)
+        most_similar = sorted(
+            (
+                (
+                    trigram_similarity(
+                        self.party_trigrams[party.pk], name_trigrams
+                    ),
+                    index,
+                    party,
+                )
+                for index, party in enumerate(parties)
+            ),
+            key=lambda match: (-match[0], match[1]),
+        )
+        if most_similar and most_similar[0][0] >= MIN_PARTY_SIMILARITY:
+            return most_similar[0][2]
+
+        print(f"Couldn't find party for {party_name}.")
+        if most_similar:
+            similarity, _, closest_party = most_similar[0]
+            print(
+                f"Closest is {closest_party.name} with similarity {similarity}"
+            )
+        return None
+
+
+class PartyMatcherCache:
+    """
+    Keeps a `PartyMatcher` in this process for `SOPN_PARTY_MATCHER_TTL`
+    seconds, or until `invalidate` is called in any process.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.matcher = None
+        self.loaded_at = None
+        self.version = None
+
+    def get(self) -> PartyMatcher:
+        ttl = settings.SOPN_PARTY_MATCHER_TTL
+        if not ttl:
+            return PartyMatcher.build()
+        version = cache.get(PARTY_MATCHER_VERSION_CACHE_KEY)
+        if (
+            self.matcher is None
+            or version != self.version
+            or time.monotonic() - self.loaded_at >= ttl
+        ):
+            self.matcher = PartyMatcher.build()
+            self.loaded_at = time.monotonic()
+            self.version = version
+        return self.matcher
+
+    def invalidate(self):
+        cache.set(PARTY_MATCHER_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        self.clear()
+
+
+party_matcher_cache = PartyMatcherCache()
+
+
+def get_party_matcher() -> PartyMatcher:
+    return party_matcher_cache.get()
+
+
+def invalidate_party_matchers():
+    """
+    Make every process rebuild its PartyMatcher before it's next used. Call
+    this after parties or descriptions have changed.
+    """
+    party_matcher_cache.invalidate()
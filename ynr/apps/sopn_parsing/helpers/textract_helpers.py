@@ -3,10 +3,11 @@ from __future__ import annotations  # To allow 'self' type annotations in 3.12
 import abc
 import json
 from pathlib import Path
-from typing import Optional, Type
+from typing import List, NamedTuple, Optional, Type
 
 from django.conf import settings
 from django.db import IntegrityError
+from django.utils import timezone
 from official_documents.models import BallotSOPN
 from PIL import Image
 from sopn_parsing.models import (
@@ -18,6 +19,12 @@ from textractor import Textractor
 from textractor.data.constants import TextractAPI, TextractFeatures
 from textractor.entities.lazy_document import LazyDocument
 
+COMPLETED_STATES = (
+    AWSTextractParsedSOPNStatus.SUCCEEDED,
+    AWSTextractParsedSOPNStatus.FAILED,
+    AWSTextractParsedSOPNStatus.PARTIAL_SUCCESS,
+)
+
 
 class NotUsingAWSException(ValueError):
     """
@@ -26,6 +33,16 @@ class NotUsingAWSException(ValueError):
     """
 
 
+class FetchedResult(NamedTuple):
+    """
+    The results of a finished job, fetched from the backend but not saved
+    """
+
+    response: dict
+    page_images: List[Image.Image]
+    annotated_images: List[Image.Image]
+
+
 class BaseSOPNParser(abc.ABC):
     def __init__(self, ballot_sopn: BallotSOPN, *args, **kwargs):
         self.ballot_sopn = ballot_sopn
@@ -51,6 +68,32 @@ class BaseSOPNParser(abc.ABC):
 
         ...
 
+    @abc.abstractmethod
+    def get_job_status(self) -> str:
+        """
+        Ask the backend for the status of the job. This doesn't touch the
+        database, so it can be called from a thread.
+        """
+        ...
+
+    @abc.abstractmethod
+    def fetch_result(self) -> Optional[FetchedResult]:
+        """
+        Fetch the results of a finished job, or None if they can't be
+        fetched. This doesn't touch the database, so it can be called from a
+        thread.
+        """
+        ...
+
+    @abc.abstractmethod
+    def save_result(
+        self, result: Optional[FetchedResult]
+    ) -> Optional[AWSTextractParsedSOPN]:
+        """
+        Store the results from `fetch_result` on the model
+        """
+        ...
+
 
 class DummySOPNParser(BaseSOPNParser):
     """
@@ -90,6 +133,25 @@ class DummySOPNParser(BaseSOPNParser):
     ) -> Optional[dict]:
         return self.textract_response_json
 
+    def get_job_status(self) -> str:
+        return AWSTextractParsedSOPNStatus.SUCCEEDED
+
+    def fetch_result(self) -> Optional[FetchedResult]:
+        return FetchedResult(self.textract_response_json, [], [])
+
+    def save_result(
+        self, result: Optional[FetchedResult]
+    ) -> Optional[AWSTextractParsedSOPN]:
+        textract_result = self.ballot_sopn.awstextractparsedsopn
+        if result is None:
+            textract_result.status = AWSTextractParsedSOPNStatus.FAILED
+            textract_result.save()
+            return None
+        textract_result.status = result.response["JobStatus"]
+        textract_result.raw_data = json.dumps(result.response)
+        textract_result.save()
+        return textract_result
+
 
 class TextractSOPNHelper(BaseSOPNParser):
     """Get the AWS Textract results for a given SOPN."""
@@ -121,7 +183,12 @@ class TextractSOPNHelper(BaseSOPNParser):
         try:
             textract_result, _ = AWSTextractParsedSOPN.objects.update_or_create(
                 sopn=self.ballot_sopn,
-                defaults={"raw_data": "", "job_id": document.job_id},
+                defaults={
+                    "raw_data": "",
+                    "job_id": document.job_id,
+                    "poll_attempts": 0,
+                    "next_poll": timezone.now(),
+                },
             )
             textract_result.save()
             textract_result.refresh_from_db()
@@ -136,7 +203,7 @@ class TextractSOPNHelper(BaseSOPNParser):
 
     def textract_start_document_analysis(self) -> LazyDocument:
         document: LazyDocument = self.extractor.start_document_analysis(
-            file_source=f"s3://{self.bucket_name}{settings.MEDIA_URL}{self.ballot_sopn.uploaded_file.name}",
+            file_source=self.document_path,
             features=[TextractFeatures.TABLES],
             s3_output_path=f"s3://{settings.TEXTRACT_S3_BUCKET_NAME}/raw_textract_responses",
             s3_upload_path=self.upload_path,
@@ -144,8 +211,11 @@ class TextractSOPNHelper(BaseSOPNParser):
         )
         return document
 
+    @property
+    def document_path(self):
+        return f"s3://{self.bucket_name}{settings.MEDIA_URL}{self.ballot_sopn.uploaded_file.name}"
+
     def update_job_status(self, blocking=False, reparse=False):
-        COMPLETED_STATES = ("SUCCEEDED", "FAILED", "PARTIAL_SUCCESS")
         textract_result = self.ballot_sopn.awstextractparsedsopn
         if textract_result.status in COMPLETED_STATES and not reparse:
             return textract_result
@@ -153,62 +223,85 @@ class TextractSOPNHelper(BaseSOPNParser):
         if not blocking:
             # If we're not blocking, simply check the status and save it
             # In the case that it's not finished, just save the status and return
-            response = self.extractor.textract_client.get_document_analysis(
-                JobId=textract_result.job_id
-            )
-            textract_result.status = response["JobStatus"]
-            if response["JobStatus"] not in COMPLETED_STATES:
+            textract_result.status = self.get_job_status()
+            if textract_result.status not in COMPLETED_STATES:
                 textract_result.save()
                 return textract_result
 
+        return self.save_result(self.fetch_result())
+
+    def get_job_status(self) -> str:
+        # Only the status is needed, so don't fetch a page of blocks too
+        response = self.extractor.textract_client.get_document_analysis(
+            JobId=self.ballot_sopn.awstextractparsedsopn.job_id, MaxResults=1
+        )
+        return response["JobStatus"]
+
+    def fetch_result(self) -> Optional[FetchedResult]:
         # extractor.get_result is blocking by default (e.g, it will poll
         # for the job finishing see
         # https://github.com/aws-samples/amazon-textract-textractor/issues/326)
-        # because the above check for `if not blocking` should have returned
-        # by now if we didn't want to block (or the job is finished)
-        # it's safe to call this and have it 'block' on noting.
+        # because callers only fetch the result once the job is finished
+        # (or they want to block) it's safe to call this and have it 'block'
+        # on noting.
         try:
             textract_document = self.extractor.get_result(
-                textract_result.job_id, TextractAPI.ANALYZE
+                self.ballot_sopn.awstextractparsedsopn.job_id,
+                TextractAPI.ANALYZE,
             )
         except Exception as e:
             print(
                 f"Failed to get results for {self.ballot_sopn.ballot.ballot_paper_id}"
             )
             print(e)
-            textract_result.status = "FAILED"
+            return None
+
+        page_images = self.extractor._get_document_images_from_path(
+            self.document_path
+        )
+        # Add the images back in manually
+        for i, page in enumerate(textract_document._pages):
+            page.image = page_images[i]
+        annotated_images = [
+            page.visualize() for page in textract_document.pages
+        ]
+        return FetchedResult(
+            textract_document.response, page_images, annotated_images
+        )
+
+    def save_result(
+        self, result: Optional[FetchedResult]
+    ) -> Optional[AWSTextractParsedSOPN]:
+        textract_result = self.ballot_sopn.awstextractparsedsopn
+        if result is None:
+            textract_result.status = AWSTextractParsedSOPNStatus.FAILED
             textract_result.save()
             return None
 
         print("Saving images")
         textract_result.images.all().delete()
-        images = self.extractor._get_document_images_from_path(
-            f"s3://{self.bucket_name}{settings.MEDIA_URL}{self.ballot_sopn.uploaded_file.name}"
-        )
-        for i, image in enumerate(images):
+        for i, image in enumerate(result.page_images):
             image_model = AWSTextractParsedSOPNImage.objects.create(
                 parsed_sopn=textract_result,
             )
+            # Pages with tables are saved with the tables marked on them
+            if i < len(result.annotated_images):
+                image, filename = (
+                    result.annotated_images[i],
+                    f"page_{i}_annotated.png",
+                )
+            else:
+                filename = f"page_{i}.png"
             image_model.image = AWSTextractParsedSOPNImage.pil_to_content_image(
-                image, f"page_{i}.png"
+                image, filename
             )
             image_model.save()
         print(
             f"Finished saving images for {self.ballot_sopn.ballot.ballot_paper_id}"
         )
 
-        # Add the images back in manually
-        images = list(textract_result.images.all())
-        for i, page in enumerate(textract_document._pages):
-            page.image = Image.open(images[i].image)
-        for i, page in enumerate(textract_document.pages):
-            images[i].image = AWSTextractParsedSOPNImage.pil_to_content_image(
-                page.visualize(), f"page_{i}_annotated.png"
-            )
-            images[i].save()
-
-        textract_result.status = textract_document.response["JobStatus"]
-        textract_result.raw_data = json.dumps(textract_document.response)
+        textract_result.status = result.response["JobStatus"]
+        textract_result.raw_data = json.dumps(result.response)
         textract_result.save()
         return textract_result
 
@@ -0,0 +1,99 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from pandas import concat
+from sopn_parsing.helpers.parse_tables import find_table
+from sopn_parsing.models import AWSTextractParsedSOPN
+
+TEST_DATA_DIR = Path(__file__).parents[2] / "tests" / "data"
+
+
+class Command(BaseCommand):
+    help = """
+    Time and measure the memory used by finding the table of candidates in
+    Textract output, which is the part of parsing a SOPN that doesn't need
+    the database.
+
+    By default this uses the Textract responses that the sopn_parsing tests
+    use, including the Welsh SOPN. Use --copies to repeat each table, as if
+    Textract had found several tables in one document.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            metavar="PATH",
+            help="Textract responses, as JSON, to use instead of the test data",
+        )
+        parser.add_argument(
+            "--copies",
+            type=int,
+            default=1,
+            help="How many times to repeat each table",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="How many times to time each table",
+        )
+
+    def handle(self, **options):
+        self.repeat = int(options["repeat"])
+        copies = int(options["copies"])
+        responses = self.load_responses(options["paths"])
+
+        timings = []
+        for name, raw_data in responses.items():
+            textract_model = AWSTextractParsedSOPN(raw_data=raw_data)
+            textract_model.parse_raw_data()
+            df = concat([textract_model.as_pandas] * copies, ignore_index=True)
+            result = self.measure(lambda df=df: find_table(df.copy()))
+            timings.append(result["median_ms"])
+            self.stdout.write(
+                f"{name}: {len(df)} rows, "
+                f"median {result['median_ms']:.2f}ms, "
+                f"min {result['min_ms']:.2f}ms, "
+                f"peak {result['peak_kib']:.0f}KiB"
+            )
+        self.stdout.write(f"Total of medians: {sum(timings):.2f}ms")
+
+    def load_responses(self, paths):
+        if paths:
+            return {Path(path).stem: Path(path).read_text() for path in paths}
+
+        from sopn_parsing.tests.data.welsh_sopn_data import welsh_sopn_data
+
+        responses = {
+            path.stem: path.read_text()
+            for path in sorted(
+                (TEST_DATA_DIR / "textract_responses").glob("*.json")
+            )
+        }
+        responses["welsh_sopn_data"] = json.dumps(welsh_sopn_data)
+        return responses
+
+    def measure(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "median_ms": statistics.median(timings),
+            "min_ms": min(timings),
+            "peak_kib": peak / 1024,
+        }
@@ -1,14 +1,62 @@
+import multiprocessing
+import os
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from datetime import timedelta
+from functools import partial
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 from sopn_parsing.helpers.parse_tables import parse_raw_data_for_ballot
 from sopn_parsing.helpers.textract_helpers import (
+    COMPLETED_STATES,
     NotUsingAWSException,
-    TextractSOPNHelper,
+    get_extractor_class,
 )
 from sopn_parsing.models import (
     AWSTextractParsedSOPN,
     AWSTextractParsedSOPNStatus,
 )
 
+CURRENT_BALLOT_KWARGS = {
+    "sopn__ballot__election__current": True,
+    "sopn__ballot__candidates_locked": False,
+}
+
+# Jobs that Textract hasn't finished yet
+POLLED_STATES = (
+    AWSTextractParsedSOPNStatus.NOT_STARTED,
+    AWSTextractParsedSOPNStatus.IN_PROGRESS,
+)
+
+FAILED = AWSTextractParsedSOPNStatus.FAILED
+
+# How long a claimed job is left alone by other runs of this command
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# A job that's still running is next asked about after 30 seconds, then
+# after a minute, two minutes and so on, up to an hour
+MIN_POLL_INTERVAL = timedelta(seconds=30)
+MAX_POLL_INTERVAL = timedelta(hours=1)
+
+
+def next_poll_interval(poll_attempts):
+    return min(MIN_POLL_INTERVAL * 2 ** (poll_attempts - 1), MAX_POLL_INTERVAL)
+
+
+def parse_raw_data(raw_data):
+    """
+    Convert the raw Textract JSON to the JSON of a data frame. This is CPU
+    bound, so it's run in a separate process.
+    """
+    textract_model = AWSTextractParsedSOPN(raw_data=raw_data)
+    textract_model.parse_raw_data()
+    return textract_model.parsed_data
+
 
 class Command(BaseCommand):
     """
@@ -26,44 +74,221 @@ class Command(BaseCommand):
     gets a job_id.
 
     We need to check if the job ID has finished and pull in the data to `raw_data`.
+    Jobs are checked on in a thread pool. A job that hasn't finished is
+    checked on less and less often, see `next_poll_interval`.
 
     We need to parse the `raw_data` into `parsed_data` and make a `RawData`
-    object for bulk adding.
+    object for bulk adding. The raw data is converted in a process pool.
+
+    Rows are claimed in batches with SELECT ... FOR UPDATE SKIP LOCKED, so
+    one run doesn't hold up the next if it overruns.
     """
 
+    help = "Check on Textract jobs and parse the tables in their results"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="How many jobs or tables to claim at once",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="How many Textract jobs to check on at once",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="How many processes to parse tables in. Use 0 to parse "
+            "them in this process",
+        )
+
     def handle(self, *args, **options):
-        current_ballot_kwargs = {
-            "sopn__ballot__election__current": True,
-            "sopn__ballot__candidates_locked": False,
-        }
+        batch_size = int(options["batch_size"])
+        processes = int(options["processes"])
 
         # Textract
-        qs = AWSTextractParsedSOPN.objects.exclude(
-            status__in=[
-                AWSTextractParsedSOPNStatus.SUCCEEDED,
-                AWSTextractParsedSOPNStatus.FAILED,
-            ]
-        ).filter(**current_ballot_kwargs)
-        for aws_textract_model in qs:
+        with ThreadPoolExecutor(
+            max_workers=int(options["threads"])
+        ) as thread_pool:
+            while True:
+                batch = self.claim_jobs(batch_size)
+                if not batch:
+                    break
+                try:
+                    self.poll_jobs(batch, thread_pool)
+                except NotUsingAWSException:
+                    # Don't try to do anything more with Textract
+                    self.release_jobs(batch)
+                    break
+
+        process_pool = None
+        if processes:
+            # Forked, so that the workers don't have to set Django up again.
+            # They only use textractor and pandas, never the database.
+            process_pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("fork"),
+            )
+        # Tables that couldn't be parsed are left to be tried again next
+        # time, but only once in each run
+        self.seen = set()
+        try:
+            while True:
+                with transaction.atomic():
+                    batch = self.claim_tables(batch_size)
+                    if not batch:
+                        break
+                    self.parse_tables(batch, process_pool)
+        finally:
+            if process_pool:
+                process_pool.shutdown()
+
+    def claim_jobs(self, batch_size):
+        """
+        Claim the unfinished jobs that are due to be checked on, by moving
+        their `next_poll` on by `CLAIM_TIMEOUT`. The row locks are only held
+        while claiming, not while talking to Textract.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                AWSTextractParsedSOPN.objects.select_for_update(
+                    skip_locked=True, of=("self",)
+                )
+                .filter(
+                    status__in=POLLED_STATES,
+                    next_poll__lte=now,
+                    **CURRENT_BALLOT_KWARGS,
+                )
+                .exclude(job_id="")
+                .select_related("sopn__ballot")
+                .order_by("next_poll", "pk")[:batch_size]
+            )
+            AWSTextractParsedSOPN.objects.filter(
+                pk__in=[job.pk for job in batch]
+            ).update(next_poll=now + CLAIM_TIMEOUT)
+        return batch
+
+    def release_jobs(self, batch):
+        AWSTextractParsedSOPN.objects.filter(
+            pk__in=[job.pk for job in batch]
+        ).update(next_poll=timezone.now())
+
+    def poll_jobs(self, batch, thread_pool):
+        """
+        Check on each job in the thread pool, and save the results to the
+        database from this thread as they finish
+        """
+        extractor_class = get_extractor_class()
+        futures = {}
+        for job in batch:
+            extractor = extractor_class(job.sopn)
+            futures[thread_pool.submit(self.poll_job, extractor)] = (
+                job,
+                extractor,
+            )
+
+        for future in as_completed(futures):
+            job, extractor = futures[future]
             try:
-                textract_helper = TextractSOPNHelper(aws_textract_model.sopn)
-            except NotUsingAWSException:
-                # Don't try to do anything more with Textract
-                break
-            # Get the status. If it's finished processing, this will set the raw_data
-            # field (and do other things like make images)
-            textract_helper.update_job_status()
-
-        qs = (
-            AWSTextractParsedSOPN.objects.filter(parsed_data=None)
+                status, result = future.result()
+            except Exception as e:
+                msg = "Couldn't check on {ballot}: {error}"
+                self.stderr.write(
+                    msg.format(ballot=job.sopn.ballot.ballot_paper_id, error=e)
+                )
+                self.back_off(job)
+                continue
+
+            if status in COMPLETED_STATES:
+                # This sets the raw_data field and makes images
+                extractor.save_result(result)
+            else:
+                job.status = status
+                self.back_off(job)
+
+    def poll_job(self, extractor):
+        """
+        Get the status of a job, and its results if it's finished. This only
+        talks to the backend and storage, so that it can run in a thread.
+        """
+        status = extractor.get_job_status()
+        if status in COMPLETED_STATES and status != FAILED:
+            return status, extractor.fetch_result()
+        return status, None
+
+    def back_off(self, job):
+        job.poll_attempts += 1
+        job.next_poll = timezone.now() + next_poll_interval(job.poll_attempts)
+        job.save()
+
+    def claim_tables(self, batch_size):
+        batch = list(
+            AWSTextractParsedSOPN.objects.select_for_update(
+                skip_locked=True, of=("self",)
+            )
+            .filter(
+                parsed_data=None,
+                raw_data_type="pandas",
+                sopn__ballot__suggestedpostlock=None,
+                **CURRENT_BALLOT_KWARGS,
+            )
             .exclude(raw_data="")
-            .filter(**current_ballot_kwargs)
+            .exclude(pk__in=self.seen)
+            .select_related("sopn__ballot")
+            .order_by("pk")[:batch_size]
         )
-        self.parse_tables_for_qs(qs)
+        self.seen.update(textract_model.pk for textract_model in batch)
+        return batch
+
+    def parse_tables(self, batch, process_pool):
+        """
+        Convert the raw data of each table in the process pool, then match
+        the candidates and parties in this process
+        """
+        if process_pool:
+            futures = {
+                process_pool.submit(
+                    parse_raw_data, textract_model.raw_data
+                ): textract_model
+                for textract_model in batch
+            }
+            done = (
+                (futures[future], future.result)
+                for future in as_completed(futures)
+            )
+        else:
+            done = (
+                (
+                    textract_model,
+                    partial(parse_raw_data, textract_model.raw_data),
+                )
+                for textract_model in batch
+            )
 
-    def parse_tables_for_qs(self, qs):
-        for parsed_sopn_model in qs:
+        for textract_model, get_parsed_data in done:
+            # A savepoint for each table, so that one that can't be parsed
+            # doesn't stop the rest of the batch being saved
             try:
-                parse_raw_data_for_ballot(parsed_sopn_model.sopn.ballot)
-            except ValueError as e:
-                print(str(e))
+                with transaction.atomic():
+                    textract_model.parsed_data = get_parsed_data()
+                    textract_model.save()
+                    # `parsed_data` is set now, so this only has to find the
+                    # table in it
+                    parse_raw_data_for_ballot(
+                        textract_model.sopn.ballot, reparse=True
+                    )
+            except Exception as e:
+                textract_model.parsed_data = None
+                msg = "Couldn't parse the table for {ballot}: {error}"
+                self.stderr.write(
+                    msg.format(
+                        ballot=textract_model.sopn.ballot.ballot_paper_id,
+                        error=e,
+                    )
+                )
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.16 on 2026-10-18 19:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "sopn_parsing",
+            "0009_alter_awstextractparsedsopn_official_document_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="awstextractparsedsopn",
+            name="next_poll",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.AddField(
+            model_name="awstextractparsedsopn",
+            name="poll_attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -3,6 +3,7 @@ from io import BytesIO
 
 from django.core.files.images import ImageFile
 from django.db import models
+from django.utils import timezone
 from model_utils.models import TimeStampedModel
 from pandas import concat
 from textractor.parsers import response_parser
@@ -101,6 +102,10 @@ class AWSTextractParsedSOPN(TimeStampedModel):
         choices=AWSTextractParsedSOPNStatus.choices,
         default=AWSTextractParsedSOPNStatus.NOT_STARTED,
     )
+    # How many times the Textract job has been found to still be running,
+    # and when sopn_parsing_process_unparsed should next ask about it
+    poll_attempts = models.PositiveIntegerField(default=0)
+    next_poll = models.DateTimeField(default=timezone.now, db_index=True)
 
     @property
     def as_pandas(self):
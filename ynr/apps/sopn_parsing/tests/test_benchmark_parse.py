@@ -0,0 +1,19 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+
+class TestBenchmarkParse(SimpleTestCase):
+    def test_benchmark_test_data(self):
+        out = StringIO()
+        call_command(
+            "sopn_parsing_benchmark_parse",
+            "--repeat=1",
+            "--copies=2",
+            stdout=out,
+        )
+        out = out.getvalue()
+        self.assertIn("welsh_sopn_data: ", out)
+        self.assertIn("mayor.london.2021-05-06: ", out)
+        self.assertIn("Total of medians: ", out)
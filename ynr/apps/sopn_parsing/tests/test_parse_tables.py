@@ -6,9 +6,9 @@ from bulk_adding.models import RawPeople
 from candidates.tests.uk_examples import UK2015ExamplesMixin
 from django.core.management import call_command
 from django.db import connection
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from official_documents.models import BallotSOPN
-from pandas import Index, Series
+from pandas import DataFrame, Index, Series
 from parties.models import Party, PartyDescription
 from parties.tests.factories import PartyFactory
 from parties.tests.fixtures import DefaultPartyFixtures
@@ -652,3 +652,53 @@ class TestParseTablesFilterKwargs(TestCase):
         result = self.command.build_filter_kwargs(options)
         expected = self.default_filter_kwargs.copy()
         self.assertEqual(result, expected)
+
+
+class TestFindTable(SimpleTestCase):
+    def test_finds_header_and_rows(self):
+        df = DataFrame(
+            [
+                ["Statement of persons nominated", "", ""],
+                ["Name of Candidate (surname first)", "Address", "Description"],
+                ["SMITH John", "1 Foo Street", "Labour Party"],
+                ["JONES Jane", "2 Foo Street", "Green Party"],
+            ]
+        )
+        columns, rows = parse_tables.find_table(df)
+        self.assertEqual(
+            columns,
+            ["Name of Candidate (surname first)", "Address", "Description"],
+        )
+        self.assertEqual(
+            rows,
+            [
+                ("SMITH John", "1 Foo Street", "Labour Party"),
+                ("JONES Jane", "2 Foo Street", "Green Party"),
+            ],
+        )
+
+    def test_stops_at_polling_stations(self):
+        df = DataFrame(
+            [
+                ["Candidate name", "Description"],
+                ["SMITH John", "Labour Party"],
+                ["Situation of Polling Stations", ""],
+                ["Village Hall", "1-100"],
+            ]
+        )
+        columns, rows = parse_tables.find_table(df)
+        self.assertEqual(rows, [("SMITH John", "Labour Party")])
+
+    def test_text_after_a_bracket_is_ignored(self):
+        df = DataFrame(
+            [
+                ["Number (if any)", "Candidate name", "Description"],
+                ["1", "SMITH John", "Labour Party"],
+            ]
+        )
+        self.assertIsNone(parse_tables.find_table(df))
+
+    def test_no_header(self):
+        df = DataFrame([["SMITH John", "Labour Party"]])
+        self.assertIsNone(parse_tables.find_table(df))
+        self.assertIsNone(parse_tables.find_table(DataFrame()))
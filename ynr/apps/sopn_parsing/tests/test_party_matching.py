@@ -0,0 +1,178 @@
+from datetime import date
+
+from django.test import SimpleTestCase
+from parties.models import Party, PartyDescription
+from sopn_parsing.helpers.party_matching import (
+    PartyMatcher,
+    levenshtein,
+    trigram_similarity,
+    trigrams,
+)
+
+
+class TestMatchingFunctions(SimpleTestCase):
+    def test_levenshtein(self):
+        self.assertEqual(levenshtein("kitten", "sitting", 5), 3)
+        self.assertEqual(levenshtein("", "abc", 5), 3)
+        self.assertEqual(levenshtein("Labour", "Labour", 5), 0)
+
+    def test_levenshtein_stops_at_max_distance(self):
+        self.assertEqual(levenshtein("kitten", "sitting", 2), 3)
+        self.assertEqual(levenshtein("a", "abcdefgh", 3), 4)
+
+    def test_trigram_similarity(self):
+        # The example from the pg_trgm docs
+        self.assertAlmostEqual(
+            trigram_similarity(trigrams("word"), trigrams("two words")),
+            0.363636,
+            places=5,
+        )
+        self.assertEqual(trigram_similarity(trigrams(""), trigrams("a")), 0)
+
+
+class TestPartyMatcher(SimpleTestCase):
+    def setUp(self):
+        self.labour = Party(
+            pk=1,
+            ec_id="PP53",
+            name="Labour Party",
+            register="GB",
+            date_registered=date(1999, 1, 1),
+        )
+        self.greens = Party(
+            pk=2,
+            ec_id="PP63",
+            name="Green Party",
+            register="GB",
+            date_registered=date(1999, 1, 1),
+        )
+        self.barnsley = Party(
+            pk=3,
+            ec_id="PP1000",
+            name="Barnsley Independent Group",
+            register="GB",
+            date_registered=date(2015, 1, 1),
+        )
+        self.old_party = Party(
+            pk=4,
+            ec_id="PP1001",
+            name="Labour Parti",
+            register="GB",
+            date_registered=date(1999, 1, 1),
+            date_deregistered=date(2005, 1, 1),
+        )
+        self.independent = Party(
+            pk=5,
+            ec_id="ynmp-party:2",
+            name="Independent",
+            register=None,
+            date_registered=date(1999, 1, 1),
+        )
+        self.ni_party = Party(
+            pk=6,
+            ec_id="PP2000",
+            name="Sinn Féin",
+            register="NI",
+            date_registered=date(1999, 1, 1),
+        )
+        self.co_op = PartyDescription(
+            pk=1,
+            party_id=1,
+            description="Labour & Co-operative Party",
+        )
+        self.welsh_labour = PartyDescription(
+            pk=2,
+            party_id=1,
+            description="Welsh Labour | Llafur Cymru",
+        )
+        self.matcher = PartyMatcher(
+            [
+                self.labour,
+                self.greens,
+                self.barnsley,
+                self.old_party,
+                self.independent,
+                self.ni_party,
+            ],
+            [self.co_op, self.welsh_labour],
+        )
+        self.election_date = date(2024, 5, 2)
+
+    def test_description_that_is_a_party_name(self):
+        self.assertIsNone(self.matcher.match_description("Labour Party", "GB"))
+
+    def test_exact_description(self):
+        self.assertEqual(
+            self.matcher.match_description(
+                "labour and co-operative party", "GB"
+            ),
+            self.co_op,
+        )
+
+    def test_description_with_typo(self):
+        self.assertEqual(
+            self.matcher.match_description(
+                "Labour and Co-operative Pary", "GB"
+            ),
+            self.co_op,
+        )
+
+    def test_description_prefix(self):
+        self.assertEqual(
+            self.matcher.match_description("Labour and Co", "GB"),
+            self.co_op,
+        )
+
+    def test_welsh_description(self):
+        self.assertEqual(
+            self.matcher.match_description("llafur cymru", "GB"),
+            self.welsh_labour,
+        )
+
+    def test_description_in_another_register(self):
+        self.assertIsNone(self.matcher.match_description("Llafur Cymru", "NI"))
+
+    def test_independent(self):
+        self.assertEqual(self.matcher.independent_party(), self.independent)
+
+    def test_exact_party(self):
+        self.assertEqual(
+            self.matcher.match_party("Green Party", "GB", self.election_date),
+            self.greens,
+        )
+
+    def test_party_with_typo(self):
+        self.assertEqual(
+            self.matcher.match_party("Labour Pary", "GB", self.election_date),
+            self.labour,
+        )
+
+    def test_deregistered_party_not_matched(self):
+        self.assertEqual(
+            self.matcher.match_party("Labour Parti", "GB", self.election_date),
+            self.labour,
+        )
+        self.assertEqual(
+            self.matcher.match_party("Labour Parti", "GB", date(2001, 1, 1)),
+            self.old_party,
+        )
+
+    def test_similar_party(self):
+        self.assertEqual(
+            self.matcher.match_party(
+                "Barnsley IndependentGroup Candidate", "GB", self.election_date
+            ),
+            self.barnsley,
+        )
+
+    def test_no_party(self):
+        self.assertIsNone(
+            self.matcher.match_party(
+                "Something Else Entirely", "GB", self.election_date
+            )
+        )
+
+    def test_party_in_another_register(self):
+        self.assertIsNone(
+            self.matcher.match_party("Sinn Féin", "GB", self.election_date)
+        )
@@ -0,0 +1,119 @@
+from datetime import timedelta
+from unittest import mock
+
+from candidates.models import Ballot
+from candidates.tests.uk_examples import UK2015ExamplesMixin
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from official_documents.models import BallotSOPN
+from parties.models import Party
+from parties.tests.fixtures import DefaultPartyFixtures
+from sopn_parsing.helpers.parse_tables import parse_raw_data_for_ballot
+from sopn_parsing.helpers.textract_helpers import DummySOPNParser
+from sopn_parsing.management.commands.sopn_parsing_process_unparsed import (
+    MAX_POLL_INTERVAL,
+    next_poll_interval,
+)
+from sopn_parsing.models import (
+    AWSTextractParsedSOPN,
+    AWSTextractParsedSOPNStatus,
+)
+
+
+@override_settings(USE_DUMMY_PDF_EXTRACTOR=True)
+class TestProcessUnparsed(DefaultPartyFixtures, UK2015ExamplesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.textract_models = []
+        for ballot in (self.dulwich_post_ballot, self.camberwell_post_ballot):
+            sopn = BallotSOPN.objects.create(
+                ballot=ballot, source_url="example.com"
+            )
+            self.textract_models.append(
+                AWSTextractParsedSOPN.objects.create(
+                    sopn=sopn, job_id=f"job-{ballot.pk}", raw_data=""
+                )
+            )
+
+    def process_unparsed(self):
+        call_command("sopn_parsing_process_unparsed", processes=0, threads=2)
+        for textract_model in self.textract_models:
+            textract_model.refresh_from_db()
+
+    def test_finished_jobs_are_fetched_and_parsed(self):
+        self.process_unparsed()
+        for textract_model in self.textract_models:
+            self.assertNotEqual(textract_model.raw_data, "")
+            self.assertIsNotNone(textract_model.parsed_data)
+            self.assertEqual(len(textract_model.as_pandas), 4)
+
+    def test_running_jobs_back_off(self):
+        with mock.patch.object(
+            DummySOPNParser, "get_job_status", return_value="IN_PROGRESS"
+        ) as get_job_status:
+            self.process_unparsed()
+            self.assertEqual(get_job_status.call_count, 2)
+            for textract_model in self.textract_models:
+                self.assertEqual(textract_model.status, "IN_PROGRESS")
+                self.assertEqual(textract_model.poll_attempts, 1)
+                self.assertEqual(textract_model.raw_data, "")
+                self.assertGreater(textract_model.next_poll, timezone.now())
+
+            # Not due to be asked about again yet
+            self.process_unparsed()
+            self.assertEqual(get_job_status.call_count, 2)
+
+    def test_errors_back_off(self):
+        with mock.patch.object(
+            DummySOPNParser, "get_job_status", side_effect=ValueError("Oops")
+        ):
+            self.process_unparsed()
+        for textract_model in self.textract_models:
+            self.assertEqual(textract_model.status, "NOT_STARTED")
+            self.assertEqual(textract_model.poll_attempts, 1)
+
+    def test_failed_jobs(self):
+        with mock.patch.object(
+            DummySOPNParser, "get_job_status", return_value="FAILED"
+        ), mock.patch.object(DummySOPNParser, "fetch_result") as fetch_result:
+            self.process_unparsed()
+        fetch_result.assert_not_called()
+        for textract_model in self.textract_models:
+            self.assertEqual(
+                textract_model.status, AWSTextractParsedSOPNStatus.FAILED
+            )
+            self.assertIsNone(textract_model.parsed_data)
+
+    def test_table_errors_dont_stop_the_batch(self):
+        dulwich_ballot = self.dulwich_post_ballot
+
+        def parse(ballot, reparse=False):
+            if ballot == dulwich_ballot:
+                raise Party.MultipleObjectsReturned("Two parties")
+            return parse_raw_data_for_ballot(ballot, reparse=reparse)
+
+        with mock.patch(
+            "sopn_parsing.management.commands.sopn_parsing_process_unparsed.parse_raw_data_for_ballot",
+            side_effect=parse,
+        ):
+            self.process_unparsed()
+        dulwich, camberwell = self.textract_models
+        self.assertIsNone(dulwich.parsed_data)
+        self.assertIsNotNone(camberwell.parsed_data)
+
+    def test_only_current_unlocked_ballots(self):
+        Ballot.objects.filter(pk=self.camberwell_post_ballot.pk).update(
+            candidates_locked=True
+        )
+        self.process_unparsed()
+        dulwich, camberwell = self.textract_models
+        self.assertNotEqual(dulwich.raw_data, "")
+        self.assertEqual(camberwell.status, "NOT_STARTED")
+        self.assertEqual(camberwell.raw_data, "")
+
+    def test_next_poll_interval(self):
+        self.assertEqual(next_poll_interval(1), timedelta(seconds=30))
+        self.assertEqual(next_poll_interval(3), timedelta(minutes=2))
+        self.assertEqual(next_poll_interval(20), MAX_POLL_INTERVAL)
@@ -232,11 +232,15 @@ class SuggestedWinner(TimeStampedModel):
                 membership.elected = True
                 membership.save()
                 if ALWAYS_REFRESH:
-                    MaterializedMemberships.refresh_view()
+                    MaterializedMemberships.refresh_rows(
+                        membership_ids=[membership.pk]
+                    )
                 return suggestion
             if not is_elected:
                 membership.elected = False
                 membership.save()
                 if ALWAYS_REFRESH:
-                    MaterializedMemberships.refresh_view()
+                    MaterializedMemberships.refresh_rows(
+                        membership_ids=[membership.pk]
+                    )
             return suggestion
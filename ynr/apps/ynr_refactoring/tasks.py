@@ -30,6 +30,15 @@ def moderation_queue_process_queued_images():
     call_command("moderation_queue_process_queued_images")
 
 
+@register_task(
+    name="Retry automated moderation of statements",
+    schedule_type=Schedule.CRON,
+    cron="4-59/5 * * * *",
+)
+def moderation_queue_moderate_statements():
+    call_command("moderation_queue_moderate_statements")
+
+
 @register_task(
     name="Parse raw data from SOPNs",
     schedule_type=Schedule.CRON,
@@ -46,6 +55,16 @@ def sopn_parsing_process_unparsed():
 )
 def update_data_export_view():
     call_command("update_data_export_view")
+    call_command("data_exports_prebuild_csvs")
+
+
+@register_task(
+    name="Rebuild materialized view",
+    schedule_type=Schedule.CRON,
+    cron="33 3 * * *",
+)
+def update_data_export_view_full():
+    call_command("update_data_export_view", full=True)
 
 
 @register_task(
@@ -301,6 +301,10 @@ SOURCE_HINTS = """
 # By default, cache successful results from Every Election for a day
 EE_CACHE_SECONDS = 86400
 
+# How hard the election importer is allowed to hit Every Election
+EE_IMPORT_REQUESTS_PER_SECOND = 5
+EE_IMPORT_THREADS = 4
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -353,6 +357,20 @@ CACHES = {
     }
 }
 
+# How long in seconds each process caches person search results and the
+# name synonyms table for. Set to 0 to disable the caches.
+SEARCH_CACHE_TTL = 60
+
+# How long in seconds each process keeps the parties and descriptions that
+# SOPN parsing matches against. Importing parties from the EC clears it
+# sooner. Set to 0 to load them for each SOPN.
+SOPN_PARTY_MATCHER_TTL = 60 * 60
+
+# Include people with similar names when reconciling people in bulk adding,
+# so that typos don't stop existing people being suggested. This needs the
+# pg_trgm extension.
+BULK_ADD_FUZZY_SEARCH = True
+
 # sorl-thumbnail settings:
 THUMBNAIL_CACHE = "default"
 THUMBNAIL_DEBUG = DEBUG
@@ -374,6 +392,21 @@ TWITTER_APP_ONLY_BEARER_TOKEN = os.environ.get(
 
 OPEN_AI_API_KEY = os.environ.get("OPEN_AI_API_KEY", None)
 
+# The backend that finds faces in uploaded photos so they can be cropped.
+# "moderation_queue.face_detection.OpenCVFaceDetectionBackend" can be used
+# instead of Rekognition if opencv-python-headless is installed.
+FACE_DETECTION_BACKEND = (
+    "moderation_queue.face_detection.RekognitionFaceDetectionBackend"
+)
+
+# The backend that checks edited statements to voters for abuse, after the
+# edit has been saved. Use
+# "moderation_queue.statement_moderation.FakeModerationBackend" to try this
+# out without the OpenAI API.
+STATEMENT_MODERATION_BACKEND = (
+    "moderation_queue.statement_moderation.OpenAIModerationBackend"
+)
+
 # A bearer token for the Mastodon API for mapping between
 # Mastodon usernames and IDs.
 MASTODON_APP_ONLY_BEARER_TOKEN = os.environ.get(
@@ -3,3 +3,6 @@
 NEEDS_REVIEW_FIRST_EDITS = 3
 NEEDS_REVIEW_MAX_REVERTS = 2
 LAST_24_HOURS = 24
+# How long in seconds the facts about a user that are used to decide if their
+# edits need review are cached for. They're also cleared when they change.
+NEEDS_REVIEW_USER_FACTS_CACHE_SECONDS = 60 * 60
@@ -7,6 +7,9 @@ from .base import *  # noqa: F403
 
 RUNNING_TESTS = True
 
+# Don't rate limit requests to the mocked or stub Every Election
+EE_IMPORT_REQUESTS_PER_SECOND = None
+
 DC_ENVIRONMENT = "testing"
 
 
@@ -23,6 +26,9 @@ SITE_NAME = "example.com"
 MIGRATION_MODULES = DisableMigrations()
 
 CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+SEARCH_CACHE_TTL = 0
+SOPN_PARTY_MATCHER_TTL = 0
+BULK_ADD_FUZZY_SEARCH = False
 
 REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] = {"anon": "1000/minute"}  # noqa: F405
 